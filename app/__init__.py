@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import os
 from typing import Any
 
 from flask import Flask
+from jinja2 import FileSystemBytecodeCache
 from flask_sqlalchemy import SQLAlchemy
 from flask_wtf.csrf import CSRFProtect
 
@@ -23,11 +25,55 @@ def create_app() -> Flask:
     db.init_app(app)
     csrf.init_app(app)
 
+    # Data version stamps (bumped on every ORM write)
+    from . import versions
+
+    versions.init_app(app)
+
+    # Change events for derived data (outbox rows written with every domain write)
+    from . import outbox
+
+    outbox.init_app(app)
+
+    # Outbox consumers register on import; the dispatcher delivers to these
+    from . import summaries
+
+    # Soft-deleted customers and portfolios stay out of ORM queries
+    from . import deletion
+
+    deletion.init_app(app)
+
+    # HTTP caching (fingerprinted static URLs)
+    from . import http_cache
+
+    http_cache.init_app(app)
+
+    # gzip / brotli for HTML and JSON responses
+    from . import compression
+
+    compression.init_app(app)
+
+    # Request metrics and /metrics
+    from . import metrics
+
+    metrics.init_app(app)
+
+    # Per-class concurrency limits for reports, lists and trades
+    from . import admission
+
+    admission.init_app(app)
+
     # Blueprints
     from .routes import register_blueprints
 
     register_blueprints(app)
 
+    # Jinja: keep compiled templates on disk so workers skip the compile step
+    cache_dir = app.config.get("JINJA_BYTECODE_CACHE_DIR") or None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
     # Jinja filters or globals can be registered here if needed
 
     # Ensure tables exist (safe no-ops if already created)
@@ -0,0 +1,204 @@
+"""Admission control: per-class concurrency limits so heavy reports cannot starve trades.
+
+Views are tagged with an endpoint class through the `limit` decorator:
+
+- reports: the report pages, team rollups and the customer page, whose ledger
+  figures are read concurrently (long queries, big result sets)
+- lists: list pages, search and the JSON API's reads (lists, holdings, one customer)
+- trades: trade submission (the trade form's POST and POST /api/v1/orders)
+
+Each class runs at most `limit` requests at once. Further requests wait in a bounded
+queue for up to ADMISSION_QUEUE_TIMEOUT seconds; when the queue is full, or the wait
+runs out, the request is turned away at once with 503 and a Retry-After estimated
+from how long the class's requests have been taking. The decorator sits inside the
+login and role checks, so anonymous and forbidden requests never take or wait for a
+slot; apart from their user lookup nothing is queried before admission. A streamed page
+(app/streaming.py) keeps its slot until the last byte is sent, since it reads rows
+while it sends them.
+
+All classes also share ADMISSION_CAPACITY slots (keep it below the SQLAlchemy pool
+size plus overflow). A class's `reserved` slots are kept free for it: other classes
+can only take a shared slot while enough are left to cover every reservation not in
+use. With the defaults, trades always find 3 slots however busy reports and lists are.
+
+Limits are per process; with several worker processes each enforces its own.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from functools import wraps
+from typing import Any, Callable
+
+from flask import Flask, Response, abort, current_app, jsonify, request
+
+from . import metrics
+
+# Weight of the latest request in each class's running average hold time
+HOLD_SMOOTHING = 0.2
+MAX_RETRY_AFTER = 60
+
+ADMISSION_REJECTED = metrics.Counter(
+    "admission_rejected_total", "Requests turned away with 503, by endpoint class and reason.", ("class", "reason")
+)
+ADMISSION_WAIT = metrics.Histogram(
+    "admission_wait_seconds", "Time admitted requests spent queued, by endpoint class.", ("class",)
+)
+
+
+class Rejected(Exception):
+    """A request that was not admitted; `retry_after` is in seconds."""
+
+    def __init__(self, name: str, reason: str, retry_after: int) -> None:
+        super().__init__(f"{name}: {reason}")
+        self.name = name
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class EndpointClass:
+    """Limits and live counts of one endpoint class (guarded by the controller's lock)."""
+
+    def __init__(self, name: str, limit: int, queue: int, reserved: int = 0) -> None:
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.reserved = reserved
+        self.active = 0
+        self.waiting = 0
+        self.hold_seconds = 1.0
+
+    def retry_after(self) -> int:
+        """Seconds until the requests ahead of a new arrival are likely done."""
+        ahead = self.active + self.waiting + 1
+        return max(1, min(MAX_RETRY_AFTER, math.ceil(self.hold_seconds * ahead / max(self.limit, 1))))
+
+
+class AdmissionController:
+    """Admits requests per endpoint class against per-class limits and a shared capacity."""
+
+    def __init__(self, capacity: int, classes: dict[str, dict[str, int]], queue_timeout: float) -> None:
+        self.capacity = capacity
+        self.queue_timeout = queue_timeout
+        self.classes = {name: EndpointClass(name, **settings) for name, settings in classes.items()}
+        self._cond = threading.Condition()
+
+    def _can_run(self, cls: EndpointClass) -> bool:
+        if cls.active >= cls.limit:
+            return False
+        in_use = sum(c.active for c in self.classes.values())
+        owed = sum(max(c.reserved - c.active, 0) for c in self.classes.values() if c is not cls)
+        return self.capacity - in_use > owed
+
+    def acquire(self, name: str) -> float:
+        """Take a slot for class `name`, waiting if need be; returns the seconds waited or raises Rejected."""
+        cls = self.classes[name]
+        with self._cond:
+            if cls.waiting == 0 and self._can_run(cls):
+                cls.active += 1
+                return 0.0
+            if cls.waiting >= cls.queue:
+                raise Rejected(name, "queue_full", cls.retry_after())
+            cls.waiting += 1
+            started = time.monotonic()
+            deadline = started + self.queue_timeout
+            try:
+                while not self._can_run(cls):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Rejected(name, "timeout", cls.retry_after())
+                    self._cond.wait(remaining)
+            finally:
+                cls.waiting -= 1
+            cls.active += 1
+            return time.monotonic() - started
+
+    def release(self, name: str, held: float) -> None:
+        cls = self.classes[name]
+        with self._cond:
+            cls.active -= 1
+            cls.hold_seconds += HOLD_SMOOTHING * (held - cls.hold_seconds)
+            self._cond.notify_all()
+
+    def state(self) -> dict[str, dict[str, Any]]:
+        with self._cond:
+            return {
+                name: {"active": c.active, "waiting": c.waiting, "limit": c.limit, "reserved": c.reserved}
+                for name, c in self.classes.items()
+            }
+
+
+_controller: AdmissionController | None = None
+
+
+def init_app(app: Flask) -> None:
+    """Build the controller from config (ADMISSION_*); a no-op when ADMISSION_ENABLED is off."""
+    global _controller
+    if not app.config.get("ADMISSION_ENABLED"):
+        return
+    controller = AdmissionController(
+        app.config["ADMISSION_CAPACITY"],
+        app.config["ADMISSION_CLASSES"],
+        app.config["ADMISSION_QUEUE_TIMEOUT"],
+    )
+    app.extensions["admission"] = controller
+    _controller = controller
+
+
+def _busy(exc: Rejected) -> Any:
+    message = "The server is busy; please retry shortly."
+    if request.blueprint == "api":
+        response = jsonify({"error": message})
+        response.status_code = 503
+        response.headers["Retry-After"] = str(exc.retry_after)
+        return response
+    abort(503, description=message, retry_after=exc.retry_after)
+
+
+def limit(endpoint_class: str | dict[str, str]) -> Callable:
+    """
+    Decorator: run the view under an endpoint class's limits.
+
+    `endpoint_class` is a class name, or a mapping of HTTP method to class name for
+    views whose methods differ in weight; methods not in the mapping are not limited.
+    """
+    def decorator(f: Callable) -> Callable:
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            controller = current_app.extensions.get("admission")
+            name = endpoint_class if isinstance(endpoint_class, str) else endpoint_class.get(request.method)
+            if controller is None or name is None:
+                return f(*args, **kwargs)
+            try:
+                waited = controller.acquire(name)
+            except Rejected as exc:
+                ADMISSION_REJECTED.inc(**{"class": name, "reason": exc.reason})
+                return _busy(exc)
+            ADMISSION_WAIT.observe(waited, **{"class": name})
+            started = time.perf_counter()
+            streamed = False
+            try:
+                response = f(*args, **kwargs)
+                if isinstance(response, Response) and response.is_streamed:
+                    # A streamed page queries while it is sent; keep the slot until the end
+                    response.call_on_close(lambda: controller.release(name, time.perf_counter() - started))
+                    streamed = True
+                return response
+            finally:
+                if not streamed:
+                    controller.release(name, time.perf_counter() - started)
+        return decorated_function
+    return decorator
+
+
+def _admission_stats():
+    if _controller is None:
+        return
+    state = _controller.state()
+    yield "admission_active", "gauge", "Requests running, by endpoint class.", [({"class": n}, s["active"]) for n, s in state.items()]
+    yield "admission_waiting", "gauge", "Requests queued for a slot, by endpoint class.", [({"class": n}, s["waiting"]) for n, s in state.items()]
+
+
+metrics.register_collector(_admission_stats)
@@ -0,0 +1,255 @@
+"""The three reports, answered offline from a columnar snapshot (app/snapshot.py).
+
+Nothing here touches the database. The snapshot keeps transactions sorted by
+portfolio, with each portfolio's [t_start, t_end) slice. So per-portfolio aggregates
+are segment reductions (np.add.reduceat / np.maximum.reduceat) in one pass over a
+column, and per-bucket aggregates then run over portfolios only. Each report mirrors
+its SQL in sql/report_queries.sql and takes the web reports' optional date range
+(date_to exclusive).
+
+Amounts come back as Decimal, like the SQL rows.
+"""
+
+from __future__ import annotations
+
+from datetime import date
+from decimal import Decimal
+from typing import Any, Iterable
+
+import numpy as np
+
+from .snapshot import Snapshot
+
+OWNER_TYPES = ("Customer", "Employee")
+
+
+def _money(cents: Any) -> Decimal:
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def _trade_mask(snap: Snapshot, date_from: date | None, date_to: date | None) -> np.ndarray | None:
+    if date_from is None and date_to is None:
+        return None
+    dates = snap.column("transactions", "transaction_date")
+    mask = np.ones(len(dates), dtype=bool)
+    if date_from is not None:
+        mask &= dates >= np.datetime64(date_from, "s")
+    if date_to is not None:
+        mask &= dates < np.datetime64(date_to, "s")
+    return mask
+
+
+def _segments(snap: Snapshot) -> tuple[np.ndarray, np.ndarray]:
+    """(portfolios that have trades, their slice starts)."""
+    starts = snap.column("portfolios", "t_start")
+    ends = snap.column("portfolios", "t_end")
+    nonempty = np.flatnonzero(ends > starts)
+    return nonempty, np.asarray(starts[nonempty])
+
+
+def _reduce(ufunc: np.ufunc, values: np.ndarray, nonempty: np.ndarray, starts: np.ndarray, n: int, empty: int) -> np.ndarray:
+    out = np.full(n, empty, dtype=np.int64)
+    if len(starts):
+        out[nonempty] = ufunc.reduceat(values, starts)
+    return out
+
+
+def portfolio_totals(
+    snap: Snapshot,
+    date_from: date | None = None,
+    date_to: date | None = None,
+) -> dict[str, np.ndarray]:
+    """
+    Per-portfolio trade count, value, largest trade and commissions (cents), aligned
+    with the portfolios columns. `max_cents` is -1 where a portfolio has no trades.
+    """
+    n = snap.meta["rows"]["portfolios"]
+    nonempty, starts = _segments(snap)
+    value = snap.column("transactions", "value_cents")
+    fee = snap.column("transactions", "fee_cents")
+    mask = _trade_mask(snap, date_from, date_to)
+    if mask is None:
+        counts = np.asarray(snap.column("portfolios", "t_end") - snap.column("portfolios", "t_start"))
+        largest = value
+    else:
+        counts = _reduce(np.add, mask.astype(np.int64), nonempty, starts, n, 0)
+        value = np.where(mask, value, 0)
+        fee = np.where(mask, fee, 0)
+        largest = np.where(mask, value, np.iinfo(np.int64).min)
+    max_cents = _reduce(np.maximum, largest, nonempty, starts, n, -1)
+    max_cents[counts == 0] = -1
+    return {
+        "count": counts,
+        "value_cents": _reduce(np.add, value, nonempty, starts, n, 0),
+        "max_cents": max_cents,
+        "fee_cents": _reduce(np.add, fee, nonempty, starts, n, 0),
+    }
+
+
+def portfolio_details(
+    snap: Snapshot,
+    p_ids: Iterable[int] | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    limit: int | None = None,
+) -> dict[str, np.ndarray]:
+    """
+    JOIN report as columns: one entry per trade, ordered by portfolio then newest
+    first. `p_ids` restricts it to some portfolios (their slices are read directly).
+    """
+    portfolio_ids = snap.column("portfolios", "p_id")
+    starts = snap.column("portfolios", "t_start")
+    ends = snap.column("portfolios", "t_end")
+    if p_ids is None:
+        rows = np.arange(len(snap.column("transactions", "t_id")))
+    else:
+        wanted = np.unique(np.fromiter(p_ids, dtype=np.int64))
+        pos = np.searchsorted(portfolio_ids, wanted).clip(max=max(len(portfolio_ids) - 1, 0))
+        found = pos[portfolio_ids[pos] == wanted] if len(portfolio_ids) else pos[:0]
+        rows = np.concatenate([np.arange(starts[i], ends[i]) for i in found] or [np.empty(0, dtype=np.int64)])
+
+    mask = _trade_mask(snap, date_from, date_to)
+    if mask is not None:
+        rows = rows[mask[rows]]
+    dates = snap.column("transactions", "transaction_date")[rows]
+    t_p_ids = snap.column("transactions", "p_id")[rows]
+    # Rows are already grouped by portfolio; order each group newest first
+    rows = rows[np.lexsort((-dates.astype(np.int64), t_p_ids))]
+    if limit is not None:
+        rows = rows[:limit]
+
+    t_p_ids = snap.column("transactions", "p_id")[rows]
+    portfolio_pos = np.searchsorted(portfolio_ids, t_p_ids)
+    product_ids = snap.column("products", "product_id")
+    t_product_ids = snap.column("transactions", "product_id")[rows]
+    product_pos = np.searchsorted(product_ids, t_product_ids).clip(max=max(len(product_ids) - 1, 0))
+    # JOIN products: trades of a deleted product drop out
+    known = product_ids[product_pos] == t_product_ids if len(product_ids) else np.zeros(len(rows), bool)
+    rows, portfolio_pos, product_pos = rows[known], portfolio_pos[known], product_pos[known]
+
+    owned_by_customer = snap.column("portfolios", "c_id")[portfolio_pos] >= 0
+    return {
+        "portfolio_id": snap.column("transactions", "p_id")[rows],
+        "portfolio_name": snap.decode("portfolios", "name", snap.codes("portfolios", "name")[portfolio_pos]),
+        "currency": snap.decode("portfolios", "currency", snap.codes("portfolios", "currency")[portfolio_pos]),
+        "risk_level": snap.decode("portfolios", "risk_level", snap.codes("portfolios", "risk_level")[portfolio_pos]),
+        "owner_name": snap.decode("portfolios", "owner_name", snap.codes("portfolios", "owner_name")[portfolio_pos]),
+        "owner_type": np.where(owned_by_customer, OWNER_TYPES[0], OWNER_TYPES[1]),
+        "product_name": snap.decode("products", "name", snap.codes("products", "name")[product_pos]),
+        "ticker_symbol": snap.decode("products", "ticker", snap.codes("products", "ticker")[product_pos]),
+        "quantity": snap.column("transactions", "quantity")[rows],
+        "price_cents": snap.column("transactions", "price_cents")[rows],
+        "transaction_date": snap.column("transactions", "transaction_date")[rows],
+    }
+
+
+def top_portfolios(
+    snap: Snapshot,
+    top: int | None = None,
+    percentile: float | None = None,
+    currency: str | None = None,
+    owner_type: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+) -> list[dict[str, Any]]:
+    """
+    WINDOW report, as reports.build_top_portfolios_query: portfolios above the average
+    value of the selected portfolios with trades, or at/above a percentile rank.
+    """
+    totals = portfolio_totals(snap, date_from, date_to)
+    n = len(totals["count"])
+    selected = np.ones(n, dtype=bool)
+    if currency:
+        code = snap.code_of("portfolios", "currency", currency)
+        selected &= snap.codes("portfolios", "currency") == (code if code is not None else -2)
+    if owner_type in OWNER_TYPES:
+        by_customer = snap.column("portfolios", "c_id") >= 0
+        selected &= by_customer if owner_type == "Customer" else ~by_customer
+
+    index = np.flatnonzero(selected)
+    values = totals["value_cents"][index]
+    has_trades = totals["count"][index] > 0
+    if not len(index):
+        return []
+    # AVG over portfolios with trades, kept as an exact (sum, count) pair
+    avg_sum, avg_n = int(values[has_trades].sum()), int(has_trades.sum())
+    # PERCENT_RANK() OVER (ORDER BY value): share of rows strictly below, over n - 1
+    ranked = np.sort(values)
+    pct_rank = np.searchsorted(ranked, values, "left") / (len(values) - 1) if len(values) > 1 else np.zeros(len(values))
+
+    if percentile is not None:
+        keep = pct_rank >= percentile / 100.0
+    elif avg_n:
+        keep = values * avg_n > avg_sum
+    else:
+        keep = np.zeros(len(index), dtype=bool)
+    index, values, pct_rank = index[keep], values[keep], pct_rank[keep]
+    p_ids = snap.column("portfolios", "p_id")[index]
+    order = np.lexsort((p_ids, -values))
+    if top is not None:
+        order = order[:top]
+    index, values, pct_rank, p_ids = index[order], values[order], pct_rank[order], p_ids[order]
+
+    names = snap.decode("portfolios", "name", snap.codes("portfolios", "name")[index])
+    owners = snap.decode("portfolios", "owner_name", snap.codes("portfolios", "owner_name")[index])
+    currencies = snap.decode("portfolios", "currency", snap.codes("portfolios", "currency")[index])
+    by_customer = snap.column("portfolios", "c_id")[index] >= 0
+    avg_value = (Decimal(avg_sum) / avg_n / 100).quantize(Decimal("0.000001")) if avg_n else None
+    return [
+        {
+            "portfolio_id": int(p_ids[i]),
+            "portfolio_name": names[i],
+            "owner_name": owners[i],
+            "owner_type": OWNER_TYPES[0] if by_customer[i] else OWNER_TYPES[1],
+            "currency": currencies[i],
+            "total_value": _money(values[i]),
+            "avg_value": avg_value,
+            "pct_rank": float(pct_rank[i]),
+        }
+        for i in range(len(index))
+    ]
+
+
+def performance_summary(
+    snap: Snapshot,
+    date_from: date | None = None,
+    date_to: date | None = None,
+) -> list[dict[str, Any]]:
+    """AGGREGATE report: per (currency, risk level) counts, totals, average, maximum and commissions."""
+    totals = portfolio_totals(snap, date_from, date_to)
+    currency_codes = np.asarray(snap.codes("portfolios", "currency"))
+    risk_codes = np.asarray(snap.codes("portfolios", "risk_level"))
+    with_currency = currency_codes >= 0
+    risk_slots = len(snap.dictionary("portfolios", "risk_level")) + 1
+    bucket_keys = currency_codes[with_currency].astype(np.int64) * risk_slots + (risk_codes[with_currency] + 1)
+    keys, bucket = np.unique(bucket_keys, return_inverse=True)
+    n = len(keys)
+
+    def per_bucket(ufunc: np.ufunc, values: np.ndarray, empty: int) -> np.ndarray:
+        out = np.full(n, empty, dtype=np.int64)
+        ufunc.at(out, bucket, values[with_currency])
+        return out
+
+    portfolio_count = np.bincount(bucket, minlength=n)
+    trade_count = per_bucket(np.add, totals["count"], 0)
+    invested = per_bucket(np.add, totals["value_cents"], 0)
+    largest = per_bucket(np.maximum, totals["max_cents"], -1)
+    commissions = per_bucket(np.add, totals["fee_cents"], 0)
+
+    currencies = snap.dictionary("portfolios", "currency")
+    risk_levels = [None] + snap.dictionary("portfolios", "risk_level")
+    rows = []
+    for i in np.flatnonzero(trade_count > 0):
+        rows.append({
+            "currency": currencies[keys[i] // risk_slots],
+            "risk_level": risk_levels[keys[i] % risk_slots],
+            "portfolio_count": int(portfolio_count[i]),
+            "total_transactions": int(trade_count[i]),
+            "total_invested": _money(invested[i]),
+            "avg_transaction_value": (_money(invested[i]) / int(trade_count[i])).quantize(Decimal("0.000001")),
+            "max_transaction_value": _money(largest[i]),
+            "total_commissions": _money(commissions[i]),
+        })
+    rows.sort(key=lambda r: r["total_invested"], reverse=True)
+    rows.sort(key=lambda r: r["currency"])
+    return rows
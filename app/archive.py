@@ -0,0 +1,386 @@
+"""Monthly partitions of the transactions table and the cold archive of closed months.
+
+transactions is partitioned by RANGE COLUMNS (transaction_date): one partition per
+month named pYYYYMM, plus p_future for anything later
+(sql/migration_transactions_partitioning.sql). A query that bounds transaction_date
+reads only the months in range.
+
+Archiving a closed month takes three steps:
+
+1. Stream its rows to <ARCHIVE_DIR>/transactions_YYYYMM.csv.gz and check the row
+   count against the partition.
+2. Store per (portfolio, product) totals for the month in archived_trade_totals, so
+   holdings, net worth and the performance rollup still cover all history.
+3. Drop the partition and record the file in <ARCHIVE_DIR>/manifest.json, with its
+   rows, T_ID range and SHA-256.
+
+Re-running a month is safe. If a crash leaves the totals stored but the partition in
+place, the month is finished without storing them twice. Until that drop, balances
+count the month twice.
+
+Full-history reads use the monthly totals, or read_rows() for the rows themselves
+(by_portfolio() puts them in per-portfolio order without holding them in memory).
+lots.rebuild() replays only live months.
+"""
+
+from __future__ import annotations
+
+import csv
+import gzip
+import hashlib
+import heapq
+import json
+import os
+import pickle
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import IO, Any, Iterable, Iterator
+
+from flask import current_app
+from sqlalchemy import func, select, text
+
+from . import cursors, db, lots, versions
+from .models import ArchivedTradeTotal
+
+FUTURE = "p_future"
+MANIFEST = "manifest.json"
+COLUMNS = ("T_ID", "P_ID", "Product_ID", "quantity", "price_per_unit", "transaction_date", "commission_fee")
+FETCH_ROWS = 10_000
+# Rows sorted in memory at a time by by_portfolio(); the rest wait in temporary files
+SORT_RUN_ROWS = 50_000
+
+
+class ArchiveError(RuntimeError):
+    """A month that cannot be archived (still open, not consumed by the lot engine, no partition)."""
+
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"p{month:%Y%m}"
+
+
+def archive_dir() -> Path:
+    """ARCHIVE_DIR from the config; relative paths are taken from the project root."""
+    path = Path(current_app.config["ARCHIVE_DIR"])
+    if not path.is_absolute():
+        path = Path(current_app.root_path).parent / path
+    return path
+
+
+def _db_today() -> date:
+    return db.session.execute(select(func.now())).scalar().date()
+
+
+def partitions() -> list[dict[str, Any]]:
+    """transactions partitions in order: name, month (None for p_future) and estimated rows."""
+    rows = db.session.execute(
+        text(
+            """
+            SELECT PARTITION_NAME AS name, TABLE_ROWS AS est_rows
+            FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'transactions'
+              AND PARTITION_NAME IS NOT NULL
+            ORDER BY PARTITION_ORDINAL_POSITION
+            """
+        )
+    ).mappings()
+    return [
+        {
+            "name": r["name"],
+            "month": None if r["name"] == FUTURE else datetime.strptime(r["name"][1:], "%Y%m").date(),
+            "est_rows": int(r["est_rows"] or 0),
+        }
+        for r in rows
+    ]
+
+
+def add_future_months(months_ahead: int = 3) -> list[str]:
+    """
+    Split p_future into monthly partitions through `months_ahead` months after the
+    current one. The first run starts at the oldest trade's month. Returns the names
+    of the partitions created.
+    """
+    parts = partitions()
+    if not parts:
+        raise ArchiveError("transactions is not partitioned; run sql/migration_transactions_partitioning.sql first.")
+    today = _db_today()
+    months = [p["month"] for p in parts if p["month"] is not None]
+    if months:
+        first = add_months(months[-1], 1)
+    else:
+        oldest = db.session.execute(text("SELECT MIN(transaction_date) FROM transactions")).scalar()
+        first = month_start(oldest.date() if oldest else today)
+    last = add_months(month_start(today), months_ahead)
+
+    new = []
+    month = first
+    while month <= last:
+        new.append(month)
+        month = add_months(month, 1)
+    if not new:
+        return []
+    definitions = ", ".join(
+        f"PARTITION {partition_name(m)} VALUES LESS THAN ('{add_months(m, 1).isoformat()}')" for m in new
+    )
+    db.session.execute(
+        text(
+            f"ALTER TABLE transactions REORGANIZE PARTITION {FUTURE} INTO "
+            f"({definitions}, PARTITION {FUTURE} VALUES LESS THAN (MAXVALUE))"
+        )
+    )
+    db.session.commit()
+    return [partition_name(m) for m in new]
+
+
+def manifest(directory: Path | None = None) -> dict[str, dict[str, Any]]:
+    """Archived months by period ('YYYY-MM'), as recorded in manifest.json."""
+    path = (directory or archive_dir()) / MANIFEST
+    if not path.exists():
+        return {}
+    with path.open(encoding="utf-8") as fh:
+        return {entry["period"]: entry for entry in json.load(fh)["months"]}
+
+
+def _save_manifest(directory: Path, entries: dict[str, dict[str, Any]]) -> None:
+    path = directory / MANIFEST
+    tmp = path.with_name(MANIFEST + ".tmp")
+    with tmp.open("w", encoding="utf-8") as fh:
+        json.dump(
+            {"table": "transactions", "columns": COLUMNS, "months": [entries[k] for k in sorted(entries)]},
+            fh,
+            indent=2,
+        )
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _export(name: str, path: Path) -> dict[str, Any]:
+    """Stream one partition to a gzip CSV in T_ID order; returns rows, T_ID range, size and hash."""
+    tmp = path.with_name(path.name + ".tmp")
+    rows = 0
+    min_t_id = max_t_id = None
+    stmt = text(
+        f"SELECT {', '.join(COLUMNS)} FROM transactions PARTITION ({name}) ORDER BY T_ID"
+    ).execution_options(stream_results=True)
+    with gzip.open(tmp, "wt", newline="", encoding="utf-8") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(COLUMNS)
+        for chunk in db.session.execute(stmt).partitions(FETCH_ROWS):
+            writer.writerows(
+                (
+                    r.T_ID, r.P_ID, r.Product_ID, r.quantity, r.price_per_unit,
+                    r.transaction_date.isoformat(sep=" "),
+                    "" if r.commission_fee is None else r.commission_fee,
+                )
+                for r in chunk
+            )
+            if min_t_id is None:
+                min_t_id = chunk[0].T_ID
+            max_t_id = chunk[-1].T_ID
+            rows += len(chunk)
+    os.replace(tmp, path)
+    return {
+        "file": path.name,
+        "rows": rows,
+        "min_t_id": min_t_id,
+        "max_t_id": max_t_id,
+        "bytes": path.stat().st_size,
+        "sha256": _sha256(path),
+    }
+
+
+def archive_month(month: date, directory: Path | None = None) -> dict[str, Any]:
+    """Archive one closed month (see the module docstring); returns its manifest entry."""
+    directory = directory or archive_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    month = month_start(month)
+    period = f"{month:%Y-%m}"
+    name = partition_name(month)
+    entries = manifest(directory)
+    if entries.get(period, {}).get("dropped"):
+        return entries[period]
+
+    if name not in {p["name"] for p in partitions()}:
+        raise ArchiveError(f"transactions has no partition {name} for {period}.")
+    if add_months(month, 1) > month_start(_db_today()):
+        raise ArchiveError(f"{period} is not closed yet.")
+    count, max_t_id = db.session.execute(
+        text(f"SELECT COUNT(*), MAX(T_ID) FROM transactions PARTITION ({name})")
+    ).one()
+    lots_cursor = cursors.get(lots.CURSOR)
+    if count and lots_cursor and lots_cursor < max_t_id:
+        raise ArchiveError(
+            f"The lot engine has not consumed {period} yet (cursor T_ID {lots_cursor}, "
+            f"month ends at T_ID {max_t_id}); run scripts/replay_lots.py first."
+        )
+
+    stored = db.session.execute(
+        select(func.count()).select_from(ArchivedTradeTotal).where(ArchivedTradeTotal.period == month)
+    ).scalar()
+    if not stored:
+        path = directory / f"transactions_{month:%Y%m}.csv.gz"
+        entry = {"period": period, "partition": name, **_export(name, path), "dropped": False}
+        if entry["rows"] != count:
+            path.unlink()
+            raise ArchiveError(f"{period}: exported {entry['rows']} rows but the partition holds {count}; nothing archived.")
+        entries[period] = entry
+        _save_manifest(directory, entries)
+        db.session.execute(
+            text(
+                f"""
+                INSERT INTO archived_trade_totals
+                  (period, P_ID, Product_ID, trade_count, quantity, invested, commissions,
+                   commission_count, max_value)
+                SELECT :period, P_ID, Product_ID, COUNT(*), SUM(quantity),
+                       SUM(quantity * price_per_unit), COALESCE(SUM(commission_fee), 0),
+                       COUNT(commission_fee), MAX(quantity * price_per_unit)
+                FROM transactions PARTITION ({name})
+                GROUP BY P_ID, Product_ID
+                """
+            ),
+            {"period": month},
+        )
+        versions.bump("archived_trade_totals", "transactions", versions.REWRITE_STAMPS["transactions"])
+        db.session.commit()
+    elif period not in entries:
+        raise ArchiveError(f"{period}: totals are stored but {MANIFEST} has no file for it; restore the manifest first.")
+
+    # DDL commits implicitly; bump again so caches built in between are dropped
+    db.session.execute(text(f"ALTER TABLE transactions DROP PARTITION {name}"))
+    versions.bump("transactions", versions.REWRITE_STAMPS["transactions"])
+    db.session.commit()
+
+    entry = entries[period]
+    entry["dropped"] = True
+    entry["archived_at"] = datetime.utcnow().replace(microsecond=0).isoformat()
+    _save_manifest(directory, entries)
+    return entry
+
+
+def archive_before(before: date, directory: Path | None = None) -> list[dict[str, Any]]:
+    """Archive every monthly partition that ends on or before the first day of `before`'s month."""
+    cutoff = month_start(before)
+    return [
+        archive_month(p["month"], directory)
+        for p in partitions()
+        if p["month"] is not None and add_months(p["month"], 1) <= cutoff
+    ]
+
+
+def verify(directory: Path | None = None) -> list[str]:
+    """Problems with archived files (missing, or not matching their manifest hash); empty means intact."""
+    directory = directory or archive_dir()
+    problems = []
+    for period, entry in sorted(manifest(directory).items()):
+        path = directory / entry["file"]
+        if not path.exists():
+            problems.append(f"{period}: {entry['file']} is missing")
+        elif _sha256(path) != entry["sha256"]:
+            problems.append(f"{period}: {entry['file']} does not match its SHA-256")
+    return problems
+
+
+def read_rows(
+    date_from: date | None = None,
+    date_to: date | None = None,
+    directory: Path | None = None,
+) -> Iterator[dict[str, Any]]:
+    """Archived trades with date_from <= transaction_date < date_to, oldest month first."""
+    directory = directory or archive_dir()
+    for period, entry in sorted(manifest(directory).items()):
+        if not entry.get("dropped"):
+            continue
+        month = datetime.strptime(period, "%Y-%m").date()
+        if (date_to is not None and month >= date_to) or (
+            date_from is not None and add_months(month, 1) <= date_from
+        ):
+            continue
+        with gzip.open(directory / entry["file"], "rt", newline="", encoding="utf-8") as fh:
+            for record in csv.DictReader(fh):
+                when = datetime.fromisoformat(record["transaction_date"])
+                if (date_from is not None and when.date() < date_from) or (
+                    date_to is not None and when.date() >= date_to
+                ):
+                    continue
+                yield {
+                    "T_ID": int(record["T_ID"]),
+                    "P_ID": int(record["P_ID"]),
+                    "Product_ID": int(record["Product_ID"]),
+                    "quantity": int(record["quantity"]),
+                    "price_per_unit": Decimal(record["price_per_unit"]),
+                    "transaction_date": when,
+                    "commission_fee": Decimal(record["commission_fee"]) if record["commission_fee"] else None,
+                }
+
+
+def _portfolio_order(row: dict[str, Any]) -> tuple[int, float]:
+    """P_ID, then newest trade first."""
+    return row["P_ID"], -row["transaction_date"].timestamp()
+
+
+def _spill(rows: list[dict[str, Any]]) -> IO[bytes]:
+    run = tempfile.TemporaryFile()
+    for row in rows:
+        pickle.dump(row, run, pickle.HIGHEST_PROTOCOL)
+    run.seek(0)
+    return run
+
+
+def _unspill(run: IO[bytes]) -> Iterator[dict[str, Any]]:
+    while True:
+        try:
+            yield pickle.load(run)
+        except EOFError:
+            return
+
+
+def _merge(runs: list[IO[bytes]], tail: list[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+    try:
+        yield from heapq.merge(*(_unspill(run) for run in runs), tail, key=_portfolio_order)
+    finally:
+        for run in runs:
+            run.close()
+
+
+def by_portfolio(rows: Iterable[dict[str, Any]], run_rows: int = SORT_RUN_ROWS) -> Iterator[dict[str, Any]]:
+    """
+    Archived rows (from read_rows) ordered by P_ID, newest first within a portfolio.
+
+    An external merge sort: `rows` are read before this returns, `run_rows` at a time,
+    each run sorted and written to a temporary file; the iterator returned merges the
+    runs. Memory holds one run however many rows there are.
+    """
+    runs: list[IO[bytes]] = []
+    batch: list[dict[str, Any]] = []
+    try:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= run_rows:
+                batch.sort(key=_portfolio_order)
+                runs.append(_spill(batch))
+                batch = []
+    except BaseException:
+        for run in runs:
+            run.close()
+        raise
+    batch.sort(key=_portfolio_order)
+    return _merge(runs, batch)
@@ -5,7 +5,7 @@ from __future__ import annotations
 from functools import wraps
 from typing import Callable
 
-from flask import session, redirect, url_for, flash, abort
+from flask import session, redirect, url_for, flash, abort, jsonify
 from werkzeug.exceptions import Forbidden
 
 from .models import User
@@ -48,6 +48,18 @@ def role_required(*allowed_roles: str) -> Callable:
     return decorator
 
 
+def api_login_required(f: Callable) -> Callable:
+    """Decorator for JSON endpoints: 401 instead of a redirect when not logged in."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        user_id = session.get("user_id")
+        user = User.query.get(user_id) if user_id is not None else None
+        if user is None or not user.is_active:
+            return jsonify({"error": "authentication required"}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+
 def manager_required(f: Callable) -> Callable:
     """Decorator to require manager or superadmin role."""
     return role_required("manager", "superadmin")(f)
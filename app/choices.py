@@ -0,0 +1,62 @@
+"""Dropdown choices for the create/edit forms, read as (id, label) columns only.
+
+Each provider selects just the key and label columns (no ORM objects) and caches the
+list per data version of its table, so a form page with unchanged customers or
+employees reads one data_versions row instead of the whole table. Submitted IDs are
+checked with `exists`, a primary-key lookup, so a POST never loads the list at all
+(see LookupSelectField in app/forms.py).
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+from sqlalchemy import select
+
+from . import db, versions
+from .cache import LRUCache
+from .models import Customer, Employee
+
+# (provider name, table version) -> tuple of (id, label)
+_choices = LRUCache("choices", maxsize=16)
+
+
+class ChoiceProvider:
+    """
+    (id, label) choices of one table, ordered for display. `key` is the primary key
+    column; the label is the `label` columns joined with spaces.
+    """
+
+    def __init__(self, name: str, table: str, key: Any, label: tuple[Any, ...], order_by: tuple[Any, ...]) -> None:
+        self.name = name
+        self.table = table
+        self.key = key
+        self.label = label
+        self.order_by = order_by
+
+    def choices(self) -> tuple[tuple[int, str], ...]:
+        version = versions.current(self.table)[self.table][0]
+        return _choices.get_or_set((self.name, version), self._load)
+
+    def _load(self) -> tuple[tuple[int, str], ...]:
+        rows = db.session.execute(select(self.key, *self.label).order_by(*self.order_by))
+        return tuple((int(key), " ".join(str(part) for part in parts)) for key, *parts in rows)
+
+    def exists(self, key: int) -> bool:
+        return db.session.scalar(select(self.key).where(self.key == key)) is not None
+
+
+CUSTOMERS = ChoiceProvider(
+    "customers",
+    "customers",
+    Customer.c_id,
+    (Customer.first_name, Customer.last_name),
+    (Customer.first_name.asc(), Customer.last_name.asc()),
+)
+EMPLOYEES = ChoiceProvider(
+    "employees",
+    "employees",
+    Employee.e_id,
+    (Employee.employee_name,),
+    (Employee.employee_name.asc(),),
+)
@@ -0,0 +1,120 @@
+"""Response compression for HTML and JSON, negotiated from Accept-Encoding.
+
+Brotli is used when the `brotli` package is installed and the client prefers it (or
+ranks it equal to gzip); otherwise gzip. Bodies shorter than COMPRESS_MIN_BYTES go
+out as they are, since the headers would cost about as much as they save. Streamed
+responses (app/streaming.py) have no length up front and are always compressed: each
+write is compressed and flushed as it arrives, so the browser can render the top of
+the page while the rows are still being read.
+
+A compressed response gets `Vary: Accept-Encoding` and its ETag is made weak, as the
+bytes differ from the identity encoding; http_cache.conditional compares ETags weakly.
+Its 304s (from http_cache.conditional) carry the same Vary header.
+Set COMPRESS_RESPONSES=0 when a proxy in front of the app compresses instead.
+"""
+
+from __future__ import annotations
+
+import zlib
+from typing import Any, Iterable, Iterator
+
+from flask import Flask, current_app, request
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+MIMETYPES = ("text/html", "application/json")
+
+
+class _Gzip:
+    def __init__(self, level: int) -> None:
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def write(self, data: bytes) -> bytes:
+        return self._z.compress(data) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._z.flush()
+
+
+class _Brotli:
+    def __init__(self, quality: int) -> None:
+        self._c = brotli.Compressor(quality=quality)
+
+    def write(self, data: bytes) -> bytes:
+        return self._c.process(data) + self._c.flush()
+
+    def finish(self) -> bytes:
+        return self._c.finish()
+
+
+def init_app(app: Flask) -> None:
+    if app.config.get("COMPRESS_RESPONSES", True):
+        app.after_request(_compress)
+
+
+def _encoding() -> str | None:
+    """'br', 'gzip' or None, from the request's Accept-Encoding."""
+    accepted = request.accept_encodings
+    gzip_q = accepted["gzip"]
+    brotli_q = accepted["br"] if brotli is not None else 0
+    if brotli_q and brotli_q >= gzip_q:
+        return "br"
+    return "gzip" if gzip_q else None
+
+
+def _compressor(encoding: str) -> _Gzip | _Brotli:
+    config = current_app.config
+    if encoding == "br":
+        return _Brotli(config.get("BROTLI_QUALITY", 5))
+    return _Gzip(config.get("COMPRESS_LEVEL", 6))
+
+
+def _stream(body: Iterable[Any], compressor: _Gzip | _Brotli) -> Iterator[bytes]:
+    try:
+        for piece in body:
+            data = compressor.write(piece.encode("utf-8") if isinstance(piece, str) else piece)
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        # Closing the original body ends the page's request context
+        close = getattr(body, "close", None)
+        if close is not None:
+            close()
+
+
+def _compress(response: Any) -> Any:
+    if response.status_code == 304 and response.mimetype in MIMETYPES:
+        # Stands in for a response that varies by encoding; caches must key it the same way
+        response.vary.add("Accept-Encoding")
+        return response
+    if (
+        request.method == "HEAD"
+        or response.status_code != 200
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in MIMETYPES
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    streamed = response.is_streamed
+    if not streamed and (response.content_length or 0) < current_app.config.get("COMPRESS_MIN_BYTES", 1024):
+        return response
+    encoding = _encoding()
+    if encoding is None:
+        return response
+
+    compressor = _compressor(encoding)
+    if streamed:
+        response.response = _stream(response.response, compressor)
+        response.headers.pop("Content-Length", None)
+    else:
+        response.set_data(compressor.write(response.get_data()) + compressor.finish())
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
+    return response
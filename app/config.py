@@ -22,6 +22,69 @@ class Config:
     )
     SQLALCHEMY_TRACK_MODIFICATIONS: bool = False
 
+    # FX: firm-wide figures are converted into this currency (see app/fx.py)
+    BASE_CURRENCY: str = os.getenv("BASE_CURRENCY", "USD")
+
+    # Risk metrics (see app/risk.py): ticker of the product betas are measured against
+    RISK_INDEX_TICKER: str = os.getenv("RISK_INDEX_TICKER", "SPY")
+
+    # Trades: when set, the trade form only queues orders and scripts/run_order_worker.py applies them
+    TRADE_QUEUE: bool = os.getenv("TRADE_QUEUE", "0") == "1"
+
+    # Trade path retries on deadlocks, lock wait timeouts and lost connections (app/retry.py):
+    # attempts per trade, and the base and cap of the jittered backoff in seconds
+    TRADE_RETRY_ATTEMPTS: int = int(os.getenv("TRADE_RETRY_ATTEMPTS", "4"))
+    TRADE_RETRY_BASE_DELAY: float = float(os.getenv("TRADE_RETRY_BASE_DELAY", "0.02"))
+    TRADE_RETRY_MAX_DELAY: float = float(os.getenv("TRADE_RETRY_MAX_DELAY", "0.5"))
+
+    # Purge job (scripts/run_purge_worker.py): rows deleted per transaction
+    PURGE_BATCH_SIZE: int = int(os.getenv("PURGE_BATCH_SIZE", "2000"))
+
+    # Independent reads of one view (customers.view) run concurrently on a shared pool of
+    # this many threads, all within CONCURRENT_READ_TIMEOUT seconds (see app/parallel.py)
+    CONCURRENT_READS: bool = os.getenv("CONCURRENT_READS", "1") == "1"
+    CONCURRENT_READ_WORKERS: int = int(os.getenv("CONCURRENT_READ_WORKERS", "3"))
+    CONCURRENT_READ_TIMEOUT: float = float(os.getenv("CONCURRENT_READ_TIMEOUT", "5"))
+
+    # gzip (or brotli, when installed) for HTML and JSON bodies of at least
+    # COMPRESS_MIN_BYTES; turn off when a proxy compresses (see app/compression.py)
+    COMPRESS_RESPONSES: bool = os.getenv("COMPRESS_RESPONSES", "1") == "1"
+    COMPRESS_MIN_BYTES: int = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+    COMPRESS_LEVEL: int = int(os.getenv("COMPRESS_LEVEL", "6"))
+    BROTLI_QUALITY: int = int(os.getenv("BROTLI_QUALITY", "5"))
+
+    # Archived months of transactions (gzip CSV plus manifest.json); see app/archive.py
+    ARCHIVE_DIR: str = os.getenv("ARCHIVE_DIR", "archive")
+
+    # Admission control (see app/admission.py): concurrent requests per endpoint class.
+    # Keep ADMISSION_CAPACITY below the SQLAlchemy pool size plus overflow (5 + 10).
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "1") == "1"
+    ADMISSION_CAPACITY: int = int(os.getenv("ADMISSION_CAPACITY", "12"))
+    ADMISSION_QUEUE_TIMEOUT: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2"))
+    ADMISSION_CLASSES: dict = {
+        "reports": {
+            "limit": int(os.getenv("ADMISSION_REPORTS_LIMIT", "3")),
+            "queue": int(os.getenv("ADMISSION_REPORTS_QUEUE", "6")),
+        },
+        "lists": {
+            "limit": int(os.getenv("ADMISSION_LISTS_LIMIT", "6")),
+            "queue": int(os.getenv("ADMISSION_LISTS_QUEUE", "24")),
+        },
+        "trades": {
+            "limit": int(os.getenv("ADMISSION_TRADES_LIMIT", "12")),
+            "queue": int(os.getenv("ADMISSION_TRADES_QUEUE", "48")),
+            "reserved": int(os.getenv("ADMISSION_TRADES_RESERVED", "3")),
+        },
+    }
+
+    # /metrics requires "Authorization: Bearer <token>" when set; without one it answers
+    # loopback clients only, unless METRICS_PUBLIC=1 (see app/metrics.py)
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")
+    METRICS_PUBLIC: bool = os.getenv("METRICS_PUBLIC", "0") == "1"
+
+    # Compiled Jinja templates are cached here across restarts (empty: a per-user temp dir)
+    JINJA_BYTECODE_CACHE_DIR: str = os.getenv("JINJA_BYTECODE_CACHE_DIR", "")
+
     # Server
     FLASK_RUN_HOST: str = os.getenv("FLASK_RUN_HOST", "127.0.0.1")
     FLASK_RUN_PORT: str = os.getenv("FLASK_RUN_PORT", "5000")
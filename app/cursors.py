@@ -0,0 +1,31 @@
+"""Durable cursors for background jobs (one row per job in job_cursors)."""
+
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import text
+
+from . import db
+
+
+def get(name: str) -> int:
+    """Last recorded position of a job (0 if it never ran)."""
+    value = db.session.execute(
+        text("SELECT position FROM job_cursors WHERE name = :name"), {"name": name}
+    ).scalar()
+    return int(value) if value is not None else 0
+
+
+def set(name: str, position: int) -> None:
+    """Record a job's position in the current transaction (caller commits)."""
+    now = datetime.utcnow().replace(microsecond=0)
+    result = db.session.execute(
+        text("UPDATE job_cursors SET position = :pos, updated_at = :now WHERE name = :name"),
+        {"name": name, "pos": position, "now": now},
+    )
+    if result.rowcount == 0:
+        db.session.execute(
+            text("INSERT INTO job_cursors (name, position, updated_at) VALUES (:name, :pos, :now)"),
+            {"name": name, "pos": position, "now": now},
+        )
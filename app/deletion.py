@@ -0,0 +1,237 @@
+"""Deleting customers and portfolios: soft-delete on request, purge in the background.
+
+The delete buttons only stamp deleted_at (a customer's portfolios with it) and
+deactivate the customer's logins, which takes a few single-row updates. From then on,
+ORM queries leave the rows out (the do_orm_execute hook below), and the raw SQL
+behind per-portfolio views and reports filters on deleted_at itself. Only the
+performance rollup, kept by triggers, counts a deleted portfolio until it is purged.
+
+The purge job (purge_pending, scripts/run_purge_worker.py) removes the rows with
+set-based DELETEs in dependency order, each in chunks of `batch_size` rows per
+transaction so no statement holds locks for long:
+
+    portfolio: transactions -> open_lots, lot_positions -> archived_trade_totals
+               -> trade_orders -> portfolios
+    customer:  its portfolios as above -> trade_orders of its logins -> users
+               -> customer_phones, customer_emails, customer_details -> customers
+
+Deleting trades fires after_transaction_delete, which keeps the performance rollup
+current. Archived months are taken out of the rollup by hand, since their totals
+never went through a trigger, and each run ends by storing the maxima the rollup
+could not keep (rollups.refresh_stale_maxima). Every step can be re-run, so an
+interrupted purge picks up where it stopped. Soft deletes and purges record outbox
+events (app/outbox.py); a purged portfolio or customer is one delete event, not one
+per row removed. Archive files are not rewritten; reports drop their rows because
+the portfolio is gone.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from datetime import datetime
+from typing import Any
+
+from flask import Flask, current_app
+from sqlalchemy import event, text
+from sqlalchemy.orm import ORMExecuteState, Session, with_loader_criteria
+
+from . import db, outbox, rollups, versions
+from .models import Customer, Portfolio
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 2_000
+_listening = False
+
+
+def init_app(app: Flask) -> None:
+    """Hide soft-deleted customers and portfolios from ORM queries (idempotent)."""
+    global _listening
+    if not _listening:
+        event.listen(Session, "do_orm_execute", _hide_deleted)
+        _listening = True
+
+
+def _hide_deleted(state: ORMExecuteState) -> None:
+    if not state.is_select or state.execution_options.get("include_deleted", False):
+        return
+    state.statement = state.statement.options(
+        with_loader_criteria(Customer, Customer.deleted_at.is_(None), include_aliases=True),
+        with_loader_criteria(Portfolio, Portfolio.deleted_at.is_(None), include_aliases=True),
+    )
+
+
+def soft_delete_customer(c_id: int) -> bool:
+    """Mark a customer and their portfolios deleted and deactivate their logins (caller commits)."""
+    now = datetime.utcnow()
+    found = db.session.execute(
+        text("UPDATE customers SET deleted_at = :now WHERE C_ID = :cid AND deleted_at IS NULL"),
+        {"now": now, "cid": c_id},
+    ).rowcount
+    if not found:
+        return False
+    p_ids = db.session.execute(
+        text("SELECT P_ID FROM portfolios WHERE C_ID = :cid AND deleted_at IS NULL"), {"cid": c_id}
+    ).scalars().all()
+    db.session.execute(
+        text("UPDATE portfolios SET deleted_at = :now WHERE C_ID = :cid AND deleted_at IS NULL"),
+        {"now": now, "cid": c_id},
+    )
+    user_ids = db.session.execute(text("SELECT user_id FROM users WHERE C_ID = :cid"), {"cid": c_id}).scalars().all()
+    db.session.execute(text("UPDATE users SET is_active = 0 WHERE C_ID = :cid"), {"cid": c_id})
+    versions.bump("customers", "portfolios", "users")
+    outbox.emit("customers", c_id, "update", {"deleted_at": now})
+    outbox.emit_many("portfolios", "update", [(p_id, {"deleted_at": now}) for p_id in p_ids])
+    outbox.emit_many("users", "update", [(user_id, {"is_active": False}) for user_id in user_ids])
+    return True
+
+
+def soft_delete_portfolio(p_id: int) -> bool:
+    """Mark a portfolio deleted (caller commits)."""
+    now = datetime.utcnow()
+    found = db.session.execute(
+        text("UPDATE portfolios SET deleted_at = :now WHERE P_ID = :pid AND deleted_at IS NULL"),
+        {"now": now, "pid": p_id},
+    ).rowcount
+    if found:
+        versions.bump("portfolios")
+        outbox.emit("portfolios", p_id, "update", {"deleted_at": now})
+    return bool(found)
+
+
+def _delete_chunked(table: str, where: str, params: dict[str, Any], batch_size: int, *stamps: str) -> int:
+    """
+    DELETE matching rows `batch_size` at a time, one commit per chunk; returns rows
+    deleted. Each chunk bumps `stamps` (default: the table itself).
+    """
+    stmt = text(f"DELETE FROM {table} WHERE {where} LIMIT :batch_size")
+    total = 0
+    while True:
+        deleted = db.session.execute(stmt, {**params, "batch_size": batch_size}).rowcount
+        if deleted:
+            versions.bump(*(stamps or (table,)))
+        db.session.commit()
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+def _unroll_archived(p_id: int) -> None:
+    """Take a portfolio's archived months out of the performance rollup (no commit)."""
+    # Totals come off shard 0; every shard of the bucket is flagged if the maximum may go
+    db.session.execute(
+        text(
+            """
+            UPDATE portfolio_performance_rollup r
+            JOIN portfolios p ON p.P_ID = :pid
+            JOIN (
+              SELECT COALESCE(SUM(trade_count), 0) AS trade_count,
+                     COALESCE(SUM(invested), 0) AS invested,
+                     COALESCE(SUM(commissions), 0) AS commissions,
+                     COALESCE(SUM(commission_count), 0) AS commission_count,
+                     MAX(max_value) AS max_value
+              FROM archived_trade_totals
+              WHERE P_ID = :pid
+            ) a
+            SET r.transaction_count = r.transaction_count - IF(r.shard = 0, a.trade_count, 0),
+                r.total_invested = r.total_invested - IF(r.shard = 0, a.invested, 0),
+                r.total_commissions = r.total_commissions - IF(r.shard = 0, a.commissions, 0),
+                r.commission_count = r.commission_count - IF(r.shard = 0, a.commission_count, 0),
+                r.max_stale = r.max_stale OR COALESCE(a.max_value >= r.max_transaction_value, FALSE)
+            WHERE r.currency_null = (p.currency IS NULL) AND r.currency = COALESCE(p.currency, '')
+              AND r.risk_level = COALESCE(p.risk_level, '')
+              AND a.trade_count > 0
+            """
+        ),
+        {"pid": p_id},
+    )
+
+
+def purge_portfolio(p_id: int, batch_size: int = DEFAULT_BATCH_SIZE) -> dict[str, int]:
+    """Remove a portfolio and everything that hangs off it, chunk by chunk; returns rows deleted per table."""
+    where, params = "P_ID = :pid", {"pid": p_id}
+    counts = {
+        "transactions": _delete_chunked(
+            "transactions", where, params, batch_size, "transactions", versions.REWRITE_STAMPS["transactions"]
+        ),
+        "open_lots": _delete_chunked("open_lots", where, params, batch_size, "lot_positions"),
+        "lot_positions": _delete_chunked("lot_positions", where, params, batch_size),
+    }
+    # Rollup adjustment and the archived rows go together, so a re-run never subtracts twice
+    _unroll_archived(p_id)
+    counts["archived_trade_totals"] = db.session.execute(
+        text("DELETE FROM archived_trade_totals WHERE P_ID = :pid"), params
+    ).rowcount
+    if counts["archived_trade_totals"]:
+        versions.bump("archived_trade_totals")
+    db.session.commit()
+    counts["trade_orders"] = _delete_chunked("trade_orders", where, params, batch_size)
+    c_id = db.session.execute(text("SELECT C_ID FROM portfolios WHERE P_ID = :pid"), params).scalar()
+    counts["portfolios"] = db.session.execute(text("DELETE FROM portfolios WHERE P_ID = :pid"), params).rowcount
+    versions.bump("portfolios")
+    if counts["portfolios"]:
+        # One event stands for the portfolio and everything deleted with it
+        outbox.emit("portfolios", p_id, "delete", {"p_id": p_id, "c_id": c_id})
+    db.session.commit()
+    return counts
+
+
+def purge_customer(c_id: int, batch_size: int = DEFAULT_BATCH_SIZE) -> dict[str, int]:
+    """Remove a customer, their portfolios, logins and contact records; returns rows deleted per table."""
+    counts: dict[str, int] = {}
+    p_ids = db.session.execute(text("SELECT P_ID FROM portfolios WHERE C_ID = :cid"), {"cid": c_id}).scalars().all()
+    for p_id in p_ids:
+        for table, n in purge_portfolio(p_id, batch_size).items():
+            counts[table] = counts.get(table, 0) + n
+
+    params = {"cid": c_id}
+    logins = "user_id IN (SELECT user_id FROM users WHERE C_ID = :cid)"
+    counts["trade_orders"] = counts.get("trade_orders", 0) + _delete_chunked(
+        "trade_orders", logins, params, batch_size
+    )
+    for table in ("users", "customer_phones", "customer_emails", "customer_details"):
+        counts[table] = _delete_chunked(table, "C_ID = :cid", params, batch_size)
+    counts["customers"] = db.session.execute(text("DELETE FROM customers WHERE C_ID = :cid"), params).rowcount
+    versions.bump("customers")
+    if counts["customers"]:
+        outbox.emit("customers", c_id, "delete", {"c_id": c_id})
+    db.session.commit()
+    return counts
+
+
+def purge_pending(batch_size: int | None = None) -> dict[str, int]:
+    """
+    Purge every soft-deleted portfolio, then every soft-deleted customer.
+
+    Returns the number of portfolios and customers removed.
+    """
+    batch_size = batch_size or current_app.config.get("PURGE_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+    p_ids = db.session.execute(
+        text("SELECT P_ID FROM portfolios WHERE deleted_at IS NOT NULL ORDER BY deleted_at, P_ID")
+    ).scalars().all()
+    for p_id in p_ids:
+        purge_portfolio(p_id, batch_size)
+    c_ids = db.session.execute(
+        text("SELECT C_ID FROM customers WHERE deleted_at IS NOT NULL ORDER BY deleted_at, C_ID")
+    ).scalars().all()
+    for c_id in c_ids:
+        purge_customer(c_id, batch_size)
+    # Store the maxima of rollup buckets that lost a trade, here or by a portfolio move
+    rollups.refresh_stale_maxima()
+    db.session.commit()
+    return {"portfolios": len(p_ids), "customers": len(c_ids)}
+
+
+def run_worker(poll_interval: float = 60.0, stop: threading.Event | None = None) -> None:
+    """Purge soft-deleted rows every `poll_interval` seconds until `stop` is set."""
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        try:
+            purged = purge_pending()
+            if purged["portfolios"] or purged["customers"]:
+                log.info("purged %(portfolios)d portfolio(s) and %(customers)d customer(s)", purged)
+        except Exception:
+            log.exception("purge failed; will retry")
+            db.session.rollback()
+        stop.wait(poll_interval)
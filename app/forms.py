@@ -15,8 +15,43 @@ from wtforms import (
     FieldList,
     FormField,
     SubmitField,
+    HiddenField,
 )
-from wtforms.validators import DataRequired, Optional, NumberRange, Length, Email
+from wtforms.validators import DataRequired, Optional, NumberRange, Length, Email, ValidationError
+
+from .choices import CUSTOMERS, EMPLOYEES, ChoiceProvider
+
+
+CURRENCY_CHOICES = [
+    ("", "-- Select --"),
+    ("USD", "USD"),
+    ("INR", "INR"),
+    ("EUR", "EUR"),
+    ("GBP", "GBP"),
+    ("JPY", "JPY"),
+]
+
+
+class LookupSelectField(SelectField):
+    """
+    Integer select whose options come from a ChoiceProvider (app/choices.py).
+
+    Options are only loaded when the field is rendered, with 0 as the "-- None --"
+    entry. A submitted ID is checked with a point lookup instead of against the list.
+    """
+
+    def __init__(self, label: str | None = None, validators=None, provider: ChoiceProvider | None = None, **kwargs) -> None:
+        super().__init__(label, validators, coerce=int, **kwargs)
+        self.provider = provider
+
+    def iter_choices(self):
+        if self.choices is None:
+            self.choices = [(0, "-- None --"), *self.provider.choices()]
+        return super().iter_choices()
+
+    def pre_validate(self, form) -> None:
+        if self.data and not self.provider.exists(self.data):
+            raise ValidationError(self.gettext("Not a valid choice."))
 
 
 class CustomerForm(FlaskForm):
@@ -66,7 +101,7 @@ class EmployeeForm(FlaskForm):
     job_title = StringField("Job Title", validators=[Optional(), Length(max=100)])
     hire_date = DateField("Hire Date", validators=[Optional()])
     specialization = StringField("Specialization", validators=[Optional(), Length(max=255)])
-    manager_id = SelectField("Manager", coerce=int, validators=[Optional()])
+    manager_id = LookupSelectField("Manager", validators=[Optional()], provider=EMPLOYEES)
     submit = SubmitField("Create Employee")
 
 
@@ -91,8 +126,8 @@ class ProductForm(FlaskForm):
 
 class PortfolioForm(FlaskForm):
     portfolio_name = StringField("Portfolio Name", validators=[DataRequired(), Length(max=100)])
-    c_id = SelectField("Customer Owner", coerce=int, validators=[Optional()])
-    e_id = SelectField("Employee Owner", coerce=int, validators=[Optional()])
+    c_id = LookupSelectField("Customer Owner", validators=[Optional()], provider=CUSTOMERS)
+    e_id = LookupSelectField("Employee Owner", validators=[Optional()], provider=EMPLOYEES)
     creation_date = DateField("Creation Date", validators=[DataRequired()])
     risk_level = SelectField(
         "Risk Level",
@@ -101,14 +136,7 @@ class PortfolioForm(FlaskForm):
     )
     currency = SelectField(
         "Currency",
-        choices=[
-            ("", "-- Select --"),
-            ("USD", "USD"),
-            ("INR", "INR"),
-            ("EUR", "EUR"),
-            ("GBP", "GBP"),
-            ("JPY", "JPY"),
-        ],
+        choices=CURRENCY_CHOICES,
         validators=[Optional()],
     )
     submit = SubmitField("Create Portfolio")
@@ -126,6 +154,8 @@ class TransactionForm(FlaskForm):
         validators=[Optional()],
         render_kw={"readonly": True, "disabled": True},
     )
+    # Generated when the form is rendered; a resubmit of the same form is one order
+    idempotency_key = HiddenField("Idempotency Key", validators=[DataRequired(), Length(max=64)])
     submit = SubmitField("Submit Trade")
 
 
@@ -163,8 +193,8 @@ class UserForm(FlaskForm):
         ],
         validators=[DataRequired()],
     )
-    c_id = SelectField("Customer", coerce=int, validators=[Optional()])
-    e_id = SelectField("Employee", coerce=int, validators=[Optional()])
+    c_id = LookupSelectField("Customer", validators=[Optional()], provider=CUSTOMERS)
+    e_id = LookupSelectField("Employee", validators=[Optional()], provider=EMPLOYEES)
     is_active = RadioField(
         "Status",
         choices=[("True", "Active"), ("False", "Inactive")],
@@ -0,0 +1,126 @@
+"""Rendered-fragment cache for large table bodies.
+
+A fragment is a partial template (e.g. products/_rows.html) rendered from the result
+of one query. Cache keys are (template, view key such as sort/order/filters, role
+class, data versions of the tables read), so a repeat view with unchanged data skips
+both the query and the render; any write to one of the tables moves to a new key and
+the stale entry ages out of the LRU. The cache is bounded by the total size of the
+fragments (FRAGMENT_CACHE_CHARS), not their number, so a few large tables cannot pin
+more memory than that.
+
+The only per-session content in a fragment is the CSRF token of the manager-only
+action forms. Fragments render it as a placeholder (`row_csrf`) that is swapped for
+the session's token on the way out, so one cached fragment serves every manager.
+
+`stream` is the variant for tables that can grow without bound: it renders the rows
+batch by batch as the query yields them, for a page sent with streaming.page, so
+only one batch is in memory at a time.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Hashable, Iterable, Iterator, Sequence
+
+from flask import render_template, session
+from flask_wtf.csrf import generate_csrf
+from markupsafe import Markup
+
+from . import versions
+from .cache import LRUCache
+
+CSRF_PLACEHOLDER = "__fragment_csrf_token__"
+
+# Fragments larger than this are rendered every time rather than pinned in memory
+MAX_FRAGMENT_CHARS = 4_000_000
+# Total characters the cache holds per process, whatever the number of fragments
+FRAGMENT_CACHE_CHARS = 16_000_000
+# Rows fetched and rendered per batch by `stream`
+STREAM_BATCH_ROWS = 500
+
+_fragments = LRUCache("fragments", maxsize=FRAGMENT_CACHE_CHARS, weigh=len)
+
+
+def role_class() -> str:
+    """'manage' for managers/superadmins (action buttons shown), 'view' otherwise."""
+    return "manage" if session.get("role") in ("manager", "superadmin") else "view"
+
+
+def _cache_key(template: str, tables: Iterable[str], key: Hashable, role: str) -> tuple:
+    stamps = versions.current(*tables)
+    return (template, key, role, tuple(sorted((t, v) for t, (v, _) in stamps.items())))
+
+
+def render(
+    template: str,
+    tables: Iterable[str],
+    key: Hashable,
+    load: Callable[[], dict[str, Any]],
+) -> Markup:
+    """
+    Return the rendered fragment, running `load()` and the template only on a miss.
+
+    `key` must cover everything besides the role class and data versions that changes
+    the output (sort, order, filters, and the viewer's entity for scoped lists).
+    `load()` returns the template context. Versions are read before the query, so a
+    concurrent write can only make a cached fragment newer than its key, never older.
+    """
+    role = role_class()
+    cache_key = _cache_key(template, tables, key, role)
+    html = _fragments.get(cache_key)
+    if html is None:
+        html = render_template(
+            template, can_manage=role == "manage", row_csrf=CSRF_PLACEHOLDER, **load()
+        )
+        if len(html) <= MAX_FRAGMENT_CHARS:
+            _fragments.set(cache_key, html)
+    if CSRF_PLACEHOLDER in html:
+        html = html.replace(CSRF_PLACEHOLDER, generate_csrf())
+    return Markup(html)
+
+
+def stream(
+    template: str,
+    tables: Iterable[str],
+    key: Hashable,
+    batches: Callable[[], Iterable[Sequence[Any]]],
+    name: str,
+) -> Iterator[Markup]:
+    """
+    Yield the fragment in pieces: the cached copy in one piece on a hit, otherwise one
+    piece per batch of rows from `batches()` (e.g. Result.partitions()), rendered with
+    the batch as `name`. The template must render each row on its own.
+
+    A miss keeps a copy of what it sends while that stays under MAX_FRAGMENT_CHARS and
+    caches it after the last batch. Versions and the CSRF token are read here, before
+    the response starts, since the session cannot change once headers are out.
+    """
+    role = role_class()
+    cache_key = _cache_key(template, tables, key, role)
+    token = generate_csrf() if role == "manage" else None
+    html = _fragments.get(cache_key)
+
+    def pieces() -> Iterator[Markup]:
+        if html is not None:
+            yield Markup(html.replace(CSRF_PLACEHOLDER, token) if token else html)
+            return
+        kept: list[str] | None = []
+        size = 0
+        for batch in batches():
+            piece = render_template(
+                template, can_manage=role == "manage", row_csrf=CSRF_PLACEHOLDER, **{name: batch}
+            )
+            if kept is not None:
+                size += len(piece)
+                if size <= MAX_FRAGMENT_CHARS:
+                    kept.append(piece)
+                else:
+                    kept = None
+            yield Markup(piece.replace(CSRF_PLACEHOLDER, token) if token else piece)
+        if kept is not None:
+            _fragments.set(cache_key, "".join(kept))
+
+    return pieces()
+
+
+def clear() -> None:
+    _fragments.clear()
@@ -0,0 +1,125 @@
+"""FX rates: cached lookups and base-currency conversion of grouped amounts.
+
+Rates live in fx_rates as units of BASE_CURRENCY per one unit of a currency, one row
+per day (loaded by scripts/load_fx_rates.py). A lookup for a date uses the latest rate
+on or before it. Portfolios without a currency are treated as BASE_CURRENCY.
+
+Conversion is meant to run on amounts already grouped by currency: callers aggregate
+in SQL with GROUP BY currency and convert each bucket once.
+"""
+
+from __future__ import annotations
+
+import csv
+from datetime import date
+from decimal import Decimal
+from typing import Any, Iterable
+
+from flask import current_app
+from sqlalchemy import text
+
+from . import db, versions
+from .cache import LRUCache
+
+# (currency, date) -> Decimal rate or None; entries for past dates never change, and
+# the TTL lets same-day feed reloads show up without a restart
+_rates = LRUCache("fx_rates", maxsize=4096, ttl=300)
+
+
+def base_currency() -> str:
+    return current_app.config.get("BASE_CURRENCY", "USD")
+
+
+def rate(currency: str | None, on: date | None = None) -> Decimal | None:
+    """Units of the base currency per one unit of `currency` on a date (None if unknown)."""
+    base = base_currency()
+    if not currency or currency == base:
+        return Decimal(1)
+    on = on or date.today()
+    return _rates.get_or_set((currency, on), lambda: _load_rate(currency, on))
+
+
+def _load_rate(currency: str, on: date) -> Decimal | None:
+    row = db.session.execute(
+        text(
+            """
+            SELECT rate_to_base FROM fx_rates
+            WHERE currency = :cur AND rate_date <= :on
+            ORDER BY rate_date DESC
+            LIMIT 1
+            """
+        ),
+        {"cur": currency, "on": on},
+    ).first()
+    return Decimal(row.rate_to_base) if row is not None else None
+
+
+def convert(amount: Any, currency: str | None, on: date | None = None) -> Decimal | None:
+    """Convert one amount into the base currency; None when no rate is known."""
+    fx = rate(currency, on)
+    if fx is None or amount is None:
+        return None
+    return (Decimal(amount) * fx).quantize(Decimal("0.01"))
+
+
+def convert_buckets(
+    rows: Iterable[Any],
+    amount_keys: Iterable[str],
+    currency_key: str = "currency",
+    on: date | None = None,
+) -> tuple[list[dict[str, Any]], list[str]]:
+    """
+    Add `<key>_base` for every amount key to per-currency rows.
+
+    Returns the converted rows (as dicts, with `fx_rate`) and the currencies that had
+    no rate; their `_base` amounts are None.
+    """
+    amount_keys = list(amount_keys)
+    converted: list[dict[str, Any]] = []
+    missing: list[str] = []
+    for row in rows:
+        item = dict(row)
+        fx = rate(item.get(currency_key), on)
+        item["fx_rate"] = fx
+        for key in amount_keys:
+            value = item.get(key)
+            item[f"{key}_base"] = (
+                (Decimal(value) * fx).quantize(Decimal("0.01"))
+                if fx is not None and value is not None
+                else None
+            )
+        if fx is None:
+            missing.append(item.get(currency_key))
+        converted.append(item)
+    return converted, missing
+
+
+def load_feed(path: str) -> int:
+    """
+    Upsert rates from a CSV feed with a header row: date,currency,rate (caller commits).
+
+    `rate` is units of the base currency per one unit of `currency`. Returns the number
+    of rows read.
+    """
+    params = []
+    with open(path, newline="", encoding="utf-8") as fh:
+        for record in csv.DictReader(fh):
+            params.append({
+                "cur": record["currency"].strip().upper(),
+                "on": date.fromisoformat(record["date"].strip()),
+                "rate": Decimal(record["rate"].strip()),
+            })
+    if params:
+        db.session.execute(
+            text(
+                """
+                INSERT INTO fx_rates (currency, rate_date, rate_to_base)
+                VALUES (:cur, :on, :rate)
+                ON DUPLICATE KEY UPDATE rate_to_base = VALUES(rate_to_base)
+                """
+            ),
+            params,
+        )
+        versions.bump("fx_rates")
+    _rates.clear()
+    return len(params)
@@ -0,0 +1,190 @@
+"""Employee hierarchy closure table maintenance and team rollups."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from sqlalchemy import text
+
+from . import db
+
+# Every (ancestor, descendant, depth) pair implied by employees.manager_id
+_CLOSURE_CTE = """
+    WITH RECURSIVE tree (ancestor_id, descendant_id, depth) AS (
+      SELECT E_ID, E_ID, 0 FROM employees
+      UNION ALL
+      SELECT tree.ancestor_id, e.E_ID, tree.depth + 1
+      FROM tree
+      JOIN employees e ON e.manager_id = tree.descendant_id
+    )
+"""
+
+
+def add_employee(e_id: int, manager_id: int | None) -> None:
+    """Insert closure rows for a new leaf employee (caller commits)."""
+    db.session.execute(
+        text(
+            """
+            INSERT INTO employee_hierarchy (ancestor_id, descendant_id, depth)
+            VALUES (:eid, :eid, 0)
+            """
+        ),
+        {"eid": e_id},
+    )
+    if manager_id is not None:
+        db.session.execute(
+            text(
+                """
+                INSERT INTO employee_hierarchy (ancestor_id, descendant_id, depth)
+                SELECT h.ancestor_id, :eid, h.depth + 1
+                FROM employee_hierarchy h
+                WHERE h.descendant_id = :mid
+                """
+            ),
+            {"eid": e_id, "mid": manager_id},
+        )
+
+
+def remove_employee(e_id: int) -> None:
+    """Drop closure rows for an employee being deleted (caller commits)."""
+    db.session.execute(
+        text("DELETE FROM employee_hierarchy WHERE descendant_id = :eid OR ancestor_id = :eid"),
+        {"eid": e_id},
+    )
+
+
+def has_reports(e_id: int) -> bool:
+    """True if anyone reports (directly or indirectly) to this employee."""
+    row = db.session.execute(
+        text(
+            """
+            SELECT 1 FROM employee_hierarchy
+            WHERE ancestor_id = :eid AND depth > 0
+            LIMIT 1
+            """
+        ),
+        {"eid": e_id},
+    ).first()
+    return row is not None
+
+
+def is_in_team(manager_id: int, e_id: int) -> bool:
+    """True if e_id is manager_id or sits anywhere below them."""
+    row = db.session.execute(
+        text(
+            """
+            SELECT 1 FROM employee_hierarchy
+            WHERE ancestor_id = :mid AND descendant_id = :eid
+            """
+        ),
+        {"mid": manager_id, "eid": e_id},
+    ).first()
+    return row is not None
+
+
+def rebuild() -> int:
+    """Recompute the whole closure table from employees.manager_id (caller commits)."""
+    db.session.execute(text("DELETE FROM employee_hierarchy"))
+    result = db.session.execute(
+        text(
+            "INSERT INTO employee_hierarchy (ancestor_id, descendant_id, depth) "
+            + _CLOSURE_CTE
+            + " SELECT ancestor_id, descendant_id, depth FROM tree"
+        )
+    )
+    return result.rowcount
+
+
+def check() -> dict[str, int]:
+    """
+    Compare the stored closure table with one derived from employees.manager_id.
+
+    Returns counts of pairs that are missing from the table, present but not implied
+    by the tree ("extra"), and present with the wrong depth. All zero means consistent.
+    """
+    row = db.session.execute(
+        text(
+            _CLOSURE_CTE
+            + """
+            SELECT
+              (SELECT COUNT(*) FROM tree t
+               LEFT JOIN employee_hierarchy h
+                 ON h.ancestor_id = t.ancestor_id AND h.descendant_id = t.descendant_id
+               WHERE h.ancestor_id IS NULL) AS missing,
+              (SELECT COUNT(*) FROM employee_hierarchy h
+               LEFT JOIN tree t
+                 ON h.ancestor_id = t.ancestor_id AND h.descendant_id = t.descendant_id
+               WHERE t.ancestor_id IS NULL) AS extra,
+              (SELECT COUNT(*) FROM employee_hierarchy h
+               JOIN tree t
+                 ON h.ancestor_id = t.ancestor_id AND h.descendant_id = t.descendant_id
+               WHERE h.depth <> t.depth) AS wrong_depth
+            """
+        )
+    ).mappings().first()
+    return {key: int(row[key] or 0) for key in ("missing", "extra", "wrong_depth")}
+
+
+def team_members(e_id: int) -> list[Any]:
+    """Per-member portfolio count and invested value (archived months included) for the subtree rooted at e_id."""
+    return db.session.execute(
+        text(
+            """
+            SELECT e.E_ID AS e_id,
+                   e.E_name AS employee_name,
+                   e.job_title,
+                   h.depth,
+                   COUNT(DISTINCT p.P_ID) AS portfolio_count,
+                   COALESCE(SUM(t.quantity * t.price_per_unit), 0)
+                     + COALESCE((SELECT SUM(a.invested)
+                                 FROM archived_trade_totals a
+                                 JOIN portfolios ap ON ap.P_ID = a.P_ID
+                                 WHERE ap.E_ID = e.E_ID AND ap.deleted_at IS NULL), 0) AS invested
+            FROM employee_hierarchy h
+            JOIN employees e ON e.E_ID = h.descendant_id
+            LEFT JOIN portfolios p ON p.E_ID = h.descendant_id AND p.deleted_at IS NULL
+            LEFT JOIN transactions t ON t.P_ID = p.P_ID
+            WHERE h.ancestor_id = :eid
+            GROUP BY e.E_ID, e.E_name, e.job_title, h.depth
+            ORDER BY h.depth, e.E_name
+            """
+        ),
+        {"eid": e_id},
+    ).mappings().all()
+
+
+def team_holdings(e_id: int) -> list[Any]:
+    """Per-product quantity and invested value across every portfolio managed in the subtree, archived months included."""
+    return db.session.execute(
+        text(
+            """
+            SELECT x.product_id,
+                   x.product_name,
+                   x.ticker,
+                   COUNT(DISTINCT x.p_id) AS portfolio_count,
+                   SUM(x.qty) AS total_qty,
+                   SUM(x.invested) AS invested
+            FROM (
+              SELECT pr.Product_ID AS product_id, pr.Product_name AS product_name,
+                     pr.ticker_symbol AS ticker, p.P_ID AS p_id,
+                     t.quantity AS qty, t.quantity * t.price_per_unit AS invested
+              FROM employee_hierarchy h
+              JOIN portfolios p ON p.E_ID = h.descendant_id AND p.deleted_at IS NULL
+              JOIN transactions t ON t.P_ID = p.P_ID
+              JOIN products pr ON pr.Product_ID = t.Product_ID
+              WHERE h.ancestor_id = :eid
+              UNION ALL
+              SELECT pr.Product_ID, pr.Product_name, pr.ticker_symbol, p.P_ID,
+                     a.quantity, a.invested
+              FROM employee_hierarchy h
+              JOIN portfolios p ON p.E_ID = h.descendant_id AND p.deleted_at IS NULL
+              JOIN archived_trade_totals a ON a.P_ID = p.P_ID
+              JOIN products pr ON pr.Product_ID = a.Product_ID
+              WHERE h.ancestor_id = :eid
+            ) x
+            GROUP BY x.product_id, x.product_name, x.ticker
+            ORDER BY invested DESC
+            """
+        ),
+        {"eid": e_id},
+    ).mappings().all()
@@ -0,0 +1,275 @@
+"""Per-portfolio holdings (product -> quantity, invested) with watermark-based caching.
+
+Each cached portfolio keeps its per-product totals plus the highest T_ID folded in.
+A read folds in only the portfolio's trades above that watermark (a range scan on the
+P_ID index, which carries T_ID), so the cost of a refresh is proportional to the trades
+added since the last view, not to the portfolio's history.
+
+Only settled trades (older than SETTLE_SECONDS) move the watermark; younger ones are
+added on top of the cached totals for the current read but not cached, so a lower
+T_ID that commits late is still picked up. Updating or deleting existing trades bumps
+the "transactions_rewrite" data version, which invalidates every entry. The cache is
+an LRU bounded by portfolio count.
+
+A new entry starts from the portfolio's archived months (archived_trade_totals,
+app/archive.py); archiving bumps the rewrite stamp too.
+
+firm_positions keeps the same totals for every portfolio at once, for the firm-wide
+analytics (app/sectors.py, app/risk.py): one GROUP BY over the ledger builds it, and
+later reads fold in the trades above its watermark the same way.
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any, Iterable
+
+from sqlalchemy import bindparam, func, select, text
+
+from . import db, versions
+from .cache import LRUCache
+
+SETTLE_SECONDS = 30
+REWRITE = versions.REWRITE_STAMPS["transactions"]
+
+# p_id -> (rewrite version, watermark T_ID, {product_id: (qty, invested)})
+_cache = LRUCache("holdings", maxsize=4096)
+# "firm" -> (epoch, watermark T_ID, {(p_id, product_id): (qty, invested)})
+_firm = LRUCache("firm_positions", maxsize=1)
+
+
+def _ranges(ranges: dict[int, tuple[int, int | None]]) -> tuple[str, dict[str, Any]]:
+    """WHERE fragment selecting each portfolio's T_ID range (after, before)."""
+    clauses = []
+    params: dict[str, Any] = {}
+    for i, (p_id, (after, before)) in enumerate(ranges.items()):
+        clause = f"(t.P_ID = :p{i} AND t.T_ID > :a{i}"
+        params[f"p{i}"] = p_id
+        params[f"a{i}"] = after
+        if before is not None:
+            clause += f" AND t.T_ID < :b{i}"
+            params[f"b{i}"] = before
+        clauses.append(clause + ")")
+    return " OR ".join(clauses), params
+
+
+def _aggregate(ranges: dict[int, tuple[int, int | None]]) -> list[Any]:
+    if not ranges:
+        return []
+    where, params = _ranges(ranges)
+    return db.session.execute(
+        text(
+            f"""
+            SELECT t.P_ID AS p_id,
+                   t.Product_ID AS product_id,
+                   SUM(t.quantity) AS qty,
+                   SUM(t.quantity * t.price_per_unit) AS invested,
+                   MAX(t.T_ID) AS max_t_id
+            FROM transactions t
+            WHERE {where}
+            GROUP BY t.P_ID, t.Product_ID
+            """
+        ),
+        params,
+    ).all()
+
+
+def _archived(p_ids: list[int]) -> dict[int, dict[int, tuple[int, Decimal]]]:
+    """Per-product totals of archived months, the starting point for new entries."""
+    if not p_ids:
+        return {}
+    result: dict[int, dict[int, tuple[int, Decimal]]] = {}
+    for row in db.session.execute(
+        text(
+            """
+            SELECT P_ID AS p_id, Product_ID AS product_id,
+                   SUM(quantity) AS qty, SUM(invested) AS invested
+            FROM archived_trade_totals
+            WHERE P_ID IN :p_ids
+            GROUP BY P_ID, Product_ID
+            """
+        ).bindparams(bindparam("p_ids", expanding=True)),
+        {"p_ids": p_ids},
+    ):
+        result.setdefault(row.p_id, {})[row.product_id] = (int(row.qty or 0), Decimal(row.invested or 0))
+    return result
+
+
+def totals(p_ids: Iterable[int]) -> dict[int, dict[int, tuple[int, Decimal]]]:
+    """{p_id: {product_id: (quantity, invested)}} for each portfolio, folding in new trades."""
+    p_ids = list(dict.fromkeys(p_ids))
+    if not p_ids:
+        return {}
+    epoch = versions.current(REWRITE)[REWRITE][0]
+    db_now = db.session.execute(select(func.now())).scalar()
+    cutoff = db_now - timedelta(seconds=SETTLE_SECONDS)
+
+    cached: dict[int, tuple[int, dict[int, tuple[int, Decimal]]]] = {}
+    new_entries = []
+    for p_id in p_ids:
+        entry = _cache.get(p_id)
+        if entry is not None and entry[0] == epoch:
+            cached[p_id] = (entry[1], entry[2])
+        else:
+            cached[p_id] = (0, {})
+            new_entries.append(p_id)
+    for p_id, products in _archived(new_entries).items():
+        cached[p_id] = (0, products)
+
+    # First unsettled trade above each watermark: everything before it can be cached
+    where, params = _ranges({p: (wm, None) for p, (wm, _) in cached.items()})
+    params["cutoff"] = cutoff
+    fresh_from = {
+        row.p_id: row.first_t_id
+        for row in db.session.execute(
+            text(
+                f"""
+                SELECT t.P_ID AS p_id, MIN(t.T_ID) AS first_t_id
+                FROM transactions t
+                WHERE ({where}) AND t.transaction_date > :cutoff
+                GROUP BY t.P_ID
+                """
+            ),
+            params,
+        )
+    }
+
+    settled = _aggregate({p: (wm, fresh_from.get(p)) for p, (wm, _) in cached.items()})
+    tail = _aggregate({p: (first - 1, None) for p, first in fresh_from.items()})
+
+    folded: dict[int, tuple[int, dict[int, tuple[int, Decimal]]]] = {
+        p: (wm, dict(products)) for p, (wm, products) in cached.items()
+    }
+    for row in settled:
+        wm, products = folded[row.p_id]
+        qty, invested = products.get(row.product_id, (0, Decimal(0)))
+        products[row.product_id] = (qty + int(row.qty or 0), invested + Decimal(row.invested or 0))
+        folded[row.p_id] = (max(wm, int(row.max_t_id)), products)
+    for p_id, (wm, products) in folded.items():
+        _cache.set(p_id, (epoch, wm, products))
+
+    result = {p: dict(products) for p, (_, products) in folded.items()}
+    for row in tail:
+        products = result[row.p_id]
+        qty, invested = products.get(row.product_id, (0, Decimal(0)))
+        products[row.product_id] = (qty + int(row.qty or 0), invested + Decimal(row.invested or 0))
+    return result
+
+
+def _firm_aggregate(after: int, before: int | None) -> list[Any]:
+    """Per (portfolio, product) totals of the trades with after < T_ID < before, firm-wide."""
+    clause = " AND T_ID < :before" if before is not None else ""
+    return db.session.execute(
+        text(
+            f"""
+            SELECT P_ID AS p_id, Product_ID AS product_id,
+                   SUM(quantity) AS qty, SUM(quantity * price_per_unit) AS invested,
+                   MAX(T_ID) AS max_t_id
+            FROM transactions
+            WHERE T_ID > :after{clause}
+            GROUP BY P_ID, Product_ID
+            """
+        ),
+        {"after": after, "before": before},
+    ).all()
+
+
+def _fold(positions: dict[tuple[int, int], tuple[int, Decimal]], rows: Iterable[Any]) -> None:
+    for row in rows:
+        key = (row.p_id, row.product_id)
+        qty, invested = positions.get(key, (0, Decimal(0)))
+        positions[key] = (qty + int(row.qty or 0), invested + Decimal(row.invested or 0))
+
+
+def firm_positions() -> tuple[Any, dict[tuple[int, int], tuple[int, Decimal]]]:
+    """
+    (key, {(p_id, product_id): (quantity, invested)}) for every portfolio, live trades
+    plus archived months. The key changes whenever the totals do, so callers can cache
+    what they derive from them. The dict is shared: do not modify it.
+    """
+    stamps = versions.current(REWRITE, "archived_trade_totals")
+    epoch = (stamps[REWRITE][0], stamps["archived_trade_totals"][0])
+    db_now = db.session.execute(select(func.now())).scalar()
+    cutoff = db_now - timedelta(seconds=SETTLE_SECONDS)
+
+    entry = _firm.get("firm")
+    rebuilt = entry is None or entry[0] != epoch
+    if not rebuilt:
+        watermark, positions = entry[1], entry[2]
+    else:
+        watermark, positions = 0, {}
+        for row in db.session.execute(
+            text(
+                """
+                SELECT P_ID AS p_id, Product_ID AS product_id,
+                       SUM(quantity) AS qty, SUM(invested) AS invested
+                FROM archived_trade_totals
+                GROUP BY P_ID, Product_ID
+                """
+            )
+        ):
+            positions[(row.p_id, row.product_id)] = (int(row.qty or 0), Decimal(row.invested or 0))
+
+    # First unsettled trade above the watermark: everything before it can be cached
+    fresh_from = db.session.execute(
+        text("SELECT MIN(T_ID) FROM transactions WHERE T_ID > :after AND transaction_date > :cutoff"),
+        {"after": watermark, "cutoff": cutoff},
+    ).scalar()
+    settled = _firm_aggregate(watermark, fresh_from)
+    if settled or rebuilt:
+        positions = dict(positions)
+        _fold(positions, settled)
+        watermark = max([watermark, *(int(row.max_t_id) for row in settled)])
+        _firm.set("firm", (epoch, watermark, positions))
+
+    tail = _firm_aggregate(fresh_from - 1, None) if fresh_from is not None else []
+    if not tail:
+        return (epoch, watermark), positions
+    result = dict(positions)
+    _fold(result, tail)
+    signature = tuple(sorted((row.p_id, row.product_id, int(row.qty or 0), Decimal(row.invested or 0)) for row in tail))
+    return (epoch, watermark, signature), result
+
+
+def portfolio_holdings(p_ids: Iterable[int]) -> dict[int, list[dict[str, Any]]]:
+    """
+    Per-portfolio product rows (product_id, product_name, ticker, total_qty, invested),
+    largest investment first, in the shape customers.view and the API render.
+    """
+    by_portfolio = totals(p_ids)
+    product_ids = {pid for products in by_portfolio.values() for pid in products}
+    names = {}
+    if product_ids:
+        names = {
+            row.Product_ID: row
+            for row in db.session.execute(
+                text(
+                    "SELECT Product_ID, Product_name, ticker_symbol FROM products WHERE Product_ID IN :ids"
+                ).bindparams(bindparam("ids", expanding=True)),
+                {"ids": list(product_ids)},
+            )
+        }
+    result: dict[int, list[dict[str, Any]]] = {}
+    for p_id, products in by_portfolio.items():
+        rows = []
+        for product_id, (qty, invested) in products.items():
+            product = names.get(product_id)
+            rows.append({
+                "product_id": product_id,
+                "product_name": product.Product_name if product else None,
+                "ticker": product.ticker_symbol if product else None,
+                "total_qty": qty,
+                "invested": invested,
+            })
+        rows.sort(key=lambda r: r["invested"], reverse=True)
+        result[p_id] = rows
+    return result
+
+
+def invalidate(p_id: int | None = None) -> None:
+    """Drop one portfolio's entry (or all) in this process; other processes rely on the data version."""
+    if p_id is None:
+        _cache.clear()
+    else:
+        _cache.delete(p_id)
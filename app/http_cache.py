@@ -0,0 +1,148 @@
+"""HTTP caching: conditional responses from data versions, fingerprinted static files.
+
+Pages and API responses decorated with `conditional` carry an ETag and Last-Modified
+built from the data_versions stamps of the tables they read (app/versions.py) and
+answer If-None-Match / If-Modified-Since with 304 before the view runs.
+
+Static files get a content hash in their URL (`?v=<hash>`) and, when requested with
+it, long-lived immutable cache headers.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import os
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Any, Callable
+
+from flask import Flask, current_app, make_response, request, session
+
+from . import versions
+from .auth import get_current_user
+
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+# (path, mtime) -> short content hash
+_static_hashes: dict[tuple[str, float], str] = {}
+
+
+def init_app(app: Flask) -> None:
+    """Fingerprint url_for('static', ...) URLs and mark fingerprinted responses immutable."""
+    app.url_defaults(_fingerprint_static_url)
+    app.after_request(_static_cache_headers)
+
+
+def _static_hash(filename: str) -> str | None:
+    static_folder = current_app.static_folder
+    if not static_folder:
+        return None
+    path = os.path.join(static_folder, filename)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    key = (path, mtime)
+    digest = _static_hashes.get(key)
+    if digest is None:
+        with open(path, "rb") as fh:
+            digest = hashlib.sha256(fh.read()).hexdigest()[:12]
+        _static_hashes[key] = digest
+    return digest
+
+
+def _fingerprint_static_url(endpoint: str, values: dict[str, Any]) -> None:
+    if endpoint == "static" and "filename" in values and "v" not in values:
+        digest = _static_hash(values["filename"])
+        if digest is not None:
+            values["v"] = digest
+
+
+def _static_cache_headers(response: Any) -> Any:
+    if request.endpoint != "static" or response.status_code not in (200, 304):
+        return response
+    requested = request.args.get("v")
+    filename = (request.view_args or {}).get("filename")
+    if requested and filename and hmac.compare_digest(requested, _static_hash(filename) or ""):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+
+def viewer_scope() -> str:
+    """
+    Part of the ETag that captures whose view of the data this is.
+
+    Covers role / linked entity (access rules narrow the data) and the session's CSRF
+    secret, so a 304 never hands back a page whose forms carry another session's token.
+    Role and entity come from the user row, not the session, so a role change or a
+    deactivation takes effect on the next request.
+    """
+    user = get_current_user()
+    if user is None or not user.is_active:
+        role, who = "", ""
+    else:
+        role = user.role
+        who = "all" if user.can_access_all() else f"{user.c_id or ''}:{user.e_id or ''}"
+    csrf = hashlib.sha1(str(session.get("csrf_token", "")).encode("utf-8")).hexdigest()[:12]
+    return f"{session.get('user_id', '')}|{role}|{who}|{csrf}"
+
+
+def _http_date(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc, microsecond=0)
+
+
+def conditional(*tables: str, scope: Callable[[], Any] | None = None) -> Callable:
+    """
+    Decorator: attach ETag / Last-Modified from data versions and answer 304 early.
+
+    The ETag covers the tables' versions, the request path and query string, and
+    whatever `scope()` returns. A table name may name a per-row stamp with the view's
+    URL arguments, e.g. "price_series:{product_id}". Last-Modified is the latest change
+    to any of the tables (or the login time, whichever is later). Responses are
+    `private, no-cache`: browsers keep them but revalidate on every navigation. Requests with pending flash messages
+    always render, so the messages are shown and consumed.
+    """
+    def decorator(f: Callable) -> Callable:
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if session.get("_flashes"):
+                return f(*args, **kwargs)
+
+            stamps = versions.current(*(t.format(**kwargs) for t in tables))
+            etag = versions.etag_from(
+                stamps,
+                request.path,
+                request.query_string.decode("utf-8"),
+                scope() if scope is not None else "",
+            )
+            changed = [ts for _, ts in stamps.values() if ts is not None]
+            auth_at = session.get("auth_at")
+            if auth_at:
+                changed.append(datetime.utcfromtimestamp(auth_at))
+            last_modified = _http_date(max(changed)) if changed else None
+
+            not_modified = False
+            if request.if_none_match:
+                # Weak comparison: compression (app/compression.py) sends the ETag as W/"..."
+                not_modified = request.if_none_match.contains_weak(etag)
+            elif last_modified is not None and request.if_modified_since is not None:
+                not_modified = last_modified <= request.if_modified_since
+
+            if not_modified:
+                response = make_response("", 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return decorated_function
+    return decorator
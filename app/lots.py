@@ -0,0 +1,327 @@
+"""FIFO lot engine: open lots, realized and unrealized P&L per portfolio.
+
+Trades are consumed in T_ID order. A positive quantity is a buy, a negative one a
+sell. A trade first closes open lots of the opposite sign in FIFO order, realizing
+(price - lot price) * quantity per closed unit for longs (the reverse for shorts);
+whatever is left opens a new lot. Commissions are totalled separately and do not
+enter P&L.
+
+State per (portfolio, product) is a Position: three parallel int arrays (opening
+T_ID, remaining quantity, price in cents) plus a head index, so consuming from the
+front and appending at the back are both O(1) and a lot costs 24 bytes. The engine
+reads the ledger in keyset chunks; after each chunk it writes only what changed
+(lots closed, the one partly closed head lot, lots opened, position totals), moves
+the cursor and commits. Positions are kept in an LRU bounded by `max_positions`
+and reloaded from open_lots when a later chunk touches them again.
+
+Only settled trades are consumed: the cursor never passes a trade younger than
+`settle_seconds`, so a lower T_ID that commits late is not skipped. Deleting or
+editing transactions invalidates the lot state; run rebuild() afterwards. A rebuild
+replays only live months: trades already moved to the archive (app/archive.py) are
+not read back.
+"""
+
+from __future__ import annotations
+
+import time
+from array import array
+from collections import OrderedDict
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any, Iterable
+
+from sqlalchemy import bindparam, delete, func, insert, select, text, tuple_, update
+
+from . import cursors, db, versions
+from .models import LotPosition, OpenLot
+
+CURSOR = "lots"
+KEY_BATCH = 500
+
+
+def _cents(value: Any) -> int:
+    return int((Decimal(value or 0) * 100).to_integral_value())
+
+
+def _money(cents: int) -> Decimal:
+    return Decimal(cents) / 100
+
+
+class Position:
+    """Open lots and running totals for one (portfolio, product)."""
+
+    __slots__ = (
+        "tids", "qtys", "prices", "head", "realized", "fees", "last_t_id",
+        "persisted", "dirty", "_head0", "_len0", "_head_qty0",
+    )
+
+    def __init__(self, persisted: bool = False) -> None:
+        self.tids = array("q")
+        self.qtys = array("q")
+        self.prices = array("q")
+        self.head = 0
+        self.realized = 0
+        self.fees = 0
+        self.last_t_id = 0
+        self.persisted = persisted
+        self.dirty = False
+
+    def _touch(self) -> None:
+        if not self.dirty:
+            self.dirty = True
+            self._head0 = self.head
+            self._len0 = len(self.tids)
+            self._head_qty0 = self.qtys[self.head] if self.head < self._len0 else None
+
+    def apply(self, t_id: int, quantity: int, price: int, fee: int) -> None:
+        """Consume one trade (price and fee in cents)."""
+        self._touch()
+        self.fees += fee
+        self.last_t_id = t_id
+        qtys, prices = self.qtys, self.prices
+        remaining = quantity
+        while remaining and self.head < len(qtys):
+            lot = qtys[self.head]
+            if (lot > 0) == (remaining > 0):
+                break
+            matched = min(abs(lot), abs(remaining))
+            sign = 1 if lot > 0 else -1
+            self.realized += sign * matched * (price - prices[self.head])
+            lot -= sign * matched
+            remaining += sign * matched
+            qtys[self.head] = lot
+            if lot == 0:
+                self.head += 1
+        if remaining:
+            self.tids.append(t_id)
+            qtys.append(remaining)
+            prices.append(price)
+
+    def open_qty(self) -> int:
+        return sum(self.qtys[self.head:])
+
+    def open_cost(self) -> int:
+        return sum(q * p for q, p in zip(self.qtys[self.head:], self.prices[self.head:]))
+
+    def changes(self) -> tuple[list[int], list[tuple[int, int]], list[tuple[int, int, int]]]:
+        """(closed lot T_IDs, (T_ID, qty) updates, (T_ID, qty, price) inserts) since the last flush."""
+        head, head0, len0 = self.head, self._head0, self._len0
+        closed = list(self.tids[head0:min(head, len0)])
+        updates = []
+        if head < len0 and (head != head0 or self.qtys[head] != self._head_qty0):
+            updates.append((self.tids[head], self.qtys[head]))
+        start = max(head, len0)
+        inserts = list(zip(self.tids[start:], self.qtys[start:], self.prices[start:]))
+        return closed, updates, inserts
+
+    def mark_clean(self) -> None:
+        if self.head:
+            del self.tids[:self.head]
+            del self.qtys[:self.head]
+            del self.prices[:self.head]
+            self.head = 0
+        self.persisted = True
+        self.dirty = False
+
+
+class LotEngine:
+    """Replays the ledger into lot state; see the module docstring."""
+
+    def __init__(
+        self,
+        chunk_size: int = 50_000,
+        max_positions: int = 100_000,
+        settle_seconds: int = 30,
+    ) -> None:
+        self.chunk_size = chunk_size
+        self.max_positions = max_positions
+        self.settle_seconds = settle_seconds
+        self.positions: OrderedDict[tuple[int, int], Position] = OrderedDict()
+
+    def _settled_upto(self, after: int) -> int:
+        """Highest T_ID that is safe to consume: everything before the first unsettled trade."""
+        db_now = db.session.execute(select(func.now())).scalar()
+        cutoff = db_now - timedelta(seconds=self.settle_seconds)
+        first_unsettled = db.session.execute(
+            text(
+                "SELECT MIN(T_ID) FROM transactions WHERE T_ID > :after AND transaction_date > :cutoff"
+            ),
+            {"after": after, "cutoff": cutoff},
+        ).scalar()
+        if first_unsettled is not None:
+            return int(first_unsettled) - 1
+        return int(db.session.execute(text("SELECT COALESCE(MAX(T_ID), 0) FROM transactions")).scalar())
+
+    def _load(self, keys: Iterable[tuple[int, int]]) -> None:
+        """Bring positions for `keys` into memory, from the lot tables when persisted."""
+        missing = [k for k in keys if k not in self.positions]
+        for i in range(0, len(missing), KEY_BATCH):
+            batch = missing[i:i + KEY_BATCH]
+            found: dict[tuple[int, int], Position] = {}
+            for row in db.session.execute(
+                select(LotPosition).where(tuple_(LotPosition.p_id, LotPosition.product_id).in_(batch))
+            ).scalars():
+                pos = Position(persisted=True)
+                pos.realized = _cents(row.realized_pnl)
+                pos.fees = _cents(row.commissions)
+                pos.last_t_id = row.last_t_id
+                found[(row.p_id, row.product_id)] = pos
+            if found:
+                for lot in db.session.execute(
+                    select(OpenLot.p_id, OpenLot.product_id, OpenLot.t_id, OpenLot.quantity, OpenLot.price_per_unit)
+                    .where(tuple_(OpenLot.p_id, OpenLot.product_id).in_(list(found)))
+                    .order_by(OpenLot.p_id, OpenLot.product_id, OpenLot.t_id)
+                ):
+                    pos = found[(lot.p_id, lot.product_id)]
+                    pos.tids.append(lot.t_id)
+                    pos.qtys.append(lot.quantity)
+                    pos.prices.append(_cents(lot.price_per_unit))
+            for key in batch:
+                self.positions[key] = found.get(key) or Position()
+
+    def _flush(self, cursor: int) -> None:
+        """Write every dirty position, move the cursor and commit."""
+        closed: list[int] = []
+        updates: list[dict[str, Any]] = []
+        inserts: list[dict[str, Any]] = []
+        new_positions: list[dict[str, Any]] = []
+        changed_positions: list[dict[str, Any]] = []
+        dirty = [(key, pos) for key, pos in self.positions.items() if pos.dirty]
+        for (p_id, product_id), pos in dirty:
+            c, u, ins = pos.changes()
+            closed.extend(c)
+            updates.extend({"t_id": t, "quantity": q} for t, q in u)
+            inserts.extend(
+                {"t_id": t, "p_id": p_id, "product_id": product_id, "quantity": q, "price_per_unit": _money(p)}
+                for t, q, p in ins
+            )
+            row = {
+                "p_id": p_id,
+                "product_id": product_id,
+                "open_qty": pos.open_qty(),
+                "open_cost": _money(pos.open_cost()),
+                "realized_pnl": _money(pos.realized),
+                "commissions": _money(pos.fees),
+                "last_t_id": pos.last_t_id,
+            }
+            (changed_positions if pos.persisted else new_positions).append(row)
+
+        # ORM bulk statements: executemany by primary key, no per-object flush
+        for i in range(0, len(closed), KEY_BATCH):
+            db.session.execute(delete(OpenLot).where(OpenLot.t_id.in_(closed[i:i + KEY_BATCH])))
+        if updates:
+            db.session.execute(update(OpenLot), updates)
+        if inserts:
+            db.session.execute(insert(OpenLot), inserts)
+        if new_positions:
+            db.session.execute(insert(LotPosition), new_positions)
+        if changed_positions:
+            db.session.execute(update(LotPosition), changed_positions)
+        cursors.set(CURSOR, cursor)
+        if dirty:
+            versions.bump("lot_positions")
+        db.session.commit()
+
+        for _, pos in dirty:
+            pos.mark_clean()
+        while len(self.positions) > self.max_positions:
+            self.positions.popitem(last=False)
+
+    def run(self, max_trades: int | None = None) -> dict[str, Any]:
+        """
+        Consume settled trades after the cursor, committing once per chunk.
+
+        Returns counts and timing; `max_trades` stops early (at a chunk boundary).
+        """
+        started = time.perf_counter()
+        after = cursors.get(CURSOR)
+        upto = self._settled_upto(after)
+        trades = chunks = 0
+        stmt = text(
+            """
+            SELECT T_ID, P_ID, Product_ID, quantity, price_per_unit, commission_fee
+            FROM transactions
+            WHERE T_ID > :after AND T_ID <= :upto
+            ORDER BY T_ID
+            LIMIT :limit
+            """
+        )
+        while after < upto and (max_trades is None or trades < max_trades):
+            rows = db.session.execute(stmt, {"after": after, "upto": upto, "limit": self.chunk_size}).all()
+            if not rows:
+                break
+            self._load(list(dict.fromkeys((r.P_ID, r.Product_ID) for r in rows)))
+            positions = self.positions
+            for t_id, p_id, product_id, qty, price, fee in rows:
+                key = (p_id, product_id)
+                pos = positions[key]
+                positions.move_to_end(key)
+                pos.apply(t_id, qty, _cents(price), _cents(fee))
+            after = rows[-1].T_ID
+            self._flush(after)
+            trades += len(rows)
+            chunks += 1
+        # Record progress past the settled tail even if it held no trades
+        if after < upto and (max_trades is None or trades < max_trades):
+            after = upto
+            self._flush(after)
+        db.session.commit()
+        elapsed = time.perf_counter() - started
+        return {
+            "trades": trades,
+            "chunks": chunks,
+            "cursor": after,
+            "positions_in_memory": len(self.positions),
+            "seconds": elapsed,
+        }
+
+
+def rebuild() -> None:
+    """Forget all lot state so the next run replays the ledger from the first trade (caller commits)."""
+    db.session.execute(text("DELETE FROM open_lots"))
+    db.session.execute(text("DELETE FROM lot_positions"))
+    cursors.set(CURSOR, 0)
+    versions.bump("lot_positions")
+
+
+def portfolio_pnl(p_ids: Iterable[int]) -> dict[int, dict[str, Decimal]]:
+    """
+    Realized and unrealized P&L per portfolio from the lot state.
+
+    Unrealized is open quantity at the product's current price minus the open lots'
+    cost; products without a price count at cost. Portfolios with no lot state yet are
+    absent from the result.
+    """
+    p_ids = list(p_ids)
+    if not p_ids:
+        return {}
+    rows = db.session.execute(
+        text(
+            """
+            SELECT lp.P_ID AS p_id,
+                   SUM(lp.realized_pnl) AS realized,
+                   SUM(lp.open_cost) AS open_cost,
+                   SUM(CASE WHEN pr.current_price IS NULL THEN lp.open_cost
+                            ELSE lp.open_qty * pr.current_price END) AS market_value,
+                   SUM(lp.commissions) AS commissions
+            FROM lot_positions lp
+            LEFT JOIN products pr ON pr.Product_ID = lp.Product_ID
+            WHERE lp.P_ID IN :p_ids
+            GROUP BY lp.P_ID
+            """
+        ).bindparams(bindparam("p_ids", expanding=True)),
+        {"p_ids": p_ids},
+    ).mappings()
+    result = {}
+    for r in rows:
+        realized = Decimal(r["realized"] or 0)
+        open_cost = Decimal(r["open_cost"] or 0)
+        market_value = Decimal(r["market_value"] or 0).quantize(Decimal("0.01"))
+        result[r["p_id"]] = {
+            "realized": realized,
+            "unrealized": market_value - open_cost,
+            "open_cost": open_cost,
+            "market_value": market_value,
+            "commissions": Decimal(r["commissions"] or 0),
+        }
+    return result
@@ -0,0 +1,291 @@
+"""Runtime metrics in the Prometheus text format, served at /metrics.
+
+Counters and histograms are split into SHARDS shards, each a dict with its own lock.
+A thread is given a shard the first time it records (round robin) and keeps it for
+its life, so concurrent threads rarely share a lock, and a scrape sums the shards.
+The shard count is fixed: the development server's thread per request leaves no
+per-thread state behind.
+
+Recorded here:
+
+- per-endpoint request latency histograms, in-flight requests and status counters
+  (request hooks installed by init_app)
+- trade executions and their duration: the trade form's synchronous path and the
+  order writer's batches (app/orders.py)
+- at scrape time, the SQLAlchemy pool (checked in / checked out / overflow) and
+  the hit and miss counts of every LRUCache (app/cache.py)
+
+Set METRICS_TOKEN to require `Authorization: Bearer <token>` on /metrics. Without a
+token the endpoint answers only clients on the loopback interface (a scraper on the
+same host); METRICS_PUBLIC=1 opens it to everyone, e.g. behind a proxy that already
+restricts it.
+"""
+
+from __future__ import annotations
+
+import hmac
+import itertools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Iterator
+
+from flask import Flask, Response, abort, current_app, g, request
+
+from . import cache, db
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Clients allowed on /metrics when no METRICS_TOKEN is set
+LOOPBACK = ("127.0.0.1", "::1")
+
+# Seconds; suits page views and trades (a few ms) up to heavy reports (tens of seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = tuple[str, ...]
+
+SHARDS = 16
+_next_shard = itertools.count()
+_thread = threading.local()
+
+_registry: list["_Metric"] = []
+# Callables yielding (name, type, help, [(labels, value), ...]) at scrape time
+_collectors: list[Callable[[], Iterable[tuple[str, str, str, list[tuple[dict[str, str], float]]]]]] = []
+
+
+def _shard_index() -> int:
+    """The calling thread's shard, assigned round robin on first use."""
+    index = getattr(_thread, "shard", None)
+    if index is None:
+        index = _thread.shard = next(_next_shard) % SHARDS
+    return index
+
+
+class _Metric:
+    """Base for sharded metrics: SHARDS dicts keyed by label values, one lock each."""
+
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._shards: list[dict[LabelValues, Any]] = [{} for _ in range(SHARDS)]
+        self._locks = [threading.Lock() for _ in range(SHARDS)]
+        _registry.append(self)
+
+    def _shard(self) -> tuple[dict[LabelValues, Any], threading.Lock]:
+        index = _shard_index()
+        return self._shards[index], self._locks[index]
+
+    def _key(self, labels: dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def _copies(self) -> list[dict[LabelValues, Any]]:
+        copies = []
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                # Histogram cells are lists updated in place
+                copies.append({k: list(v) if isinstance(v, list) else v for k, v in shard.items()})
+        return copies
+
+
+class Counter(_Metric):
+    """Monotonic count (or a gauge, when `kind="gauge"` and it is also decremented)."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), kind: str = "counter") -> None:
+        super().__init__(name, help, labels)
+        self.kind = kind
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        shard, lock = self._shard()
+        key = self._key(labels)
+        with lock:
+            shard[key] = shard.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def values(self) -> dict[LabelValues, float]:
+        totals: dict[LabelValues, float] = {}
+        for shard in self._copies():
+            for key, value in shard.items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def samples(self) -> Iterator[tuple[str, LabelValues, float]]:
+        for key, value in sorted(self.values().items()):
+            yield self.name, key, value
+
+
+class Histogram(_Metric):
+    """Bucketed observations with sum and count; each shard entry is [bucket counts..., sum]."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        shard, lock = self._shard()
+        key = self._key(labels)
+        bucket = bisect_left(self.buckets, value)
+        with lock:
+            cells = shard.get(key)
+            if cells is None:
+                # One cell per bucket, one for +Inf, then the sum
+                cells = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            cells[bucket] += 1
+            cells[-1] += value
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> Iterator[tuple[str, LabelValues, float]]:
+        totals: dict[LabelValues, list[float]] = {}
+        for shard in self._copies():
+            for key, cells in shard.items():
+                into = totals.setdefault(key, [0] * len(cells))
+                for i, value in enumerate(cells):
+                    into[i] += value
+        bounds = [_bound(b) for b in self.buckets] + ["+Inf"]
+        for key, cells in sorted(totals.items()):
+            running = 0
+            for bound, n in zip(bounds, cells):
+                running += n
+                yield f"{self.name}_bucket", key + (bound,), running
+            yield f"{self.name}_sum", key, cells[-1]
+            yield f"{self.name}_count", key, running
+
+
+def register_collector(collector: Callable[[], Iterable[tuple[str, str, str, list[tuple[dict[str, str], float]]]]]) -> None:
+    """Add a callable read at scrape time, for values that already live elsewhere (pools, caches)."""
+    _collectors.append(collector)
+
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by endpoint, method and status.", ("endpoint", "method", "status"))
+HTTP_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency by endpoint.", ("endpoint", "method"))
+HTTP_IN_FLIGHT = Counter("http_requests_in_flight", "HTTP requests being handled.", ("endpoint",), kind="gauge")
+TRADES = Counter("trade_executions_total", "Trades executed, by path (web form, API or order queue) and outcome.", ("path", "outcome"))
+TRADE_SECONDS = Histogram(
+    "trade_execution_duration_seconds",
+    "Time to execute and commit: one trade on the web and API paths, one batch on the queue path.",
+    ("path",),
+)
+
+
+def _bound(value: float) -> str:
+    return f"{value:.1f}" if float(value).is_integer() else repr(float(value))
+
+
+def _number(value: float) -> str:
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _pool_stats() -> Iterable[tuple[str, str, str, list[tuple[dict[str, str], float]]]]:
+    pool = db.engine.pool
+    readings = {
+        "db_pool_size": ("Configured pool size.", "size"),
+        "db_pool_checked_in": ("Idle connections in the pool.", "checkedin"),
+        "db_pool_checked_out": ("Connections in use.", "checkedout"),
+        "db_pool_overflow": ("Connections open beyond the pool size (negative: not all opened yet).", "overflow"),
+    }
+    for name, (help, method) in readings.items():
+        reading = getattr(pool, method, None)
+        if reading is not None:
+            yield name, "gauge", help, [({}, reading())]
+
+
+def _cache_stats() -> Iterable[tuple[str, str, str, list[tuple[dict[str, str], float]]]]:
+    stats = cache.all_cache_stats()
+    yield "cache_hits_total", "counter", "LRUCache hits.", [({"cache": n}, s["hits"]) for n, s in sorted(stats.items())]
+    yield "cache_misses_total", "counter", "LRUCache misses.", [({"cache": n}, s["misses"]) for n, s in sorted(stats.items())]
+    yield "cache_evictions_total", "counter", "LRUCache evictions.", [({"cache": n}, s["evictions"]) for n, s in sorted(stats.items())]
+    yield "cache_hit_ratio", "gauge", "LRUCache hits over lookups since start.", [({"cache": n}, s["hit_rate"]) for n, s in sorted(stats.items())]
+    yield "cache_entries", "gauge", "LRUCache entries held.", [({"cache": n}, s["size"]) for n, s in sorted(stats.items())]
+    yield "cache_weight", "gauge", "LRUCache total weight held (characters for fragments, else entries).", [({"cache": n}, s["weight"]) for n, s in sorted(stats.items())]
+
+
+register_collector(_pool_stats)
+register_collector(_cache_stats)
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format."""
+    lines: list[str] = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, key, value in metric.samples():
+            names = metric.labels + (("le",) if len(key) > len(metric.labels) else ())
+            lines.append(f"{name}{_labels(names, key)} {_number(value)}")
+    for collector in _collectors:
+        for name, kind, help, samples in collector():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels, labels.values())} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _endpoint() -> str:
+    return request.endpoint or "unmatched"
+
+
+def _start_request() -> None:
+    g._metrics_started = time.perf_counter()
+    g._metrics_endpoint = _endpoint()
+    HTTP_IN_FLIGHT.inc(endpoint=g._metrics_endpoint)
+
+
+def _record_response(response: Any) -> Any:
+    started = g.get("_metrics_started")
+    if started is not None:
+        endpoint = g._metrics_endpoint
+        HTTP_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, method=request.method)
+        HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+
+def _finish_request(exc: BaseException | None) -> None:
+    endpoint = g.pop("_metrics_endpoint", None)
+    if endpoint is not None:
+        HTTP_IN_FLIGHT.dec(endpoint=endpoint)
+
+
+def metrics_view() -> Response:
+    token = current_app.config.get("METRICS_TOKEN")
+    if token:
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(supplied.encode("utf-8"), token.encode("utf-8")):
+            abort(401)
+    elif not current_app.config.get("METRICS_PUBLIC") and request.remote_addr not in LOOPBACK:
+        abort(403)
+    return Response(render(), content_type=CONTENT_TYPE)
+
+
+def init_app(app: Flask) -> None:
+    """Install the request hooks and the /metrics endpoint."""
+    app.before_request(_start_request)
+    app.after_request(_record_response)
+    app.teardown_request(_finish_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
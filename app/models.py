@@ -3,7 +3,8 @@ from __future__ import annotations
 from datetime import datetime, date
 from typing import List, Optional
 
-from sqlalchemy import UniqueConstraint, CheckConstraint, ForeignKey
+from sqlalchemy import UniqueConstraint, CheckConstraint, ForeignKey, Index
+from sqlalchemy.dialects import mysql
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -18,6 +19,8 @@ class Customer(db.Model):
     last_name: Mapped[str] = mapped_column(db.String(50), nullable=False)
     date_of_birth: Mapped[date | None] = mapped_column(db.Date, nullable=True)
     address: Mapped[str | None] = mapped_column(db.String(255), nullable=True)
+    # Set by the delete button; the purge job removes the row later (app/deletion.py)
+    deleted_at: Mapped[datetime | None] = mapped_column(db.DateTime, nullable=True)
 
     details: Mapped[Optional["CustomerDetails"]] = relationship(
         back_populates="customer", uselist=False, cascade="all, delete-orphan"
@@ -30,6 +33,10 @@ class Customer(db.Model):
     )
     portfolios: Mapped[List["Portfolio"]] = relationship(back_populates="customer")
 
+    # The name indexes customers.search relies on are created by
+    # sql/migration_customer_search.sql only
+    __table_args__ = (Index("idx_customers_deleted_at", "deleted_at"),)
+
     def __repr__(self) -> str:
         return f"<Customer {self.c_id} {self.first_name} {self.last_name}>"
 
@@ -62,6 +69,8 @@ class CustomerPhone(db.Model):
 
     customer: Mapped[Customer] = relationship(back_populates="phones")
 
+    # idx_customer_phones_number: sql/migration_customer_search.sql
+
 
 class CustomerEmail(db.Model):
     __tablename__ = "customer_emails"
@@ -93,6 +102,19 @@ class Employee(db.Model):
         return f"<Employee {self.e_id} {self.employee_name}>"
 
 
+class EmployeeHierarchy(db.Model):
+    """Closure table over Employee.manager_id: one row per (ancestor, descendant) pair."""
+    __tablename__ = "employee_hierarchy"
+
+    ancestor_id: Mapped[int] = mapped_column(ForeignKey("employees.E_ID"), primary_key=True)
+    descendant_id: Mapped[int] = mapped_column(ForeignKey("employees.E_ID"), primary_key=True)
+    depth: Mapped[int] = mapped_column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        Index("idx_employee_hierarchy_descendant", "descendant_id", "ancestor_id"),
+    )
+
+
 class Product(db.Model):
     __tablename__ = "products"
 
@@ -120,6 +142,8 @@ class Portfolio(db.Model):
         db.Enum("low", "medium", "high", name="portfolio_risk_enum"), nullable=True
     )
     currency: Mapped[str | None] = mapped_column(db.String(10), nullable=True)
+    # Set by the delete button; the purge job removes the row later (app/deletion.py)
+    deleted_at: Mapped[datetime | None] = mapped_column(db.DateTime, nullable=True)
 
     customer: Mapped[Optional["Customer"]] = relationship(back_populates="portfolios")
     employee: Mapped[Optional["Employee"]] = relationship(back_populates="portfolios")
@@ -130,10 +154,16 @@ class Portfolio(db.Model):
             "(c_id IS NOT NULL) OR (e_id IS NOT NULL)",
             name="chk_portfolio_dual_ownership",
         ),
+        Index("idx_portfolios_deleted_at", "deleted_at"),
     )
 
 
 class Transaction(db.Model):
+    """
+    A trade. Partitioning by month makes the table's key (T_ID, transaction_date)
+    (sql/migration_transactions_partitioning.sql); T_ID alone still identifies a row,
+    so the ORM maps just T_ID and the metadata creates on every backend.
+    """
     __tablename__ = "transactions"
 
     t_id: Mapped[int] = mapped_column("T_ID", db.Integer, primary_key=True, autoincrement=True)
@@ -148,6 +178,103 @@ class Transaction(db.Model):
     product: Mapped[Product] = relationship(back_populates="transactions")
 
 
+class DataVersion(db.Model):
+    """Change stamp per table (or per shard of a hot table), bumped with every write (app/versions.py)."""
+    __tablename__ = "data_versions"
+
+    table_name: Mapped[str] = mapped_column(db.String(64), primary_key=True)
+    version: Mapped[int] = mapped_column(db.BigInteger, nullable=False, default=0)
+    updated_at: Mapped[datetime | None] = mapped_column(db.DateTime, nullable=True)
+
+
+class FxRate(db.Model):
+    """Daily FX rate: units of the base currency per one unit of `currency`."""
+    __tablename__ = "fx_rates"
+
+    currency: Mapped[str] = mapped_column(db.String(10), primary_key=True)
+    rate_date: Mapped[date] = mapped_column(db.Date, primary_key=True)
+    rate_to_base: Mapped[float] = mapped_column(db.Numeric(18, 8), nullable=False)
+
+
+class PriceHistory(db.Model):
+    """Daily close per product (loaded by scripts/load_price_history.py; see app/risk.py)."""
+    __tablename__ = "price_history"
+
+    product_id: Mapped[int] = mapped_column("Product_ID", ForeignKey("products.Product_ID"), primary_key=True)
+    price_date: Mapped[date] = mapped_column(db.Date, primary_key=True)
+    close_price: Mapped[float] = mapped_column(db.Numeric(12, 4), nullable=False)
+
+
+# DATETIME(3) on MySQL: ticks carry milliseconds
+MILLIS = db.DateTime().with_variant(mysql.DATETIME(fsp=3), "mysql")
+
+
+class PriceTick(db.Model):
+    """A raw trade price from the price feed (app/price_series.py)."""
+    __tablename__ = "price_ticks"
+
+    # BIGINT on MySQL; SQLite only auto-increments INTEGER primary keys
+    tick_id: Mapped[int] = mapped_column(
+        db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True, autoincrement=True
+    )
+    product_id: Mapped[int] = mapped_column("Product_ID", ForeignKey("products.Product_ID"), nullable=False)
+    tick_time: Mapped[datetime] = mapped_column(MILLIS, nullable=False)
+    price: Mapped[float] = mapped_column(db.Numeric(12, 4), nullable=False)
+    volume: Mapped[int] = mapped_column(db.BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("idx_price_ticks_product_time", "Product_ID", "tick_time"),
+    )
+
+
+class PriceBar(db.Model):
+    """
+    OHLC bar of one product at one resolution ('1m', '1h', '1d'), folded in as ticks
+    arrive. first/last_tick_time let a late tick still update open and close correctly.
+    """
+    __tablename__ = "price_bars"
+
+    product_id: Mapped[int] = mapped_column("Product_ID", ForeignKey("products.Product_ID"), primary_key=True)
+    resolution: Mapped[str] = mapped_column(
+        db.Enum("1m", "1h", "1d", name="price_bar_resolution_enum"), primary_key=True
+    )
+    bucket_start: Mapped[datetime] = mapped_column(db.DateTime, primary_key=True)
+    open_price: Mapped[float] = mapped_column(db.Numeric(12, 4), nullable=False)
+    high_price: Mapped[float] = mapped_column(db.Numeric(12, 4), nullable=False)
+    low_price: Mapped[float] = mapped_column(db.Numeric(12, 4), nullable=False)
+    close_price: Mapped[float] = mapped_column(db.Numeric(12, 4), nullable=False)
+    volume: Mapped[int] = mapped_column(db.BigInteger, nullable=False, default=0)
+    tick_count: Mapped[int] = mapped_column(db.Integer, nullable=False, default=0)
+    first_tick_time: Mapped[datetime] = mapped_column(MILLIS, nullable=False)
+    last_tick_time: Mapped[datetime] = mapped_column(MILLIS, nullable=False)
+
+
+class PerformanceRollup(db.Model):
+    """
+    Per (currency, risk_level) totals behind reports.portfolio_performance_summary.
+
+    Maintained by the triggers in sql/migration_performance_rollup.sql. Each bucket is
+    spread over shard rows (trades land in shard T_ID % 16) and read as their sum. NULL
+    currency and risk level are stored as '' so they can be part of the key;
+    currency_null marks a NULL currency.
+    """
+    __tablename__ = "portfolio_performance_rollup"
+
+    currency_null: Mapped[bool] = mapped_column(db.Boolean, primary_key=True, server_default=db.false())
+    currency: Mapped[str] = mapped_column(db.String(10), primary_key=True, server_default="")
+    risk_level: Mapped[str] = mapped_column(db.String(10), primary_key=True, server_default="")
+    shard: Mapped[int] = mapped_column(db.SmallInteger, primary_key=True, server_default="0")
+    portfolio_count: Mapped[int] = mapped_column(db.Integer, nullable=False, server_default="0")
+    transaction_count: Mapped[int] = mapped_column(db.BigInteger, nullable=False, server_default="0")
+    total_invested: Mapped[float] = mapped_column(db.Numeric(20, 2), nullable=False, server_default="0")
+    total_commissions: Mapped[float] = mapped_column(db.Numeric(20, 2), nullable=False, server_default="0")
+    # Trades with a commission_fee; none means the report shows NULL commissions
+    commission_count: Mapped[int] = mapped_column(db.BigInteger, nullable=False, server_default="0")
+    max_transaction_value: Mapped[float | None] = mapped_column(db.Numeric(20, 2), nullable=True)
+    # Set when a trade leaves the bucket that may have held the maximum
+    max_stale: Mapped[bool] = mapped_column(db.Boolean, nullable=False, server_default=db.false())
+
+
 class User(db.Model):
     """User authentication model linking to Customer or Employee with role-based access."""
     __tablename__ = "users"
@@ -202,3 +329,137 @@ class User(db.Model):
         return f"<User {self.user_id} {self.username} ({self.role})>"
 
 
+class TradeOrder(db.Model):
+    """
+    A trade accepted at intake and applied later by the order writer (app/orders.py).
+
+    (user_id, idempotency_key) is unique, so a repeated submit returns the existing
+    order instead of creating a second trade. t_id points at the resulting transaction.
+    """
+    __tablename__ = "trade_orders"
+
+    order_id: Mapped[int] = mapped_column(db.Integer, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.user_id"), nullable=False)
+    idempotency_key: Mapped[str] = mapped_column(db.String(64), nullable=False)
+    p_id: Mapped[int] = mapped_column("P_ID", db.Integer, nullable=False)
+    product_id: Mapped[int] = mapped_column("Product_ID", db.Integer, nullable=False)
+    quantity: Mapped[int] = mapped_column(db.Integer, nullable=False)
+    price_per_unit: Mapped[float] = mapped_column(db.Numeric(10, 2), nullable=False)
+    commission_rate: Mapped[float] = mapped_column(db.Numeric(8, 4), nullable=False)
+    status: Mapped[str] = mapped_column(
+        db.Enum("queued", "executed", "failed", name="trade_order_status_enum"),
+        nullable=False,
+        default="queued",
+    )
+    error: Mapped[str | None] = mapped_column(db.String(255), nullable=True)
+    t_id: Mapped[int | None] = mapped_column("T_ID", db.Integer, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(db.DateTime, nullable=False, default=datetime.utcnow)
+    processed_at: Mapped[datetime | None] = mapped_column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "idempotency_key", name="uq_trade_orders_idempotency"),
+        Index("idx_trade_orders_status", "status", "order_id"),
+    )
+
+
+class JobCursor(db.Model):
+    """Durable progress marker for a background job (app/cursors.py), e.g. the last T_ID processed."""
+    __tablename__ = "job_cursors"
+
+    name: Mapped[str] = mapped_column(db.String(64), primary_key=True)
+    position: Mapped[int] = mapped_column(db.BigInteger, nullable=False, default=0)
+    updated_at: Mapped[datetime | None] = mapped_column(db.DateTime, nullable=True)
+
+
+class OutboxEvent(db.Model):
+    """
+    A change to a domain row, written in the same transaction as the change (app/outbox.py).
+
+    Tailed in event_id order by the outbox dispatcher, which hands the events to the
+    registered consumers of derived data.
+    """
+    __tablename__ = "outbox_events"
+
+    # BIGINT on MySQL; SQLite only auto-increments INTEGER primary keys
+    event_id: Mapped[int] = mapped_column(
+        db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True, autoincrement=True
+    )
+    aggregate: Mapped[str] = mapped_column(db.String(32), nullable=False)
+    aggregate_id: Mapped[int] = mapped_column(db.BigInteger, nullable=False)
+    op: Mapped[str] = mapped_column(
+        db.Enum("insert", "update", "delete", name="outbox_op_enum"), nullable=False
+    )
+    payload: Mapped[dict | None] = mapped_column(db.JSON, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(db.DateTime, nullable=False)
+
+
+class CustomerSummary(db.Model):
+    """
+    Net worth, portfolio count and last trade date per customer, kept current from
+    outbox events by app/summaries.py for the customers list.
+    """
+    __tablename__ = "customer_summaries"
+
+    c_id: Mapped[int] = mapped_column("C_ID", db.Integer, primary_key=True, autoincrement=False)
+    net_worth: Mapped[float] = mapped_column(db.Numeric(20, 2), nullable=False, default=0)
+    portfolio_count: Mapped[int] = mapped_column(db.Integer, nullable=False, default=0)
+    last_trade_date: Mapped[datetime | None] = mapped_column(db.DateTime, nullable=True)
+    # Outbox events up to this ID are already reflected (set when the row is recomputed)
+    through_event: Mapped[int] = mapped_column(db.BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        # Sort keys of the customers list, with C_ID as the tie-breaker
+        Index("idx_customer_summaries_net_worth", "net_worth", "C_ID"),
+        Index("idx_customer_summaries_portfolio_count", "portfolio_count", "C_ID"),
+        Index("idx_customer_summaries_last_trade", "last_trade_date", "C_ID"),
+    )
+
+
+class LotPosition(db.Model):
+    """Per (portfolio, product) lot totals maintained by the FIFO lot engine (app/lots.py)."""
+    __tablename__ = "lot_positions"
+
+    p_id: Mapped[int] = mapped_column("P_ID", db.Integer, primary_key=True)
+    product_id: Mapped[int] = mapped_column("Product_ID", db.Integer, primary_key=True)
+    open_qty: Mapped[int] = mapped_column(db.BigInteger, nullable=False, default=0)
+    open_cost: Mapped[float] = mapped_column(db.Numeric(20, 2), nullable=False, default=0)
+    realized_pnl: Mapped[float] = mapped_column(db.Numeric(20, 2), nullable=False, default=0)
+    commissions: Mapped[float] = mapped_column(db.Numeric(20, 2), nullable=False, default=0)
+    last_t_id: Mapped[int] = mapped_column(db.Integer, nullable=False, default=0)
+
+
+class OpenLot(db.Model):
+    """An open (or partly closed) lot, identified by the trade that opened it."""
+    __tablename__ = "open_lots"
+
+    t_id: Mapped[int] = mapped_column("T_ID", db.Integer, primary_key=True, autoincrement=False)
+    p_id: Mapped[int] = mapped_column("P_ID", db.Integer, nullable=False)
+    product_id: Mapped[int] = mapped_column("Product_ID", db.Integer, nullable=False)
+    # Remaining quantity; negative for a short lot
+    quantity: Mapped[int] = mapped_column(db.Integer, nullable=False)
+    price_per_unit: Mapped[float] = mapped_column(db.Numeric(10, 2), nullable=False)
+
+    __table_args__ = (
+        Index("idx_open_lots_position", "P_ID", "Product_ID", "T_ID"),
+    )
+
+
+class ArchivedTradeTotal(db.Model):
+    """Per (month, portfolio, product) totals of trades moved to the cold archive (app/archive.py)."""
+    __tablename__ = "archived_trade_totals"
+
+    p_id: Mapped[int] = mapped_column("P_ID", db.Integer, primary_key=True)
+    product_id: Mapped[int] = mapped_column("Product_ID", db.Integer, primary_key=True)
+    # First day of the archived month
+    period: Mapped[date] = mapped_column(db.Date, primary_key=True)
+    trade_count: Mapped[int] = mapped_column(db.Integer, nullable=False)
+    quantity: Mapped[int] = mapped_column(db.BigInteger, nullable=False)
+    invested: Mapped[float] = mapped_column(db.Numeric(20, 2), nullable=False)
+    commissions: Mapped[float] = mapped_column(db.Numeric(20, 2), nullable=False)
+    # Trades with a commission_fee
+    commission_count: Mapped[int] = mapped_column(db.Integer, nullable=False, server_default="0")
+    max_value: Mapped[float | None] = mapped_column(db.Numeric(20, 2), nullable=True)
+
+    __table_args__ = (
+        Index("idx_archived_trade_totals_period", "period"),
+    )
@@ -0,0 +1,324 @@
+"""Trade order queue: idempotent intake and a group-commit writer.
+
+Intake (submit) records an order the caller has already validated under the client's
+idempotency key. A repeated key for the same user returns the existing order, so
+double submits never create a second trade.
+
+The writer (drain / run_worker) claims queued orders with SELECT ... FOR UPDATE SKIP
+LOCKED and commits a whole batch at once. Several writers can run side by side. It
+does not call Process_Trade: trades are inserted through the ORM (the outbox hook
+records them), and _apply repeats the procedure's rules in Python: the commission
+arithmetic, the locking portfolio and product checks and NOW() as the trade time. A
+change to the procedure has to be made in _apply too.
+
+The synchronous path (execute_now) goes through CALL Process_Trade, inside the
+request's transaction, and records the trade in the outbox itself (app/outbox.py).
+The trade form and POST /api/v1/orders use it unless TRADE_QUEUE is set.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any
+
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import IntegrityError
+
+from . import db, metrics, outbox, retry, versions
+from .models import Portfolio, Product, TradeOrder, Transaction
+
+log = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 64
+# transactions.commission_fee is DECIMAL(8,2)
+MAX_FEE = Decimal("999999.99")
+
+
+class OrderError(ValueError):
+    """An order that cannot be accepted (bad input, or a key reused for another order)."""
+
+
+def commission_rate(portfolio: Portfolio) -> Decimal:
+    """Employees pay 10%, customers 20% (same rule as the trade form)."""
+    return Decimal("0.20") if portfolio.c_id is not None else Decimal("0.10")
+
+
+def commission_fee(quantity: int, price_per_unit: Any, rate: Any) -> Decimal:
+    """ROUND(quantity * price_per_unit * rate, 2), as Process_Trade computes it."""
+    return (Decimal(quantity) * Decimal(str(price_per_unit)) * Decimal(str(rate or 0))).quantize(
+        Decimal("0.01"), rounding=ROUND_HALF_UP
+    )
+
+
+def _same_order(order: TradeOrder, p_id: int, product_id: int, quantity: int, price_per_unit: Any) -> bool:
+    return (
+        order.p_id == p_id
+        and order.product_id == product_id
+        and order.quantity == quantity
+        and Decimal(order.price_per_unit) == Decimal(str(price_per_unit)).quantize(Decimal("0.01"))
+    )
+
+
+def find(user_id: int, key: str) -> TradeOrder | None:
+    return db.session.scalar(
+        select(TradeOrder).where(TradeOrder.user_id == user_id, TradeOrder.idempotency_key == key)
+    )
+
+
+def submit(
+    user_id: int,
+    key: str,
+    p_id: int,
+    product_id: int,
+    quantity: int,
+    price_per_unit: Any,
+    rate: Any,
+) -> tuple[TradeOrder, bool]:
+    """
+    Record an order (flushed, caller commits); returns (order, created).
+
+    When the user already has an order under `key`, that order is returned with
+    created=False. Reusing a key for a different order raises OrderError. A concurrent
+    submit of the same key loses on the unique index and also gets the existing order;
+    that path rolls the session back, so call submit before other writes.
+    """
+    key = (key or "").strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise OrderError(f"Idempotency key must be 1-{MAX_KEY_LENGTH} characters.")
+
+    existing = find(user_id, key)
+    if existing is None:
+        fee = commission_fee(quantity, price_per_unit, rate)
+        if fee > MAX_FEE:
+            raise OrderError("Order value too large: commission fee exceeds 999,999.99.")
+        order = TradeOrder(
+            user_id=user_id,
+            idempotency_key=key,
+            p_id=p_id,
+            product_id=product_id,
+            quantity=quantity,
+            price_per_unit=price_per_unit,
+            commission_rate=rate,
+            status="queued",
+        )
+        db.session.add(order)
+        try:
+            db.session.flush()
+            return order, True
+        except IntegrityError:
+            db.session.rollback()
+            existing = find(user_id, key)
+            if existing is None:
+                raise
+
+    if not _same_order(existing, p_id, product_id, quantity, price_per_unit):
+        raise OrderError("Idempotency key was already used for a different order.")
+    return existing, False
+
+
+def execute_now(order: TradeOrder) -> None:
+    """Apply one order in the current transaction through CALL Process_Trade (caller commits)."""
+    db.session.execute(
+        text("CALL Process_Trade(:p_id, :product_id, :qty, :ppu, :comm)"),
+        {
+            "p_id": order.p_id,
+            "product_id": order.product_id,
+            "qty": order.quantity,
+            "ppu": order.price_per_unit,
+            "comm": order.commission_rate,
+        },
+    )
+    versions.bump("transactions")
+    trade = db.session.execute(
+        text(
+            "SELECT T_ID, transaction_date, commission_fee FROM transactions WHERE T_ID = LAST_INSERT_ID()"
+        )
+    ).one()
+    outbox.emit(
+        "transactions",
+        trade.T_ID,
+        "insert",
+        {
+            "t_id": trade.T_ID,
+            "p_id": order.p_id,
+            "product_id": order.product_id,
+            "quantity": order.quantity,
+            "price_per_unit": order.price_per_unit,
+            "transaction_date": trade.transaction_date,
+            "commission_fee": trade.commission_fee,
+        },
+    )
+    order.t_id = trade.T_ID
+    order.status = "executed"
+    order.processed_at = datetime.utcnow()
+
+
+def _claim(batch_size: int) -> list[TradeOrder]:
+    return list(
+        db.session.scalars(
+            select(TradeOrder)
+            .where(TradeOrder.status == "queued")
+            .order_by(TradeOrder.order_id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+    )
+
+
+def _fail(order: TradeOrder, reason: str, now: datetime) -> None:
+    order.status = "failed"
+    order.error = reason[:255]
+    order.processed_at = now
+
+
+def _apply(orders: list[TradeOrder]) -> dict[str, int]:
+    """Insert one transaction per order and mark the orders executed (no commit)."""
+    executed_at = db.session.execute(select(func.now())).scalar()
+    now = datetime.utcnow()
+
+    p_ids = {o.p_id for o in orders}
+    product_ids = {o.product_id for o in orders}
+    # Shared locks until commit, as Process_Trade takes: transactions has no foreign keys
+    # (sql/migration_transactions_partitioning.sql), so these keep the portfolio from
+    # being soft-deleted and the product from being deleted under the batch
+    known_portfolios = set(
+        db.session.scalars(
+            select(Portfolio.p_id)
+            .where(Portfolio.p_id.in_(p_ids), Portfolio.deleted_at.is_(None))
+            .with_for_update(read=True)
+        )
+    )
+    known_products = set(
+        db.session.scalars(
+            select(Product.product_id).where(Product.product_id.in_(product_ids)).with_for_update(read=True)
+        )
+    )
+
+    pending: list[tuple[TradeOrder, Transaction]] = []
+    failed = 0
+    for order in orders:
+        if order.p_id not in known_portfolios:
+            _fail(order, "Portfolio no longer exists.", now)
+            failed += 1
+            continue
+        if order.product_id not in known_products:
+            _fail(order, "Product no longer exists.", now)
+            failed += 1
+            continue
+        trade = Transaction(
+            p_id=order.p_id,
+            product_id=order.product_id,
+            quantity=order.quantity,
+            price_per_unit=order.price_per_unit,
+            transaction_date=executed_at,
+            commission_fee=commission_fee(order.quantity, order.price_per_unit, order.commission_rate),
+        )
+        db.session.add(trade)
+        pending.append((order, trade))
+
+    db.session.flush()
+    for order, trade in pending:
+        order.t_id = trade.t_id
+        order.status = "executed"
+        order.processed_at = now
+    return {"executed": len(pending), "failed": failed}
+
+
+def drain(batch_size: int = 500) -> dict[str, int]:
+    """
+    Apply up to `batch_size` queued orders in one transaction (one commit).
+
+    If the batch fails as a whole, it is rolled back and retried one order per
+    transaction, so a single bad order is marked failed without holding up the rest.
+    An order that hits a deadlock or lock wait on its own stays queued for the next
+    drain (app/retry.py).
+    Returns counts of executed and failed orders.
+    """
+    orders = _claim(batch_size)
+    if not orders:
+        db.session.rollback()
+        return {"executed": 0, "failed": 0}
+
+    with metrics.TRADE_SECONDS.time(path="queue"):
+        counts = _drain_claimed(orders)
+    for outcome, n in counts.items():
+        metrics.TRADES.inc(n, path="queue", outcome=outcome)
+    return counts
+
+
+def _drain_claimed(orders: list[TradeOrder]) -> dict[str, int]:
+    try:
+        counts = _apply(orders)
+        db.session.commit()
+        return counts
+    except Exception:
+        log.exception("order batch failed; retrying orders one by one")
+        db.session.rollback()
+
+    counts = {"executed": 0, "failed": 0}
+    for order_id in [o.order_id for o in orders]:
+        order = db.session.scalar(
+            select(TradeOrder)
+            .where(TradeOrder.order_id == order_id, TradeOrder.status == "queued")
+            .with_for_update(skip_locked=True)
+        )
+        if order is None:
+            db.session.rollback()
+            continue
+        try:
+            result = _apply([order])
+            db.session.commit()
+        except Exception as exc:
+            db.session.rollback()
+            reason = retry.classify(exc)
+            if reason:
+                # Transient: leave it queued for the next drain instead of failing it
+                retry.TRADE_RETRIES.inc(path="queue", reason=reason)
+                continue
+            order = db.session.get(TradeOrder, order_id)
+            _fail(order, f"{type(exc).__name__}: {exc}", datetime.utcnow())
+            db.session.commit()
+            result = {"executed": 0, "failed": 1}
+        for status, n in result.items():
+            counts[status] += n
+    return counts
+
+
+def run_worker(
+    batch_size: int = 500,
+    poll_interval: float = 0.2,
+    stop: threading.Event | None = None,
+) -> None:
+    """Drain the queue until `stop` is set, sleeping `poll_interval` when it is empty."""
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        try:
+            counts = drain(batch_size)
+        except Exception:
+            log.exception("order writer error")
+            db.session.rollback()
+            counts = {"executed": 0, "failed": 0}
+        if counts["executed"] + counts["failed"] == 0:
+            stop.wait(poll_interval)
+        else:
+            log.info("applied %(executed)d orders (%(failed)d failed)", counts)
+
+
+def to_dict(order: TradeOrder) -> dict[str, Any]:
+    return {
+        "order_id": order.order_id,
+        "idempotency_key": order.idempotency_key,
+        "status": order.status,
+        "p_id": order.p_id,
+        "product_id": order.product_id,
+        "quantity": order.quantity,
+        "price_per_unit": float(order.price_per_unit),
+        "commission_rate": float(order.commission_rate),
+        "t_id": order.t_id,
+        "error": order.error,
+        "created_at": order.created_at.isoformat() if order.created_at else None,
+        "processed_at": order.processed_at.isoformat() if order.processed_at else None,
+    }
@@ -0,0 +1,317 @@
+"""Transactional outbox: change events for derived data, delivered in commit order.
+
+Every write to a domain table adds an outbox_events row in the same transaction, so
+an event exists exactly when its change committed. ORM writes are captured by a flush
+listener (like the version stamps in app/versions.py); code that writes around the
+ORM calls emit() itself:
+
+- orders.execute_now (CALL Process_Trade) emits the trade it inserted
+- soft deletes emit updates of deleted_at; the purge job emits one delete per
+  portfolio or customer, which stands for everything removed with it (trades, lots,
+  orders, logins, contact records)
+
+An event carries the table (`aggregate`), the row's primary key, the operation and a
+JSON payload: every loaded column for inserts and deletes, the changed columns for
+updates (with their old values under "_previous" when they were loaded). Secrets and
+national identifiers are left out (_REDACTED).
+
+Consumers of derived data register with the `consumer` decorator, in a module that
+create_app imports, and receive lists of events in event_id order. The dispatcher
+(dispatch / run_worker, scripts/run_outbox_dispatcher.py) keeps one durable cursor
+per consumer in job_cursors and commits a consumer's writes together with its
+cursor, so a consumer that keeps its state in the database sees each event exactly
+once. A failing consumer is retried on the next pass without holding up the others.
+New consumers start from the oldest retained event.
+
+As with the lot engine, the cursor never passes an event younger than
+`settle_seconds`: a lower event_id whose transaction commits late is not skipped.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Iterable, NamedTuple
+
+from flask import Flask
+from sqlalchemy import bindparam, event, func, inspect, select, text
+from sqlalchemy.orm import Session
+
+from . import cursors, db
+
+log = logging.getLogger(__name__)
+
+SETTLE_SECONDS = 5
+RETENTION_DAYS = 7
+PRUNE_INTERVAL = 300
+CURSOR_PREFIX = "outbox:"
+
+# Domain tables whose ORM writes become events
+TRACKED = {
+    "customers",
+    "customer_details",
+    "customer_phones",
+    "customer_emails",
+    "employees",
+    "products",
+    "portfolios",
+    "transactions",
+    "users",
+}
+# Columns never copied into a payload
+_REDACTED = {
+    "users": {"password_hash"},
+    "customer_details": {"ssn", "pan_number", "aadhar_number"},
+}
+_INSERT = text(
+    "INSERT INTO outbox_events (aggregate, aggregate_id, op, payload, created_at) "
+    "VALUES (:aggregate, :aggregate_id, :op, :payload, NOW())"
+)
+_listening = False
+
+
+class Event(NamedTuple):
+    event_id: int
+    aggregate: str
+    aggregate_id: int
+    op: str
+    payload: dict[str, Any]
+    created_at: datetime
+
+
+class Consumer(NamedTuple):
+    name: str
+    handle: Callable[[list[Event]], None]
+    # None: every aggregate
+    aggregates: frozenset[str] | None
+
+
+_consumers: dict[str, Consumer] = {}
+
+
+def init_app(app: Flask) -> None:
+    """Install the flush listener that records ORM writes as events (idempotent)."""
+    global _listening
+    if not _listening:
+        event.listen(Session, "after_flush", _record_flushed)
+        _listening = True
+
+
+def consumer(name: str, *aggregates: str) -> Callable:
+    """
+    Decorator: register `handle(events)` as consumer `name` of events on `aggregates`
+    (all of them when none are given). It runs in the dispatcher's transaction.
+    """
+    def decorator(handle: Callable[[list[Event]], None]) -> Callable[[list[Event]], None]:
+        _consumers[name] = Consumer(name, handle, frozenset(aggregates) or None)
+        return handle
+    return decorator
+
+
+def registered() -> list[str]:
+    """Names of the registered consumers (create_app imports the modules that define them)."""
+    return sorted(_consumers)
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _columns(obj: Any, table: str, changed_only: bool) -> tuple[int | None, dict[str, Any]]:
+    """(primary key, payload) of a flushed object, from its loaded state only."""
+    state = inspect(obj)
+    mapper = state.mapper
+    redacted = _REDACTED.get(table, ())
+    payload: dict[str, Any] = {}
+    previous: dict[str, Any] = {}
+    for attr in mapper.column_attrs:
+        key = attr.key
+        if key in redacted or key not in state.dict:
+            continue
+        if changed_only:
+            history = state.attrs[key].history
+            if not history.has_changes():
+                continue
+            if history.deleted:
+                previous[key] = _jsonable(history.deleted[0])
+        payload[key] = _jsonable(state.dict[key])
+    if previous:
+        payload["_previous"] = previous
+    identity = state.identity or mapper.primary_key_from_instance(obj)
+    return (identity[0] if identity and len(identity) == 1 else None), payload
+
+
+def _record_flushed(session: Session, flush_context: Any) -> None:
+    rows = []
+    changes = [(obj, "insert") for obj in session.new]
+    changes += [(obj, "update") for obj in session.dirty if session.is_modified(obj)]
+    changes += [(obj, "delete") for obj in session.deleted]
+    for obj, op in changes:
+        table = getattr(obj, "__tablename__", None)
+        if table not in TRACKED:
+            continue
+        key, payload = _columns(obj, table, changed_only=op == "update")
+        if key is None or (op == "update" and not payload):
+            continue
+        rows.append({"aggregate": table, "aggregate_id": key, "op": op, "payload": json.dumps(payload)})
+    if rows:
+        session.connection().execute(_INSERT, rows)
+
+
+def emit(aggregate: str, aggregate_id: int, op: str, payload: dict[str, Any] | None = None) -> None:
+    """Record a change made outside the ORM, in the current transaction (caller commits)."""
+    emit_many(aggregate, op, [(aggregate_id, payload or {})])
+
+
+def emit_many(aggregate: str, op: str, changes: Iterable[tuple[int, dict[str, Any]]]) -> None:
+    """emit() for several rows of one table in one statement."""
+    rows = [
+        {
+            "aggregate": aggregate,
+            "aggregate_id": aggregate_id,
+            "op": op,
+            "payload": json.dumps({k: _jsonable(v) for k, v in payload.items()}),
+        }
+        for aggregate_id, payload in changes
+    ]
+    if rows:
+        db.session.execute(_INSERT, rows)
+
+
+def _settled_upto(after: int, settle_seconds: int) -> int:
+    """Highest event_id that is safe to deliver: everything before the first unsettled event."""
+    db_now = db.session.execute(select(func.now())).scalar()
+    cutoff = db_now - timedelta(seconds=settle_seconds)
+    first_unsettled = db.session.execute(
+        text("SELECT MIN(event_id) FROM outbox_events WHERE event_id > :after AND created_at > :cutoff"),
+        {"after": after, "cutoff": cutoff},
+    ).scalar()
+    if first_unsettled is not None:
+        return int(first_unsettled) - 1
+    return int(db.session.execute(text("SELECT COALESCE(MAX(event_id), 0) FROM outbox_events")).scalar())
+
+
+def _read(after: int, upto: int, limit: int, aggregates: frozenset[str] | None) -> list[Event]:
+    """The consumer's next events after `after`, oldest first."""
+    params: dict[str, Any] = {"after": after, "upto": upto, "limit": limit}
+    only = ""
+    if aggregates is not None:
+        only = "AND aggregate IN :aggregates"
+        params["aggregates"] = sorted(aggregates)
+    stmt = text(
+        f"""
+        SELECT event_id, aggregate, aggregate_id, op, payload, created_at
+        FROM outbox_events
+        WHERE event_id > :after AND event_id <= :upto {only}
+        ORDER BY event_id
+        LIMIT :limit
+        """
+    )
+    if aggregates is not None:
+        stmt = stmt.bindparams(bindparam("aggregates", expanding=True))
+    events = []
+    for row in db.session.execute(stmt, params):
+        # The MySQL driver returns JSON columns as text
+        payload = json.loads(row.payload) if isinstance(row.payload, (str, bytes)) else row.payload
+        events.append(
+            Event(int(row.event_id), row.aggregate, int(row.aggregate_id), row.op, payload or {}, row.created_at)
+        )
+    return events
+
+
+def dispatch(batch_size: int = 1_000, settle_seconds: int = SETTLE_SECONDS) -> dict[str, int]:
+    """
+    Deliver up to `batch_size` settled events to each consumer, one commit per consumer.
+
+    Returns the number of events each consumer handled (-1 for a consumer that failed;
+    its cursor stays put and the same events come again on the next call).
+    """
+    positions = {name: cursors.get(CURSOR_PREFIX + name) for name in _consumers}
+    upto = _settled_upto(min(positions.values(), default=0), settle_seconds)
+    delivered: dict[str, int] = {}
+    for name, c in _consumers.items():
+        after = positions[name]
+        if after >= upto:
+            delivered[name] = 0
+            continue
+        try:
+            events = _read(after, upto, batch_size, c.aggregates)
+            if events:
+                c.handle(events)
+            # A short batch means nothing else for this consumer up to `upto`
+            position = events[-1].event_id if len(events) == batch_size else upto
+            cursors.set(CURSOR_PREFIX + name, position)
+            db.session.commit()
+            delivered[name] = len(events)
+        except Exception:
+            log.exception("outbox consumer %s failed; will retry", name)
+            db.session.rollback()
+            delivered[name] = -1
+    db.session.rollback()
+    return delivered
+
+
+def prune(retention_days: int = RETENTION_DAYS, batch_size: int = 5_000) -> int:
+    """
+    Delete events every consumer has passed and older than `retention_days`, a chunk
+    per transaction; returns rows deleted. Raises RuntimeError when no consumer is
+    registered, since nothing could ever be pruned.
+    """
+    if not _consumers:
+        raise RuntimeError("no outbox consumers are registered; events would never be pruned")
+    passed = min(cursors.get(CURSOR_PREFIX + name) for name in _consumers)
+    cutoff = db.session.execute(select(func.now())).scalar() - timedelta(days=retention_days)
+    stmt = text(
+        "DELETE FROM outbox_events WHERE event_id <= :passed AND created_at < :cutoff "
+        "ORDER BY event_id LIMIT :batch_size"
+    )
+    total = 0
+    while True:
+        deleted = db.session.execute(stmt, {"passed": passed, "cutoff": cutoff, "batch_size": batch_size}).rowcount
+        db.session.commit()
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+def lag() -> dict[str, int]:
+    """Events waiting per consumer (the newest event_id minus the consumer's cursor)."""
+    newest = int(db.session.execute(text("SELECT COALESCE(MAX(event_id), 0) FROM outbox_events")).scalar())
+    return {name: max(newest - cursors.get(CURSOR_PREFIX + name), 0) for name in _consumers}
+
+
+def run_worker(
+    batch_size: int = 1_000,
+    poll_interval: float = 1.0,
+    retention_days: int = RETENTION_DAYS,
+    stop: threading.Event | None = None,
+) -> None:
+    """Dispatch until `stop` is set, sleeping `poll_interval` when no consumer had work."""
+    if not _consumers:
+        raise RuntimeError("no outbox consumers are registered")
+    stop = stop or threading.Event()
+    last_prune = 0.0
+    while not stop.is_set():
+        try:
+            delivered = dispatch(batch_size)
+            if time.monotonic() - last_prune > PRUNE_INTERVAL:
+                pruned = prune(retention_days)
+                if pruned:
+                    log.info("pruned %d outbox events", pruned)
+                last_prune = time.monotonic()
+        except Exception:
+            log.exception("outbox dispatcher error")
+            db.session.rollback()
+            delivered = {}
+        if not any(n > 0 for n in delivered.values()):
+            stop.wait(poll_interval)
+        else:
+            log.info("delivered %s", ", ".join(f"{name}: {n}" for name, n in delivered.items()))
@@ -0,0 +1,158 @@
+"""Independent database reads of one request, run concurrently on a bounded thread pool.
+
+A read-heavy view that needs several unrelated figures (customers.view: age, net
+worth, holdings, sectors, lot P&L) hands them to `gather` as named callables. The
+first runs in the request thread on the request's session; the others run on a
+shared pool of CONCURRENT_READ_WORKERS threads, each in its own app context and so
+on its own session and pooled connection. The view then waits about as long as its
+slowest read instead of the sum of all of them.
+
+Every read shares one deadline (CONCURRENT_READ_TIMEOUT seconds from the call):
+
+- a read still queued at the deadline is cancelled before it touches the database
+- on MySQL, each read's connection carries max_execution_time for the time left, so
+  the server aborts a SELECT that would run past the deadline instead of letting it
+  hold a connection after the page has given up on it
+- the view stops waiting at the deadline either way
+
+A read that fails or misses the deadline is logged and replaced by its fallback
+value, so one slow figure degrades the page instead of failing it. Reads must not
+write and must return plain values or detached rows, since their session is closed
+when the worker's app context ends. With CONCURRENT_READS=0 (or inside a pool
+thread) the same reads run one after another in the request thread.
+
+Each pool thread holds a connection while it runs, so keep ADMISSION_CAPACITY plus
+CONCURRENT_READ_WORKERS within the SQLAlchemy pool size plus overflow (5 + 10). That
+only holds when the calling view is under admission.limit, so its own connection is
+one of the ADMISSION_CAPACITY.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+from flask import Flask, current_app
+from sqlalchemy import text
+
+from . import db, metrics
+
+log = logging.getLogger(__name__)
+
+READS = metrics.Counter(
+    "concurrent_reads_total", "Reads run by parallel.gather, by view, read and outcome.", ("view", "read", "outcome")
+)
+READ_SECONDS = metrics.Histogram(
+    "concurrent_read_duration_seconds", "Duration of each read run by parallel.gather.", ("view", "read")
+)
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+# Set in pool threads: a gather from inside a read runs inline instead of queueing
+# behind itself
+_local = threading.local()
+
+
+def _pool(workers: int) -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="parallel-read")
+        return _executor
+
+
+@contextmanager
+def _statement_deadline(seconds: float) -> Iterator[None]:
+    """On MySQL, have the server abort SELECTs on this session's connection after `seconds`."""
+    if db.session.get_bind().dialect.name != "mysql":
+        yield
+        return
+    db.session.execute(text("SET SESSION max_execution_time = :ms"), {"ms": max(int(seconds * 1000), 1)})
+    try:
+        yield
+    finally:
+        try:
+            db.session.execute(text("SET SESSION max_execution_time = 0"))
+        except Exception:
+            # Never hand a connection with a time limit back to the pool
+            log.warning("could not reset max_execution_time; discarding the connection")
+            db.session.connection().invalidate()
+
+
+def _run(view: str, name: str, fn: Callable[[], Any], deadline: float) -> Any:
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError(f"{name} was not started before the deadline")
+    with READ_SECONDS.time(view=view, read=name), _statement_deadline(remaining):
+        return fn()
+
+
+def _in_worker(app: Flask, view: str, name: str, fn: Callable[[], Any], deadline: float) -> Any:
+    _local.worker = True
+    with app.app_context():
+        return _run(view, name, fn, deadline)
+
+
+def _settle(view: str, name: str, outcome: str, value: Any, fallback: Any, exc: BaseException | None = None) -> Any:
+    READS.inc(view=view, read=name, outcome=outcome)
+    if exc is None:
+        return value
+    if outcome == "timeout":
+        log.warning("%s: read %s missed the deadline; showing its fallback", view, name)
+    else:
+        log.warning("%s: read %s failed; showing its fallback", view, name, exc_info=exc)
+    return fallback
+
+
+def gather(
+    view: str,
+    calls: dict[str, Callable[[], Any]],
+    fallbacks: dict[str, Any] | None = None,
+    timeout: float | None = None,
+) -> dict[str, Any]:
+    """
+    Run independent reads concurrently; returns {name: result}. A read that raises or
+    misses the deadline yields `fallbacks[name]` (None when not given).
+    """
+    config = current_app.config
+    fallbacks = fallbacks or {}
+    timeout = timeout or config.get("CONCURRENT_READ_TIMEOUT", 5.0)
+    deadline = time.monotonic() + timeout
+    names = list(calls)
+    results: dict[str, Any] = {}
+
+    def inline(name: str) -> None:
+        try:
+            value = _run(view, name, calls[name], deadline)
+        except TimeoutError as exc:
+            results[name] = _settle(view, name, "timeout", None, fallbacks.get(name), exc)
+        except Exception as exc:
+            results[name] = _settle(view, name, "error", None, fallbacks.get(name), exc)
+        else:
+            results[name] = _settle(view, name, "ok", value, None)
+
+    if len(names) < 2 or not config.get("CONCURRENT_READS", True) or getattr(_local, "worker", False):
+        for name in names:
+            inline(name)
+        return results
+
+    app = current_app._get_current_object()
+    pool = _pool(config.get("CONCURRENT_READ_WORKERS", 3))
+    futures = {name: pool.submit(_in_worker, app, view, name, calls[name], deadline) for name in names[1:]}
+    # The request thread takes the first read itself rather than sitting idle
+    inline(names[0])
+    for name, future in futures.items():
+        try:
+            value = future.result(timeout=max(deadline - time.monotonic(), 0))
+        except (FutureTimeout, TimeoutError) as exc:
+            future.cancel()
+            results[name] = _settle(view, name, "timeout", None, fallbacks.get(name), exc)
+        except Exception as exc:
+            results[name] = _settle(view, name, "error", None, fallbacks.get(name), exc)
+        else:
+            results[name] = _settle(view, name, "ok", value, None)
+    return {name: results[name] for name in names}
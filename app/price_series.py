@@ -0,0 +1,246 @@
+"""Intraday price series: raw ticks plus OHLC bars at 1m, 1h and 1d, for charts.
+
+Every tick is kept in price_ticks. The same ingest folds it into three bars in
+price_bars (one per resolution), so a bar is always current and a chart never
+aggregates ticks at read time. Bars are upserted per batch: high/low/volume/count
+combine directly, and open/close follow the earliest/latest tick time seen, so a
+tick that arrives late or out of order lands in the right place.
+
+A range read picks the representation by point budget (`series`): raw ticks when the
+range is short enough that the ticks themselves fit, else the finest bar resolution
+whose bucket count over the range fits, else daily bars merged k days per point.
+Each read touches at most about `max_points` rows of one resolution (the merged daily
+case reads one row per day), so the response size and cost stay flat whether the
+range is an hour or ten years.
+
+Writes bump a data version per product (STAMP, e.g. "price_series:42"), which the
+range endpoint's ETag uses, so ticks for one product leave other products' cached
+charts valid.
+"""
+
+from __future__ import annotations
+
+import csv
+import math
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Iterable, NamedTuple
+
+from sqlalchemy import DateTime, text
+
+from . import db, versions
+
+# data_versions row per product, formatted with the product id
+STAMP = "price_series:{product_id}"
+
+# Finest first: (name, bucket length in seconds)
+RESOLUTIONS = (("1m", 60), ("1h", 3_600), ("1d", 86_400))
+DEFAULT_POINTS = 500
+MAX_POINTS = 2_000
+LOAD_CHUNK = 5_000
+
+_INSERT_TICK = text(
+    "INSERT INTO price_ticks (Product_ID, tick_time, price, volume) VALUES (:pid, :at, :price, :volume)"
+)
+# Assignments run left to right and see the new values of earlier ones, so open and
+# close are decided before first/last_tick_time move
+_UPSERT_BAR = text(
+    """
+    INSERT INTO price_bars (Product_ID, resolution, bucket_start, open_price, high_price, low_price,
+                            close_price, volume, tick_count, first_tick_time, last_tick_time)
+    VALUES (:pid, :res, :bucket, :open, :high, :low, :close, :volume, :n, :first, :last)
+    ON DUPLICATE KEY UPDATE
+      open_price = IF(VALUES(first_tick_time) < first_tick_time, VALUES(open_price), open_price),
+      close_price = IF(VALUES(last_tick_time) >= last_tick_time, VALUES(close_price), close_price),
+      first_tick_time = LEAST(first_tick_time, VALUES(first_tick_time)),
+      last_tick_time = GREATEST(last_tick_time, VALUES(last_tick_time)),
+      high_price = GREATEST(high_price, VALUES(high_price)),
+      low_price = LEAST(low_price, VALUES(low_price)),
+      volume = volume + VALUES(volume),
+      tick_count = tick_count + VALUES(tick_count)
+    """
+)
+
+
+class Tick(NamedTuple):
+    product_id: int
+    at: datetime
+    price: Decimal
+    volume: int = 0
+
+
+def bucket_start(at: datetime, resolution: str) -> datetime:
+    """Start of the 1m / 1h / 1d bucket containing `at`."""
+    if resolution == "1m":
+        return at.replace(second=0, microsecond=0)
+    if resolution == "1h":
+        return at.replace(minute=0, second=0, microsecond=0)
+    return at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _fold(ticks: list[Tick]) -> list[dict[str, Any]]:
+    """One bar row per (product, resolution, bucket) touched by the batch."""
+    bars: dict[tuple[int, str, datetime], dict[str, Any]] = {}
+    for tick in sorted(ticks, key=lambda t: t.at):
+        for resolution, _ in RESOLUTIONS:
+            key = (tick.product_id, resolution, bucket_start(tick.at, resolution))
+            bar = bars.get(key)
+            if bar is None:
+                bars[key] = {
+                    "pid": tick.product_id,
+                    "res": resolution,
+                    "bucket": key[2],
+                    "open": tick.price,
+                    "high": tick.price,
+                    "low": tick.price,
+                    "close": tick.price,
+                    "volume": tick.volume,
+                    "n": 1,
+                    "first": tick.at,
+                    "last": tick.at,
+                }
+            else:
+                bar["high"] = max(bar["high"], tick.price)
+                bar["low"] = min(bar["low"], tick.price)
+                bar["close"] = tick.price
+                bar["volume"] += tick.volume
+                bar["n"] += 1
+                bar["last"] = tick.at
+    return list(bars.values())
+
+
+def ingest(ticks: Iterable[Tick]) -> int:
+    """Store ticks and fold them into their 1m/1h/1d bars (caller commits); returns ticks stored."""
+    ticks = list(ticks)
+    if not ticks:
+        return 0
+    db.session.execute(
+        _INSERT_TICK,
+        [{"pid": t.product_id, "at": t.at, "price": t.price, "volume": t.volume} for t in ticks],
+    )
+    db.session.execute(_UPSERT_BAR, _fold(ticks))
+    versions.bump(*{STAMP.format(product_id=t.product_id) for t in ticks})
+    return len(ticks)
+
+
+def load_feed(path: str, chunk_size: int = LOAD_CHUNK) -> tuple[int, list[str]]:
+    """
+    Ingest a CSV feed with a header row: time,ticker,price and an optional volume,
+    committing every `chunk_size` ticks. Returns the ticks stored and the tickers that
+    matched no product.
+    """
+    tickers = {
+        row.ticker_symbol.upper(): row.Product_ID
+        for row in db.session.execute(text("SELECT Product_ID, ticker_symbol FROM products"))
+        if row.ticker_symbol
+    }
+    unknown: set[str] = set()
+    loaded = 0
+    chunk: list[Tick] = []
+    with open(path, newline="", encoding="utf-8") as fh:
+        for record in csv.DictReader(fh):
+            ticker = record["ticker"].strip().upper()
+            product_id = tickers.get(ticker)
+            if product_id is None:
+                unknown.add(ticker)
+                continue
+            chunk.append(Tick(
+                product_id,
+                datetime.fromisoformat(record["time"].strip()),
+                Decimal(record["price"].strip()),
+                int(record.get("volume") or 0),
+            ))
+            if len(chunk) >= chunk_size:
+                loaded += ingest(chunk)
+                db.session.commit()
+                chunk = []
+    loaded += ingest(chunk)
+    db.session.commit()
+    return loaded, sorted(unknown)
+
+
+def _point(at: datetime, o: Any, h: Any, l: Any, c: Any, volume: Any) -> dict[str, Any]:
+    return {
+        "t": at.isoformat(),
+        "open": float(o),
+        "high": float(h),
+        "low": float(l),
+        "close": float(c),
+        "volume": int(volume or 0),
+    }
+
+
+def _ticks(product_id: int, start: datetime, end: datetime, limit: int) -> list[Any]:
+    return db.session.execute(
+        text(
+            """
+            SELECT tick_time, price, volume
+            FROM price_ticks
+            WHERE Product_ID = :pid AND tick_time >= :start AND tick_time < :end
+            ORDER BY tick_time
+            LIMIT :limit
+            """
+        ).columns(tick_time=DateTime),
+        {"pid": product_id, "start": start, "end": end, "limit": limit},
+    ).all()
+
+
+def _bars(product_id: int, resolution: str, start: datetime, end: datetime) -> list[Any]:
+    return db.session.execute(
+        text(
+            """
+            SELECT bucket_start, open_price, high_price, low_price, close_price, volume
+            FROM price_bars
+            WHERE Product_ID = :pid AND resolution = :res
+              AND bucket_start >= :start AND bucket_start < :end
+            ORDER BY bucket_start
+            """
+        ).columns(bucket_start=DateTime),
+        {"pid": product_id, "res": resolution, "start": bucket_start(start, resolution), "end": end},
+    ).all()
+
+
+def _merge(bars: list[Any], origin: datetime, days: int) -> list[dict[str, Any]]:
+    """Daily bars merged into one point per `days` days counted from `origin`."""
+    points: list[dict[str, Any]] = []
+    group = None
+    for bar in bars:
+        index = (bar.bucket_start - origin).days // days
+        if index != group:
+            group = index
+            points.append(_point(origin + timedelta(days=index * days), bar.open_price, bar.high_price,
+                                 bar.low_price, bar.close_price, bar.volume))
+        else:
+            point = points[-1]
+            point["high"] = max(point["high"], float(bar.high_price))
+            point["low"] = min(point["low"], float(bar.low_price))
+            point["close"] = float(bar.close_price)
+            point["volume"] += int(bar.volume or 0)
+    return points
+
+
+def series(
+    product_id: int, start: datetime, end: datetime, max_points: int = DEFAULT_POINTS
+) -> tuple[str, list[dict[str, Any]]]:
+    """
+    (resolution, points) for [start, end) with at most `max_points` points. The
+    resolution is "tick", "1m", "1h", "1d" or "<k>d" for daily bars merged k at a time.
+    """
+    span = (end - start).total_seconds()
+    if span <= 0:
+        return "tick", []
+    if span <= max_points * RESOLUTIONS[0][1]:
+        # Short range: show the ticks themselves when they fit
+        ticks = _ticks(product_id, start, end, max_points + 1)
+        if len(ticks) <= max_points:
+            return "tick", [_point(t.tick_time, t.price, t.price, t.price, t.price, t.volume) for t in ticks]
+    for resolution, seconds in RESOLUTIONS:
+        # The first bucket may start before `start`
+        if math.ceil(span / seconds) + 1 <= max_points:
+            return resolution, [
+                _point(b.bucket_start, b.open_price, b.high_price, b.low_price, b.close_price, b.volume)
+                for b in _bars(product_id, resolution, start, end)
+            ]
+    origin = bucket_start(start, "1d")
+    days = math.ceil(math.ceil((end - origin).total_seconds() / RESOLUTIONS[-1][1]) / max_points)
+    return f"{days}d", _merge(_bars(product_id, "1d", start, end), origin, days)
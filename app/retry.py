@@ -0,0 +1,88 @@
+"""Retries for transient MySQL failures on the trade path.
+
+Errors are classified by MySQL error number:
+
+- deadlock (1213): InnoDB picked this transaction as the victim and rolled it back
+- lock_wait (1205): a row lock was not granted within innodb_lock_wait_timeout
+- connection (2006, 2013, or a connection SQLAlchemy invalidated): the server went
+  away mid-transaction
+
+Anything else (constraint violations, bad input, SIGNALs raised by Process_Trade)
+is not retried. A retry replays the whole transaction after a rollback, so the
+callable must start from scratch each time. On the trade path that is safe even when
+the connection dropped during COMMIT: the order's idempotency key makes a replay of
+an order that did commit return the existing order instead of trading twice.
+
+Backoff is "full jitter": before attempt n, sleep a random time between 0 and
+min(max_delay, base_delay * 2**n), so threads that collided do not collide again in
+lockstep.
+"""
+
+from __future__ import annotations
+
+import logging
+import random
+import time
+from typing import Callable, TypeVar
+
+from flask import current_app
+from sqlalchemy.exc import DBAPIError
+
+from . import db, metrics
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_RETRYABLE = {
+    1213: "deadlock",
+    1205: "lock_wait",
+    2006: "connection",
+    2013: "connection",
+}
+
+TRADE_RETRIES = metrics.Counter(
+    "trade_retries_total", "Trade transactions replayed after a transient error, by path and reason.", ("path", "reason")
+)
+
+
+def classify(exc: BaseException) -> str | None:
+    """The retry reason for a transient error ("deadlock", "lock_wait", "connection"), else None."""
+    if not isinstance(exc, DBAPIError):
+        return None
+    if exc.connection_invalidated:
+        return "connection"
+    args = getattr(exc.orig, "args", ())
+    code = args[0] if args and isinstance(args[0], int) else None
+    return _RETRYABLE.get(code)
+
+
+def backoff(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Seconds to sleep before retry number `attempt` (1-based), with full jitter."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def run(fn: Callable[[], T], path: str, attempts: int | None = None) -> T:
+    """
+    Call `fn` (one whole transaction, including its commit), replaying it after a
+    rollback when it fails with a transient error. Gives up after `attempts` calls
+    (TRADE_RETRY_ATTEMPTS) and re-raises the last error.
+    """
+    config = current_app.config
+    attempts = attempts or config.get("TRADE_RETRY_ATTEMPTS", 4)
+    base_delay = config.get("TRADE_RETRY_BASE_DELAY", 0.02)
+    max_delay = config.get("TRADE_RETRY_MAX_DELAY", 0.5)
+    attempt = 1
+    while True:
+        try:
+            return fn()
+        except Exception as exc:
+            reason = classify(exc)
+            if reason is None or attempt >= attempts:
+                raise
+            db.session.rollback()
+            TRADE_RETRIES.inc(path=path, reason=reason)
+            delay = backoff(attempt, base_delay, max_delay)
+            log.info("%s trade hit %s (attempt %d/%d); retrying in %.3fs", path, reason, attempt, attempts, delay)
+            time.sleep(delay)
+            attempt += 1
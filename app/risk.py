@@ -0,0 +1,391 @@
+"""Portfolio risk metrics from daily price history, computed for every portfolio at once.
+
+price_history holds one close per product per day (loaded by
+scripts/load_price_history.py). For a lookback window ending at the latest loaded
+date, the closes become a (days x products) matrix, forward-filled over missing days,
+and daily returns give one product covariance matrix S. Positions (net quantity per
+portfolio and product, live and archived) are valued at the latest close and laid out
+as a (portfolios x products) value matrix V, so every metric is a matrix expression
+over all portfolios:
+
+- volatility: sqrt(diag(V S V')) / value, annualized with sqrt(252)
+- VaR: z(confidence) * sqrt(diag(V S V')) * sqrt(horizon days), in money
+- beta against an index product m: V S[:, m] / S[m, m] / value
+- Herfindahl concentration: sum of squared position weights
+
+V is built a block of portfolios at a time (BLOCK rows), which bounds memory to
+BLOCK x products floats however many portfolios there are.
+
+A product needs MIN_OBSERVATIONS daily returns in the window to count as priced;
+other positions are left out of volatility, beta and VaR (coverage reports the priced
+share of each portfolio's value) but still count for concentration, valued at the
+product's current price or, failing that, its invested amount. Amounts are in each
+portfolio's own currency; `top` ranks by VaR converted to the base currency (app/fx.py)
+at the rate of the window's last day.
+
+Positions come from holdings.firm_positions, which folds in only new trades. The
+price side (latest date, closes, covariance) is cached per price_history and products
+version and the set of products held, so a trade never re-reads the price history,
+and the latest date comes from the (Product_ID, price_date) key, one seek per product.
+"""
+
+from __future__ import annotations
+
+import csv
+import math
+from datetime import date, timedelta
+from decimal import Decimal
+from statistics import NormalDist
+from typing import Any, NamedTuple
+
+import numpy as np
+from sqlalchemy import bindparam, func, select, text
+
+from . import db, fx, holdings, versions
+from .cache import LRUCache
+from .models import PriceHistory
+
+# Everything a result depends on (for http_cache.conditional)
+TABLES = ("price_history", "transactions", "archived_trade_totals", "portfolios", "products")
+TRADING_DAYS = 252
+MIN_OBSERVATIONS = 20
+BLOCK = 2_000
+LOAD_CHUNK = 5_000
+
+# (positions key, versions, index product, lookback, confidence, horizon) -> Risk;
+# market data by price_history/products versions and products held; live portfolios
+# by portfolios version
+_cache = LRUCache("risk", maxsize=8)
+
+_UPSERT = text(
+    """
+    INSERT INTO price_history (Product_ID, price_date, close_price)
+    VALUES (:pid, :on, :close)
+    ON DUPLICATE KEY UPDATE close_price = VALUES(close_price)
+    """
+)
+
+
+class Risk(NamedTuple):
+    """Per-portfolio metrics as arrays aligned with `p_ids`; NaN where undefined."""
+    p_ids: np.ndarray
+    # Portfolio currency (object array; None when not set)
+    currency: np.ndarray
+    value: np.ndarray
+    volatility: np.ndarray
+    var: np.ndarray
+    beta: np.ndarray
+    hhi: np.ndarray
+    coverage: np.ndarray
+    # Last day of the window and the number of daily returns in it
+    as_of: date | None
+    observations: int
+
+
+def load_feed(path: str, chunk_size: int = LOAD_CHUNK) -> tuple[int, list[str]]:
+    """
+    Upsert closes from a CSV feed with a header row: date,ticker,close.
+
+    Rows are written `chunk_size` per statement and committed per chunk, so a feed of
+    years of history never builds one huge transaction; re-running a feed is safe.
+    Returns the rows loaded and the tickers that matched no product.
+    """
+    tickers = {
+        row.ticker_symbol.upper(): row.Product_ID
+        for row in db.session.execute(text("SELECT Product_ID, ticker_symbol FROM products"))
+        if row.ticker_symbol
+    }
+    unknown: set[str] = set()
+    loaded = 0
+    chunk: list[dict[str, Any]] = []
+
+    def flush() -> None:
+        nonlocal loaded
+        if chunk:
+            db.session.execute(_UPSERT, chunk)
+            versions.bump("price_history")
+            db.session.commit()
+            loaded += len(chunk)
+            chunk.clear()
+
+    with open(path, newline="", encoding="utf-8") as fh:
+        for record in csv.DictReader(fh):
+            ticker = record["ticker"].strip().upper()
+            product_id = tickers.get(ticker)
+            if product_id is None:
+                unknown.add(ticker)
+                continue
+            chunk.append({
+                "pid": product_id,
+                "on": date.fromisoformat(record["date"].strip()),
+                "close": Decimal(record["close"].strip()),
+            })
+            if len(chunk) >= chunk_size:
+                flush()
+    flush()
+    return loaded, sorted(unknown)
+
+
+def index_product(ticker: str) -> int | None:
+    """Product_ID of the benchmark ticker, or None when there is no such product."""
+    if not ticker:
+        return None
+    return db.session.execute(
+        text("SELECT Product_ID FROM products WHERE ticker_symbol = :t"), {"t": ticker}
+    ).scalar()
+
+
+def _live_portfolios() -> dict[int, str | None]:
+    """{p_id: currency} of portfolios that are not deleted, cached per portfolios version."""
+    version = versions.current("portfolios")["portfolios"][0]
+
+    def load() -> dict[int, str | None]:
+        rows = db.session.execute(text("SELECT P_ID, currency FROM portfolios WHERE deleted_at IS NULL"))
+        return {row.P_ID: row.currency for row in rows}
+
+    return _cache.get_or_set(("portfolios", version), load)
+
+
+def _positions(
+    positions: dict[tuple[int, int], tuple[int, Decimal]], live: dict[int, str | None]
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """(p_id, product_id, quantity, invested) of every open position, ordered by portfolio."""
+    open_positions = sorted(
+        (p_id, product_id, qty, invested)
+        for (p_id, product_id), (qty, invested) in positions.items()
+        if qty != 0 and p_id in live
+    )
+    n = len(open_positions)
+    p_ids = np.fromiter((r[0] for r in open_positions), dtype=np.int64, count=n)
+    products = np.fromiter((r[1] for r in open_positions), dtype=np.int64, count=n)
+    quantity = np.fromiter((float(r[2]) for r in open_positions), dtype=np.float64, count=n)
+    invested = np.fromiter((float(r[3]) for r in open_positions), dtype=np.float64, count=n)
+    return p_ids, products, quantity, invested
+
+
+def _latest_date(product_ids: np.ndarray) -> date | None:
+    """Latest close date among `product_ids`; a loose index scan of the primary key."""
+    if not len(product_ids):
+        return None
+    latest = db.session.execute(
+        select(func.max(PriceHistory.price_date))
+        .where(PriceHistory.product_id.in_(product_ids.tolist()))
+        .group_by(PriceHistory.product_id)
+    ).scalars()
+    return max(latest, default=None)
+
+
+def _closes(product_ids: np.ndarray, start: date, end: date) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (days, closes): the distinct price dates in [start, end] and a (days x products)
+    matrix of closes aligned with `product_ids`, forward-filled; NaN before a
+    product's first close.
+    """
+    rows = db.session.execute(
+        text(
+            """
+            SELECT Product_ID AS product_id, price_date, close_price
+            FROM price_history
+            WHERE Product_ID IN :ids AND price_date BETWEEN :start AND :end
+            """
+        ).bindparams(bindparam("ids", expanding=True)),
+        {"ids": product_ids.tolist(), "start": start, "end": end},
+    ).all()
+    if not rows:
+        return np.empty(0, dtype="datetime64[D]"), np.empty((0, len(product_ids)))
+    on = np.array([r.price_date for r in rows], dtype="datetime64[D]")
+    days, day_idx = np.unique(on, return_inverse=True)
+    col_idx = np.searchsorted(product_ids, np.fromiter((r.product_id for r in rows), dtype=np.int64))
+    closes = np.full((len(days), len(product_ids)), np.nan)
+    closes[day_idx, col_idx] = np.fromiter((float(r.close_price) for r in rows), dtype=np.float64)
+
+    # Forward fill: each cell takes the close of the latest day on or before it that had one
+    last_seen = np.where(~np.isnan(closes), np.arange(len(days))[:, None], 0)
+    np.maximum.accumulate(last_seen, axis=0, out=last_seen)
+    return days, closes[last_seen, np.arange(len(product_ids))]
+
+
+def _fallback_prices(product_ids: np.ndarray) -> np.ndarray:
+    """products.current_price aligned with `product_ids` (NaN when not set)."""
+    prices = np.full(len(product_ids), np.nan)
+    for row in db.session.execute(
+        text("SELECT Product_ID, current_price FROM products WHERE Product_ID IN :ids").bindparams(
+            bindparam("ids", expanding=True)
+        ),
+        {"ids": product_ids.tolist()},
+    ):
+        if row.current_price is not None:
+            prices[np.searchsorted(product_ids, row.Product_ID)] = float(row.current_price)
+    return prices
+
+
+class _Market(NamedTuple):
+    """Price-side inputs for a set of products: independent of positions."""
+    as_of: date | None
+    observations: int
+    priced: np.ndarray
+    cov: np.ndarray
+    price: np.ndarray
+
+
+def _market(product_ids: np.ndarray, lookback_days: int) -> _Market:
+    n_products = len(product_ids)
+    as_of = _latest_date(product_ids)
+    days, closes = (np.empty(0, dtype="datetime64[D]"), np.empty((0, n_products)))
+    if as_of is not None:
+        days, closes = _closes(product_ids, as_of - timedelta(days=lookback_days), as_of)
+
+    # Daily returns; days before a product's first close count as flat
+    returns = closes[1:] / closes[:-1] - 1 if len(days) > 1 else np.empty((0, n_products))
+    observed = (~np.isnan(returns)).sum(axis=0)
+    returns = np.nan_to_num(returns, nan=0.0)
+    priced = observed >= MIN_OBSERVATIONS
+    if priced.any():
+        cov = np.atleast_2d(np.cov(returns, rowvar=False))
+    else:
+        cov = np.zeros((n_products, n_products))
+
+    # Latest close, else current price; NaN leaves the position at its invested amount
+    last_close = closes[-1] if len(days) else np.full(n_products, np.nan)
+    price = np.where(np.isnan(last_close), _fallback_prices(product_ids), last_close)
+    return _Market(as_of, max(len(days) - 1, 0), priced, cov, price)
+
+
+def compute(
+    index_product_id: int | None = None,
+    lookback_days: int = 365,
+    confidence: float = 0.99,
+    horizon_days: int = 1,
+) -> Risk:
+    """Risk metrics for every portfolio, from the cache when neither positions nor prices have changed."""
+    positions_key, positions = holdings.firm_positions()
+    stamps = versions.current("price_history", "products", "portfolios")
+    prices_key = (stamps["price_history"][0], stamps["products"][0])
+    key = (
+        positions_key,
+        prices_key,
+        stamps["portfolios"][0],
+        index_product_id,
+        lookback_days,
+        confidence,
+        horizon_days,
+    )
+    return _cache.get_or_set(
+        key,
+        lambda: _compute(positions, prices_key, index_product_id, lookback_days, confidence, horizon_days),
+    )
+
+
+def _compute(
+    positions: dict[tuple[int, int], tuple[int, Decimal]],
+    prices_key: tuple[int, int],
+    index_product_id: int | None,
+    lookback_days: int,
+    confidence: float,
+    horizon_days: int,
+) -> Risk:
+    live = _live_portfolios()
+    pos_p, pos_product, quantity, invested = _positions(positions, live)
+    p_ids, pos_row = np.unique(pos_p, return_inverse=True)
+    extra = [index_product_id] if index_product_id is not None else []
+    product_ids = np.unique(np.concatenate([pos_product, np.array(extra, dtype=np.int64)]))
+    pos_col = np.searchsorted(product_ids, pos_product)
+    n_portfolios, n_products = len(p_ids), len(product_ids)
+
+    market = _cache.get_or_set(
+        ("market", prices_key, product_ids.tobytes(), lookback_days),
+        lambda: _market(product_ids, lookback_days),
+    )
+    priced, cov, price = market.priced, market.cov, market.price
+    pos_value = np.where(np.isnan(price[pos_col]), invested, quantity * price[pos_col])
+    pos_priced = priced[pos_col]
+
+    value = np.bincount(pos_row, weights=pos_value, minlength=n_portfolios)
+    priced_value = np.bincount(pos_row, weights=np.where(pos_priced, pos_value, 0.0), minlength=n_portfolios)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weight = pos_value / value[pos_row]
+        hhi = np.where(value > 0, np.bincount(pos_row, weights=weight ** 2, minlength=n_portfolios), np.nan)
+        coverage = np.where(value > 0, priced_value / value, np.nan)
+
+    variance = np.zeros(n_portfolios)
+    index_cov = np.zeros(n_portfolios)
+    m = int(np.searchsorted(product_ids, index_product_id)) if index_product_id is not None else None
+    has_index = m is not None and bool(priced[m]) and cov[m, m] > 0
+    block_starts = np.searchsorted(pos_row, np.arange(0, n_portfolios, BLOCK))
+    for b, first in enumerate(block_starts):
+        last = block_starts[b + 1] if b + 1 < len(block_starts) else len(pos_row)
+        start_row = b * BLOCK
+        rows = min(BLOCK, n_portfolios - start_row)
+        v = np.zeros((rows, n_products))
+        sel = slice(first, last)
+        np.add.at(v, (pos_row[sel] - start_row, pos_col[sel]), np.where(pos_priced[sel], pos_value[sel], 0.0))
+        vs = v @ cov
+        variance[start_row:start_row + rows] = np.einsum("ij,ij->i", vs, v)
+        if has_index:
+            index_cov[start_row:start_row + rows] = vs[:, m]
+
+    sigma = np.sqrt(np.clip(variance, 0, None))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        volatility = np.where(priced_value > 0, sigma / priced_value * math.sqrt(TRADING_DAYS), np.nan)
+        beta = (
+            np.where(priced_value > 0, index_cov / cov[m, m] / priced_value, np.nan)
+            if has_index
+            else np.full(n_portfolios, np.nan)
+        )
+    z = NormalDist().inv_cdf(confidence)
+    var = np.where(priced_value > 0, z * sigma * math.sqrt(horizon_days), np.nan)
+    return Risk(
+        p_ids=p_ids,
+        currency=np.array([live.get(int(p)) for p in p_ids], dtype=object),
+        value=value,
+        volatility=volatility,
+        var=var,
+        beta=beta,
+        hhi=hhi,
+        coverage=coverage,
+        as_of=market.as_of,
+        observations=market.observations,
+    )
+
+
+def top(risk: Risk, n: int = 50) -> list[dict[str, Any]]:
+    """
+    The `n` portfolios with the largest VaR (then value) in the base currency, as
+    report rows with names. Portfolios whose currency has no rate come last.
+    """
+    rates = {currency: fx.rate(currency, risk.as_of) for currency in set(risk.currency.tolist())}
+    to_base = np.array([np.nan if rates[c] is None else float(rates[c]) for c in risk.currency], dtype=np.float64)
+    var_base = risk.var * to_base
+    value_base = risk.value * to_base
+    order = np.lexsort((-np.nan_to_num(value_base, nan=-np.inf), -np.nan_to_num(var_base, nan=-np.inf)))[:n]
+    if not len(order):
+        return []
+    names = {
+        row.P_ID: row.P_name
+        for row in db.session.execute(
+            text("SELECT P_ID, P_name FROM portfolios WHERE P_ID IN :ids").bindparams(
+                bindparam("ids", expanding=True)
+            ),
+            {"ids": risk.p_ids[order].tolist()},
+        )
+    }
+
+    def num(x: float) -> float | None:
+        return None if math.isnan(x) else float(x)
+
+    rows = []
+    for i in order:
+        p_id = int(risk.p_ids[i])
+        rows.append({
+            "p_id": p_id,
+            "portfolio_name": names.get(p_id),
+            "currency": risk.currency[i],
+            "value": float(risk.value[i]),
+            "volatility": num(risk.volatility[i]),
+            "var": num(risk.var[i]),
+            "var_base": num(var_base[i]),
+            "beta": num(risk.beta[i]),
+            "hhi": num(risk.hhi[i]),
+            "coverage": num(risk.coverage[i]),
+        })
+    return rows
@@ -0,0 +1,201 @@
+"""Portfolio performance rollup: reads, MAX refresh, rebuild and verification.
+
+The rollup rows are kept current by the triggers in sql/migration_performance_rollup.sql;
+this module only reads them and repairs them. Each (currency, risk_level) bucket is
+spread over shard rows, so every read sums them.
+"""
+
+from __future__ import annotations
+
+from decimal import Decimal
+from typing import Any
+
+from sqlalchemy import text
+
+from . import db
+
+# The same totals computed straight from the ledger: live trades plus archived months
+# (dropping a partition fires no delete triggers, so the rollup keeps archived trades)
+_LIVE_AGGREGATE = """
+    SELECT p.currency IS NULL AS currency_null,
+           COALESCE(p.currency, '') AS currency,
+           COALESCE(p.risk_level, '') AS risk_level,
+           COUNT(p.P_ID) AS portfolio_count,
+           COALESCE(SUM(l.trade_count), 0) + COALESCE(SUM(a.trade_count), 0) AS transaction_count,
+           COALESCE(SUM(l.invested), 0) + COALESCE(SUM(a.invested), 0) AS total_invested,
+           COALESCE(SUM(l.commissions), 0) + COALESCE(SUM(a.commissions), 0) AS total_commissions,
+           COALESCE(SUM(l.commission_count), 0) + COALESCE(SUM(a.commission_count), 0) AS commission_count,
+           GREATEST(COALESCE(MAX(l.max_value), MAX(a.max_value)),
+                    COALESCE(MAX(a.max_value), MAX(l.max_value))) AS max_transaction_value
+    FROM portfolios p
+    LEFT JOIN (
+      SELECT P_ID, COUNT(*) AS trade_count,
+             SUM(quantity * price_per_unit) AS invested,
+             SUM(commission_fee) AS commissions,
+             COUNT(commission_fee) AS commission_count,
+             MAX(quantity * price_per_unit) AS max_value
+      FROM transactions
+      GROUP BY P_ID
+    ) l ON l.P_ID = p.P_ID
+    LEFT JOIN (
+      SELECT P_ID, SUM(trade_count) AS trade_count, SUM(invested) AS invested,
+             SUM(commissions) AS commissions, SUM(commission_count) AS commission_count,
+             MAX(max_value) AS max_value
+      FROM archived_trade_totals
+      GROUP BY P_ID
+    ) a ON a.P_ID = p.P_ID
+    GROUP BY p.currency IS NULL, COALESCE(p.currency, ''), COALESCE(p.risk_level, '')
+"""
+
+# Largest single trade of the bucket `b`, live and archived
+_BUCKET_MAX = """
+    SELECT MAX({value})
+    FROM {table} t
+    JOIN portfolios p ON p.P_ID = t.P_ID
+    WHERE (p.currency IS NULL) = b.currency_null
+      AND COALESCE(p.currency, '') = b.currency
+      AND COALESCE(p.risk_level, '') = b.risk_level
+"""
+_LIVE_MAX = _BUCKET_MAX.format(value="t.quantity * t.price_per_unit", table="transactions")
+_ARCHIVED_MAX = _BUCKET_MAX.format(value="t.max_value", table="archived_trade_totals")
+_LEDGER_MAX = f"GREATEST(COALESCE(({_LIVE_MAX}), ({_ARCHIVED_MAX})), COALESCE(({_ARCHIVED_MAX}), ({_LIVE_MAX})))"
+
+# A bucket is the sum of its shard rows; its maximum is the largest shard maximum
+_BUCKETS = """
+    SELECT currency_null, currency, risk_level,
+           SUM(portfolio_count) AS portfolio_count,
+           SUM(transaction_count) AS transaction_count,
+           SUM(total_invested) AS total_invested,
+           SUM(total_commissions) AS total_commissions,
+           SUM(commission_count) AS commission_count,
+           MAX(max_transaction_value) AS max_transaction_value,
+           MAX(max_stale) AS max_stale
+    FROM portfolio_performance_rollup
+    GROUP BY currency_null, currency, risk_level
+"""
+
+_COMPARED = (
+    "portfolio_count",
+    "transaction_count",
+    "total_invested",
+    "total_commissions",
+    "commission_count",
+    "max_transaction_value",
+)
+
+
+def refresh_stale_maxima() -> int:
+    """
+    Recompute MAX for buckets a deleted or moved trade may have held (caller commits).
+
+    Every shard row of such a bucket gets the bucket's maximum, so the largest shard
+    maximum stays the bucket's. Run by the purge job, not by readers.
+    """
+    result = db.session.execute(
+        text(
+            f"""
+            UPDATE portfolio_performance_rollup r
+            JOIN (
+              SELECT currency_null, currency, risk_level
+              FROM portfolio_performance_rollup
+              GROUP BY currency_null, currency, risk_level
+              HAVING MAX(max_stale)
+            ) b ON b.currency_null = r.currency_null AND b.currency = r.currency
+               AND b.risk_level = r.risk_level
+            SET r.max_transaction_value = {_LEDGER_MAX},
+                r.max_stale = FALSE
+            """
+        )
+    )
+    return result.rowcount
+
+
+def performance_summary() -> list[Any]:
+    """
+    Rows for reports.portfolio_performance_summary, read from the rollup (no writes).
+
+    Same output as the GROUP BY over the ledger it replaces: NULL currencies are left
+    out, and commissions are NULL for a bucket where no trade has a commission_fee.
+    A bucket whose maximum is stale gets it from the ledger here; the purge job
+    stores it again.
+    """
+    return db.session.execute(
+        text(
+            f"""
+            SELECT b.currency,
+                   NULLIF(b.risk_level, '') AS risk_level,
+                   b.portfolio_count,
+                   b.transaction_count AS total_transactions,
+                   b.total_invested,
+                   b.total_invested / b.transaction_count AS avg_transaction_value,
+                   CASE WHEN b.max_stale THEN {_LEDGER_MAX}
+                        ELSE b.max_transaction_value END AS max_transaction_value,
+                   CASE WHEN b.commission_count > 0 THEN b.total_commissions END AS total_commissions
+            FROM ({_BUCKETS}) b
+            WHERE NOT b.currency_null AND b.transaction_count > 0
+            ORDER BY b.currency, b.total_invested DESC
+            """
+        )
+    ).mappings().all()
+
+
+def rebuild() -> int:
+    """Replace every rollup row with totals from the ledger, one shard per bucket (caller commits)."""
+    db.session.execute(text("DELETE FROM portfolio_performance_rollup"))
+    result = db.session.execute(
+        text(
+            """
+            INSERT INTO portfolio_performance_rollup
+              (currency_null, currency, risk_level, portfolio_count, transaction_count,
+               total_invested, total_commissions, commission_count, max_transaction_value)
+            SELECT currency_null, currency, risk_level, portfolio_count, transaction_count,
+                   total_invested, total_commissions, commission_count, max_transaction_value
+            FROM (
+            """
+            + _LIVE_AGGREGATE
+            + ") live"
+        )
+    )
+    return result.rowcount
+
+
+def check() -> list[dict[str, Any]]:
+    """
+    Compare the rollup, summed over shards, with the live aggregate.
+
+    Returns one entry per bucket that differs, holding the stored and live values;
+    an empty list means the rollup is consistent.
+    """
+    refresh_stale_maxima()
+    stored = {
+        (bool(r["currency_null"]), r["currency"], r["risk_level"]): r
+        for r in db.session.execute(text(_BUCKETS)).mappings()
+    }
+    live = {
+        (bool(r["currency_null"]), r["currency"], r["risk_level"]): r
+        for r in db.session.execute(text(_LIVE_AGGREGATE)).mappings()
+    }
+    db.session.rollback()
+
+    mismatches = []
+    for key in sorted(set(stored) | set(live)):
+        s_row, l_row = stored.get(key), live.get(key)
+        # Buckets emptied by moves/deletes may linger with zero totals; that is fine
+        if l_row is None and s_row is not None and not s_row["portfolio_count"] and not s_row["transaction_count"]:
+            continue
+        diffs = {}
+        for field in _COMPARED:
+            s_val = _normalise(s_row[field]) if s_row is not None else None
+            l_val = _normalise(l_row[field]) if l_row is not None else None
+            if s_val != l_val:
+                diffs[field] = {"stored": s_val, "live": l_val}
+        if diffs:
+            currency = None if key[0] else key[1]
+            mismatches.append({"currency": currency, "risk_level": key[2], "fields": diffs})
+    return mismatches
+
+
+def _normalise(value: Any) -> Any:
+    if value is None:
+        return None
+    return Decimal(value).quantize(Decimal("0.01"))
@@ -12,6 +12,7 @@ def register_blueprints(app: Flask) -> None:
     from .transactions import bp as transactions_bp
     from .reports import bp as reports_bp
     from .users import bp as users_bp
+    from .api import bp as api_bp
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(customers_bp)
@@ -21,6 +22,7 @@ def register_blueprints(app: Flask) -> None:
     app.register_blueprint(transactions_bp)
     app.register_blueprint(reports_bp)
     app.register_blueprint(users_bp)
+    app.register_blueprint(api_bp)
 
     # Root route -> redirect to login or products
     @app.route("/")
@@ -0,0 +1,318 @@
+"""Versioned JSON API for dashboards: products, portfolios, holdings and customers,
+plus idempotent trade order intake and per-order status.
+
+Access rules match the HTML views: managers/superadmins see everything, other users
+only their own records. Every endpoint carries a strong ETag derived from the data
+versions of the tables it reads, so unchanged polls get 304 without running the query.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation
+from typing import Any
+
+from flask import Blueprint, current_app, jsonify, request, url_for
+
+from .. import admission, db, holdings, http_cache, metrics, orders, price_series, retry
+from ..auth import api_login_required, get_current_user, can_access_entity
+from ..models import Customer, Portfolio, Product, TradeOrder
+
+bp = Blueprint("api", __name__, url_prefix="/api/v1")
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+
+def _page_args() -> tuple[int, int]:
+    page = max(request.args.get("page", 1, type=int) or 1, 1)
+    per_page = request.args.get("per_page", DEFAULT_PER_PAGE, type=int) or DEFAULT_PER_PAGE
+    return page, min(max(per_page, 1), MAX_PER_PAGE)
+
+
+def _paginate(query: Any, serialize: Any) -> Any:
+    """Run a query for one page (fetching one extra row to know if there is a next page)."""
+    page, per_page = _page_args()
+    items = query.limit(per_page + 1).offset((page - 1) * per_page).all()
+    return jsonify({
+        "data": [serialize(item) for item in items[:per_page]],
+        "page": page,
+        "per_page": per_page,
+        "has_next": len(items) > per_page,
+    })
+
+
+def _money(value: Any) -> float | None:
+    return float(value) if value is not None else None
+
+
+def _product_json(p: Product) -> dict[str, Any]:
+    return {
+        "product_id": p.product_id,
+        "product_name": p.product_name,
+        "ticker_symbol": p.ticker_symbol,
+        "current_price": _money(p.current_price),
+        "sector": p.sector,
+    }
+
+
+def _portfolio_json(p: Portfolio) -> dict[str, Any]:
+    return {
+        "p_id": p.p_id,
+        "portfolio_name": p.portfolio_name,
+        "c_id": p.c_id,
+        "e_id": p.e_id,
+        "creation_date": p.creation_date.isoformat() if p.creation_date else None,
+        "risk_level": p.risk_level,
+        "currency": p.currency,
+    }
+
+
+def _customer_json(c: Customer) -> dict[str, Any]:
+    return {
+        "c_id": c.c_id,
+        "first_name": c.first_name,
+        "last_name": c.last_name,
+        "date_of_birth": c.date_of_birth.isoformat() if c.date_of_birth else None,
+        "address": c.address,
+    }
+
+
+def _forbidden() -> Any:
+    return jsonify({"error": "forbidden"}), 403
+
+
+def _not_found() -> Any:
+    return jsonify({"error": "not found"}), 404
+
+
+def _bad_request(message: str, status: int = 400) -> Any:
+    return jsonify({"error": message}), status
+
+
+@bp.get("/products")
+@api_login_required
+@admission.limit("lists")
+@http_cache.conditional("products")
+def products():
+    """All products, ordered by ID."""
+    return _paginate(Product.query.order_by(Product.product_id.asc()), _product_json)
+
+
+def _window_scope() -> str:
+    # Without `to` the window ends now, so the same URL moves on every minute
+    return "" if request.args.get("to") else datetime.utcnow().strftime("%Y-%m-%dT%H:%M")
+
+
+def _utc_datetime(value: str) -> datetime:
+    """An ISO datetime as naive UTC; a "Z" suffix or an offset is converted, none means UTC."""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+@bp.get("/products/<int:product_id>/prices")
+@api_login_required
+@admission.limit("lists")
+@http_cache.conditional(price_series.STAMP, scope=_window_scope)
+def product_prices(product_id: int):
+    """
+    OHLC points for a chart: `from` / `to` (ISO datetimes in UTC unless they carry an
+    offset, default the last 24 hours) and `points`, the most points wanted (default 500, max 2000). The resolution is
+    the finest that fits: raw ticks, 1m, 1h or 1d bars, or daily bars merged k days
+    per point ("<k>d").
+    """
+    if db.session.get(Product, product_id) is None:
+        return _not_found()
+    try:
+        end = _utc_datetime(request.args["to"]) if request.args.get("to") else datetime.utcnow()
+        start = (
+            _utc_datetime(request.args["from"])
+            if request.args.get("from")
+            else end - timedelta(days=1)
+        )
+    except ValueError:
+        return _bad_request("from and to must be ISO datetimes")
+    if start >= end:
+        return _bad_request("from must be before to")
+    max_points = request.args.get("points", price_series.DEFAULT_POINTS, type=int) or price_series.DEFAULT_POINTS
+    max_points = min(max(max_points, 2), price_series.MAX_POINTS)
+
+    resolution, points = price_series.series(product_id, start, end, max_points)
+    return jsonify({
+        "product_id": product_id,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "resolution": resolution,
+        "data": points,
+    })
+
+
+@bp.get("/portfolios")
+@api_login_required
+@admission.limit("lists")
+@http_cache.conditional("portfolios", scope=http_cache.viewer_scope)
+def portfolios():
+    """Portfolios - managers/superadmins see all, regular users only their own."""
+    current_user = get_current_user()
+    query = Portfolio.query.order_by(Portfolio.p_id.asc())
+    if not current_user.can_access_all():
+        if current_user.c_id is not None:
+            query = query.filter_by(c_id=current_user.c_id)
+        elif current_user.e_id is not None:
+            query = query.filter_by(e_id=current_user.e_id)
+        else:
+            query = query.filter(db.false())
+    return _paginate(query, _portfolio_json)
+
+
+@bp.get("/portfolios/<int:p_id>/holdings")
+@api_login_required
+@admission.limit("lists")
+@http_cache.conditional("portfolios", "transactions", "products", scope=http_cache.viewer_scope)
+def portfolio_holdings(p_id: int):
+    """Per-product quantity and invested value for one portfolio."""
+    current_user = get_current_user()
+    if db.session.get(Portfolio, p_id) is None:
+        return _not_found()
+    if not can_access_entity(current_user, "portfolio", p_id):
+        return _forbidden()
+
+    rows = holdings.portfolio_holdings([p_id])[p_id]
+    return jsonify({
+        "p_id": p_id,
+        "data": [
+            {
+                "product_id": r["product_id"],
+                "product_name": r["product_name"],
+                "ticker": r["ticker"],
+                "total_qty": int(r["total_qty"] or 0),
+                "invested": _money(r["invested"]),
+            }
+            for r in rows
+        ],
+    })
+
+
+@bp.get("/customers")
+@api_login_required
+@admission.limit("lists")
+@http_cache.conditional("customers", scope=http_cache.viewer_scope)
+def customers():
+    """Customers - managers/superadmins see all, regular users only themselves."""
+    current_user = get_current_user()
+    query = Customer.query.order_by(Customer.c_id.asc())
+    if not current_user.can_access_all():
+        if current_user.c_id is not None:
+            query = query.filter_by(c_id=current_user.c_id)
+        else:
+            query = query.filter(db.false())
+    return _paginate(query, _customer_json)
+
+
+@bp.get("/customers/<int:c_id>")
+@api_login_required
+@admission.limit("lists")
+@http_cache.conditional("customers", "portfolios", scope=http_cache.viewer_scope)
+def customer(c_id: int):
+    """One customer with the IDs of their portfolios."""
+    current_user = get_current_user()
+    c = db.session.get(Customer, c_id)
+    if c is None:
+        return _not_found()
+    if not current_user.can_access_all() and not can_access_entity(current_user, "customer", c_id):
+        return _forbidden()
+
+    data = _customer_json(c)
+    data["portfolio_ids"] = [p.p_id for p in c.portfolios]
+    return jsonify(data)
+
+
+@bp.post("/orders")
+@api_login_required
+@admission.limit("trades")
+def create_order():
+    """
+    Place a trade. Requires an `Idempotency-Key` header; resending the same key returns
+    the original order (200) instead of placing another one. Like the trade form, the
+    order is applied at once through Process_Trade (201, status executed), or only
+    queued for the order writer when TRADE_QUEUE is set (202, status queued).
+
+    Body: {"p_id", "product_id", "quantity", "price_per_unit" (optional, defaults to the
+    product's current price)}. Commission follows the portfolio owner: 10% for
+    employees, 20% for customers.
+    """
+    current_user = get_current_user()
+    key = request.headers.get("Idempotency-Key", "")
+    payload = request.get_json(silent=True) or {}
+    try:
+        p_id = int(payload["p_id"])
+        product_id = int(payload["product_id"])
+        quantity = int(payload["quantity"])
+    except (KeyError, TypeError, ValueError):
+        return _bad_request("p_id, product_id and quantity are required integers")
+    if quantity < 1:
+        return _bad_request("quantity must be at least 1")
+
+    portfolio = db.session.get(Portfolio, p_id)
+    if portfolio is None:
+        return _bad_request("unknown portfolio", 422)
+    if not can_access_entity(current_user, "portfolio", p_id):
+        return _forbidden()
+    product = db.session.get(Product, product_id)
+    if product is None:
+        return _bad_request("unknown product", 422)
+
+    price = payload.get("price_per_unit")
+    if price is None:
+        price = product.current_price if product.current_price is not None else 0
+    try:
+        price = Decimal(str(price))
+    except InvalidOperation:
+        return _bad_request("price_per_unit must be a number")
+    if not price.is_finite() or price < 0:
+        return _bad_request("price_per_unit must be a non-negative number")
+
+    rate = orders.commission_rate(portfolio)
+    queued = bool(current_app.config.get("TRADE_QUEUE"))
+
+    def place() -> tuple[TradeOrder, bool]:
+        order, created = orders.submit(current_user.user_id, key, p_id, product_id, quantity, price, rate)
+        if created and not queued:
+            with metrics.TRADE_SECONDS.time(path="api"):
+                orders.execute_now(order)
+                db.session.commit()
+        else:
+            db.session.commit()
+        return order, created
+
+    try:
+        order, created = retry.run(place, path="api")
+    except orders.OrderError as exc:
+        return _bad_request(str(exc), 422)
+    except Exception:
+        if not queued:
+            metrics.TRADES.inc(path="api", outcome="failed")
+        raise
+    if created and not queued:
+        metrics.TRADES.inc(path="api", outcome="executed")
+
+    response = jsonify(orders.to_dict(order))
+    response.status_code = 200 if not created else 202 if queued else 201
+    response.headers["Location"] = url_for("api.order", order_id=order.order_id)
+    return response
+
+
+@bp.get("/orders/<int:order_id>")
+@api_login_required
+@http_cache.conditional("trade_orders", scope=http_cache.viewer_scope)
+def order(order_id: int):
+    """Status of one order: queued, executed (with t_id) or failed (with error)."""
+    current_user = get_current_user()
+    o = db.session.get(TradeOrder, order_id)
+    if o is None:
+        return _not_found()
+    if o.user_id != current_user.user_id and not current_user.can_access_all():
+        return _forbidden()
+    return jsonify(orders.to_dict(o))
@@ -2,6 +2,8 @@
 
 from __future__ import annotations
 
+import time
+
 from flask import Blueprint, flash, redirect, render_template, request, session, url_for
 
 from .. import db
@@ -43,6 +45,7 @@ def login():
         session["role"] = user.role
         session["entity_type"] = user.get_entity_type()
         session["entity_id"] = user.get_entity_id()
+        session["auth_at"] = int(time.time())
         
         flash(f"Welcome back, {user.username}!", "success")
         
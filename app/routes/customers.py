@@ -1,21 +1,82 @@
 from __future__ import annotations
 
+import base64
+import json
+from datetime import date, datetime
 from typing import Any, List
 
 from flask import Blueprint, flash, redirect, render_template, request, url_for
-from sqlalchemy import text
+from sqlalchemy import and_, or_, text
 from werkzeug.exceptions import NotFound
 
-from .. import db
+from .. import admission, db, deletion, fx, holdings, http_cache, lots, parallel, sectors
 from ..auth import login_required, manager_required, get_current_user, can_access_entity
 from ..forms import CustomerForm, CustomerDetailsForm
-from ..models import Customer, CustomerDetails, CustomerPhone, CustomerEmail
+from ..models import Customer, CustomerDetails, CustomerPhone, CustomerEmail, CustomerSummary
 
 bp = Blueprint("customers", __name__, url_prefix="/customers")
 
 
+LIST_PAGE_SIZE = 50
+
+# Sort keys of the customers list, each ending in C_ID so the order is total. A
+# customer the outbox consumer has not summarized yet has NULL summary columns and
+# sorts with the NULLs (first ascending, last descending), so every sort lists the
+# same customers.
+LIST_SORTS = {
+    "id": [Customer.c_id],
+    "name": [Customer.first_name, Customer.last_name, Customer.c_id],
+    "dob": [Customer.date_of_birth, Customer.c_id],
+    "net_worth": [CustomerSummary.net_worth, Customer.c_id],
+    "portfolios": [CustomerSummary.portfolio_count, Customer.c_id],
+    "last_trade": [CustomerSummary.last_trade_date, Customer.c_id],
+}
+
+
+def _typed_cursor(cols: List[Any], values: list[Any] | None) -> list[Any] | None:
+    """Cursor values converted back to their columns' Python types, or None when invalid."""
+    if values is None:
+        return None
+    typed = []
+    try:
+        for col, value in zip(cols, values):
+            python_type = col.type.python_type
+            if value is None:
+                typed.append(None)
+            elif python_type in (date, datetime):
+                typed.append(python_type.fromisoformat(value))
+            else:
+                typed.append(python_type(value))
+    except (TypeError, ValueError, ArithmeticError):
+        return None
+    return typed
+
+
+def _after_keyset(cols: List[Any], values: list[Any], descending: bool) -> Any:
+    """
+    Rows after `values` in the order of `cols`. MySQL sorts NULL first ascending and
+    last descending, so a NULL key is placed accordingly.
+    """
+    def equal(col: Any, value: Any) -> Any:
+        return col.is_(None) if value is None else col == value
+
+    def beyond(col: Any, value: Any) -> Any:
+        if descending:
+            return db.false() if value is None else or_(col < value, col.is_(None))
+        return col.is_not(None) if value is None else col > value
+
+    return or_(
+        *(
+            and_(*(equal(c, v) for c, v in zip(cols[:i], values[:i])), beyond(cols[i], values[i]))
+            for i in range(len(cols))
+        )
+    )
+
+
 @bp.get("/")
 @login_required
+@admission.limit("lists")
+@http_cache.conditional("customers", "customer_summaries", scope=http_cache.viewer_scope)
 def list_customers():
     """List customers - managers/superadmins see all, regular users see only themselves."""
     current_user = get_current_user()
@@ -25,30 +86,207 @@ def list_customers():
     
     sort = request.args.get("sort", "id")
     order = request.args.get("order", "asc")
-
-    col_map = {
-        "id": [Customer.c_id],
-        "name": [Customer.first_name, Customer.last_name],
-        "dob": [Customer.date_of_birth],
-    }
-    cols = col_map.get(sort, col_map["id"])  # default to id
-    order_by = [c.desc() if order == "desc" else c.asc() for c in cols]
-
+    if sort not in LIST_SORTS:
+        sort = "id"
+    cols = LIST_SORTS[sort]
+    descending = order == "desc"
+
+    # Net worth, portfolio count and last trade come precomputed (app/summaries.py)
+    query = db.session.query(Customer, CustomerSummary).outerjoin(
+        CustomerSummary, CustomerSummary.c_id == Customer.c_id
+    )
     # Managers and superadmins see all customers
-    if current_user.can_access_all():
-        customers = Customer.query.order_by(*order_by).all()
-    else:
+    if not current_user.can_access_all():
         # Regular users/employees see only their own customer record
-        if current_user.c_id is not None:
-            customers = Customer.query.filter_by(c_id=current_user.c_id).order_by(*order_by).all()
+        if current_user.c_id is None:
+            query = query.filter(db.false())
         else:
-            customers = []
-    
+            query = query.filter(Customer.c_id == current_user.c_id)
+
+    after = _typed_cursor(cols, _decode_cursor(request.args.get("after"), len(cols)))
+    if after is not None:
+        query = query.filter(_after_keyset(cols, after, descending))
+    order_by = [c.desc() if descending else c.asc() for c in cols]
+    rows = query.order_by(*order_by).limit(LIST_PAGE_SIZE + 1).all()
+
+    next_after: str | None = None
+    if len(rows) > LIST_PAGE_SIZE:
+        rows = rows[:LIST_PAGE_SIZE]
+        customer, summary = rows[-1]
+        entities = {Customer: customer, CustomerSummary: summary}
+        next_after = _encode_cursor(*(getattr(entities[c.class_], c.key, None) for c in cols))
+
     return render_template(
         "customers/list.html",
-        customers=customers,
+        rows=rows,
         sort=sort,
         order=order,
+        is_first_page=after is None,
+        next_after=next_after,
+    )
+
+
+SEARCH_PAGE_SIZE = 25
+
+# Match ranks, best first
+MATCH_LABELS = {
+    0: "PAN / Aadhar / SSN",
+    1: "Email",
+    2: "Phone",
+    3: "Full name",
+    4: "Name prefix",
+}
+
+# Results are ordered by (match_rank, last_name, first_name, C_ID) and paged by keyset:
+# the next page starts after the last row shown (:after_*), so rows never move or go
+# missing between pages, however deep the page. Exact matches are few (unique keys,
+# phone numbers) and are collected once in `exact`. Each name branch returns only
+# customers whose best match it is, in the outer order, after the keyset and capped
+# at :window rows: the full-name and last-name branches walk idx_customers_last_first
+# in that order; the first-name branch reads its prefix range from the covering
+# idx_customers_first_last and keeps the top :window in a bounded sort.
+CUSTOMER_SEARCH_SQL = text(
+    """
+    WITH exact AS (
+      SELECT e.c_id, MIN(e.match_rank) AS match_rank
+      FROM (
+        SELECT cd.C_ID AS c_id, 0 AS match_rank FROM customer_details cd WHERE cd.pan_number = :term
+        UNION ALL
+        SELECT cd.C_ID, 0 FROM customer_details cd WHERE cd.aadhar_number = :term
+        UNION ALL
+        SELECT cd.C_ID, 0 FROM customer_details cd WHERE cd.ssn = :term
+        UNION ALL
+        SELECT ce.C_ID, 1 FROM customer_emails ce WHERE ce.email_address = :term
+        UNION ALL
+        SELECT cp.C_ID, 2 FROM customer_phones cp WHERE cp.phone_number = :term
+      ) AS e
+      GROUP BY e.c_id
+    )
+    SELECT c.C_ID AS c_id,
+           c.first_name,
+           c.last_name,
+           c.date_of_birth,
+           m.match_rank
+    FROM (
+      SELECT x.c_id, x.match_rank FROM exact x
+      UNION ALL
+      (SELECT c1.C_ID, 3 FROM customers c1
+       WHERE c1.last_name LIKE :tail_prefix AND c1.first_name LIKE :head_prefix
+         AND c1.deleted_at IS NULL AND (:only_cid IS NULL OR c1.C_ID = :only_cid)
+         AND c1.C_ID NOT IN (SELECT c_id FROM exact)
+         AND (:after_rank IS NULL OR :after_rank < 3
+              OR (:after_rank = 3 AND (c1.last_name, c1.first_name, c1.C_ID) > (:after_last, :after_first, :after_cid)))
+       ORDER BY c1.last_name, c1.first_name, c1.C_ID LIMIT :window)
+      UNION ALL
+      (SELECT c2.C_ID, 4 FROM customers c2
+       WHERE c2.last_name LIKE :prefix
+         AND NOT (c2.last_name LIKE :tail_prefix AND c2.first_name LIKE :head_prefix)
+         AND c2.deleted_at IS NULL AND (:only_cid IS NULL OR c2.C_ID = :only_cid)
+         AND c2.C_ID NOT IN (SELECT c_id FROM exact)
+         AND (:after_rank IS NULL OR :after_rank < 4
+              OR (:after_rank = 4 AND (c2.last_name, c2.first_name, c2.C_ID) > (:after_last, :after_first, :after_cid)))
+       ORDER BY c2.last_name, c2.first_name, c2.C_ID LIMIT :window)
+      UNION ALL
+      (SELECT c3.C_ID, 4 FROM customers c3
+       WHERE c3.first_name LIKE :prefix AND c3.last_name NOT LIKE :prefix
+         AND NOT (c3.last_name LIKE :tail_prefix AND c3.first_name LIKE :head_prefix)
+         AND c3.deleted_at IS NULL AND (:only_cid IS NULL OR c3.C_ID = :only_cid)
+         AND c3.C_ID NOT IN (SELECT c_id FROM exact)
+         AND (:after_rank IS NULL OR :after_rank < 4
+              OR (:after_rank = 4 AND (c3.last_name, c3.first_name, c3.C_ID) > (:after_last, :after_first, :after_cid)))
+       ORDER BY c3.last_name, c3.first_name, c3.C_ID LIMIT :window)
+    ) AS m
+    JOIN customers c ON c.C_ID = m.c_id
+    WHERE (:only_cid IS NULL OR c.C_ID = :only_cid) AND c.deleted_at IS NULL
+      AND (:after_rank IS NULL
+           OR (m.match_rank, c.last_name, c.first_name, c.C_ID) > (:after_rank, :after_last, :after_first, :after_cid))
+    ORDER BY m.match_rank, c.last_name, c.first_name, c.C_ID
+    LIMIT :limit
+    """
+)
+
+
+def _like_prefix(value: str) -> str:
+    """Escape LIKE wildcards so user input only ever matches as a literal prefix."""
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
+def _encode_cursor(*values: Any) -> str:
+    """Opaque `after` token for keyset paging: the sort key of the last row shown."""
+    raw = json.dumps(values, default=str, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(token: str | None, size: int) -> list[Any] | None:
+    """The values of an `after` token, or None when absent or malformed."""
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except ValueError:
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+
+@bp.get("/search")
+@login_required
+@admission.limit("lists")
+def search():
+    """Search customers by name prefix or exact PAN/Aadhar/SSN, email or phone."""
+    current_user = get_current_user()
+    if current_user is None:
+        flash("Please log in to access this page.", "warning")
+        return redirect(url_for("auth.login"))
+
+    q = (request.args.get("q") or "").strip()
+    after = _decode_cursor(request.args.get("after"), 4)
+
+    results: list[Any] = []
+    next_after: str | None = None
+    if q:
+        # Regular users/employees can only ever find their own customer record
+        only_cid: int | None = None
+        if not current_user.can_access_all():
+            only_cid = current_user.c_id if current_user.c_id is not None else 0
+
+        tokens = q.split()
+        head = tokens[0]
+        tail = " ".join(tokens[1:]) if len(tokens) > 1 else ""
+        after_rank, after_last, after_first, after_cid = after or (None, None, None, None)
+        rows = db.session.execute(
+            CUSTOMER_SEARCH_SQL,
+            {
+                "term": q,
+                "prefix": _like_prefix(q),
+                "head_prefix": _like_prefix(head),
+                # Single-word queries never satisfy the full-name branch
+                "tail_prefix": _like_prefix(tail) if tail else "",
+                "window": SEARCH_PAGE_SIZE + 1,
+                "only_cid": only_cid,
+                "after_rank": after_rank,
+                "after_last": after_last,
+                "after_first": after_first,
+                "after_cid": after_cid,
+                "limit": SEARCH_PAGE_SIZE + 1,
+            },
+        ).mappings().all()
+        if len(rows) > SEARCH_PAGE_SIZE:
+            last = rows[SEARCH_PAGE_SIZE - 1]
+            next_after = _encode_cursor(last["match_rank"], last["last_name"], last["first_name"], last["c_id"])
+        results = [
+            {**row, "match_label": MATCH_LABELS.get(row["match_rank"], "")}
+            for row in rows[:SEARCH_PAGE_SIZE]
+        ]
+
+    return render_template(
+        "customers/search.html",
+        q=q,
+        results=results,
+        is_first_page=after is None,
+        next_after=next_after,
     )
 
 
@@ -227,8 +465,51 @@ def details(c_id: int):
     return render_template("customers/details.html", form=form, customer=customer)
 
 
+def _age_years(dob: Any) -> int | None:
+    """Age via DB function Calculate_Age(dob DATE); None without a date of birth."""
+    if not dob:
+        return None
+    result = db.session.execute(text("SELECT Calculate_Age(:dob) AS age"), {"dob": dob}).first()
+    return int(result.age) if result is not None and result.age is not None else None
+
+
+def _net_worth(c_id: int) -> tuple[float, float | None]:
+    """
+    Total net worth: SUM(quantity * price_per_unit) across the customer's portfolios,
+    live trades plus archived months, grouped by currency so each bucket is converted
+    to the base currency once. Returns (net worth, in the base currency or None).
+    """
+    nw_rows = db.session.execute(
+        text(
+            """
+            SELECT nw.currency, COALESCE(SUM(nw.amount), 0) AS net_worth
+            FROM (
+              SELECT p.currency, SUM(t.quantity * t.price_per_unit) AS amount
+              FROM transactions t
+              JOIN portfolios p ON t.P_ID = p.P_ID
+              WHERE p.C_ID = :cid AND p.deleted_at IS NULL
+              GROUP BY p.currency
+              UNION ALL
+              SELECT p.currency, SUM(a.invested)
+              FROM archived_trade_totals a
+              JOIN portfolios p ON a.P_ID = p.P_ID
+              WHERE p.C_ID = :cid AND p.deleted_at IS NULL
+              GROUP BY p.currency
+            ) nw
+            GROUP BY nw.currency
+            """
+        ),
+        {"cid": c_id},
+    ).mappings().all()
+    net_worth = float(sum(r["net_worth"] for r in nw_rows))
+    converted, missing = fx.convert_buckets(nw_rows, ["net_worth"])
+    net_worth_base = None if missing else float(sum(r["net_worth_base"] for r in converted))
+    return net_worth, net_worth_base
+
+
 @bp.get("/<int:c_id>")
 @login_required
+@admission.limit("reports")
 def view(c_id: int):
     """View customer details - users can only view their own."""
     current_user = get_current_user()
@@ -245,83 +526,65 @@ def view(c_id: int):
         flash("You do not have permission to view this customer.", "danger")
         return redirect(url_for("customers.list_customers"))
 
-    # Calculate age via DB function Calculate_Age(dob DATE)
-    age_years: int | None = None
-    if customer.date_of_birth:
-        try:
-            result = db.session.execute(
-                text("SELECT Calculate_Age(:dob) AS age"), {"dob": customer.date_of_birth}
-            ).first()
-            if result is not None:
-                age_years = int(result.age) if result.age is not None else None
-        except Exception as exc:
-            # Non-fatal: show no age if function missing
-            age_years = None
-
-    # Total net worth: SUM(quantity * price_per_unit) across customer's portfolios
-    net_worth = 0.0
-    try:
-        nw_row = db.session.execute(
-            text(
-                """
-                SELECT COALESCE(SUM(t.quantity * t.price_per_unit), 0) AS net_worth
-                FROM transactions t
-                JOIN portfolios p ON t.P_ID = p.P_ID
-                WHERE p.C_ID = :cid
-                """
-            ),
-            {"cid": customer.c_id},
-        ).first()
-        if nw_row is not None and nw_row.net_worth is not None:
-            net_worth = float(nw_row.net_worth)
-    except Exception:
-        net_worth = 0.0
-
     # Per-portfolio products summary
     portfolios = (
         db.session.query(Customer).get(customer.c_id).portfolios  # use relationship
     )
+    p_ids = [p.p_id for p in portfolios]
+    dob = customer.date_of_birth
+
+    # The figures below are independent reads; they run concurrently (app/parallel.py).
+    # One that fails or runs out of time comes back as None and is shown as unavailable,
+    # never as a zero or an empty list
+    reads = parallel.gather(
+        "customers.view",
+        {
+            "age": lambda: _age_years(dob),
+            "net_worth": lambda: _net_worth(c_id),
+            # Cached per portfolio; only trades since the last view are read (app/holdings.py)
+            "holdings": lambda: holdings.portfolio_holdings(p_ids),
+            # Sector allocation per portfolio, from the same cached holdings (app/sectors.py)
+            "sectors": lambda: sectors.portfolios(p_ids),
+            # Realized / unrealized P&L from the FIFO lot engine (absent until it has run)
+            "pnl": lambda: lots.portfolio_pnl(p_ids),
+        },
+    )
+    unavailable = {name for name in ("net_worth", "holdings", "sectors", "pnl") if reads[name] is None}
+    if dob and reads["age"] is None:
+        unavailable.add("age")
+    age_years = reads["age"]
+    net_worth, net_worth_base = reads["net_worth"] or (None, None)
     portfolio_products: list[dict[str, object]] = []
     for p in portfolios:
-        rows = db.session.execute(
-            text(
-                """
-                SELECT pr.Product_name AS product_name,
-                       pr.ticker_symbol AS ticker,
-                       SUM(t.quantity) AS total_qty,
-                       SUM(t.quantity * t.price_per_unit) AS invested
-                FROM transactions t
-                JOIN products pr ON pr.Product_ID = t.Product_ID
-                WHERE t.P_ID = :pid
-                GROUP BY pr.Product_ID, pr.Product_name, pr.ticker_symbol
-                ORDER BY invested DESC
-                """
-            ),
-            {"pid": p.p_id},
-        ).mappings().all()
         portfolio_products.append({
             "portfolio": p,
-            "products": rows,
+            "products": (reads["holdings"] or {}).get(p.p_id, []),
+            "sectors": (reads["sectors"] or {}).get(p.p_id, ()),
         })
+    pnl = reads["pnl"] or {}
+    sector_allocation = sectors.combined(reads["sectors"] or {})
 
     return render_template(
         "customers/view.html",
         customer=customer,
         age_years=age_years,
         net_worth=net_worth,
+        net_worth_base=net_worth_base,
+        base_currency=fx.base_currency(),
         portfolio_products=portfolio_products,
+        sector_allocation=sector_allocation,
+        pnl=pnl,
+        unavailable=unavailable,
     )
 
 
 @bp.route("/<int:c_id>/delete", methods=["POST"])
 @manager_required
 def delete_customer(c_id: int):
-    customer = Customer.query.get(c_id)
-    if customer is None:
+    if not deletion.soft_delete_customer(c_id):
         raise NotFound()
-    db.session.delete(customer)
     db.session.commit()
-    flash("Customer deleted successfully.", "success")
+    flash("Customer deleted. Their records are removed in the background.", "success")
     return redirect(url_for("customers.list_customers"))
 
 
@@ -3,7 +3,7 @@ from __future__ import annotations
 from flask import Blueprint, flash, redirect, render_template, url_for, request
 from werkzeug.exceptions import NotFound
 
-from .. import db
+from .. import admission, db, hierarchy, http_cache
 from ..auth import login_required, manager_required, get_current_user, can_access_entity
 from ..forms import EmployeeForm
 from ..models import Employee
@@ -13,6 +13,8 @@ bp = Blueprint("employees", __name__, url_prefix="/employees")
 
 @bp.get("/")
 @login_required
+@admission.limit("lists")
+@http_cache.conditional("employees", scope=http_cache.viewer_scope)
 def list_employees():
     """List employees - managers/superadmins see all, regular users see only themselves."""
     current_user = get_current_user()
@@ -49,9 +51,6 @@ def list_employees():
 @manager_required
 def create_employee():
     form = EmployeeForm()
-    # Populate manager choices with current employees
-    managers = Employee.query.order_by(Employee.employee_name.asc()).all()
-    form.manager_id.choices = [(0, "-- None --")] + [(e.e_id, e.employee_name) for e in managers]
 
     if form.validate_on_submit():
         manager_id_val = form.manager_id.data if form.manager_id.data != 0 else None
@@ -63,6 +62,8 @@ def create_employee():
             manager_id=manager_id_val,
         )
         db.session.add(employee)
+        db.session.flush()
+        hierarchy.add_employee(employee.e_id, manager_id_val)
         db.session.commit()
         flash("Employee created.", "success")
         return redirect(url_for("employees.list_employees"))
@@ -76,9 +77,47 @@ def delete_employee(e_id: int):
     employee = Employee.query.get(e_id)
     if employee is None:
         raise NotFound()
+    if hierarchy.has_reports(e_id):
+        flash("Reassign this employee's team before deleting them.", "danger")
+        return redirect(url_for("employees.list_employees"))
+    hierarchy.remove_employee(e_id)
     db.session.delete(employee)
     db.session.commit()
     flash("Employee deleted successfully.", "success")
     return redirect(url_for("employees.list_employees"))
 
 
+@bp.get("/<int:e_id>/team")
+@login_required
+@admission.limit("reports")
+def team(e_id: int):
+    """Team rollup - managers see any team, employees only their own subtree."""
+    current_user = get_current_user()
+    if current_user is None:
+        flash("Please log in to access this page.", "warning")
+        return redirect(url_for("auth.login"))
+
+    employee = db.session.get(Employee, e_id)
+    if employee is None:
+        raise NotFound()
+
+    if not current_user.can_access_all() and not (
+        current_user.e_id is not None and hierarchy.is_in_team(current_user.e_id, e_id)
+    ):
+        flash("You do not have permission to view this team.", "danger")
+        return redirect(url_for("employees.list_employees"))
+
+    members = hierarchy.team_members(e_id)
+    holdings = hierarchy.team_holdings(e_id)
+    total_invested = sum(float(m.invested or 0) for m in members)
+    total_portfolios = sum(int(m.portfolio_count or 0) for m in members)
+    return render_template(
+        "employees/team.html",
+        employee=employee,
+        members=members,
+        holdings=holdings,
+        total_invested=total_invested,
+        total_portfolios=total_portfolios,
+    )
+
+
@@ -3,16 +3,20 @@ from __future__ import annotations
 from flask import Blueprint, flash, redirect, render_template, url_for, request
 from werkzeug.exceptions import NotFound
 
-from .. import db
+from sqlalchemy.orm import joinedload
+
+from .. import admission, db, deletion, fragments, http_cache, streaming
 from ..auth import login_required, manager_required, get_current_user, can_access_entity
 from ..forms import PortfolioForm
-from ..models import Portfolio, Customer, Employee
+from ..models import Portfolio
 
 bp = Blueprint("portfolios", __name__, url_prefix="/portfolios")
 
 
 @bp.get("/")
 @login_required
+@admission.limit("lists")
+@http_cache.conditional("portfolios", "customers", "employees", scope=http_cache.viewer_scope)
 def list_portfolios():
     """List portfolios - managers/superadmins see all, regular users see only their own."""
     current_user = get_current_user()
@@ -34,29 +38,37 @@ def list_portfolios():
     cols = col_map.get(sort, col_map["id"])  # default id
     order_by = [c.desc() if order == "desc" else c.asc() for c in cols]
 
-    # Managers and superadmins see all portfolios
-    if current_user.can_access_all():
-        portfolios = Portfolio.query.order_by(*order_by).all()
-    else:
-        # Regular users/employees see only their own portfolios
-        if current_user.c_id is not None:
-            portfolios = Portfolio.query.filter_by(c_id=current_user.c_id).order_by(*order_by).all()
-        elif current_user.e_id is not None:
-            portfolios = Portfolio.query.filter_by(e_id=current_user.e_id).order_by(*order_by).all()
-        else:
-            portfolios = []
+    def load():
+        # Owners are joined in: the rows are read from an open cursor, so the template
+        # must not lazy-load them
+        query = Portfolio.query.options(joinedload(Portfolio.customer), joinedload(Portfolio.employee))
+        # Managers and superadmins see all portfolios
+        if not current_user.can_access_all():
+            # Regular users/employees see only their own portfolios
+            if current_user.c_id is not None:
+                query = query.filter_by(c_id=current_user.c_id)
+            elif current_user.e_id is not None:
+                query = query.filter_by(e_id=current_user.e_id)
+            else:
+                return []
+        return streaming.batches(query.order_by(*order_by).yield_per(fragments.STREAM_BATCH_ROWS))
+
+    viewer = "all" if current_user.can_access_all() else (current_user.c_id, current_user.e_id)
+    rows_html = fragments.stream(
+        "portfolios/_rows.html",
+        ["portfolios", "customers", "employees"],
+        (sort, order, viewer),
+        load,
+        "portfolios",
+    )
     
-    return render_template("portfolios/list.html", portfolios=portfolios, sort=sort, order=order)
+    return streaming.page("portfolios/list.html", rows_html=rows_html, sort=sort, order=order)
 
 
 @bp.route("/create", methods=["GET", "POST"])
 @manager_required
 def create_portfolio():
     form = PortfolioForm()
-    customers = Customer.query.order_by(Customer.first_name.asc(), Customer.last_name.asc()).all()
-    employees = Employee.query.order_by(Employee.employee_name.asc()).all()
-    form.c_id.choices = [(0, "-- None --")] + [(c.c_id, f"{c.first_name} {c.last_name}") for c in customers]
-    form.e_id.choices = [(0, "-- None --")] + [(e.e_id, e.employee_name) for e in employees]
 
     if form.validate_on_submit():
         c_val = form.c_id.data if form.c_id.data != 0 else None
@@ -84,12 +96,10 @@ def create_portfolio():
 @bp.route("/<int:p_id>/delete", methods=["POST"])
 @manager_required
 def delete_portfolio(p_id: int):
-    portfolio = Portfolio.query.get(p_id)
-    if portfolio is None:
+    if not deletion.soft_delete_portfolio(p_id):
         raise NotFound()
-    db.session.delete(portfolio)
     db.session.commit()
-    flash("Portfolio deleted successfully.", "success")
+    flash("Portfolio deleted. Its trades are removed in the background.", "success")
     return redirect(url_for("portfolios.list_portfolios"))
 
 
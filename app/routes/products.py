@@ -1,18 +1,21 @@
 from __future__ import annotations
 
 from flask import Blueprint, flash, redirect, render_template, url_for, request
+from sqlalchemy import select
 from werkzeug.exceptions import NotFound
 
-from .. import db
+from .. import admission, db, fragments, http_cache, sectors, streaming
 from ..auth import login_required, manager_required
 from ..forms import ProductForm
-from ..models import Product
+from ..models import Product, Transaction
 
 bp = Blueprint("products", __name__, url_prefix="/products")
 
 
 @bp.get("/")
 @login_required
+@admission.limit("lists")
+@http_cache.conditional("products", scope=http_cache.viewer_scope)
 def list_products():
     sort = request.args.get("sort", "id")
     order = request.args.get("order", "asc")
@@ -27,8 +30,29 @@ def list_products():
     cols = col_map.get(sort, col_map["id"])  # default id
     order_by = [c.desc() if order == "desc" else c.asc() for c in cols]
 
-    products = Product.query.order_by(*order_by).all()
-    return render_template("products/list.html", products=products, sort=sort, order=order)
+    sector = request.args.get("sector", "")
+    query = Product.query
+    if sector == sectors.UNASSIGNED:
+        query = query.filter(db.or_(Product.sector.is_(None), Product.sector == ""))
+    elif sector:
+        query = query.filter(Product.sector == sector)
+
+    rows_html = fragments.stream(
+        "products/_rows.html",
+        ["products"],
+        (sort, order, sector),
+        lambda: streaming.batches(query.order_by(*order_by).yield_per(fragments.STREAM_BATCH_ROWS)),
+        "products",
+    )
+    return streaming.page(
+        "products/list.html",
+        rows_html=rows_html,
+        sort=sort,
+        order=order,
+        sector=sector,
+        facets=sectors.product_facets(),
+        unassigned=sectors.UNASSIGNED,
+    )
 
 
 @bp.route("/create", methods=["GET", "POST"])
@@ -60,9 +84,18 @@ def create_product():
 @bp.route("/<int:product_id>/delete", methods=["POST"])
 @manager_required
 def delete_product(product_id: int):
-    product = Product.query.get(product_id)
+    # Locked first, so a trade on it either finished before or waits and then fails
+    product = db.session.get(Product, product_id, with_for_update=True)
     if product is None:
         raise NotFound()
+    # A locking read sees trades committed since this transaction began
+    traded = db.session.scalar(
+        select(Transaction.t_id).where(Transaction.product_id == product_id).limit(1).with_for_update(read=True)
+    )
+    if traded is not None:
+        db.session.rollback()
+        flash("Product has trades and cannot be deleted.", "danger")
+        return redirect(url_for("products.list_products"))
     db.session.delete(product)
     db.session.commit()
     flash("Product deleted successfully.", "success")
@@ -1,10 +1,16 @@
 from __future__ import annotations
 
-from flask import Blueprint, render_template
-from sqlalchemy import text
+import heapq
+import itertools
+from datetime import date, timedelta
+from typing import Any, Iterator
 
-from .. import db
+from flask import Blueprint, current_app, render_template, request
+from sqlalchemy import bindparam, text
+
+from .. import admission, archive, db, fragments, fx, http_cache, risk, rollups, sectors, streaming
 from ..auth import login_required, manager_required
+from ..forms import CURRENCY_CHOICES
 
 bp = Blueprint("reports", __name__, url_prefix="/reports")
 
@@ -15,15 +21,143 @@ def index():
     return render_template("reports/index.html")
 
 
+def _period_args() -> tuple[date | None, date | None, bool]:
+    """
+    (from, to, full history) from ?from=YYYY-MM-DD&to=YYYY-MM-DD&history=full.
+
+    `to` is inclusive in the URL and returned as the exclusive bound (the next day).
+    """
+    bounds = []
+    for name in ("from", "to"):
+        value = request.args.get(name)
+        try:
+            bounds.append(date.fromisoformat(value) if value else None)
+        except ValueError:
+            bounds.append(None)
+    date_from, date_to = bounds
+    if date_to is not None:
+        date_to += timedelta(days=1)
+    return date_from, date_to, request.args.get("history") == "full"
+
+
+def _period_context(date_from: date | None, date_to: date | None, full_history: bool) -> dict[str, Any]:
+    return {
+        "date_from": date_from,
+        "date_to": date_to - timedelta(days=1) if date_to is not None else None,
+        "full_history": full_history,
+    }
+
+
+def _date_filter(alias: str, date_from: date | None, date_to: date | None, params: dict[str, Any]) -> list[str]:
+    """transaction_date bounds; on the partitioned table MySQL reads only the months they cover."""
+    clauses = []
+    if date_from is not None:
+        clauses.append(f"{alias}.transaction_date >= :date_from")
+        params["date_from"] = date_from
+    if date_to is not None:
+        clauses.append(f"{alias}.transaction_date < :date_to")
+        params["date_to"] = date_to
+    return clauses
+
+
+def _archived_period_filter(alias: str, date_from: date | None, date_to: date | None, params: dict[str, Any]) -> list[str]:
+    """Bounds on archived_trade_totals.period; archived months count whole when the range cuts them."""
+    clauses = []
+    if date_from is not None:
+        clauses.append(f"{alias}.period >= :period_from")
+        params["period_from"] = archive.month_start(date_from)
+    if date_to is not None:
+        clauses.append(f"{alias}.period < :date_to")
+        params["date_to"] = date_to
+    return clauses
+
+
+def _archived_detail_rows(date_from: date | None, date_to: date | None) -> Iterator[dict[str, Any]]:
+    """
+    Rows of archived months for portfolio_details, read back from the archive files,
+    by portfolio and newest first like the live rows.
+
+    The files are read once, before this returns: archive.by_portfolio sorts them
+    through temporary files while the portfolio and product ids are collected, and the
+    lookups run. Memory holds one sort run and the lookups, not the rows.
+    """
+    p_ids: set[int] = set()
+    product_ids: set[int] = set()
+
+    def collect(rows: Iterator[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+        for t in rows:
+            p_ids.add(t["P_ID"])
+            product_ids.add(t["Product_ID"])
+            yield t
+
+    ordered = archive.by_portfolio(collect(archive.read_rows(date_from, date_to)))
+    if not p_ids:
+        return iter(())
+    portfolios = {
+        r["portfolio_id"]: r
+        for r in db.session.execute(
+            text(
+                """
+                SELECT p.P_ID AS portfolio_id,
+                       p.P_name AS portfolio_name,
+                       p.currency,
+                       p.risk_level,
+                       COALESCE(CONCAT(c.first_name, ' ', c.last_name), e.E_name) AS owner_name,
+                       CASE WHEN p.C_ID IS NOT NULL THEN 'Customer' ELSE 'Employee' END AS owner_type
+                FROM portfolios p
+                LEFT JOIN customers c ON p.C_ID = c.C_ID
+                LEFT JOIN employees e ON p.E_ID = e.E_ID
+                WHERE p.P_ID IN :ids AND p.deleted_at IS NULL
+                """
+            ).bindparams(bindparam("ids", expanding=True)),
+            {"ids": sorted(p_ids)},
+        ).mappings()
+    }
+    products = {
+        r.Product_ID: r
+        for r in db.session.execute(
+            text(
+                "SELECT Product_ID, Product_name, ticker_symbol FROM products WHERE Product_ID IN :ids"
+            ).bindparams(bindparam("ids", expanding=True)),
+            {"ids": sorted(product_ids)},
+        )
+    }
+
+    def rows() -> Iterator[dict[str, Any]]:
+        for t in ordered:
+            portfolio, product = portfolios.get(t["P_ID"]), products.get(t["Product_ID"])
+            if portfolio is None or product is None:
+                continue
+            yield {
+                **portfolio,
+                "product_name": product.Product_name,
+                "ticker_symbol": product.ticker_symbol,
+                "quantity": t["quantity"],
+                "price_per_unit": t["price_per_unit"],
+                "transaction_date": t["transaction_date"],
+            }
+
+    return rows()
+
+
 @bp.get("/portfolio-details")
 @manager_required
+@admission.limit("reports")
+@http_cache.conditional(
+    "portfolios", "customers", "employees", "transactions", "products", scope=http_cache.viewer_scope
+)
 def portfolio_details():
     """
     JOIN QUERY: Multi-table join showing portfolio details with customer/employee and product information.
     Joins: portfolios, customers, employees, transactions, products
+    An optional date range reads only the months it covers; history=full adds the
+    archived months' rows from the archive files.
     """
+    date_from, date_to, full_history = _period_args()
+    params: dict[str, Any] = {}
+    where = ["p.deleted_at IS NULL"] + _date_filter("t", date_from, date_to, params)
     sql = text(
-        """
+        f"""
         SELECT 
           p.P_ID AS portfolio_id,
           p.P_name AS portfolio_name,
@@ -44,76 +178,319 @@ def portfolio_details():
         LEFT JOIN employees e ON p.E_ID = e.E_ID
         JOIN transactions t ON t.P_ID = p.P_ID
         JOIN products pr ON pr.Product_ID = t.Product_ID
+        {"WHERE " + " AND ".join(where) if where else ""}
         ORDER BY p.P_ID, t.transaction_date DESC
         """
     )
-    rows = db.session.execute(sql).mappings().all()
-    return render_template("reports/portfolio_details.html", rows=rows)
 
+    def load():
+        if not full_history:
+            return streaming.result_batches(sql, params)
+        # Archived rows are sorted and looked up before the live cursor opens on the connection
+        archived = _archived_detail_rows(date_from, date_to)
+        live = itertools.chain.from_iterable(streaming.result_batches(sql, params))
+        # Archived months are older than every live one, so within a portfolio the
+        # live rows (listed first on equal keys) keep the newest-first order
+        return streaming.batches(heapq.merge(live, archived, key=lambda r: r["portfolio_id"]))
 
-@bp.get("/top-portfolios-by-value")
-@manager_required
-def top_portfolios_by_value():
+    rows_html = fragments.stream(
+        "reports/_portfolio_details_rows.html",
+        ["portfolios", "customers", "employees", "transactions", "products"],
+        (date_from, date_to, full_history),
+        load,
+        "rows",
+    )
+    return streaming.page(
+        "reports/portfolio_details.html",
+        rows_html=rows_html,
+        **_period_context(date_from, date_to, full_history),
+    )
+
+
+OWNER_TYPES = ("Customer", "Employee")
+
+
+def build_top_portfolios_query(
+    top: int | None = None,
+    percentile: float | None = None,
+    currency: str | None = None,
+    owner_type: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    full_history: bool = False,
+) -> tuple[Any, dict[str, Any]]:
     """
-    NESTED QUERY: Uses subquery to find portfolios with total value above average.
-    Shows portfolios that exceed the average portfolio value.
+    Build the single-pass top-portfolios query.
+
+    transactions is aggregated once per portfolio; the average, percentile rank and
+    value rank all come from window functions over that rollup. Without a percentile
+    the cutoff is the original one: above the average value of portfolios that have
+    trades. Currency/owner filters apply before the windows, so the cutoff is relative
+    to the selected portfolios. A date range (to exclusive) limits the trades and the
+    partitions read; full_history adds archived months from archived_trade_totals.
     """
+    where = ["p.deleted_at IS NULL"]
+    params: dict[str, Any] = {}
+    trade_where = _date_filter("t", date_from, date_to, params)
+    portfolio_values = f"""
+          SELECT t.P_ID, SUM(t.quantity * t.price_per_unit) AS total_value
+          FROM transactions t
+          {"WHERE " + " AND ".join(trade_where) if trade_where else ""}
+          GROUP BY t.P_ID"""
+    if full_history:
+        archived_where = _archived_period_filter("a", date_from, date_to, params)
+        portfolio_values = f"""
+          SELECT u.P_ID, SUM(u.total_value) AS total_value
+          FROM ({portfolio_values}
+            UNION ALL
+            SELECT a.P_ID, SUM(a.invested)
+            FROM archived_trade_totals a
+            {"WHERE " + " AND ".join(archived_where) if archived_where else ""}
+            GROUP BY a.P_ID
+          ) u
+          GROUP BY u.P_ID"""
+    if currency:
+        where.append("p.currency = :currency")
+        params["currency"] = currency
+    if owner_type == "Customer":
+        where.append("p.C_ID IS NOT NULL")
+    elif owner_type == "Employee":
+        where.append("p.C_ID IS NULL")
+
+    if percentile is not None:
+        cutoff = "r.pct_rank >= :pct"
+        params["pct"] = percentile / 100.0
+    else:
+        cutoff = "r.total_value > r.avg_value"
+
+    limit = ""
+    if top is not None:
+        limit = "LIMIT :top"
+        params["top"] = top
+
     sql = text(
-        """
-        SELECT 
-          p.P_ID AS portfolio_id,
-          p.P_name AS portfolio_name,
-          COALESCE(CONCAT(c.first_name, ' ', c.last_name), e.E_name) AS owner_name,
-          p.currency,
-          COALESCE(SUM(t.quantity * t.price_per_unit), 0) AS total_value
-        FROM portfolios p
-        LEFT JOIN customers c ON p.C_ID = c.C_ID
-        LEFT JOIN employees e ON p.E_ID = e.E_ID
-        LEFT JOIN transactions t ON t.P_ID = p.P_ID
-        GROUP BY p.P_ID, p.P_name, owner_name, p.currency
-        HAVING COALESCE(SUM(t.quantity * t.price_per_unit), 0) > (
-          SELECT AVG(portfolio_value)
-          FROM (
-            SELECT SUM(t2.quantity * t2.price_per_unit) AS portfolio_value
-            FROM portfolios p2
-            JOIN transactions t2 ON t2.P_ID = p2.P_ID
-            GROUP BY p2.P_ID
-          ) AS avg_values
+        f"""
+        WITH portfolio_values AS ({portfolio_values}
+        ),
+        ranked AS (
+          SELECT
+            p.P_ID AS portfolio_id,
+            p.P_name AS portfolio_name,
+            COALESCE(CONCAT(c.first_name, ' ', c.last_name), e.E_name) AS owner_name,
+            CASE WHEN p.C_ID IS NOT NULL THEN 'Customer' ELSE 'Employee' END AS owner_type,
+            p.currency,
+            COALESCE(v.total_value, 0) AS total_value,
+            AVG(v.total_value) OVER () AS avg_value,
+            PERCENT_RANK() OVER (ORDER BY COALESCE(v.total_value, 0)) AS pct_rank
+          FROM portfolios p
+          LEFT JOIN portfolio_values v ON v.P_ID = p.P_ID
+          LEFT JOIN customers c ON p.C_ID = c.C_ID
+          LEFT JOIN employees e ON p.E_ID = e.E_ID
+          WHERE {" AND ".join(where)}
         )
-        ORDER BY total_value DESC
+        SELECT r.portfolio_id, r.portfolio_name, r.owner_name, r.owner_type,
+               r.currency, r.total_value, r.avg_value, r.pct_rank
+        FROM ranked r
+        WHERE {cutoff}
+        ORDER BY r.total_value DESC, r.portfolio_id
+        {limit}
         """
     )
-    rows = db.session.execute(sql).mappings().all()
-    return render_template("reports/top_portfolios_by_value.html", rows=rows)
+    return sql, params
+
+
+@bp.get("/top-portfolios-by-value")
+@manager_required
+@admission.limit("reports")
+@http_cache.conditional(
+    "portfolios", "customers", "employees", "transactions", scope=http_cache.viewer_scope
+)
+def top_portfolios_by_value():
+    """
+    WINDOW QUERY: Ranks portfolios by total value in a single aggregation pass.
+    Defaults to portfolios above the average value; supports top-N, a percentile
+    cutoff, and currency / owner type filters.
+    """
+    top = request.args.get("top", type=int)
+    if top is not None and top < 1:
+        top = None
+    percentile = request.args.get("percentile", type=float)
+    if percentile is not None and not 0 <= percentile <= 100:
+        percentile = None
+    currency = request.args.get("currency") or None
+    owner_type = request.args.get("owner_type") or None
+    if owner_type not in OWNER_TYPES:
+        owner_type = None
+
+    date_from, date_to, full_history = _period_args()
+
+    sql, params = build_top_portfolios_query(
+        top, percentile, currency, owner_type, date_from, date_to, full_history
+    )
+    rows_html = fragments.stream(
+        "reports/_top_portfolios_rows.html",
+        ["portfolios", "customers", "employees", "transactions"],
+        (top, percentile, currency, owner_type, date_from, date_to, full_history),
+        lambda: streaming.result_batches(sql, params),
+        "rows",
+    )
+    return streaming.page(
+        "reports/top_portfolios_by_value.html",
+        rows_html=rows_html,
+        top=top,
+        percentile=percentile,
+        currency=currency,
+        owner_type=owner_type,
+        currencies=[value for value, _ in CURRENCY_CHOICES if value],
+        owner_types=OWNER_TYPES,
+        **_period_context(date_from, date_to, full_history),
+    )
 
 
 @bp.get("/portfolio-performance-summary")
 @manager_required
+@admission.limit("reports")
+@http_cache.conditional("portfolios", "transactions", scope=http_cache.viewer_scope)
 def portfolio_performance_summary():
     """
-    AGGREGATE QUERY: Uses GROUP BY with multiple aggregate functions (SUM, COUNT, AVG, MAX).
-    Summarizes portfolio performance by currency and risk level.
+    AGGREGATE QUERY: COUNT/SUM/AVG/MAX by currency and risk level.
+    Reads the trigger-maintained portfolio_performance_rollup (16 shard rows per bucket)
+    instead of scanning every portfolio and transaction.
+    """
+    rows = rollups.performance_summary()
+    return render_template("reports/portfolio_performance_summary.html", rows=rows)
+
+
+def _dated_viewer_scope() -> str:
+    # the default as-of date is today, so the same URL changes meaning at midnight
+    return f"{http_cache.viewer_scope()}|{date.today().isoformat()}"
+
+
+@bp.get("/aum-by-currency")
+@manager_required
+@admission.limit("reports")
+@http_cache.conditional("portfolios", "transactions", "fx_rates", scope=_dated_viewer_scope)
+def aum_by_currency():
+    """
+    AGGREGATE QUERY: Total AUM per portfolio currency, plus a firm-wide figure in the
+    base currency. Amounts are summed per currency in SQL and each bucket is converted
+    once with the cached FX rate for the as-of date. Soft-deleted portfolios are left
+    out. A date range limits the trades (and partitions) read; history=full adds
+    archived months.
     """
+    as_of = date.today()
+    as_of_arg = request.args.get("as_of")
+    if as_of_arg:
+        try:
+            as_of = date.fromisoformat(as_of_arg)
+        except ValueError:
+            pass
+
+    date_from, date_to, full_history = _period_args()
+
+    params: dict[str, Any] = {}
+    on = ["t.P_ID = p.P_ID"] + _date_filter("t", date_from, date_to, params)
     sql = text(
-        """
-        SELECT 
+        f"""
+        SELECT
           p.currency,
-          p.risk_level,
           COUNT(DISTINCT p.P_ID) AS portfolio_count,
-          COUNT(t.T_ID) AS total_transactions,
-          SUM(t.quantity * t.price_per_unit) AS total_invested,
-          AVG(t.quantity * t.price_per_unit) AS avg_transaction_value,
-          MAX(t.quantity * t.price_per_unit) AS max_transaction_value,
-          SUM(t.commission_fee) AS total_commissions
+          COALESCE(SUM(t.quantity * t.price_per_unit), 0) AS aum
         FROM portfolios p
-        LEFT JOIN transactions t ON t.P_ID = p.P_ID
-        WHERE p.currency IS NOT NULL
-        GROUP BY p.currency, p.risk_level
-        HAVING COUNT(t.T_ID) > 0
-        ORDER BY p.currency, total_invested DESC
+        LEFT JOIN transactions t ON {" AND ".join(on)}
+        WHERE p.deleted_at IS NULL
+        GROUP BY p.currency
+        ORDER BY aum DESC
         """
     )
-    rows = db.session.execute(sql).mappings().all()
-    return render_template("reports/portfolio_performance_summary.html", rows=rows)
+    buckets = [dict(r) for r in db.session.execute(sql, params).mappings()]
+    if full_history:
+        params = {}
+        archived_where = ["p.deleted_at IS NULL"] + _archived_period_filter("a", date_from, date_to, params)
+        archived = {
+            r.currency: r.aum
+            for r in db.session.execute(
+                text(
+                    f"""
+                    SELECT p.currency, SUM(a.invested) AS aum
+                    FROM archived_trade_totals a
+                    JOIN portfolios p ON p.P_ID = a.P_ID
+                    WHERE {" AND ".join(archived_where)}
+                    GROUP BY p.currency
+                    """
+                ),
+                params,
+            )
+        }
+        for bucket in buckets:
+            bucket["aum"] += archived.get(bucket["currency"]) or 0
+        buckets.sort(key=lambda b: b["aum"], reverse=True)
+    rows, missing = fx.convert_buckets(buckets, ["aum"], on=as_of)
+    total_base = sum((r["aum_base"] for r in rows if r["aum_base"] is not None), start=0)
+    return render_template(
+        "reports/aum_by_currency.html",
+        rows=rows,
+        missing=missing,
+        total_base=total_base,
+        base_currency=fx.base_currency(),
+        as_of=as_of,
+        **_period_context(date_from, date_to, full_history),
+    )
 
 
+@bp.get("/tech-sector-employee-investors")
+@manager_required
+@admission.limit("reports")
+@http_cache.conditional(*sectors.TABLES, "employees", scope=http_cache.viewer_scope)
+def tech_sector_employee_investors():
+    """
+    Employees whose own portfolios hold Tech products, with the Tech share of each
+    one's holdings, next to the firm-wide sector allocation. Both come from the
+    cached sector exposure (app/sectors.py), one grouped query per data change.
+    """
+    return render_template(
+        "reports/tech_sector_employee_investors.html",
+        rows=sectors.employee_investors(sectors.TECH),
+        firm=sectors.firm(),
+        sector=sectors.TECH,
+    )
+
+
+RISK_CONFIDENCES = (0.95, 0.99)
+
+
+@bp.get("/portfolio-risk")
+@manager_required
+@admission.limit("reports")
+@http_cache.conditional(*risk.TABLES, scope=http_cache.viewer_scope)
+def portfolio_risk():
+    """
+    MATRIX QUERY: volatility, VaR, beta and concentration for every portfolio from
+    the price history covariance (app/risk.py), largest VaR in the base currency first.
+    """
+    index_id = request.args.get("index", type=int)
+    if index_id is None:
+        index_id = risk.index_product(current_app.config.get("RISK_INDEX_TICKER", ""))
+    lookback_days = min(max(request.args.get("days", 365, type=int), 30), 3650)
+    confidence = request.args.get("confidence", 0.99, type=float)
+    if confidence not in RISK_CONFIDENCES:
+        confidence = 0.99
+    top_n = min(max(request.args.get("top", 50, type=int), 1), 500)
+
+    result = risk.compute(index_id, lookback_days, confidence)
+    index_choices = db.session.execute(
+        text("SELECT Product_ID, ticker_symbol FROM products ORDER BY ticker_symbol")
+    ).all()
+    return render_template(
+        "reports/portfolio_risk.html",
+        rows=risk.top(result, top_n),
+        base_currency=fx.base_currency(),
+        as_of=result.as_of,
+        observations=result.observations,
+        index_id=index_id,
+        index_choices=index_choices,
+        lookback_days=lookback_days,
+        confidence=confidence,
+        confidences=RISK_CONFIDENCES,
+        top=top_n,
+    )
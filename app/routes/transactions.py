@@ -1,18 +1,20 @@
 from __future__ import annotations
 
-from flask import Blueprint, flash, redirect, render_template, url_for
-from sqlalchemy import text
+import uuid
 
-from .. import db
+from flask import Blueprint, current_app, flash, redirect, render_template, url_for
+
+from .. import admission, db, metrics, orders, retry
 from ..auth import login_required, manager_required, get_current_user
 from ..forms import TransactionForm
-from ..models import Portfolio, Product, Customer, Employee
+from ..models import Portfolio, Product, Customer, Employee, TradeOrder
 
 bp = Blueprint("transactions", __name__, url_prefix="/trade")
 
 
 @bp.route("/create", methods=["GET", "POST"])
 @login_required
+@admission.limit({"GET": "lists", "POST": "trades"})
 def create_trade():
     """Create a trade - managers can trade for anyone, regular users only their own portfolios."""
     current_user = get_current_user()
@@ -21,6 +23,8 @@ def create_trade():
         return redirect(url_for("auth.login"))
     
     form = TransactionForm()
+    if not form.idempotency_key.data:
+        form.idempotency_key.data = uuid.uuid4().hex
     
     # Filter portfolios based on user role
     if current_user.can_access_all():
@@ -83,7 +87,7 @@ def create_trade():
     ]
 
     if form.validate_on_submit():
-        # Call stored procedure Process_Trade(P_ID, Product_ID, quantity, price_per_unit, commission_rate)
+        # Record the order, then apply it via Process_Trade(P_ID, Product_ID, quantity, price_per_unit, commission_rate)
         try:
             # Commission by user type: Employees 10%, Customers 20%
             selected_user = form.user.data or ""
@@ -122,22 +126,52 @@ def create_trade():
                 prod = db.session.get(Product, form.product_id.data)
                 ppu_input = prod.current_price if prod and prod.current_price is not None else 0
 
-            db.session.execute(
-                text("CALL Process_Trade(:p_id, :product_id, :qty, :ppu, :comm)"),
-                {
-                    "p_id": form.p_id.data,
-                    "product_id": form.product_id.data,
-                    "qty": form.quantity.data,
-                    "ppu": ppu_input,
-                    "comm": comm_float,
-                },
-            )
-            db.session.commit()
+            queued = bool(current_app.config.get("TRADE_QUEUE"))
+
+            def place() -> tuple[TradeOrder, bool]:
+                # One whole transaction, replayed by retry.run after a deadlock or lock wait
+                order, created = orders.submit(
+                    current_user.user_id,
+                    form.idempotency_key.data,
+                    form.p_id.data,
+                    form.product_id.data,
+                    form.quantity.data,
+                    ppu_input,
+                    comm_float,
+                )
+                if created and queued:
+                    # The order writer applies it (scripts/run_order_worker.py)
+                    db.session.commit()
+                elif created:
+                    with metrics.TRADE_SECONDS.time(path="web"):
+                        orders.execute_now(order)
+                        db.session.commit()
+                return order, created
+
+            try:
+                order, created = retry.run(place, path="web")
+            except orders.OrderError:
+                raise
+            except Exception:
+                if not queued:
+                    metrics.TRADES.inc(path="web", outcome="failed")
+                raise
+
+            if not created:
+                flash(f"Order #{order.order_id} was already submitted ({order.status}).", "info")
+                return redirect(url_for("transactions.create_trade"))
+            if queued:
+                flash(f"Order #{order.order_id} queued.", "success")
+                return redirect(url_for("transactions.create_trade"))
+            metrics.TRADES.inc(path="web", outcome="executed")
             flash("Trade submitted successfully.", "success")
             return redirect(url_for("transactions.create_trade"))
         except Exception as exc:
             db.session.rollback()
-            flash(f"Error executing trade: {exc}", "danger")
+            if retry.classify(exc):
+                flash("The trade could not be completed while the system is busy. Please submit it again.", "danger")
+            else:
+                flash(f"Error executing trade: {exc}", "danger")
 
     # Provide product->price map and initial commission for UI auto-fill
     price_map = {p.product_id: (float(p.current_price) if p.current_price is not None else None) for p in products}
@@ -5,16 +5,18 @@ from __future__ import annotations
 from flask import Blueprint, flash, redirect, render_template, request, url_for
 from werkzeug.exceptions import NotFound
 
-from .. import db
+from .. import admission, db, http_cache
 from ..auth import login_required, manager_required, get_current_user
 from ..forms import UserForm
-from ..models import User, Customer, Employee
+from ..models import User
 
 bp = Blueprint("users", __name__, url_prefix="/users")
 
 
 @bp.get("/")
 @manager_required
+@admission.limit("lists")
+@http_cache.conditional("users", "customers", "employees", scope=http_cache.viewer_scope)
 def list_users():
     """List all users - only managers/superadmins."""
     sort = request.args.get("sort", "id")
@@ -39,13 +41,6 @@ def create_user():
     """Create a new user account - only managers/superadmins."""
     form = UserForm()
     
-    # Populate entity choices
-    customers = Customer.query.order_by(Customer.first_name.asc(), Customer.last_name.asc()).all()
-    employees = Employee.query.order_by(Employee.employee_name.asc()).all()
-    
-    form.c_id.choices = [(0, "-- None --")] + [(c.c_id, f"{c.first_name} {c.last_name}") for c in customers]
-    form.e_id.choices = [(0, "-- None --")] + [(e.e_id, e.employee_name) for e in employees]
-    
     if form.validate_on_submit():
         username = form.username.data.strip()
         password = form.password.data
@@ -69,24 +64,14 @@ def create_user():
             flash("Username already taken. Please choose a different username.", "danger")
             return render_template("users/create.html", form=form)
         
-        # Validate entity exists and check if already linked
+        # Check the entity is not already linked; the form checked it exists
         if c_id is not None:
-            customer = db.session.get(Customer, c_id)
-            if customer is None:
-                flash("Selected customer not found.", "danger")
-                return render_template("users/create.html", form=form)
-            
             existing_link = User.query.filter_by(c_id=c_id).first()
             if existing_link:
                 flash(f"Customer ID {c_id} is already linked to user '{existing_link.username}'.", "danger")
                 return render_template("users/create.html", form=form)
         
         if e_id is not None:
-            employee = db.session.get(Employee, e_id)
-            if employee is None:
-                flash("Selected employee not found.", "danger")
-                return render_template("users/create.html", form=form)
-            
             existing_link = User.query.filter_by(e_id=e_id).first()
             if existing_link:
                 flash(f"Employee ID {e_id} is already linked to user '{existing_link.username}'.", "danger")
@@ -122,13 +107,6 @@ def edit_user(user_id: int):
     form = UserForm(obj=user)
     form.password.validators = []  # Make password optional for editing
     
-    # Populate entity choices
-    customers = Customer.query.order_by(Customer.first_name.asc(), Customer.last_name.asc()).all()
-    employees = Employee.query.order_by(Employee.employee_name.asc()).all()
-    
-    form.c_id.choices = [(0, "-- None --")] + [(c.c_id, f"{c.first_name} {c.last_name}") for c in customers]
-    form.e_id.choices = [(0, "-- None --")] + [(e.e_id, e.employee_name) for e in employees]
-    
     if request.method == "GET":
         form.c_id.data = user.c_id or 0
         form.e_id.data = user.e_id or 0
@@ -151,24 +129,14 @@ def edit_user(user_id: int):
             flash("Please select either a Customer or Employee.", "danger")
             return render_template("users/edit.html", form=form, user=user)
         
-        # Validate entity exists and check if already linked (excluding current user)
+        # Check the entity is not already linked (excluding current user); the form checked it exists
         if c_id is not None and c_id != user.c_id:
-            customer = db.session.get(Customer, c_id)
-            if customer is None:
-                flash("Selected customer not found.", "danger")
-                return render_template("users/edit.html", form=form, user=user)
-            
             existing_link = User.query.filter(User.c_id == c_id, User.user_id != user_id).first()
             if existing_link:
                 flash(f"Customer ID {c_id} is already linked to user '{existing_link.username}'.", "danger")
                 return render_template("users/edit.html", form=form, user=user)
         
         if e_id is not None and e_id != user.e_id:
-            employee = db.session.get(Employee, e_id)
-            if employee is None:
-                flash("Selected employee not found.", "danger")
-                return render_template("users/edit.html", form=form, user=user)
-            
             existing_link = User.query.filter(User.e_id == e_id, User.user_id != user_id).first()
             if existing_link:
                 flash(f"Employee ID {e_id} is already linked to user '{existing_link.username}'.", "danger")
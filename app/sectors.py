@@ -0,0 +1,209 @@
+"""Sector exposure: allocation by Product.sector per portfolio, customer, employee and firm-wide.
+
+Positions come from the holdings caches (app/holdings.py), not from a GROUP BY over
+the ledger: a customer's and its portfolios' allocations from the per-portfolio
+entries, employee and firm-wide allocations from firm_positions, which folds in only
+the trades since its last read. Each position is then valued with its product's
+sector and current price, read once per products version. The firm-wide result is
+cached against the positions key and the products and portfolios versions, so a trade
+costs re-summing positions in memory, never a ledger scan.
+
+Only open positions count (net quantity not 0). A position is valued at the
+product's current price (net quantity x price), or at its invested amount when the
+product has no price. Weights are each sector's share
+of the owner's total value. Products without a sector are reported under None
+("Unassigned").
+
+The product list's sector facets (product count per sector) are cached the same way
+against the products table alone.
+"""
+
+from __future__ import annotations
+
+from decimal import Decimal
+from typing import Any, Iterable, Mapping, NamedTuple
+
+from sqlalchemy import bindparam, text
+
+from . import db, holdings, versions
+from .cache import LRUCache
+
+# What the firm-wide allocation reads besides positions (for http_cache.conditional)
+TABLES = ("transactions", "archived_trade_totals", "products", "portfolios")
+TECH = "Tech"
+UNASSIGNED = "unassigned"
+
+# Firm-wide Exposure by positions key and versions; product and owner lookups and
+# product facets by their table's version
+_cache = LRUCache("sectors", maxsize=8)
+
+
+class Allocation(NamedTuple):
+    sector: str | None
+    value: Decimal
+    invested: Decimal
+    # Share of the owner's total value; None when the total is not positive
+    weight: float | None
+
+
+class Exposure(NamedTuple):
+    employees: dict[int, tuple[Allocation, ...]]
+    firm: tuple[Allocation, ...]
+
+
+def _allocations(totals: dict[str | None, list[Decimal]]) -> tuple[Allocation, ...]:
+    """Allocation rows from {sector: [value, invested]}, largest value first."""
+    total = sum((v for v, _ in totals.values()), start=Decimal(0))
+    rows = [
+        Allocation(sector, value, invested, float(value / total) if total > 0 else None)
+        for sector, (value, invested) in totals.items()
+    ]
+    rows.sort(key=lambda a: a.value, reverse=True)
+    return tuple(rows)
+
+
+def _add(into: dict[str | None, list[Decimal]], sector: str | None, value: Decimal, invested: Decimal) -> None:
+    entry = into.setdefault(sector, [Decimal(0), Decimal(0)])
+    entry[0] += value
+    entry[1] += invested
+
+
+def _products() -> dict[int, tuple[str | None, Decimal | None]]:
+    """{product_id: (sector, current price)}, cached per products version."""
+    version = versions.current("products")["products"][0]
+
+    def load() -> dict[int, tuple[str | None, Decimal | None]]:
+        rows = db.session.execute(text("SELECT Product_ID, sector, current_price FROM products"))
+        return {
+            row.Product_ID: (row.sector or None, Decimal(row.current_price) if row.current_price is not None else None)
+            for row in rows
+        }
+
+    return _cache.get_or_set(("products", version), load)
+
+
+def _owners() -> dict[int, tuple[int | None, int | None]]:
+    """{p_id: (c_id, e_id)} of live portfolios, cached per portfolios version."""
+    version = versions.current("portfolios")["portfolios"][0]
+
+    def load() -> dict[int, tuple[int | None, int | None]]:
+        rows = db.session.execute(text("SELECT P_ID, C_ID, E_ID FROM portfolios WHERE deleted_at IS NULL"))
+        return {row.P_ID: (row.C_ID, row.E_ID) for row in rows}
+
+    return _cache.get_or_set(("owners", version), load)
+
+
+def _value(product: tuple[str | None, Decimal | None], qty: int, invested: Decimal) -> Decimal:
+    price = product[1]
+    return invested if price is None else qty * price
+
+
+def portfolios(p_ids: Iterable[int]) -> dict[int, tuple[Allocation, ...]]:
+    """Each portfolio's allocation, from its cached holdings."""
+    products = _products()
+    result = {}
+    for p_id, positions in holdings.totals(p_ids).items():
+        totals: dict[str | None, list[Decimal]] = {}
+        for product_id, (qty, invested) in positions.items():
+            product = products.get(product_id)
+            if qty != 0 and product is not None:
+                _add(totals, product[0], _value(product, qty, invested), invested)
+        result[p_id] = _allocations(totals)
+    return result
+
+
+def combined(by_portfolio: Mapping[int, Iterable[Allocation]]) -> tuple[Allocation, ...]:
+    """One allocation over several portfolios (e.g. a customer's), weights recomputed."""
+    totals: dict[str | None, list[Decimal]] = {}
+    for allocations in by_portfolio.values():
+        for a in allocations:
+            _add(totals, a.sector, a.value, a.invested)
+    return _allocations(totals)
+
+
+def exposure() -> Exposure:
+    """Employee and firm-wide sector allocation, re-summed only when positions, prices or owners change."""
+    positions_key, positions = holdings.firm_positions()
+    stamps = versions.current("products", "portfolios")
+    key = ("exposure", positions_key, stamps["products"][0], stamps["portfolios"][0])
+
+    def load() -> Exposure:
+        products, owners = _products(), _owners()
+        employees: dict[int, dict[str | None, list[Decimal]]] = {}
+        firm: dict[str | None, list[Decimal]] = {}
+        for (p_id, product_id), (qty, invested) in positions.items():
+            if qty == 0:
+                continue
+            owner, product = owners.get(p_id), products.get(product_id)
+            if owner is None or product is None:
+                continue
+            value = _value(product, qty, invested)
+            if owner[1] is not None:
+                _add(employees.setdefault(owner[1], {}), product[0], value, invested)
+            _add(firm, product[0], value, invested)
+        return Exposure(
+            employees={k: _allocations(v) for k, v in employees.items()},
+            firm=_allocations(firm),
+        )
+
+    return _cache.get_or_set(key, load)
+
+
+def firm() -> tuple[Allocation, ...]:
+    return exposure().firm
+
+
+def in_sector(allocations: Iterable[Allocation], sector: str | None) -> Allocation | None:
+    return next((a for a in allocations if a.sector == sector), None)
+
+
+def employee_investors(sector: str = TECH) -> list[dict[str, Any]]:
+    """
+    Employees whose own portfolios hold a positive value in `sector`, largest first:
+    e_id, employee_name, job_title, sector_value, total_value, weight.
+    """
+    invested_in = {
+        e_id: (found, sum((a.value for a in allocations), start=Decimal(0)))
+        for e_id, allocations in exposure().employees.items()
+        if (found := in_sector(allocations, sector)) is not None and found.value > 0
+    }
+    if not invested_in:
+        return []
+    names = {
+        row.E_ID: row
+        for row in db.session.execute(
+            text("SELECT E_ID, E_name, job_title FROM employees WHERE E_ID IN :ids").bindparams(
+                bindparam("ids", expanding=True)
+            ),
+            {"ids": list(invested_in)},
+        )
+    }
+    rows = [
+        {
+            "e_id": e_id,
+            "employee_name": names[e_id].E_name if e_id in names else None,
+            "job_title": names[e_id].job_title if e_id in names else None,
+            "sector_value": found.value,
+            "total_value": total,
+            "weight": found.weight,
+        }
+        for e_id, (found, total) in invested_in.items()
+    ]
+    rows.sort(key=lambda r: r["sector_value"], reverse=True)
+    return rows
+
+
+def product_facets() -> tuple[tuple[str | None, int], ...]:
+    """(sector, product count) for the product list filter, most products first."""
+    version = versions.current("products")["products"][0]
+
+    def load() -> tuple[tuple[str | None, int], ...]:
+        rows = db.session.execute(
+            text(
+                "SELECT COALESCE(sector, '') AS sector, COUNT(*) AS n FROM products "
+                "GROUP BY COALESCE(sector, '') ORDER BY n DESC, sector"
+            )
+        )
+        return tuple((row.sector or None, int(row.n)) for row in rows)
+
+    return _cache.get_or_set(("facets", version), load)
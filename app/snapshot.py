@@ -0,0 +1,285 @@
+"""Columnar snapshot of the ledger for offline analytics (app/analytics.py).
+
+A snapshot is a directory of NumPy arrays, one .npy file per column. Readers open
+them memory-mapped, so only the columns a report touches are paged in:
+
+    <snapshot>/meta.json               row counts, source, export time, data versions
+    <snapshot>/transactions/<col>.npy  sorted by (P_ID, T_ID)
+    <snapshot>/portfolios/<col>.npy    sorted by P_ID; t_start / t_end give each
+                                       portfolio's slice of transactions
+    <snapshot>/products/<col>.npy      sorted by Product_ID
+
+Money is int64 cents, and value_cents (quantity * price) is precomputed. Dates are
+datetime64. Strings are dictionary-encoded: <col>.codes.npy holds int32 indexes into
+the sorted <col>.values.json, with -1 for NULL. A NULL commission fee is stored as 0,
+and a product with no current price as -1.
+
+export() reads everything in one transaction, so under MySQL's default REPEATABLE
+READ every query sees the same ledger. Trades are read in T_ID keyset chunks into
+preallocated memory-mapped files. At the end they are sorted by portfolio, and the
+snapshot is published with a directory rename. Trades whose portfolio no longer
+exists (or is soft-deleted) are dropped, since every report joins them away; meta
+counts them.
+"""
+
+from __future__ import annotations
+
+import json
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Sequence
+
+import numpy as np
+from numpy.lib.format import open_memmap
+from sqlalchemy import text
+
+from . import db, versions
+
+FORMAT = 1
+CHUNK_ROWS = 500_000
+# Rows per block when permuting columns into portfolio order
+SORT_BLOCK = 4_000_000
+
+TRANSACTION_COLUMNS = {
+    "t_id": np.int64,
+    "p_id": np.int32,
+    "product_id": np.int32,
+    "quantity": np.int32,
+    "price_cents": np.int64,
+    "value_cents": np.int64,
+    "fee_cents": np.int64,
+    "transaction_date": "datetime64[s]",
+}
+
+
+def encode_strings(values: Sequence[str | None]) -> tuple[np.ndarray, list[str]]:
+    """Dictionary-encode strings: (int32 codes, sorted distinct values); NULL is -1."""
+    dictionary = sorted({v for v in values if v is not None})
+    index = {v: i for i, v in enumerate(dictionary)}
+    codes = np.fromiter((-1 if v is None else index[v] for v in values), dtype=np.int32, count=len(values))
+    return codes, dictionary
+
+
+def write_table(directory: Path, columns: dict[str, Any]) -> None:
+    """Save one table: arrays as <name>.npy, lists of strings dictionary-encoded."""
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, values in columns.items():
+        if isinstance(values, np.ndarray):
+            np.save(directory / f"{name}.npy", values)
+        else:
+            codes, dictionary = encode_strings(values)
+            np.save(directory / f"{name}.codes.npy", codes)
+            with (directory / f"{name}.values.json").open("w", encoding="utf-8") as fh:
+                json.dump(dictionary, fh)
+
+
+def allocate_transactions(directory: Path, rows: int) -> dict[str, np.ndarray]:
+    """Writable memory-mapped transaction columns of `rows` rows, in arrival (T_ID) order."""
+    directory.mkdir(parents=True, exist_ok=True)
+    return {
+        name: open_memmap(directory / f"{name}.npy", mode="w+", dtype=dtype, shape=(rows,))
+        for name, dtype in TRANSACTION_COLUMNS.items()
+    }
+
+
+def link_transactions(root: Path, unsorted: dict[str, np.ndarray]) -> dict[str, int]:
+    """
+    Write the transactions table in (P_ID, T_ID) order and each portfolio's slice.
+
+    `unsorted` holds the columns in T_ID order; portfolios/p_id must already be saved.
+    Trades of unknown portfolios are dropped. Returns the kept and dropped counts.
+    """
+    portfolio_ids = np.load(root / "portfolios" / "p_id.npy")
+    p_ids = unsorted["p_id"]
+    order = np.argsort(p_ids, kind="stable")
+    if len(portfolio_ids):
+        pos = np.searchsorted(portfolio_ids, p_ids[order]).clip(max=len(portfolio_ids) - 1)
+        known = portfolio_ids[pos] == p_ids[order]
+        order = order[known]
+    else:
+        order = order[:0]
+
+    out_dir = root / "transactions"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name, column in unsorted.items():
+        out = open_memmap(out_dir / f"{name}.npy", mode="w+", dtype=column.dtype, shape=order.shape)
+        for start in range(0, len(order), SORT_BLOCK):
+            out[start:start + SORT_BLOCK] = column[order[start:start + SORT_BLOCK]]
+        out.flush()
+        del out
+
+    sorted_p_ids = np.load(out_dir / "p_id.npy", mmap_mode="r")
+    np.save(root / "portfolios" / "t_start.npy", np.searchsorted(sorted_p_ids, portfolio_ids, "left").astype(np.int64))
+    np.save(root / "portfolios" / "t_end.npy", np.searchsorted(sorted_p_ids, portfolio_ids, "right").astype(np.int64))
+    return {"kept": int(len(order)), "dropped": int(len(p_ids) - len(order))}
+
+
+def publish(tmp: Path, target: Path, meta: dict[str, Any]) -> None:
+    """Write meta.json and swap `tmp` in as `target` (the old snapshot is removed)."""
+    meta = {"format": FORMAT, **meta}
+    with (tmp / "meta.json").open("w", encoding="utf-8") as fh:
+        json.dump(meta, fh, indent=2, default=str)
+    old = target.with_name(target.name + ".old")
+    if old.exists():
+        shutil.rmtree(old)
+    if target.exists():
+        target.rename(old)
+    tmp.rename(target)
+    if old.exists():
+        shutil.rmtree(old)
+
+
+def _scratch(target: Path) -> Path:
+    tmp = target.with_name(target.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+    return tmp
+
+
+def export(target: Path, chunk_rows: int = CHUNK_ROWS) -> dict[str, Any]:
+    """Export transactions, portfolios and products into a snapshot at `target`; returns its meta."""
+    target = Path(target)
+    started = time.perf_counter()
+    tmp = _scratch(target)
+    db.session.rollback()
+
+    stamps = versions.current("transactions", "portfolios", "customers", "employees", "products")
+
+    portfolios = db.session.execute(
+        text(
+            """
+            SELECT p.P_ID, p.P_name, p.C_ID, p.E_ID, p.currency, p.risk_level, p.creation_date,
+                   COALESCE(CONCAT(c.first_name, ' ', c.last_name), e.E_name) AS owner_name
+            FROM portfolios p
+            LEFT JOIN customers c ON p.C_ID = c.C_ID
+            LEFT JOIN employees e ON p.E_ID = e.E_ID
+            WHERE p.deleted_at IS NULL
+            ORDER BY p.P_ID
+            """
+        )
+    ).all()
+    write_table(tmp / "portfolios", {
+        "p_id": np.array([r.P_ID for r in portfolios], dtype=np.int32),
+        "c_id": np.array([-1 if r.C_ID is None else r.C_ID for r in portfolios], dtype=np.int32),
+        "e_id": np.array([-1 if r.E_ID is None else r.E_ID for r in portfolios], dtype=np.int32),
+        "creation_date": np.array([r.creation_date for r in portfolios], dtype="datetime64[D]"),
+        "name": [r.P_name for r in portfolios],
+        "currency": [r.currency for r in portfolios],
+        "risk_level": [r.risk_level for r in portfolios],
+        "owner_name": [r.owner_name for r in portfolios],
+    })
+
+    products = db.session.execute(
+        text(
+            """
+            SELECT Product_ID, Product_name, ticker_symbol, sector,
+                   CAST(COALESCE(current_price * 100, -1) AS SIGNED) AS price_cents
+            FROM products
+            ORDER BY Product_ID
+            """
+        )
+    ).all()
+    write_table(tmp / "products", {
+        "product_id": np.array([r.Product_ID for r in products], dtype=np.int32),
+        "current_price_cents": np.array([r.price_cents for r in products], dtype=np.int64),
+        "name": [r.Product_name for r in products],
+        "ticker": [r.ticker_symbol for r in products],
+        "sector": [r.sector for r in products],
+    })
+
+    rows, max_t_id = db.session.execute(text("SELECT COUNT(*), COALESCE(MAX(T_ID), 0) FROM transactions")).one()
+    columns = allocate_transactions(tmp / "_unsorted", rows)
+    # Integers straight from MySQL: cents and seconds since the epoch (DATETIME is naive)
+    stmt = text(
+        """
+        SELECT T_ID, P_ID, Product_ID, quantity,
+               CAST(price_per_unit * 100 AS SIGNED) AS price_cents,
+               CAST(COALESCE(commission_fee, 0) * 100 AS SIGNED) AS fee_cents,
+               TIMESTAMPDIFF(SECOND, '1970-01-01 00:00:00', transaction_date) AS ts
+        FROM transactions
+        WHERE T_ID > :after AND T_ID <= :max_t_id
+        ORDER BY T_ID
+        LIMIT :limit
+        """
+    )
+    filled = 0
+    after = 0
+    while filled < rows:
+        chunk = db.session.execute(stmt, {"after": after, "max_t_id": max_t_id, "limit": chunk_rows}).all()
+        if not chunk:
+            break
+        end = filled + len(chunk)
+        t_id, p_id, product_id, quantity, price, fee, ts = (np.array(c, dtype=np.int64) for c in zip(*chunk))
+        columns["t_id"][filled:end] = t_id
+        columns["p_id"][filled:end] = p_id
+        columns["product_id"][filled:end] = product_id
+        columns["quantity"][filled:end] = quantity
+        columns["price_cents"][filled:end] = price
+        columns["value_cents"][filled:end] = quantity * price
+        columns["fee_cents"][filled:end] = fee
+        columns["transaction_date"][filled:end] = ts.astype("datetime64[s]")
+        filled = end
+        after = int(t_id[-1])
+    db.session.rollback()
+    if filled != rows:
+        raise RuntimeError(f"expected {rows} trades up to T_ID {max_t_id}, read {filled}")
+
+    linked = link_transactions(tmp, columns)
+    del columns
+    shutil.rmtree(tmp / "_unsorted")
+
+    meta = {
+        "exported_at": datetime.utcnow().replace(microsecond=0).isoformat(),
+        "source": db.engine.url.database,
+        "max_t_id": int(max_t_id),
+        "rows": {"transactions": linked["kept"], "portfolios": len(portfolios), "products": len(products)},
+        "orphan_trades": linked["dropped"],
+        "data_versions": {t: v for t, (v, _) in stamps.items()},
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+    publish(tmp, target, meta)
+    return meta
+
+
+class Snapshot:
+    """A snapshot directory opened read-only; columns are memory-mapped on first use."""
+
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        with (self.path / "meta.json").open(encoding="utf-8") as fh:
+            self.meta = json.load(fh)
+        if self.meta.get("format") != FORMAT:
+            raise ValueError(f"{self.path}: snapshot format {self.meta.get('format')}, expected {FORMAT}")
+        self._columns: dict[tuple[str, str], np.ndarray] = {}
+        self._dictionaries: dict[tuple[str, str], list[str]] = {}
+
+    def column(self, table: str, name: str) -> np.ndarray:
+        key = (table, name)
+        if key not in self._columns:
+            self._columns[key] = np.load(self.path / table / f"{name}.npy", mmap_mode="r")
+        return self._columns[key]
+
+    def codes(self, table: str, name: str) -> np.ndarray:
+        """Dictionary codes of a string column (-1 for NULL)."""
+        return self.column(table, f"{name}.codes")
+
+    def dictionary(self, table: str, name: str) -> list[str]:
+        key = (table, name)
+        if key not in self._dictionaries:
+            with (self.path / table / f"{name}.values.json").open(encoding="utf-8") as fh:
+                self._dictionaries[key] = json.load(fh)
+        return self._dictionaries[key]
+
+    def code_of(self, table: str, name: str, value: str) -> int | None:
+        """Code of one string value, or None when the column never holds it."""
+        dictionary = self.dictionary(table, name)
+        i = int(np.searchsorted(dictionary, value)) if dictionary else 0
+        return i if i < len(dictionary) and dictionary[i] == value else None
+
+    def decode(self, table: str, name: str, codes: np.ndarray) -> np.ndarray:
+        """Object array of strings (None for NULL) for the given codes."""
+        values = np.array(self.dictionary(table, name) + [None], dtype=object)
+        return values[codes]
@@ -0,0 +1,93 @@
+"""Streamed pages: the page above a large table goes out before its rows are fetched.
+
+A view that can return an unbounded table (the product and portfolio lists, the
+Portfolio Details and Top Portfolios reports) returns `page(template, rows_html, ...)`
+with the `fragments.stream` pieces as `rows_html`. Jinja renders the page as a stream
+with a marker in place of `{{ rows_html }}`, and the pieces are sent in its place:
+
+- everything up to the table body is sent before the query runs
+- rows are read from a server-side cursor STREAM_BATCH_ROWS at a time (`result_batches`
+  / `batches`), rendered and sent batch by batch
+- output is gathered into writes of about FLUSH_CHARS, so the socket (and the
+  compressor, app/compression.py) sees a few large pieces rather than one per tag
+
+Time to first byte is the time to the top of the page, and memory holds one batch
+whatever the row count. The request and app contexts stay open until the last byte,
+so the session and any admission slot are held for the whole transfer.
+
+What can no longer change once the headers are out is settled in the view: flashed
+messages are taken from the session here, and fragments.stream issues the CSRF token.
+A query error after the first byte cannot become an error page; it is logged and the
+page ends early.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Iterable, Iterator
+
+from flask import Response, get_flashed_messages, stream_template
+from markupsafe import Markup
+
+from . import db
+from .fragments import STREAM_BATCH_ROWS
+
+FLUSH_CHARS = 16_384
+# Stands in for the table body in the template's output; never sent
+ROWS_MARKER = Markup("<!-- streaming:rows -->")
+
+
+def result_batches(statement: Any, params: dict[str, Any] | None = None, size: int = STREAM_BATCH_ROWS) -> Iterator[Any]:
+    """Row mappings of a SELECT in lists of `size`, read through a server-side cursor."""
+    result = db.session.execute(statement.execution_options(yield_per=size), params or {})
+    return result.mappings().partitions()
+
+
+def batches(rows: Iterable[Any], size: int = STREAM_BATCH_ROWS) -> Iterator[list[Any]]:
+    """Lists of up to `size` items from any iterable (e.g. an ORM query with yield_per)."""
+    batch: list[Any] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _coalesce(pieces: Iterator[str], rows: Iterator[str]) -> Iterator[str]:
+    """The page with `rows` spliced in at the marker, in writes of about FLUSH_CHARS."""
+    held: list[str] = []
+    size = 0
+    try:
+        for piece in pieces:
+            if piece == ROWS_MARKER:
+                # Send the top of the page before the rows query runs
+                if held:
+                    yield "".join(held)
+                    held, size = [], 0
+                for row_piece in rows:
+                    if row_piece:
+                        yield row_piece
+                continue
+            held.append(piece)
+            size += len(piece)
+            if size >= FLUSH_CHARS:
+                yield "".join(held)
+                held, size = [], 0
+        if held:
+            yield "".join(held)
+    finally:
+        # Ends the rows query if the client left early, then the template stream, which
+        # closes its request context
+        for iterator in (rows, pieces):
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+
+def page(template: str, rows_html: Iterator[str], **context: Any) -> Response:
+    """Render `template` as a streamed text/html response, `rows_html` sent as they come."""
+    # Flashes leave the session now; the layout reads them from the request later
+    get_flashed_messages()
+    pieces = stream_template(template, rows_html=ROWS_MARKER, **context)
+    return Response(_coalesce(pieces, rows_html), mimetype="text/html")
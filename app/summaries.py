@@ -0,0 +1,320 @@
+"""Per-customer summaries for the customers list: net worth, portfolio count, last trade.
+
+customer_summaries holds one row per customer. It is kept current by an outbox
+consumer (app/outbox.py) rather than aggregated on every list view:
+
+- a new trade adds quantity * price_per_unit to its customer's net worth and moves
+  last_trade_date forward; a new portfolio adds one to the count. A batch of events
+  becomes one UPDATE per touched customer.
+- changes that are not a simple delta (a trade edited or deleted, a portfolio moved
+  to another customer, soft-deleted or purged, or a customer without a row yet)
+  recompute the customers concerned from the ledger.
+
+A recomputed row records the newest outbox event visible to the recompute in
+`through_event`; events up to it are already counted and are skipped when they are
+delivered later. rebuild() recomputes every row the same way, so it can run at any
+time (also to start the consumer on an existing ledger), and check() lists rows that
+disagree with the ledger. A trade that commits with a lower event ID while its
+customer is being recomputed can be missed that way; check() finds such rows.
+
+net_worth is the figure the client view shows as "Total net worth": quantity x price
+over the customer's live portfolios, live trades plus archived months, in each
+portfolio's own currency.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Iterable
+
+from sqlalchemy import bindparam, text
+
+from . import db, outbox, versions
+
+CONSUMER = "customer_summary"
+
+# Summary columns per customer; {customers} / {portfolios} narrow it to some customers
+_AGGREGATE = """
+    SELECT c.C_ID AS c_id,
+           COUNT(p.P_ID) AS portfolio_count,
+           COALESCE(SUM(l.invested), 0) + COALESCE(SUM(a.invested), 0) AS net_worth,
+           COALESCE(MAX(l.last_trade), MAX(a.last_period)) AS last_trade_date
+    FROM customers c
+    LEFT JOIN portfolios p ON p.C_ID = c.C_ID AND p.deleted_at IS NULL
+    LEFT JOIN (
+      SELECT P_ID, SUM(quantity * price_per_unit) AS invested, MAX(transaction_date) AS last_trade
+      FROM transactions
+      {portfolios}
+      GROUP BY P_ID
+    ) l ON l.P_ID = p.P_ID
+    LEFT JOIN (
+      SELECT P_ID, SUM(invested) AS invested, MAX(period) AS last_period
+      FROM archived_trade_totals
+      {portfolios}
+      GROUP BY P_ID
+    ) a ON a.P_ID = p.P_ID
+    {customers}
+    GROUP BY c.C_ID
+"""
+
+
+def _aggregate(c_ids: Iterable[int] | None = None) -> list[Any]:
+    """Summary rows computed from the ledger, for `c_ids` or for every customer."""
+    if c_ids is None:
+        sql = _AGGREGATE.format(portfolios="", customers="")
+        return db.session.execute(text(sql)).all()
+    c_ids = sorted(set(c_ids))
+    if not c_ids:
+        return []
+    sql = _AGGREGATE.format(
+        portfolios="WHERE P_ID IN (SELECT P_ID FROM portfolios WHERE C_ID IN :c_ids)",
+        customers="WHERE c.C_ID IN :c_ids",
+    )
+    stmt = text(sql).bindparams(bindparam("c_ids", expanding=True))
+    return db.session.execute(stmt, {"c_ids": c_ids}).all()
+
+
+def _newest_event() -> int:
+    return int(db.session.execute(text("SELECT COALESCE(MAX(event_id), 0) FROM outbox_events")).scalar())
+
+
+def _store(rows: list[Any], c_ids: Iterable[int], through_event: int) -> None:
+    """Replace the summary rows of `c_ids` with `rows` (customers missing from rows are gone)."""
+    c_ids = sorted(set(c_ids))
+    if c_ids:
+        db.session.execute(
+            text("DELETE FROM customer_summaries WHERE C_ID IN :c_ids").bindparams(
+                bindparam("c_ids", expanding=True)
+            ),
+            {"c_ids": c_ids},
+        )
+    if rows:
+        db.session.execute(
+            text(
+                "INSERT INTO customer_summaries (C_ID, net_worth, portfolio_count, last_trade_date, through_event) "
+                "VALUES (:c_id, :net_worth, :portfolio_count, :last_trade_date, :through_event)"
+            ),
+            [
+                {
+                    "c_id": r.c_id,
+                    "net_worth": r.net_worth,
+                    "portfolio_count": r.portfolio_count,
+                    "last_trade_date": r.last_trade_date,
+                    "through_event": through_event,
+                }
+                for r in rows
+            ],
+        )
+
+
+def recompute(c_ids: Iterable[int]) -> None:
+    """Recompute some customers' rows from the ledger (caller commits)."""
+    c_ids = set(c_ids)
+    if not c_ids:
+        return
+    # Read in the same transaction as the aggregate: every event it can see is counted
+    through_event = _newest_event()
+    _store(_aggregate(c_ids), c_ids, through_event)
+    versions.bump("customer_summaries")
+
+
+def rebuild() -> int:
+    """Recompute every row from the ledger (caller commits); returns the number of customers."""
+    through_event = _newest_event()
+    rows = _aggregate()
+    db.session.execute(text("DELETE FROM customer_summaries"))
+    _store(rows, (), through_event)
+    versions.bump("customer_summaries")
+    return len(rows)
+
+
+def check() -> list[dict[str, Any]]:
+    """Rows that differ from the ledger: stored and live values per customer (empty when consistent)."""
+    stored = {
+        r.c_id: r
+        for r in db.session.execute(
+            text("SELECT C_ID AS c_id, net_worth, portfolio_count, last_trade_date FROM customer_summaries")
+        )
+    }
+    live = {r.c_id: r for r in _aggregate()}
+    db.session.rollback()
+
+    mismatches = []
+    for c_id in sorted(set(stored) | set(live)):
+        s_row, l_row = stored.get(c_id), live.get(c_id)
+        if (
+            s_row is not None
+            and l_row is not None
+            and Decimal(s_row.net_worth) == Decimal(l_row.net_worth)
+            and s_row.portfolio_count == l_row.portfolio_count
+            and str(s_row.last_trade_date) == str(l_row.last_trade_date)
+        ):
+            continue
+        mismatches.append({
+            "c_id": c_id,
+            "stored": dict(s_row._mapping) if s_row is not None else None,
+            "live": dict(l_row._mapping) if l_row is not None else None,
+        })
+    return mismatches
+
+
+def _portfolio_owners(p_ids: Iterable[int], live_only: bool) -> dict[int, int | None]:
+    p_ids = sorted(set(p_ids))
+    if not p_ids:
+        return {}
+    where = "P_ID IN :p_ids" + (" AND deleted_at IS NULL" if live_only else "")
+    stmt = text(f"SELECT P_ID, C_ID FROM portfolios WHERE {where}").bindparams(bindparam("p_ids", expanding=True))
+    return {row.P_ID: row.C_ID for row in db.session.execute(stmt, {"p_ids": p_ids})}
+
+
+def _trade_portfolios(t_ids: Iterable[int]) -> dict[int, int]:
+    t_ids = sorted(set(t_ids))
+    if not t_ids:
+        return {}
+    stmt = text("SELECT T_ID, P_ID FROM transactions WHERE T_ID IN :t_ids").bindparams(
+        bindparam("t_ids", expanding=True)
+    )
+    return {row.T_ID: row.P_ID for row in db.session.execute(stmt, {"t_ids": t_ids})}
+
+
+@outbox.consumer(CONSUMER, "transactions", "portfolios", "customers")
+def apply_events(events: list[outbox.Event]) -> None:
+    """Fold a batch of outbox events into the summaries (runs in the dispatcher's transaction)."""
+    new_trades: list[outbox.Event] = []
+    new_portfolios: list[outbox.Event] = []
+    new_customers: dict[int, int] = {}
+    gone_customers: set[int] = set()
+    recompute_ids: set[int] = set()
+    # Portfolios and trades whose customer has to be looked up before recomputing
+    moved_portfolios: set[int] = set()
+    rewritten_trades: dict[int, int | None] = {}
+
+    for e in events:
+        payload = e.payload
+        previous = payload.get("_previous", {})
+        if e.aggregate == "transactions":
+            if e.op == "insert":
+                new_trades.append(e)
+            else:
+                rewritten_trades[e.aggregate_id] = payload.get("p_id") or previous.get("p_id")
+                if previous.get("p_id"):
+                    moved_portfolios.add(previous["p_id"])
+        elif e.aggregate == "portfolios":
+            if e.op == "insert":
+                new_portfolios.append(e)
+            elif e.op == "delete" or "c_id" in payload or "deleted_at" in payload:
+                for c_id in (payload.get("c_id"), previous.get("c_id")):
+                    if c_id is not None:
+                        recompute_ids.add(c_id)
+                if "c_id" not in payload:
+                    moved_portfolios.add(e.aggregate_id)
+        elif e.aggregate == "customers":
+            if e.op == "insert":
+                new_customers[e.aggregate_id] = e.event_id
+            elif e.op == "delete":
+                gone_customers.add(e.aggregate_id)
+
+    trade_portfolios = _trade_portfolios(t for t, p in rewritten_trades.items() if p is None)
+    for t_id, p_id in rewritten_trades.items():
+        p_id = p_id or trade_portfolios.get(t_id)
+        if p_id is not None:
+            moved_portfolios.add(p_id)
+    recompute_ids.update(
+        c_id for c_id in _portfolio_owners(moved_portfolios, live_only=False).values() if c_id is not None
+    )
+
+    # Deltas: per customer, net worth and portfolio count to add and the newest trade
+    owners = _portfolio_owners((e.payload.get("p_id") for e in new_trades), live_only=True)
+    deltas: dict[int, dict[str, Any]] = defaultdict(
+        lambda: {"net_worth": Decimal(0), "portfolios": 0, "last_trade": None, "events": []}
+    )
+    for e in new_trades:
+        c_id = owners.get(e.payload.get("p_id"))
+        if c_id is None:
+            continue
+        delta = deltas[c_id]
+        delta["net_worth"] += Decimal(str(e.payload.get("quantity") or 0)) * Decimal(
+            str(e.payload.get("price_per_unit") or 0)
+        )
+        traded_at = e.payload.get("transaction_date")
+        if traded_at and (delta["last_trade"] is None or traded_at > delta["last_trade"]):
+            delta["last_trade"] = traded_at
+        delta["events"].append(e.event_id)
+    for e in new_portfolios:
+        c_id = e.payload.get("c_id")
+        if c_id is not None and not e.payload.get("deleted_at"):
+            deltas[c_id]["portfolios"] += 1
+            deltas[c_id]["events"].append(e.event_id)
+
+    # Customers created in this batch start from an empty row
+    fresh = set(new_customers) - gone_customers - recompute_ids
+    fresh -= set(_through_events(fresh))
+    if fresh:
+        db.session.execute(
+            text(
+                "INSERT INTO customer_summaries (C_ID, net_worth, portfolio_count, last_trade_date, through_event) "
+                "VALUES (:c_id, 0, 0, NULL, :event_id)"
+            ),
+            [{"c_id": c_id, "event_id": new_customers[c_id]} for c_id in sorted(fresh)],
+        )
+
+    through = _through_events(set(deltas) - recompute_ids - gone_customers)
+    updates = []
+    for c_id, delta in deltas.items():
+        if c_id in recompute_ids or c_id in gone_customers:
+            continue
+        if c_id not in through:
+            # No row yet (customer older than the consumer): start it from the ledger
+            recompute_ids.add(c_id)
+            continue
+        if all(event_id <= through[c_id] for event_id in delta["events"]):
+            continue
+        if any(event_id <= through[c_id] for event_id in delta["events"]):
+            # Part of the batch is already counted by a recompute; recompute again
+            recompute_ids.add(c_id)
+            continue
+        updates.append({
+            "c_id": c_id,
+            "net_worth": delta["net_worth"],
+            "portfolios": delta["portfolios"],
+            "last_trade": _as_datetime(delta["last_trade"]),
+        })
+    if updates:
+        db.session.execute(
+            text(
+                """
+                UPDATE customer_summaries
+                SET net_worth = net_worth + :net_worth,
+                    portfolio_count = portfolio_count + :portfolios,
+                    last_trade_date = CASE
+                      WHEN :last_trade IS NOT NULL AND (last_trade_date IS NULL OR last_trade_date < :last_trade)
+                      THEN :last_trade ELSE last_trade_date END
+                WHERE C_ID = :c_id
+                """
+            ),
+            updates,
+        )
+
+    if gone_customers:
+        db.session.execute(
+            text("DELETE FROM customer_summaries WHERE C_ID IN :c_ids").bindparams(bindparam("c_ids", expanding=True)),
+            {"c_ids": sorted(gone_customers)},
+        )
+    recompute(recompute_ids - gone_customers)
+    if updates or fresh or gone_customers:
+        versions.bump("customer_summaries")
+
+
+def _through_events(c_ids: set[int]) -> dict[int, int]:
+    if not c_ids:
+        return {}
+    stmt = text("SELECT C_ID, through_event FROM customer_summaries WHERE C_ID IN :c_ids").bindparams(
+        bindparam("c_ids", expanding=True)
+    )
+    return {row.C_ID: int(row.through_event) for row in db.session.execute(stmt, {"c_ids": sorted(c_ids)})}
+
+
+def _as_datetime(value: str | None) -> datetime | None:
+    return datetime.fromisoformat(value) if value else None
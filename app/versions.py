@@ -0,0 +1,161 @@
+"""Per-table data version stamps (the basis for ETags and cache keys).
+
+Every ORM flush bumps data_versions for the tables it touched, inside the same
+transaction, so a reader that sees a new version also sees the new data. Writes that
+go around the ORM (stored procedures, raw SQL) call bump() themselves; raw SQL that
+updates or deletes trades also bumps "transactions_rewrite".
+
+Tables written by every trade (HOT) are handled differently, since a stamp row bumped
+inside the trade's transaction stays locked until commit and would make every trade
+in the system wait on the one before it. Their bumps are collected during the
+transaction and applied after it commits, in a transaction of their own, to one of
+SHARDS rows ("transactions#7") picked at random; current() sums the shards. The
+trade transaction never locks a stamp row, and two bumps only meet when they pick
+the same shard, for the length of one UPDATE. Data is visible before its version
+moves, which at worst caches a fresh result under the previous version: a cache can
+briefly be newer than its key, never older.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import random
+from datetime import datetime
+from typing import Any, Iterable
+
+from flask import Flask
+from sqlalchemy import BigInteger, DateTime, String, bindparam, event, text
+from sqlalchemy.orm import Session
+
+from . import db
+
+log = logging.getLogger(__name__)
+
+_UNTRACKED = {"data_versions"}
+# Written by every trade (the form, the API and the order writer); bumped after
+# commit into one of SHARDS rows
+HOT = frozenset({"transactions", "trade_orders"})
+SHARDS = 16
+_PENDING = "versions_after_commit"
+# Extra stamp bumped when existing rows change or disappear (not on inserts), for
+# readers that fold appended rows in incrementally (app/holdings.py)
+REWRITE_STAMPS = {"transactions": "transactions_rewrite"}
+_listening = False
+
+
+def init_app(app: Flask) -> None:
+    """Install the flush listener that bumps versions for ORM writes (idempotent)."""
+    global _listening
+    if not _listening:
+        event.listen(Session, "after_flush", _bump_flushed_tables)
+        event.listen(Session, "after_commit", _bump_committed)
+        event.listen(Session, "after_rollback", _drop_pending)
+        _listening = True
+
+
+def _bump_flushed_tables(session: Session, flush_context: Any) -> None:
+    tables = set()
+    dirty = [obj for obj in session.dirty if session.is_modified(obj)]
+    for obj in list(session.new) + dirty + list(session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        if table and table not in _UNTRACKED:
+            tables.add(table)
+    for obj in dirty + list(session.deleted):
+        stamp = REWRITE_STAMPS.get(getattr(obj, "__tablename__", None))
+        if stamp:
+            tables.add(stamp)
+    if tables:
+        _bump_in(session, tables)
+
+
+def bump(*tables: str) -> None:
+    """Mark tables as changed in the current transaction (caller commits)."""
+    _bump_in(db.session(), tables)
+
+
+def _bump_in(session: Session, tables: Iterable[str]) -> None:
+    tables = set(tables)
+    hot = tables & HOT
+    if hot:
+        session.info.setdefault(_PENDING, set()).update(hot)
+    if tables - hot:
+        _bump(session.connection(), tables - hot)
+
+
+def _bump_committed(session: Session) -> None:
+    tables = session.info.pop(_PENDING, None)
+    if not tables:
+        return
+    shard = random.randrange(SHARDS)
+    try:
+        with session.get_bind().begin() as connection:
+            _bump(connection, (f"{t}#{shard}" for t in tables))
+    except Exception:
+        # The data is committed; its readers catch up with the next bump
+        log.warning("could not bump %s after commit", ", ".join(sorted(tables)), exc_info=True)
+
+
+def _drop_pending(session: Session) -> None:
+    session.info.pop(_PENDING, None)
+
+
+def _rows(table: str) -> list[str]:
+    """The data_versions rows whose sum is `table`'s version."""
+    return [table] + [f"{table}#{i}" for i in range(SHARDS)] if table in HOT else [table]
+
+
+def _bump(connection: Any, tables: Iterable[str]) -> None:
+    now = datetime.utcnow().replace(microsecond=0)
+    for table in sorted(set(tables)):
+        result = connection.execute(
+            text(
+                "UPDATE data_versions SET version = version + 1, updated_at = :now "
+                "WHERE table_name = :t"
+            ),
+            {"t": table, "now": now},
+        )
+        if result.rowcount == 0:
+            connection.execute(
+                text(
+                    "INSERT INTO data_versions (table_name, version, updated_at) "
+                    "VALUES (:t, 1, :now)"
+                ),
+                {"t": table, "now": now},
+            )
+
+
+def current(*tables: str) -> dict[str, tuple[int, datetime | None]]:
+    """(version, updated_at) for each table; tables never written report (0, None)."""
+    stamps: dict[str, tuple[int, datetime | None]] = {t: (0, None) for t in tables}
+    owner = {row: t for t in tables for row in _rows(t)}
+    if tables:
+        rows = db.session.execute(
+            text(
+                "SELECT table_name, version, updated_at FROM data_versions "
+                "WHERE table_name IN :tables"
+            )
+            .bindparams(bindparam("tables", expanding=True))
+            .columns(table_name=String, version=BigInteger, updated_at=DateTime),
+            {"tables": list(owner)},
+        )
+        for row in rows:
+            table = owner[row.table_name]
+            version, updated_at = stamps[table]
+            if row.updated_at is not None and (updated_at is None or row.updated_at > updated_at):
+                updated_at = row.updated_at
+            stamps[table] = (version + int(row.version), updated_at)
+    return stamps
+
+
+def etag_from(stamps: dict[str, tuple[int, datetime | None]], *parts: Any) -> str:
+    """Strong ETag over version stamps plus anything else the response depends on."""
+    raw = "|".join(
+        [f"{t}:{v}" for t, (v, _) in sorted(stamps.items())] + [str(p) for p in parts]
+    )
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def etag_for(tables: Iterable[str], *parts: Any) -> str:
+    """etag_from() over the current versions of `tables`."""
+    return etag_from(current(*tables), *parts)
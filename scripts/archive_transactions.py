@@ -0,0 +1,111 @@
+"""Manage the monthly partitions of transactions and archive closed months.
+
+Usage:
+    python scripts/archive_transactions.py [--add-months N] [--before YYYY-MM | --keep-months N] [--list] [--verify] [--dir PATH]
+
+Examples:
+    # Create partitions through three months ahead (run monthly)
+    python scripts/archive_transactions.py --add-months 3
+
+    # Archive every month before January 2024
+    python scripts/archive_transactions.py --before 2024-01
+
+    # Keep the last 24 closed months live, archive the rest
+    python scripts/archive_transactions.py --keep-months 24
+
+    # Show partitions and archived months; check archive files against the manifest
+    python scripts/archive_transactions.py --list --verify
+
+Archived months are written to ARCHIVE_DIR (default: archive/) as gzip CSV with a
+manifest.json; reports read them back with history=full. Run one instance at a time,
+and run scripts/replay_lots.py first when the lot engine is in use.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import os
+from datetime import date, datetime
+from pathlib import Path
+
+# Add parent directory to path
+project_root = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, str(project_root))
+
+# Load environment variables from .env file
+from dotenv import load_dotenv
+env_path = project_root / ".env"
+if env_path.exists():
+    load_dotenv(env_path)
+else:
+    print("Warning: .env file not found. Make sure your database credentials are set in environment variables.")
+
+from app import archive, create_app
+
+
+def _month(value: str) -> date:
+    try:
+        return datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM, got {value!r}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Partition and archive the transactions table.")
+    parser.add_argument("--add-months", type=int, default=None, help="create monthly partitions through N months ahead")
+    cutoff = parser.add_mutually_exclusive_group()
+    cutoff.add_argument("--before", type=_month, default=None, help="archive closed months before YYYY-MM")
+    cutoff.add_argument("--keep-months", type=int, default=None, help="archive all but the last N closed months")
+    parser.add_argument("--list", action="store_true", help="show partitions and archived months")
+    parser.add_argument("--verify", action="store_true", help="check archive files against the manifest")
+    parser.add_argument("--dir", type=Path, default=None, help="archive directory (default: ARCHIVE_DIR)")
+    args = parser.parse_args()
+
+    if not any((args.add_months is not None, args.before, args.keep_months is not None, args.list, args.verify)):
+        parser.print_help()
+        sys.exit(1)
+
+    app = create_app()
+
+    with app.app_context():
+        directory = args.dir or archive.archive_dir()
+
+        if args.add_months is not None:
+            created = archive.add_future_months(args.add_months)
+            print(f"Created {len(created)} partition(s){': ' + ', '.join(created) if created else ''}")
+
+        before = args.before
+        if args.keep_months is not None:
+            before = archive.add_months(archive.month_start(date.today()), -args.keep_months)
+        if before is not None:
+            try:
+                entries = archive.archive_before(before, directory)
+            except archive.ArchiveError as exc:
+                print(f"Stopped: {exc}")
+                sys.exit(1)
+            for entry in entries:
+                print(f"Archived {entry['period']}: {entry['rows']} rows -> {entry['file']} ({entry['bytes']:,} bytes)")
+            if not entries:
+                print(f"No partitions before {before:%Y-%m} to archive")
+
+        if args.list:
+            print("Partitions:")
+            for p in archive.partitions():
+                print(f"  {p['name']:>9}  ~{p['est_rows']:,} rows")
+            print(f"Archived months in {directory}:")
+            for period, entry in sorted(archive.manifest(directory).items()):
+                state = "" if entry.get("dropped") else " (partition not dropped yet; re-run to finish)"
+                print(f"  {period}  {entry['rows']:,} rows  T_ID {entry['min_t_id']}-{entry['max_t_id']}  {entry['file']}{state}")
+
+        if args.verify:
+            problems = archive.verify(directory)
+            for problem in problems:
+                print(f"  {problem}")
+            print("Archive OK" if not problems else f"{len(problems)} problem(s) found")
+            if problems:
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
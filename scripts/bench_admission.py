@@ -0,0 +1,162 @@
+"""Load test: trade latency while the Portfolio Details report is being hammered.
+
+Usage:
+    python scripts/bench_admission.py <scratch_database> [trades] [report_threads] [ledger_rows]
+
+Examples:
+    # 400 trades from 4 traders while 16 threads request the report, on a 200k-trade ledger
+    python scripts/bench_admission.py findb_bench 400 16 200000
+
+Trades go through the trade form (POST /trade/create, synchronous Process_Trade; the
+scratch database needs sql/objects.sql). Each report request uses a different date
+range so neither the HTTP cache nor the fragment cache can answer it. Three runs:
+trades alone, trades under report load with admission control off, and the same with
+it on (the ADMISSION_* settings from config). For each it prints trade latency
+percentiles and how the report requests ended (200, or 503 when turned away).
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import date, timedelta
+
+from bench_utils import bench_app, grow_transactions, percentile, seed_ledger
+
+TRADERS = 4
+
+
+def _logged_in(app, user_id: int):
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["user_id"] = user_id
+        s["role"] = "manager"
+    return client
+
+
+def _trader(app, user_id: int, trades: list[dict], latencies: list[float], errors: Counter) -> None:
+    client = _logged_in(app, user_id)
+    for trade in trades:
+        started = time.perf_counter()
+        r = client.post("/trade/create", data={**trade, "idempotency_key": uuid.uuid4().hex})
+        latencies.append((time.perf_counter() - started) * 1000)
+        if r.status_code != 302:
+            errors[r.status_code] += 1
+
+
+def _reporter(app, user_id: int, seed: int, stop: threading.Event, outcomes: Counter) -> None:
+    client = _logged_in(app, user_id)
+    rng = random.Random(seed)
+    while not stop.is_set():
+        start = date(2022, 1, 1) + timedelta(days=rng.randrange(900))
+        r = client.get(f"/reports/portfolio-details?from={start}&to={start + timedelta(days=rng.randrange(30, 400))}")
+        outcomes[r.status_code] += 1
+        if r.status_code == 503:
+            # Honour Retry-After, as a browser retrying the page would
+            stop.wait(int(r.headers.get("Retry-After", "1")))
+
+
+def _run(app, user_id: int, trades: list[dict], report_threads: int) -> tuple[list[float], Counter, Counter, float]:
+    latencies: list[float] = []
+    errors: Counter = Counter()
+    outcomes: Counter = Counter()
+    stop = threading.Event()
+    reporters = [
+        threading.Thread(target=_reporter, args=(app, user_id, i, stop, outcomes)) for i in range(report_threads)
+    ]
+    for t in reporters:
+        t.start()
+    if report_threads:
+        # Let the report load build up before trading starts
+        time.sleep(2)
+
+    started = time.perf_counter()
+    traders = [
+        threading.Thread(target=_trader, args=(app, user_id, trades[i::TRADERS], latencies, errors))
+        for i in range(TRADERS)
+    ]
+    for t in traders:
+        t.start()
+    for t in traders:
+        t.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for t in reporters:
+        t.join()
+    return latencies, errors, outcomes, elapsed
+
+
+def run_benchmark(database: str, n_trades: int, report_threads: int, ledger_rows: int) -> None:
+    app = bench_app(database)
+    # The bench posts the trade form directly
+    app.config["WTF_CSRF_ENABLED"] = False
+
+    from sqlalchemy import text
+    from app import db
+
+    with app.app_context():
+        ids = seed_ledger()
+        grow_transactions(ledger_rows, ids)
+        db.session.execute(text("DELETE FROM trade_orders"))
+        db.session.execute(text("DELETE FROM users WHERE username = 'bench_admission'"))
+        e_id = db.session.execute(text("SELECT MIN(E_ID) FROM employees")).scalar()
+        db.session.execute(
+            text(
+                "INSERT INTO users (username, password_hash, role, E_ID, is_active) "
+                "VALUES ('bench_admission', '-', 'manager', :eid, 1)"
+            ),
+            {"eid": e_id},
+        )
+        db.session.commit()
+        user_id = db.session.execute(text("SELECT user_id FROM users WHERE username = 'bench_admission'")).scalar()
+        owners = list(db.session.execute(text("SELECT P_ID, C_ID, E_ID FROM portfolios")))
+
+    rng = random.Random(3)
+    controller = app.extensions.get("admission")
+    runs = [("trades alone", 0, controller), ("reports, admission off", report_threads, None)]
+    if controller is not None:
+        runs.append(("reports, admission on", report_threads, controller))
+    else:
+        print("ADMISSION_ENABLED is off; skipping the admission-on run")
+
+    print(f"{n_trades} trades from {TRADERS} traders, {report_threads} report threads, {ledger_rows:,}-trade ledger")
+    print(f"{'run':>24} | {'p50 ms':>7} | {'p95 ms':>7} | {'p99 ms':>7} | {'max ms':>7} | {'trades/s':>8} | {'failed':>6} | reports (status: count)")
+    for label, threads, admission in runs:
+        if admission is None:
+            app.extensions.pop("admission", None)
+        else:
+            app.extensions["admission"] = admission
+        trades = []
+        for _ in range(n_trades):
+            p_id, c_id, e_id = rng.choice(owners)
+            trades.append({
+                "user": f"C:{c_id}" if c_id is not None else f"E:{e_id}",
+                "p_id": p_id,
+                "product_id": rng.choice(ids["products"]),
+                "quantity": rng.randint(1, 200),
+                "price_per_unit": f"{rng.uniform(5, 500):.2f}",
+            })
+        latencies, errors, outcomes, elapsed = _run(app, user_id, trades, threads)
+        reports = ", ".join(f"{status}: {n}" for status, n in sorted(outcomes.items())) or "-"
+        print(
+            f"{label:>24} | {percentile(latencies, 50):>7.1f} | {percentile(latencies, 95):>7.1f} | "
+            f"{percentile(latencies, 99):>7.1f} | {max(latencies):>7.1f} | {n_trades / elapsed:>8.0f} | "
+            f"{sum(errors.values()):>6} | {reports}"
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    database = sys.argv[1]
+    n_trades = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    report_threads = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+    ledger_rows = int(sys.argv[4]) if len(sys.argv) > 4 else 200_000
+
+    run_benchmark(database, n_trades, report_threads, ledger_rows)
@@ -0,0 +1,116 @@
+"""Benchmark: customer detail page with its independent reads run one after another vs concurrently.
+
+Usage:
+    python scripts/bench_customer_view.py <scratch_database> [requests] [rtt_ms] [ledger_rows]
+
+Examples:
+    # 200 page loads per run, 2 ms added per statement, on a 200k-trade ledger
+    python scripts/bench_customer_view.py findb_bench 200 2 200000
+
+GET /customers/<id> needs five unrelated figures (age, net worth, holdings, sector
+allocation, lot P&L). Each page load picks a random customer. `rtt_ms` is slept
+before every SQL statement to stand in for the network round trip to a remote
+database, which is what concurrency hides; use 0 against a remote server. Two runs: CONCURRENT_READS
+off and on (the CONCURRENT_READ_* settings from config). For each it prints page
+latency percentiles and each read's mean duration from the concurrent_read_duration
+histogram, so the sum of the reads can be set against the page time.
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+import time
+
+from bench_utils import bench_app, grow_transactions, percentile, seed_ledger
+
+
+def _read_means(histogram, view: str) -> dict[str, tuple[float, int]]:
+    """{read: (total seconds, count)} for one view from the histogram's samples."""
+    totals: dict[str, list[float]] = {}
+    for name, labels, value in histogram.samples():
+        if labels[0] != view:
+            continue
+        if name.endswith("_sum"):
+            totals.setdefault(labels[1], [0.0, 0])[0] = value
+        elif name.endswith("_count"):
+            totals.setdefault(labels[1], [0.0, 0])[1] = value
+    return {read: (s, int(n)) for read, (s, n) in totals.items()}
+
+
+def run_benchmark(database: str, n_requests: int, rtt_ms: float, ledger_rows: int) -> None:
+    app = bench_app(database)
+
+    from sqlalchemy import event, text
+    from app import db, parallel
+
+    with app.app_context():
+        ids = seed_ledger()
+        grow_transactions(ledger_rows, ids)
+        db.session.execute(text("DELETE FROM users WHERE username = 'bench_customer_view'"))
+        e_id = db.session.execute(text("SELECT MIN(E_ID) FROM employees")).scalar()
+        db.session.execute(
+            text(
+                "INSERT INTO users (username, password_hash, role, E_ID, is_active) "
+                "VALUES ('bench_customer_view', '-', 'manager', :eid, 1)"
+            ),
+            {"eid": e_id},
+        )
+        db.session.commit()
+        user_id = db.session.execute(text("SELECT user_id FROM users WHERE username = 'bench_customer_view'")).scalar()
+        customers = list(ids["customers"])
+        engine = db.engine
+
+    if rtt_ms > 0:
+        @event.listens_for(engine, "before_cursor_execute")
+        def _round_trip(*_args) -> None:
+            time.sleep(rtt_ms / 1000)
+
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["user_id"] = user_id
+        s["role"] = "manager"
+
+    view = "customers.view"
+    print(
+        f"{n_requests} page loads per run, {rtt_ms:g} ms per statement, {ledger_rows:,}-trade ledger, "
+        f"{app.config['CONCURRENT_READ_WORKERS']} pool threads"
+    )
+    print(f"{'run':>16} | {'p50 ms':>7} | {'p95 ms':>7} | {'max ms':>7} | {'failed':>6} | mean ms per read")
+    for label, concurrent in (("sequential", False), ("concurrent", True)):
+        app.config["CONCURRENT_READS"] = concurrent
+        rng = random.Random(11)
+        # Warm the pool and the caches the page shares with other views
+        client.get(f"/customers/{customers[0]}")
+        before = _read_means(parallel.READ_SECONDS, view)
+        latencies: list[float] = []
+        failed = 0
+        for _ in range(n_requests):
+            started = time.perf_counter()
+            r = client.get(f"/customers/{rng.choice(customers)}")
+            latencies.append((time.perf_counter() - started) * 1000)
+            if r.status_code != 200:
+                failed += 1
+        after = _read_means(parallel.READ_SECONDS, view)
+        reads = []
+        for read, (total, count) in sorted(after.items()):
+            prev_total, prev_count = before.get(read, (0.0, 0))
+            if count > prev_count:
+                reads.append(f"{read} {(total - prev_total) / (count - prev_count) * 1000:.1f}")
+        print(
+            f"{label:>16} | {percentile(latencies, 50):>7.1f} | {percentile(latencies, 95):>7.1f} | "
+            f"{max(latencies):>7.1f} | {failed:>6} | {', '.join(reads) or '-'}"
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    database = sys.argv[1]
+    n_requests = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rtt_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 2.0
+    ledger_rows = int(sys.argv[4]) if len(sys.argv) > 4 else 200_000
+
+    run_benchmark(database, n_requests, rtt_ms, ledger_rows)
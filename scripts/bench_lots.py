@@ -0,0 +1,58 @@
+"""Benchmark a full FIFO lot replay: throughput and peak memory at growing ledger sizes.
+
+Usage:
+    python scripts/bench_lots.py <scratch_database> [sizes] [max_positions]
+
+Examples:
+    # Replay 1M and then 10M trades with at most 100k positions in memory
+    python scripts/bench_lots.py findb_bench 1000000,10000000 100000
+
+Every third trade is turned into a sell so FIFO matching and realized P&L are
+exercised. The scratch database is created if missing and its ledger is overwritten.
+"""
+
+from __future__ import annotations
+
+import resource
+import sys
+
+from bench_utils import bench_app, grow_transactions, seed_ledger
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_benchmark(database: str, sizes: list[int], max_positions: int) -> None:
+    app = bench_app(database)
+
+    from sqlalchemy import text
+    from app import db, lots
+
+    with app.app_context():
+        ids = seed_ledger()
+        print(f"{'transactions':>12} | {'seconds':>8} | {'trades/s':>9} | {'open lots':>10} | {'peak RSS MB':>11}")
+        for size in sizes:
+            count = grow_transactions(size, ids)
+            db.session.execute(text("UPDATE transactions SET quantity = -quantity WHERE MOD(T_ID, 3) = 0 AND quantity > 0"))
+            db.session.commit()
+
+            lots.rebuild()
+            db.session.commit()
+            stats = lots.LotEngine(max_positions=max_positions, settle_seconds=0).run()
+            open_lots = db.session.execute(text("SELECT COUNT(*) FROM open_lots")).scalar()
+            rate = stats["trades"] / stats["seconds"] if stats["seconds"] else 0
+            print(f"{count:>12} | {stats['seconds']:>8.1f} | {rate:>9,.0f} | {open_lots:>10} | {_peak_rss_mb():>11.0f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    database = sys.argv[1]
+    sizes = [int(s) for s in sys.argv[2].split(",")] if len(sys.argv) > 2 else [1_000_000, 10_000_000]
+    max_positions = int(sys.argv[3]) if len(sys.argv) > 3 else 100_000
+
+    run_benchmark(database, sorted(sizes), max_positions)
@@ -0,0 +1,135 @@
+"""Benchmark trade throughput: synchronous Process_Trade per request vs the order queue.
+
+Usage:
+    python scripts/bench_order_queue.py <scratch_database> [orders] [batch_sizes]
+
+Examples:
+    # 5,000 trades each way, writer batches of 1, 50 and 500
+    python scripts/bench_order_queue.py findb_bench 5000 1,50,500
+
+The synchronous path is what trade/create does without TRADE_QUEUE: one CALL
+Process_Trade and one commit per trade (the scratch database needs sql/objects.sql).
+The queued path times intake (one small commit per order) and the writer draining
+the queue in group commits, then checks that every order produced exactly one trade
+and that resubmitting keys creates nothing.
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+import time
+import uuid
+from decimal import Decimal
+
+from bench_utils import bench_app, seed_ledger
+
+
+def _make_orders(n: int, ids: dict[str, list[int]], owners: dict[int, bool], seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    orders = []
+    for _ in range(n):
+        p_id = rng.choice(ids["portfolios"])
+        orders.append({
+            "key": uuid.uuid4().hex,
+            "p_id": p_id,
+            "product_id": rng.choice(ids["products"]),
+            "quantity": rng.randint(1, 200),
+            "ppu": Decimal(str(round(rng.uniform(5, 500), 2))),
+            "rate": Decimal("0.20") if owners[p_id] else Decimal("0.10"),
+        })
+    return orders
+
+
+def run_benchmark(database: str, n_orders: int, batch_sizes: list[int]) -> None:
+    app = bench_app(database)
+
+    from sqlalchemy import text
+    from sqlalchemy.exc import DBAPIError
+    from app import db, orders, versions
+
+    with app.app_context():
+        ids = seed_ledger()
+        db.session.execute(text("DELETE FROM trade_orders"))
+        db.session.execute(text("DELETE FROM users WHERE username = 'bench_orders'"))
+        e_id = db.session.execute(text("SELECT MIN(E_ID) FROM employees")).scalar()
+        db.session.execute(
+            text(
+                "INSERT INTO users (username, password_hash, role, E_ID, is_active) "
+                "VALUES ('bench_orders', '-', 'manager', :eid, 1)"
+            ),
+            {"eid": e_id},
+        )
+        db.session.commit()
+        user_id = db.session.execute(text("SELECT user_id FROM users WHERE username = 'bench_orders'")).scalar()
+        owners = {
+            row.P_ID: row.C_ID is not None
+            for row in db.session.execute(text("SELECT P_ID, C_ID FROM portfolios"))
+        }
+
+        def trade_count() -> int:
+            return db.session.execute(text("SELECT COUNT(*) FROM transactions")).scalar()
+
+        print(f"{n_orders} trades per run")
+        print(f"{'path':>18} | {'trades/s':>9} | {'seconds':>8} | check")
+
+        # Synchronous: one procedure call and one commit per trade
+        sync_orders = _make_orders(n_orders, ids, owners, seed=1)
+        before = trade_count()
+        started = time.perf_counter()
+        try:
+            for o in sync_orders:
+                db.session.execute(
+                    text("CALL Process_Trade(:p_id, :product_id, :qty, :ppu, :comm)"),
+                    {"p_id": o["p_id"], "product_id": o["product_id"], "qty": o["quantity"], "ppu": o["ppu"], "comm": o["rate"]},
+                )
+                versions.bump("transactions")
+                db.session.commit()
+            elapsed = time.perf_counter() - started
+            added = trade_count() - before
+            print(f"{'sync':>18} | {n_orders / elapsed:>9.0f} | {elapsed:>8.2f} | {added == n_orders}")
+        except DBAPIError as exc:
+            db.session.rollback()
+            print(f"{'sync':>18} | skipped: {exc.orig}")
+
+        for i, batch in enumerate(batch_sizes):
+            queued = _make_orders(n_orders, ids, owners, seed=100 + i)
+
+            started = time.perf_counter()
+            for o in queued:
+                orders.submit(user_id, o["key"], o["p_id"], o["product_id"], o["quantity"], o["ppu"], o["rate"])
+                db.session.commit()
+            intake = time.perf_counter() - started
+
+            # Double submits must not add orders
+            for o in queued[:100]:
+                orders.submit(user_id, o["key"], o["p_id"], o["product_id"], o["quantity"], o["ppu"], o["rate"])
+                db.session.commit()
+
+            before = trade_count()
+            started = time.perf_counter()
+            executed = failed = 0
+            while True:
+                counts = orders.drain(batch)
+                if counts["executed"] + counts["failed"] == 0:
+                    break
+                executed += counts["executed"]
+                failed += counts["failed"]
+            drain = time.perf_counter() - started
+            added = trade_count() - before
+
+            ok = added == executed == n_orders and failed == 0
+            print(f"{'intake':>18} | {n_orders / intake:>9.0f} | {intake:>8.2f} |")
+            print(f"{f'writer batch={batch}':>18} | {n_orders / drain:>9.0f} | {drain:>8.2f} | {ok}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    database = sys.argv[1]
+    n_orders = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+    batch_sizes = [int(s) for s in sys.argv[3].split(",")] if len(sys.argv) > 3 else [1, 50, 500]
+
+    run_benchmark(database, n_orders, batch_sizes)
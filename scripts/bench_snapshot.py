@@ -0,0 +1,126 @@
+"""Benchmark the snapshot analytics (app/analytics.py) on synthetic ledgers.
+
+Usage:
+    python scripts/bench_snapshot.py [sizes] [portfolios] [snapshot_dir]
+
+Examples:
+    # 10M and 50M trades over 100k portfolios, snapshots written to a temp directory
+    python scripts/bench_snapshot.py 10000000,50000000 100000
+
+No database is involved: the ledger is generated straight into snapshot files with
+the same writer the export uses (sorting by portfolio included), so the timings are
+those an analyst sees on an exported snapshot. Each report is timed after one
+warm-up call (pages cached), and the per-portfolio totals are checked against
+np.bincount.
+"""
+
+from __future__ import annotations
+
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+from bench_utils import time_call
+
+from app import analytics, snapshot
+
+CHUNK = 5_000_000
+
+
+def build(target: Path, n_trades: int, n_portfolios: int, n_products: int = 2_000, seed: int = 7) -> float:
+    """Write a synthetic snapshot; returns the seconds spent sorting and linking."""
+    rng = np.random.default_rng(seed)
+    tmp = target.with_name(target.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    portfolio_ids = np.arange(1, n_portfolios + 1, dtype=np.int32)
+    employee_owned = portfolio_ids % 5 == 0
+    snapshot.write_table(tmp / "portfolios", {
+        "p_id": portfolio_ids,
+        "c_id": np.where(employee_owned, -1, portfolio_ids).astype(np.int32),
+        "e_id": (portfolio_ids % 50 + 1).astype(np.int32),
+        "creation_date": np.full(n_portfolios, np.datetime64("2020-01-01", "D")),
+        "name": [f"Portfolio {i}" for i in portfolio_ids],
+        "currency": list(rng.choice(["USD", "INR", "EUR", "GBP", "JPY"], n_portfolios)),
+        "risk_level": list(rng.choice(["low", "medium", "high"], n_portfolios)),
+        "owner_name": [f"Owner {i % 10_000}" for i in portfolio_ids],
+    })
+    product_ids = np.arange(1, n_products + 1, dtype=np.int32)
+    snapshot.write_table(tmp / "products", {
+        "product_id": product_ids,
+        "current_price_cents": rng.integers(500, 50_000, n_products),
+        "name": [f"Product {i}" for i in product_ids],
+        "ticker": [f"B{i:05d}" for i in product_ids],
+        "sector": list(rng.choice(["Tech", "Finance", "Healthcare", "Energy", "Other"], n_products)),
+    })
+
+    columns = snapshot.allocate_transactions(tmp / "_unsorted", n_trades)
+    start = np.datetime64("2022-01-01T00:00:00", "s")
+    for lo in range(0, n_trades, CHUNK):
+        hi = min(lo + CHUNK, n_trades)
+        n = hi - lo
+        quantity = rng.integers(1, 200, n)
+        price = rng.integers(500, 50_000, n)
+        columns["t_id"][lo:hi] = np.arange(lo + 1, hi + 1)
+        columns["p_id"][lo:hi] = rng.integers(1, n_portfolios + 1, n)
+        columns["product_id"][lo:hi] = rng.integers(1, n_products + 1, n)
+        columns["quantity"][lo:hi] = quantity
+        columns["price_cents"][lo:hi] = price
+        columns["value_cents"][lo:hi] = quantity * price
+        columns["fee_cents"][lo:hi] = quantity * price // 5
+        columns["transaction_date"][lo:hi] = start + np.sort(rng.integers(0, 90_000_000, n))
+
+    started = time.perf_counter()
+    linked = snapshot.link_transactions(tmp, columns)
+    linking = time.perf_counter() - started
+    del columns
+    shutil.rmtree(tmp / "_unsorted")
+    snapshot.publish(tmp, target, {
+        "exported_at": "synthetic",
+        "source": "bench_snapshot",
+        "max_t_id": n_trades,
+        "rows": {"transactions": linked["kept"], "portfolios": n_portfolios, "products": n_products},
+        "orphan_trades": linked["dropped"],
+        "data_versions": {},
+    })
+    return linking
+
+
+def run_benchmark(sizes: list[int], n_portfolios: int, directory: Path) -> None:
+    print(f"{'trades':>11} | {'sort s':>6} | {'details 1 pf':>12} | {'top (avg)':>9} | {'top p90':>8} | {'summary':>8} | {'summary 2024':>12} | check")
+    for size in sizes:
+        target = directory / f"bench_{size}"
+        linking = build(target, size, n_portfolios)
+        snap = snapshot.Snapshot(target)
+
+        totals = analytics.portfolio_totals(snap)
+        p_ids = snap.column("transactions", "p_id")
+        expected = np.bincount(p_ids, weights=snap.column("transactions", "value_cents"), minlength=n_portfolios + 1)[1:]
+        ok = bool(np.allclose(totals["value_cents"], expected, rtol=1e-12))
+
+        timings = [
+            time_call(lambda: analytics.portfolio_details(snap, [n_portfolios // 2])),
+            time_call(lambda: analytics.top_portfolios(snap)),
+            time_call(lambda: analytics.top_portfolios(snap, top=20, percentile=90)),
+            time_call(lambda: analytics.performance_summary(snap)),
+            time_call(lambda: analytics.performance_summary(snap, date(2024, 1, 1), date(2025, 1, 1))),
+        ]
+        ms = [f"{t['median']:.0f} ms" for t in timings]
+        print(f"{size:>11,} | {linking:>6.1f} | {ms[0]:>12} | {ms[1]:>9} | {ms[2]:>8} | {ms[3]:>8} | {ms[4]:>12} | {ok}")
+        del snap, totals, p_ids
+        shutil.rmtree(target)
+
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1].split(",")] if len(sys.argv) > 1 else [10_000_000, 50_000_000]
+    n_portfolios = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    if len(sys.argv) > 3:
+        run_benchmark(sorted(sizes), n_portfolios, Path(sys.argv[3]))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            run_benchmark(sorted(sizes), n_portfolios, Path(tmp))
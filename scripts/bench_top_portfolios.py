@@ -0,0 +1,87 @@
+"""Benchmark the top-portfolios-by-value report: legacy nested query vs window rewrite.
+
+Usage:
+    python scripts/bench_top_portfolios.py <scratch_database> [sizes] [repeat]
+
+Examples:
+    # Time both queries at 10k, 100k and 1M transactions
+    python scripts/bench_top_portfolios.py findb_bench 10000,100000,1000000
+
+    # Fewer sizes, more repetitions
+    python scripts/bench_top_portfolios.py findb_bench 50000 10
+
+The scratch database is created if missing and its ledger tables are overwritten.
+"""
+
+from __future__ import annotations
+
+import sys
+
+from bench_utils import bench_app, grow_transactions, seed_ledger, time_call
+
+# The report as it shipped before the window-function rewrite
+LEGACY_SQL = """
+SELECT
+  p.P_ID AS portfolio_id,
+  p.P_name AS portfolio_name,
+  COALESCE(CONCAT(c.first_name, ' ', c.last_name), e.E_name) AS owner_name,
+  p.currency,
+  COALESCE(SUM(t.quantity * t.price_per_unit), 0) AS total_value
+FROM portfolios p
+LEFT JOIN customers c ON p.C_ID = c.C_ID
+LEFT JOIN employees e ON p.E_ID = e.E_ID
+LEFT JOIN transactions t ON t.P_ID = p.P_ID
+GROUP BY p.P_ID, p.P_name, owner_name, p.currency
+HAVING COALESCE(SUM(t.quantity * t.price_per_unit), 0) > (
+  SELECT AVG(portfolio_value)
+  FROM (
+    SELECT SUM(t2.quantity * t2.price_per_unit) AS portfolio_value
+    FROM portfolios p2
+    JOIN transactions t2 ON t2.P_ID = p2.P_ID
+    GROUP BY p2.P_ID
+  ) AS avg_values
+)
+ORDER BY total_value DESC
+"""
+
+
+def run_benchmark(database: str, sizes: list[int], repeat: int) -> None:
+    """Grow the ledger through each size and time both queries at every step."""
+    app = bench_app(database)
+
+    from sqlalchemy import text
+    from app import db
+    from app.routes.reports import build_top_portfolios_query
+
+    with app.app_context():
+        ids = seed_ledger()
+        window_sql, window_params = build_top_portfolios_query()
+        top_sql, top_params = build_top_portfolios_query(top=20, percentile=90)
+
+        print(f"{'transactions':>12} | {'legacy ms':>10} | {'window ms':>10} | {'top20/p90 ms':>12} | {'speedup':>7} | same rows")
+        for size in sizes:
+            count = grow_transactions(size, ids)
+
+            legacy_ids = [r.portfolio_id for r in db.session.execute(text(LEGACY_SQL))]
+            window_ids = [r.portfolio_id for r in db.session.execute(window_sql, window_params)]
+
+            legacy = time_call(lambda: db.session.execute(text(LEGACY_SQL)).all(), repeat)
+            window = time_call(lambda: db.session.execute(window_sql, window_params).all(), repeat)
+            top = time_call(lambda: db.session.execute(top_sql, top_params).all(), repeat)
+            speedup = legacy["median"] / window["median"] if window["median"] else float("inf")
+            print(
+                f"{count:>12} | {legacy['median']:>10.1f} | {window['median']:>10.1f} | "
+                f"{top['median']:>12.1f} | {speedup:>6.2f}x | {sorted(legacy_ids) == sorted(window_ids)}"
+            )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    database = sys.argv[1]
+    sizes = [int(s) for s in sys.argv[2].split(",")] if len(sys.argv) > 2 else [10_000, 100_000, 1_000_000]
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    run_benchmark(database, sorted(sizes), repeat)
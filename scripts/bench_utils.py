@@ -0,0 +1,172 @@
+"""Shared helpers for the benchmark scripts in this folder.
+
+Benchmarks never run against the primary database: they take an explicit scratch
+database name, create it if needed, and fill it with a synthetic ledger.
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable
+
+# Add parent directory to path
+project_root = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, str(project_root))
+
+# Load environment variables from .env file
+from dotenv import load_dotenv
+env_path = project_root / ".env"
+if env_path.exists():
+    load_dotenv(env_path)
+else:
+    print("Warning: .env file not found. Make sure your database credentials are set in environment variables.")
+
+CHUNK = 10_000
+
+
+def bench_app(database: str):
+    """Create the app bound to a scratch database (created if missing)."""
+    primary = os.getenv("DB_NAME", "financial_platform_db")
+    if database == primary:
+        print(f"Error: refusing to benchmark against the primary database '{primary}'.")
+        sys.exit(1)
+
+    import pymysql
+
+    conn = pymysql.connect(
+        host=os.getenv("DB_HOST", "127.0.0.1"),
+        port=int(os.getenv("DB_PORT", "3306")),
+        user=os.getenv("DB_USER", "root"),
+        password=os.getenv("DB_PASSWORD", ""),
+    )
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE DATABASE IF NOT EXISTS `{database}`")
+    conn.close()
+
+    # Config reads the environment at import time
+    os.environ["DB_NAME"] = database
+    from app import create_app
+
+    return create_app()
+
+
+def seed_ledger(n_portfolios: int = 1_000, n_products: int = 200, seed: int = 42) -> dict[str, list[int]]:
+    """Reset the scratch database to owners, products and empty portfolios; returns their IDs."""
+    from sqlalchemy import text
+    from app import db
+
+    rng = random.Random(seed)
+    db.session.execute(text("SET FOREIGN_KEY_CHECKS = 0"))
+    for table in ("transactions", "portfolios", "products", "customers", "employees"):
+        db.session.execute(text(f"DELETE FROM {table}"))
+    db.session.execute(text("SET FOREIGN_KEY_CHECKS = 1"))
+
+    db.session.execute(
+        text("INSERT INTO employees (E_name, job_title) VALUES (:name, 'Advisor')"),
+        [{"name": f"Advisor {i}"} for i in range(max(n_portfolios // 20, 1))],
+    )
+    db.session.execute(
+        text("INSERT INTO customers (first_name, last_name) VALUES (:first, :last)"),
+        [{"first": f"Client{i}", "last": f"Bench{i % 97}"} for i in range(n_portfolios)],
+    )
+    db.session.execute(
+        text(
+            "INSERT INTO products (Product_name, ticker_symbol, current_price, sector) "
+            "VALUES (:name, :ticker, :price, :sector)"
+        ),
+        [
+            {
+                "name": f"Product {i}",
+                "ticker": f"B{i:05d}",
+                "price": round(rng.uniform(5, 500), 2),
+                "sector": rng.choice(["Tech", "Finance", "Healthcare", "Energy", "Other"]),
+            }
+            for i in range(n_products)
+        ],
+    )
+    customer_ids = list(db.session.execute(text("SELECT C_ID FROM customers")).scalars())
+    employee_ids = list(db.session.execute(text("SELECT E_ID FROM employees")).scalars())
+    product_ids = list(db.session.execute(text("SELECT Product_ID FROM products")).scalars())
+
+    portfolios = []
+    for i in range(n_portfolios):
+        # Roughly one in five portfolios is employee-owned
+        employee_owned = i % 5 == 0
+        portfolios.append({
+            "name": f"Portfolio {i}",
+            "cid": None if employee_owned else rng.choice(customer_ids),
+            "eid": rng.choice(employee_ids),
+            "created": date(2020, 1, 1) + timedelta(days=rng.randrange(1500)),
+            "risk": rng.choice(["low", "medium", "high"]),
+            "currency": rng.choice(["USD", "INR", "EUR", "GBP", "JPY"]),
+        })
+    db.session.execute(
+        text(
+            "INSERT INTO portfolios (P_name, C_ID, E_ID, creation_date, risk_level, currency) "
+            "VALUES (:name, :cid, :eid, :created, :risk, :currency)"
+        ),
+        portfolios,
+    )
+    db.session.commit()
+    portfolio_ids = list(db.session.execute(text("SELECT P_ID FROM portfolios")).scalars())
+    return {"portfolios": portfolio_ids, "products": product_ids, "customers": customer_ids}
+
+
+def grow_transactions(target: int, ids: dict[str, list[int]], seed: int = 7) -> int:
+    """Append random trades until the transactions table holds `target` rows; returns the new count."""
+    from sqlalchemy import text
+    from app import db
+
+    rng = random.Random(seed + target)
+    current = db.session.execute(text("SELECT COUNT(*) FROM transactions")).scalar() or 0
+    start = datetime(2022, 1, 1)
+    while current < target:
+        batch = min(CHUNK, target - current)
+        rows = []
+        for _ in range(batch):
+            qty = rng.randint(1, 200)
+            ppu = round(rng.uniform(5, 500), 2)
+            rows.append({
+                "pid": rng.choice(ids["portfolios"]),
+                "prod": rng.choice(ids["products"]),
+                "qty": qty,
+                "ppu": ppu,
+                "at": start + timedelta(minutes=rng.randrange(1_500_000)),
+                "fee": round(qty * ppu * 0.2, 2) if qty * ppu * 0.2 < 1_000_000 else 999_999.99,
+            })
+        db.session.execute(
+            text(
+                "INSERT INTO transactions (P_ID, Product_ID, quantity, price_per_unit, transaction_date, commission_fee) "
+                "VALUES (:pid, :prod, :qty, :ppu, :at, :fee)"
+            ),
+            rows,
+        )
+        db.session.commit()
+        current += batch
+    return current
+
+
+def time_call(fn: Callable[[], Any], repeat: int = 5) -> dict[str, float]:
+    """Run fn `repeat` times after one warm-up call; returns min/median/max in milliseconds."""
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {"min": min(samples), "median": statistics.median(samples), "max": max(samples)}
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
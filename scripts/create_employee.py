@@ -27,7 +27,7 @@ if env_path.exists():
 else:
     print("Warning: .env file not found. Make sure your database credentials are set in environment variables.")
 
-from app import create_app, db
+from app import create_app, db, hierarchy
 from app.models import Employee
 
 
@@ -55,6 +55,8 @@ def create_employee(employee_name: str, job_title: str | None = None, hire_date:
         )
         
         db.session.add(employee)
+        db.session.flush()
+        hierarchy.add_employee(employee.e_id, None)
         db.session.commit()
         
         print(f"Successfully created employee '{employee_name}' with ID {employee.e_id}")
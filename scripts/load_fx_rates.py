@@ -0,0 +1,64 @@
+"""Helper script to load FX rates from a local CSV feed.
+
+Usage:
+    python scripts/load_fx_rates.py <feed.csv>
+
+The feed needs a header row and one rate per currency per day:
+
+    date,currency,rate
+    2024-06-03,INR,0.01198
+    2024-06-03,EUR,1.0841
+
+`rate` is units of the base currency (BASE_CURRENCY, default USD) per one unit of
+`currency`. Existing (currency, date) rows are overwritten.
+
+Examples:
+    python scripts/load_fx_rates.py feeds/fx_2024-06.csv
+"""
+
+from __future__ import annotations
+
+import sys
+import os
+from pathlib import Path
+
+# Add parent directory to path
+project_root = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, str(project_root))
+
+# Load environment variables from .env file
+from dotenv import load_dotenv
+env_path = project_root / ".env"
+if env_path.exists():
+    load_dotenv(env_path)
+else:
+    print("Warning: .env file not found. Make sure your database credentials are set in environment variables.")
+
+from app import create_app, db, fx
+
+
+def load_fx_rates(path: str) -> None:
+    """Upsert every rate in the feed in a single transaction."""
+    if not os.path.exists(path):
+        print(f"Error: Feed file '{path}' not found")
+        return
+
+    app = create_app()
+
+    with app.app_context():
+        try:
+            count = fx.load_feed(path)
+        except (KeyError, ValueError, ArithmeticError) as exc:
+            db.session.rollback()
+            print(f"Error: Could not parse feed '{path}': {exc}")
+            return
+        db.session.commit()
+        print(f"Loaded {count} FX rates (base currency {fx.base_currency()}) from '{path}'")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    load_fx_rates(sys.argv[1])
@@ -0,0 +1,66 @@
+"""Helper script to load daily closes into price_history from a local CSV feed.
+
+Usage:
+    python scripts/load_price_history.py <feed.csv>
+
+The feed needs a header row and one close per product (by ticker) per day:
+
+    date,ticker,close
+    2024-06-03,ACME,184.2300
+    2024-06-03,SPY,527.8000
+
+Existing (product, date) rows are overwritten. Rows are committed in chunks of 5000,
+so an interrupted load can simply be run again. Tickers with no product are skipped
+and listed at the end.
+
+Examples:
+    python scripts/load_price_history.py feeds/closes_2019-2024.csv
+"""
+
+from __future__ import annotations
+
+import sys
+import os
+from pathlib import Path
+
+# Add parent directory to path
+project_root = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, str(project_root))
+
+# Load environment variables from .env file
+from dotenv import load_dotenv
+env_path = project_root / ".env"
+if env_path.exists():
+    load_dotenv(env_path)
+else:
+    print("Warning: .env file not found. Make sure your database credentials are set in environment variables.")
+
+from app import create_app, db, risk
+
+
+def load_price_history(path: str) -> None:
+    """Upsert every close in the feed, a chunk per transaction."""
+    if not os.path.exists(path):
+        print(f"Error: Feed file '{path}' not found")
+        return
+
+    app = create_app()
+
+    with app.app_context():
+        try:
+            count, unknown = risk.load_feed(path)
+        except (KeyError, ValueError, ArithmeticError) as exc:
+            db.session.rollback()
+            print(f"Error: Could not parse feed '{path}': {exc}")
+            return
+        print(f"Loaded {count} closes from '{path}'")
+        if unknown:
+            print(f"Skipped unknown tickers: {', '.join(unknown)}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    load_price_history(sys.argv[1])
@@ -0,0 +1,67 @@
+"""Helper script to ingest intraday price ticks from a local CSV feed.
+
+Usage:
+    python scripts/load_price_ticks.py <feed.csv>
+
+The feed needs a header row and one row per tick; volume is optional:
+
+    time,ticker,price,volume
+    2024-06-03T13:30:00.125,ACME,184.2300,200
+    2024-06-03T13:30:00.480,ACME,184.2500,50
+
+Each tick is stored and folded into its 1m, 1h and 1d OHLC bars (app/price_series.py).
+Ticks are committed in chunks of 5000; ticks may arrive in any order. Tickers with no
+product are skipped and listed at the end. Loading the same feed twice stores its
+ticks twice, so resume an interrupted load from the first uncommitted row.
+
+Examples:
+    python scripts/load_price_ticks.py feeds/ticks_2024-06-03.csv
+"""
+
+from __future__ import annotations
+
+import sys
+import os
+from pathlib import Path
+
+# Add parent directory to path
+project_root = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, str(project_root))
+
+# Load environment variables from .env file
+from dotenv import load_dotenv
+env_path = project_root / ".env"
+if env_path.exists():
+    load_dotenv(env_path)
+else:
+    print("Warning: .env file not found. Make sure your database credentials are set in environment variables.")
+
+from app import create_app, db, price_series
+
+
+def load_price_ticks(path: str) -> None:
+    """Ingest every tick in the feed, a chunk per transaction."""
+    if not os.path.exists(path):
+        print(f"Error: Feed file '{path}' not found")
+        return
+
+    app = create_app()
+
+    with app.app_context():
+        try:
+            count, unknown = price_series.load_feed(path)
+        except (KeyError, ValueError, ArithmeticError) as exc:
+            db.session.rollback()
+            print(f"Error: Could not parse feed '{path}': {exc}")
+            return
+        print(f"Ingested {count} ticks from '{path}'")
+        if unknown:
+            print(f"Skipped unknown tickers: {', '.join(unknown)}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    load_price_ticks(sys.argv[1])
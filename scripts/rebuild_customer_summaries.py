@@ -0,0 +1,72 @@
+"""Helper script to rebuild or verify the per-customer summaries.
+
+Usage:
+    python scripts/rebuild_customer_summaries.py [--check]
+
+Examples:
+    # Recompute customer_summaries from customers, portfolios and transactions
+    python scripts/rebuild_customer_summaries.py
+
+    # Only compare the summaries with the ledger and list differing customers
+    python scripts/rebuild_customer_summaries.py --check
+
+Run it once after sql/migration_customer_summaries.sql; the outbox dispatcher
+(scripts/run_outbox_dispatcher.py) keeps the rows current from then on.
+"""
+
+from __future__ import annotations
+
+import sys
+import os
+from pathlib import Path
+
+# Add parent directory to path
+project_root = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, str(project_root))
+
+# Load environment variables from .env file
+from dotenv import load_dotenv
+env_path = project_root / ".env"
+if env_path.exists():
+    load_dotenv(env_path)
+else:
+    print("Warning: .env file not found. Make sure your database credentials are set in environment variables.")
+
+from app import create_app, db, summaries
+
+
+def check_summaries() -> bool:
+    """Print customers whose summary and the ledger disagree; returns True when consistent."""
+    app = create_app()
+
+    with app.app_context():
+        mismatches = summaries.check()
+        if not mismatches:
+            print("customer_summaries matches the ledger")
+            return True
+        print(f"customer_summaries differs for {len(mismatches)} customer(s):")
+        for m in mismatches:
+            print(f"  C_ID {m['c_id']}: stored={m['stored']} live={m['live']}")
+        print("Run without --check to rebuild it.")
+        return False
+
+
+def rebuild_summaries() -> None:
+    """Recompute every summary row in a single transaction."""
+    app = create_app()
+
+    with app.app_context():
+        rows = summaries.rebuild()
+        db.session.commit()
+        print(f"Rebuilt customer_summaries for {rows} customers")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] not in ("--check",):
+        print(__doc__)
+        sys.exit(1)
+
+    if len(sys.argv) > 1:
+        sys.exit(0 if check_summaries() else 1)
+
+    rebuild_summaries()
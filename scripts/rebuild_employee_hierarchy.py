@@ -0,0 +1,70 @@
+"""Helper script to rebuild or verify the employee hierarchy closure table.
+
+Usage:
+    python scripts/rebuild_employee_hierarchy.py [--check]
+
+Examples:
+    # Recompute employee_hierarchy from employees.manager_id
+    python scripts/rebuild_employee_hierarchy.py
+
+    # Only report differences between employee_hierarchy and employees.manager_id
+    python scripts/rebuild_employee_hierarchy.py --check
+"""
+
+from __future__ import annotations
+
+import sys
+import os
+from pathlib import Path
+
+# Add parent directory to path
+project_root = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, str(project_root))
+
+# Load environment variables from .env file
+from dotenv import load_dotenv
+env_path = project_root / ".env"
+if env_path.exists():
+    load_dotenv(env_path)
+else:
+    print("Warning: .env file not found. Make sure your database credentials are set in environment variables.")
+
+from app import create_app, db, hierarchy
+
+
+def check_hierarchy() -> bool:
+    """Print closure table discrepancies; returns True when consistent."""
+    app = create_app()
+
+    with app.app_context():
+        result = hierarchy.check()
+        if not any(result.values()):
+            print("employee_hierarchy is consistent with employees.manager_id")
+            return True
+        print("employee_hierarchy is out of date:")
+        print(f"  missing pairs:     {result['missing']}")
+        print(f"  extra pairs:       {result['extra']}")
+        print(f"  wrong depth pairs: {result['wrong_depth']}")
+        print("Run without --check to rebuild it.")
+        return False
+
+
+def rebuild_hierarchy() -> None:
+    """Recompute the closure table in a single transaction."""
+    app = create_app()
+
+    with app.app_context():
+        rows = hierarchy.rebuild()
+        db.session.commit()
+        print(f"Rebuilt employee_hierarchy with {rows} rows")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] not in ("--check",):
+        print(__doc__)
+        sys.exit(1)
+
+    if len(sys.argv) > 1:
+        sys.exit(0 if check_hierarchy() else 1)
+
+    rebuild_hierarchy()
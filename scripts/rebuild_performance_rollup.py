@@ -0,0 +1,72 @@
+"""Helper script to rebuild or verify the portfolio performance rollup.
+
+Usage:
+    python scripts/rebuild_performance_rollup.py [--check]
+
+Examples:
+    # Recompute portfolio_performance_rollup from portfolios and transactions
+    python scripts/rebuild_performance_rollup.py
+
+    # Only compare the rollup with the live aggregate and list differing buckets
+    python scripts/rebuild_performance_rollup.py --check
+"""
+
+from __future__ import annotations
+
+import sys
+import os
+from pathlib import Path
+
+# Add parent directory to path
+project_root = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, str(project_root))
+
+# Load environment variables from .env file
+from dotenv import load_dotenv
+env_path = project_root / ".env"
+if env_path.exists():
+    load_dotenv(env_path)
+else:
+    print("Warning: .env file not found. Make sure your database credentials are set in environment variables.")
+
+from app import create_app, db, rollups
+
+
+def check_rollup() -> bool:
+    """Print buckets where the rollup and the ledger disagree; returns True when consistent."""
+    app = create_app()
+
+    with app.app_context():
+        mismatches = rollups.check()
+        if not mismatches:
+            print("portfolio_performance_rollup matches the live aggregate")
+            return True
+        print(f"portfolio_performance_rollup differs in {len(mismatches)} bucket(s):")
+        for m in mismatches:
+            currency = "NULL" if m["currency"] is None else repr(m["currency"])
+            print(f"  ({currency}, {m['risk_level'] or 'NULL'})")
+            for field, values in m["fields"].items():
+                print(f"    {field}: stored={values['stored']} live={values['live']}")
+        print("Run without --check to rebuild it.")
+        return False
+
+
+def rebuild_rollup() -> None:
+    """Recompute the rollup in a single transaction."""
+    app = create_app()
+
+    with app.app_context():
+        rows = rollups.rebuild()
+        db.session.commit()
+        print(f"Rebuilt portfolio_performance_rollup with {rows} buckets")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] not in ("--check",):
+        print(__doc__)
+        sys.exit(1)
+
+    if len(sys.argv) > 1:
+        sys.exit(0 if check_rollup() else 1)
+
+    rebuild_rollup()
@@ -0,0 +1,84 @@
+"""Run the FIFO lot engine: consume new trades into open lots and realized P&L.
+
+Usage:
+    python scripts/replay_lots.py [--rebuild] [--chunk N] [--max-positions N] [--settle SECONDS] [--follow SECONDS]
+
+Examples:
+    # Catch up from the last processed trade
+    python scripts/replay_lots.py
+
+    # Forget lot state and replay the whole ledger (needed after trades are deleted or edited)
+    python scripts/replay_lots.py --rebuild
+
+    # Keep running, catching up every 10 seconds
+    python scripts/replay_lots.py --follow 10
+
+Run one instance at a time.
+"""
+
+from __future__ import annotations
+
+import argparse
+import resource
+import sys
+import os
+import time
+from pathlib import Path
+
+# Add parent directory to path
+project_root = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, str(project_root))
+
+# Load environment variables from .env file
+from dotenv import load_dotenv
+env_path = project_root / ".env"
+if env_path.exists():
+    load_dotenv(env_path)
+else:
+    print("Warning: .env file not found. Make sure your database credentials are set in environment variables.")
+
+from app import create_app, db, lots
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Consume trades into FIFO lots.")
+    parser.add_argument("--rebuild", action="store_true", help="clear lot state and replay from the first trade")
+    parser.add_argument("--chunk", type=int, default=50_000, help="trades per commit (default 50000)")
+    parser.add_argument("--max-positions", type=int, default=100_000, help="positions kept in memory (default 100000)")
+    parser.add_argument("--settle", type=int, default=30, help="skip trades younger than this many seconds (default 30)")
+    parser.add_argument("--follow", type=float, default=None, help="keep running, catching up every N seconds")
+    args = parser.parse_args()
+
+    app = create_app()
+
+    with app.app_context():
+        if args.rebuild:
+            lots.rebuild()
+            db.session.commit()
+            print("Cleared lot state")
+
+        engine = lots.LotEngine(args.chunk, args.max_positions, args.settle)
+        while True:
+            stats = engine.run()
+            rate = stats["trades"] / stats["seconds"] if stats["seconds"] else 0
+            print(
+                f"Consumed {stats['trades']} trade(s) in {stats['chunks']} chunk(s), {stats['seconds']:.1f}s "
+                f"({rate:,.0f}/s); cursor T_ID {stats['cursor']}; "
+                f"{stats['positions_in_memory']} positions in memory; peak RSS {_peak_rss_mb():.0f} MB"
+            )
+            if args.follow is None:
+                break
+            time.sleep(args.follow)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("Stopped")
@@ -0,0 +1,69 @@
+"""Order writer: applies queued trade orders in group commits.
+
+Usage:
+    python scripts/run_order_worker.py [--batch N] [--interval SECONDS] [--once]
+
+Examples:
+    # Run until interrupted, committing up to 500 orders per transaction
+    python scripts/run_order_worker.py
+
+    # Apply whatever is queued right now and exit
+    python scripts/run_order_worker.py --once
+
+Several workers can run at once; each claims its own batch with SKIP LOCKED.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+import os
+from pathlib import Path
+
+# Add parent directory to path
+project_root = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, str(project_root))
+
+# Load environment variables from .env file
+from dotenv import load_dotenv
+env_path = project_root / ".env"
+if env_path.exists():
+    load_dotenv(env_path)
+else:
+    print("Warning: .env file not found. Make sure your database credentials are set in environment variables.")
+
+from app import create_app, orders
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Apply queued trade orders.")
+    parser.add_argument("--batch", type=int, default=500, help="orders per commit (default 500)")
+    parser.add_argument("--interval", type=float, default=0.2, help="seconds to wait when the queue is empty")
+    parser.add_argument("--once", action="store_true", help="drain the current queue and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    app = create_app()
+
+    with app.app_context():
+        if args.once:
+            total = {"executed": 0, "failed": 0}
+            while True:
+                counts = orders.drain(args.batch)
+                if counts["executed"] + counts["failed"] == 0:
+                    break
+                for status, n in counts.items():
+                    total[status] += n
+            print(f"Applied {total['executed']} order(s), {total['failed']} failed")
+            return
+
+        print(f"Order writer running (batch {args.batch}); Ctrl+C to stop")
+        try:
+            orders.run_worker(args.batch, args.interval)
+        except KeyboardInterrupt:
+            print("Stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Outbox dispatcher: delivers change events to the consumers of derived data.
+
+Usage:
+    python scripts/run_outbox_dispatcher.py [--batch N] [--interval SECONDS] [--once] [--lag]
+
+Examples:
+    # Run until interrupted, delivering up to 1000 events per consumer per commit
+    python scripts/run_outbox_dispatcher.py
+
+    # Catch every consumer up with what is in the outbox now, then exit
+    python scripts/run_outbox_dispatcher.py --once
+
+    # Show how many events each consumer has yet to see
+    python scripts/run_outbox_dispatcher.py --lag
+
+Run one dispatcher; each consumer's cursor is kept in job_cursors (see app/outbox.py).
+The consumers are those create_app registers; with none it exits without starting.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+import os
+from pathlib import Path
+
+# Add parent directory to path
+project_root = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, str(project_root))
+
+# Load environment variables from .env file
+from dotenv import load_dotenv
+env_path = project_root / ".env"
+if env_path.exists():
+    load_dotenv(env_path)
+else:
+    print("Warning: .env file not found. Make sure your database credentials are set in environment variables.")
+
+from app import create_app, outbox
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Deliver outbox events to their consumers.")
+    parser.add_argument("--batch", type=int, default=1000, help="events per consumer per commit (default 1000)")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds to wait when there is nothing to deliver")
+    parser.add_argument("--retention-days", type=int, default=outbox.RETENTION_DAYS, help="keep delivered events this long")
+    parser.add_argument("--once", action="store_true", help="deliver what is settled now, prune, and exit")
+    parser.add_argument("--lag", action="store_true", help="print events pending per consumer and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    app = create_app()
+
+    if not outbox.registered():
+        # Nothing would be delivered, and the outbox could never be pruned
+        print("No outbox consumers are registered; not starting.")
+        sys.exit(1)
+
+    with app.app_context():
+        if args.lag:
+            for name, pending in sorted(outbox.lag().items()):
+                print(f"{name}: {pending} event(s) pending")
+            return
+
+        if args.once:
+            total: dict[str, int] = {}
+            while True:
+                delivered = outbox.dispatch(args.batch)
+                for name, n in delivered.items():
+                    total[name] = total.get(name, 0) + max(n, 0)
+                if not any(n > 0 for n in delivered.values()):
+                    break
+            pruned = outbox.prune(args.retention_days)
+            summary = ", ".join(f"{name}: {n}" for name, n in sorted(total.items())) or "no consumers"
+            print(f"Delivered {summary}; pruned {pruned} event(s)")
+            return
+
+        print("Outbox dispatcher running; Ctrl+C to stop")
+        try:
+            outbox.run_worker(args.batch, args.interval, args.retention_days)
+        except KeyboardInterrupt:
+            print("Stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Purge job: removes soft-deleted customers and portfolios in the background.
+
+Usage:
+    python scripts/run_purge_worker.py [--batch N] [--interval SECONDS] [--once]
+
+Examples:
+    # Run until interrupted, checking for deleted rows every minute
+    python scripts/run_purge_worker.py
+
+    # Purge whatever is marked deleted right now, 500 rows per transaction, and exit
+    python scripts/run_purge_worker.py --once --batch 500
+
+The delete buttons only mark rows deleted; this job removes them and everything that
+depends on them in small transactions (see app/deletion.py). Run one instance.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+import os
+from pathlib import Path
+
+# Add parent directory to path
+project_root = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, str(project_root))
+
+# Load environment variables from .env file
+from dotenv import load_dotenv
+env_path = project_root / ".env"
+if env_path.exists():
+    load_dotenv(env_path)
+else:
+    print("Warning: .env file not found. Make sure your database credentials are set in environment variables.")
+
+from app import create_app, deletion
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Purge soft-deleted customers and portfolios.")
+    parser.add_argument("--batch", type=int, default=None, help="rows deleted per transaction (default PURGE_BATCH_SIZE)")
+    parser.add_argument("--interval", type=float, default=60.0, help="seconds between passes")
+    parser.add_argument("--once", action="store_true", help="purge what is pending and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    app = create_app()
+    if args.batch:
+        app.config["PURGE_BATCH_SIZE"] = args.batch
+
+    with app.app_context():
+        if args.once:
+            purged = deletion.purge_pending()
+            print(f"Purged {purged['portfolios']} portfolio(s) and {purged['customers']} customer(s)")
+            return
+
+        print(f"Purge job running (every {args.interval:g}s, {app.config['PURGE_BATCH_SIZE']} rows per transaction); Ctrl+C to stop")
+        try:
+            deletion.run_worker(args.interval)
+        except KeyboardInterrupt:
+            print("Stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Run one of the reports against a columnar snapshot, without touching the database.
+
+Usage:
+    python scripts/snapshot_report.py <snapshot_dir> details [--portfolio ID ...] [--limit N] [--from DATE] [--to DATE]
+    python scripts/snapshot_report.py <snapshot_dir> top [--top N] [--percentile P] [--currency CUR] [--owner-type TYPE] [--from DATE] [--to DATE]
+    python scripts/snapshot_report.py <snapshot_dir> summary [--from DATE] [--to DATE]
+
+Examples:
+    # Top 20 portfolios at or above the 90th percentile
+    python scripts/snapshot_report.py D:\\snapshots\\ledger top --top 20 --percentile 90
+
+    # Performance summary for 2024 trades
+    python scripts/snapshot_report.py D:\\snapshots\\ledger summary --from 2024-01-01 --to 2024-12-31
+
+Dates are inclusive, as on the web reports.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import os
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+# Add parent directory to path
+project_root = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, str(project_root))
+
+from app import analytics
+from app.snapshot import Snapshot
+
+
+def _print_rows(rows: list[dict]) -> None:
+    if not rows:
+        print("(no rows)")
+        return
+    columns = list(rows[0])
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in columns}
+    print(" | ".join(c.ljust(widths[c]) for c in columns))
+    for r in rows:
+        print(" | ".join(str(r[c]).ljust(widths[c]) for c in columns))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Answer a report from a snapshot.")
+    parser.add_argument("snapshot", type=Path)
+    parser.add_argument("report", choices=("details", "top", "summary"))
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, default=None)
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, default=None)
+    parser.add_argument("--portfolio", type=int, action="append", default=None, help="details: only these portfolios")
+    parser.add_argument("--limit", type=int, default=100, help="details: rows to print (default 100)")
+    parser.add_argument("--top", type=int, default=None)
+    parser.add_argument("--percentile", type=float, default=None)
+    parser.add_argument("--currency", default=None)
+    parser.add_argument("--owner-type", choices=analytics.OWNER_TYPES, default=None)
+    args = parser.parse_args()
+
+    snap = Snapshot(args.snapshot)
+    date_to = args.date_to + timedelta(days=1) if args.date_to else None
+    started = time.perf_counter()
+    if args.report == "details":
+        columns = analytics.portfolio_details(snap, args.portfolio, args.date_from, date_to, args.limit)
+        rows = [dict(zip(columns, values)) for values in zip(*columns.values())]
+    elif args.report == "top":
+        rows = analytics.top_portfolios(
+            snap, args.top, args.percentile, args.currency, args.owner_type, args.date_from, date_to
+        )
+    else:
+        rows = analytics.performance_summary(snap, args.date_from, date_to)
+    elapsed = time.perf_counter() - started
+
+    _print_rows(rows)
+    meta = snap.meta
+    print(
+        f"\n{len(rows)} row(s) in {elapsed * 1000:.0f} ms from {meta['rows']['transactions']:,} trades "
+        f"(snapshot of {meta['source']} at {meta['exported_at']}, up to T_ID {meta['max_t_id']})"
+    )
+
+
+if __name__ == "__main__":
+    main()
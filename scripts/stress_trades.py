@@ -0,0 +1,214 @@
+"""Stress test: many threads submitting trades at once, then a ledger audit.
+
+Usage:
+    python scripts/stress_trades.py <scratch_database> [threads] [trades_per_thread] [hot_portfolios] [--queue WORKERS]
+
+Examples:
+    # 32 threads x 100 trades, all on 8 portfolios (heavy lock contention)
+    python scripts/stress_trades.py findb_stress 32 100 8
+
+    # Same load through the order queue, applied by 4 order writers
+    python scripts/stress_trades.py findb_stress 32 100 8 --queue 4
+
+Trades go through the trade form (POST /trade/create; the scratch database needs
+sql/objects.sql for the synchronous path). One submit in ten is sent again with the
+same idempotency key, as a double click would. Afterwards every acknowledged trade
+is checked against the database:
+
+- lost: acknowledged (redirect) but no executed order with a matching trade
+- duplicate: more trades written than executed orders, or two trades for one order
+- quantity drift: total quantity of the new trades differs from the executed orders
+
+It prints throughput, latency percentiles, how the submits ended, and the retries
+taken per reason (trade_retries_total, app/retry.py).
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from bench_utils import bench_app, percentile, seed_ledger
+
+DOUBLE_SUBMIT_RATE = 0.1
+
+
+def _logged_in(app, user_id: int):
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["user_id"] = user_id
+        s["role"] = "manager"
+    return client
+
+
+def _submitter(
+    app, user_id: int, trades: list[dict], seed: int, acked: dict, outcomes: Counter, latencies: list[float]
+) -> None:
+    client = _logged_in(app, user_id)
+    rng = random.Random(seed)
+    for trade in trades:
+        sends = 2 if rng.random() < DOUBLE_SUBMIT_RATE else 1
+        for _ in range(sends):
+            started = time.perf_counter()
+            r = client.post("/trade/create", data=trade)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if r.status_code == 302:
+                outcomes["acknowledged"] += 1
+                acked[trade["idempotency_key"]] = trade
+            elif r.status_code == 503:
+                outcomes["503 busy"] += 1
+            else:
+                outcomes[f"{r.status_code} error"] += 1
+
+
+def _audit(app, user_id: int, after_t_id: int, acked: dict) -> dict[str, int]:
+    from sqlalchemy import text
+    from app import db
+
+    with app.app_context():
+        executed = {
+            row.idempotency_key: row
+            for row in db.session.execute(
+                text(
+                    "SELECT idempotency_key, T_ID, quantity FROM trade_orders "
+                    "WHERE user_id = :uid AND status = 'executed'"
+                ),
+                {"uid": user_id},
+            )
+        }
+        trades = db.session.execute(
+            text("SELECT T_ID, quantity FROM transactions WHERE T_ID > :after"), {"after": after_t_id}
+        ).all()
+        failed = db.session.execute(
+            text("SELECT COUNT(*) FROM trade_orders WHERE user_id = :uid AND status = 'failed'"), {"uid": user_id}
+        ).scalar()
+        db.session.rollback()
+
+    trade_ids = Counter(row.T_ID for row in trades)
+    # Acknowledged means committed (synchronous path) or queued and since drained
+    lost = sum(1 for key in acked if key not in executed or executed[key].T_ID not in trade_ids)
+    order_t_ids = Counter(row.T_ID for row in executed.values())
+    return {
+        "trades written": len(trades),
+        "orders executed": len(executed),
+        "orders failed": int(failed or 0),
+        "lost": lost,
+        "duplicate": max(len(trades) - len(executed), 0) + sum(n - 1 for n in order_t_ids.values() if n > 1),
+        "quantity drift": sum(row.quantity for row in trades) - sum(row.quantity for row in executed.values()),
+    }
+
+
+def run_stress(database: str, threads: int, per_thread: int, hot: int, queue_workers: int) -> None:
+    app = bench_app(database)
+    # The harness posts the trade form directly, and measures the database, not admission control
+    app.config["WTF_CSRF_ENABLED"] = False
+    app.config["TRADE_QUEUE"] = queue_workers > 0
+    app.extensions.pop("admission", None)
+
+    from sqlalchemy import text
+    from app import db, orders, retry
+
+    with app.app_context():
+        ids = seed_ledger(n_portfolios=max(hot, 1), n_products=50)
+        db.session.execute(text("DELETE FROM trade_orders"))
+        db.session.execute(text("DELETE FROM users WHERE username = 'stress_trades'"))
+        e_id = db.session.execute(text("SELECT MIN(E_ID) FROM employees")).scalar()
+        db.session.execute(
+            text(
+                "INSERT INTO users (username, password_hash, role, E_ID, is_active) "
+                "VALUES ('stress_trades', '-', 'manager', :eid, 1)"
+            ),
+            {"eid": e_id},
+        )
+        db.session.commit()
+        user_id = db.session.execute(text("SELECT user_id FROM users WHERE username = 'stress_trades'")).scalar()
+        owners = list(db.session.execute(text("SELECT P_ID, C_ID, E_ID FROM portfolios")))
+        after_t_id = db.session.execute(text("SELECT COALESCE(MAX(T_ID), 0) FROM transactions")).scalar()
+
+    rng = random.Random(11)
+    work = []
+    for _ in range(threads):
+        batch = []
+        for _ in range(per_thread):
+            p_id, c_id, e_id = rng.choice(owners)
+            batch.append({
+                "user": f"C:{c_id}" if c_id is not None else f"E:{e_id}",
+                "p_id": p_id,
+                "product_id": rng.choice(ids["products"]),
+                "quantity": rng.randint(1, 50),
+                "price_per_unit": f"{rng.uniform(5, 500):.2f}",
+                "idempotency_key": uuid.uuid4().hex,
+            })
+        work.append(batch)
+
+    retries_before = retry.TRADE_RETRIES.values()
+    acked: dict[str, dict] = {}
+    outcomes: Counter = Counter()
+    latencies: list[float] = []
+
+    stop = threading.Event()
+
+    def writer() -> None:
+        with app.app_context():
+            orders.run_worker(batch_size=100, poll_interval=0.05, stop=stop)
+
+    writers = [threading.Thread(target=writer) for _ in range(queue_workers)]
+    for t in writers:
+        t.start()
+
+    started = time.perf_counter()
+    submitters = [
+        threading.Thread(target=_submitter, args=(app, user_id, work[i], i, acked, outcomes, latencies))
+        for i in range(threads)
+    ]
+    for t in submitters:
+        t.start()
+    for t in submitters:
+        t.join()
+    if writers:
+        # Let the writers finish the queue
+        with app.app_context():
+            while db.session.execute(text("SELECT COUNT(*) FROM trade_orders WHERE status = 'queued'")).scalar():
+                db.session.rollback()
+                time.sleep(0.1)
+            db.session.rollback()
+        stop.set()
+        for t in writers:
+            t.join()
+    elapsed = time.perf_counter() - started
+
+    retries = Counter()
+    for (path, reason), n in retry.TRADE_RETRIES.values().items():
+        retries[f"{path}/{reason}"] += n - retries_before.get((path, reason), 0)
+
+    audit = _audit(app, user_id, after_t_id, acked)
+    mode = f"queue, {queue_workers} writer(s)" if queue_workers else "synchronous Process_Trade"
+    print(f"{threads} threads x {per_thread} trades on {len(owners)} portfolio(s), {mode}")
+    print(f"  elapsed {elapsed:.1f}s, {audit['orders executed'] / elapsed:.0f} trades/s")
+    print(
+        f"  submit latency ms: p50 {percentile(latencies, 50):.1f}, p95 {percentile(latencies, 95):.1f}, "
+        f"p99 {percentile(latencies, 99):.1f}, max {max(latencies, default=0):.1f}"
+    )
+    print("  submits: " + ", ".join(f"{k}: {v}" for k, v in sorted(outcomes.items())))
+    print("  retries: " + (", ".join(f"{k}: {v}" for k, v in sorted(retries.items()) if v) or "none"))
+    print("  audit: " + ", ".join(f"{k}: {v}" for k, v in audit.items()))
+    if audit["lost"] or audit["duplicate"] or audit["quantity drift"]:
+        print("FAILED: the ledger does not match the acknowledged orders")
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent trade submission with a ledger audit.")
+    parser.add_argument("database", help="scratch database (never the primary)")
+    parser.add_argument("threads", nargs="?", type=int, default=32)
+    parser.add_argument("trades_per_thread", nargs="?", type=int, default=100)
+    parser.add_argument("hot_portfolios", nargs="?", type=int, default=8)
+    parser.add_argument("--queue", type=int, default=0, metavar="WORKERS", help="queue trades and run this many order writers")
+    args = parser.parse_args()
+
+    run_stress(args.database, args.threads, args.trades_per_thread, args.hot_portfolios, args.queue)
@@ -0,0 +1,10 @@
+-- Migration script to add indexes backing customer search (/customers/search)
+-- Run this after the base schema is created. These indexes are defined here only, not in
+-- app/models.py, so this also runs on a database the app created with create_all.
+
+-- Name prefix lookups: "first last" and "last" / "first" prefixes each seek on one of these
+CREATE INDEX idx_customers_first_last ON customers(first_name, last_name);
+CREATE INDEX idx_customers_last_first ON customers(last_name, first_name);
+
+-- Exact phone lookups (PAN, Aadhar, SSN and email are already covered by their UNIQUE keys)
+CREATE INDEX idx_customer_phones_number ON customer_phones(phone_number);
@@ -0,0 +1,18 @@
+-- Migration script to add per-customer summaries (net worth, portfolio count, last trade)
+-- Run this after the outbox (migration_outbox.sql) is created, then fill it once with
+--   python scripts/rebuild_customer_summaries.py
+-- From then on the outbox dispatcher keeps it current (see app/summaries.py).
+
+CREATE TABLE IF NOT EXISTS customer_summaries (
+  C_ID INT PRIMARY KEY,
+  net_worth DECIMAL(20,2) NOT NULL DEFAULT 0,
+  portfolio_count INT NOT NULL DEFAULT 0,
+  last_trade_date DATETIME NULL,
+  through_event BIGINT NOT NULL DEFAULT 0,
+  INDEX idx_customer_summaries_net_worth (net_worth, C_ID),
+  INDEX idx_customer_summaries_portfolio_count (portfolio_count, C_ID),
+  INDEX idx_customer_summaries_last_trade (last_trade_date, C_ID)
+);
+
+INSERT IGNORE INTO data_versions (table_name, version, updated_at) VALUES
+  ('customer_summaries', 0, UTC_TIMESTAMP());
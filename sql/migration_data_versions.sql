@@ -0,0 +1,43 @@
+-- Migration script to add per-table data version stamps
+-- Run this after the base schema is created.
+-- Each write bumps its table's row in the same transaction (see app/versions.py);
+-- ETags and caches are derived from these stamps. transactions_rewrite only moves when
+-- existing trades are updated or deleted (incremental holdings start over then).
+-- transactions is also stamped in 16 shard rows ('transactions#0'..'#15'), bumped after
+-- each trade commits; its version is the sum of all of them.
+
+CREATE TABLE IF NOT EXISTS data_versions (
+  table_name VARCHAR(64) PRIMARY KEY,
+  version BIGINT NOT NULL DEFAULT 0,
+  updated_at DATETIME NULL
+);
+
+-- Seed one row per tracked table so bumps are always a single-row UPDATE
+INSERT IGNORE INTO data_versions (table_name, version, updated_at) VALUES
+  ('customers', 0, UTC_TIMESTAMP()),
+  ('customer_details', 0, UTC_TIMESTAMP()),
+  ('customer_phones', 0, UTC_TIMESTAMP()),
+  ('customer_emails', 0, UTC_TIMESTAMP()),
+  ('employees', 0, UTC_TIMESTAMP()),
+  ('products', 0, UTC_TIMESTAMP()),
+  ('portfolios', 0, UTC_TIMESTAMP()),
+  ('transactions', 0, UTC_TIMESTAMP()),
+  ('transactions_rewrite', 0, UTC_TIMESTAMP()),
+  ('users', 0, UTC_TIMESTAMP()),
+  ('fx_rates', 0, UTC_TIMESTAMP()),
+  ('transactions#0', 0, UTC_TIMESTAMP()),
+  ('transactions#1', 0, UTC_TIMESTAMP()),
+  ('transactions#2', 0, UTC_TIMESTAMP()),
+  ('transactions#3', 0, UTC_TIMESTAMP()),
+  ('transactions#4', 0, UTC_TIMESTAMP()),
+  ('transactions#5', 0, UTC_TIMESTAMP()),
+  ('transactions#6', 0, UTC_TIMESTAMP()),
+  ('transactions#7', 0, UTC_TIMESTAMP()),
+  ('transactions#8', 0, UTC_TIMESTAMP()),
+  ('transactions#9', 0, UTC_TIMESTAMP()),
+  ('transactions#10', 0, UTC_TIMESTAMP()),
+  ('transactions#11', 0, UTC_TIMESTAMP()),
+  ('transactions#12', 0, UTC_TIMESTAMP()),
+  ('transactions#13', 0, UTC_TIMESTAMP()),
+  ('transactions#14', 0, UTC_TIMESTAMP()),
+  ('transactions#15', 0, UTC_TIMESTAMP());
@@ -0,0 +1,25 @@
+-- Migration script to add the employee hierarchy closure table
+-- Run this after the base schema is created
+
+CREATE TABLE IF NOT EXISTS employee_hierarchy (
+  ancestor_id INT NOT NULL,
+  descendant_id INT NOT NULL,
+  depth INT NOT NULL,
+  PRIMARY KEY (ancestor_id, descendant_id),
+  CONSTRAINT fk_eh_ancestor FOREIGN KEY (ancestor_id) REFERENCES employees(E_ID),
+  CONSTRAINT fk_eh_descendant FOREIGN KEY (descendant_id) REFERENCES employees(E_ID)
+);
+
+-- Reverse lookups ("who manages this employee")
+CREATE INDEX idx_employee_hierarchy_descendant ON employee_hierarchy(descendant_id, ancestor_id);
+
+-- Seed from existing manager links (same as scripts/rebuild_employee_hierarchy.py)
+INSERT INTO employee_hierarchy (ancestor_id, descendant_id, depth)
+WITH RECURSIVE tree (ancestor_id, descendant_id, depth) AS (
+  SELECT E_ID, E_ID, 0 FROM employees
+  UNION ALL
+  SELECT tree.ancestor_id, e.E_ID, tree.depth + 1
+  FROM tree
+  JOIN employees e ON e.manager_id = tree.descendant_id
+)
+SELECT ancestor_id, descendant_id, depth FROM tree;
@@ -0,0 +1,10 @@
+-- Migration script to add FX rates (for base-currency AUM)
+-- Run this after the base schema is created, then load a feed with scripts/load_fx_rates.py
+
+-- rate_to_base: units of BASE_CURRENCY (default USD) per one unit of `currency`
+CREATE TABLE IF NOT EXISTS fx_rates (
+  currency VARCHAR(10) NOT NULL,
+  rate_date DATE NOT NULL,
+  rate_to_base DECIMAL(18,8) NOT NULL,
+  PRIMARY KEY (currency, rate_date)
+);
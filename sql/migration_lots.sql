@@ -0,0 +1,34 @@
+-- Migration script to add FIFO lot state (realized / unrealized P&L)
+-- Run this after the base schema is created, then fill it with scripts/replay_lots.py
+
+-- Progress markers for background jobs (the lot engine stores its last T_ID here)
+CREATE TABLE IF NOT EXISTS job_cursors (
+  name VARCHAR(64) PRIMARY KEY,
+  position BIGINT NOT NULL DEFAULT 0,
+  updated_at DATETIME NULL
+);
+
+CREATE TABLE IF NOT EXISTS lot_positions (
+  P_ID INT NOT NULL,
+  Product_ID INT NOT NULL,
+  open_qty BIGINT NOT NULL DEFAULT 0,
+  open_cost DECIMAL(20,2) NOT NULL DEFAULT 0,
+  realized_pnl DECIMAL(20,2) NOT NULL DEFAULT 0,
+  commissions DECIMAL(20,2) NOT NULL DEFAULT 0,
+  last_t_id INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (P_ID, Product_ID)
+);
+
+-- One row per open lot, keyed by the trade that opened it; quantity is what remains
+-- (negative for short lots)
+CREATE TABLE IF NOT EXISTS open_lots (
+  T_ID INT PRIMARY KEY,
+  P_ID INT NOT NULL,
+  Product_ID INT NOT NULL,
+  quantity INT NOT NULL,
+  price_per_unit DECIMAL(10,2) NOT NULL,
+  INDEX idx_open_lots_position (P_ID, Product_ID, T_ID)
+);
+
+INSERT IGNORE INTO data_versions (table_name, version, updated_at) VALUES
+  ('lot_positions', 0, UTC_TIMESTAMP());
@@ -0,0 +1,14 @@
+-- Migration script to add the transactional outbox (change events for derived data)
+-- Run this after the base schema and the job cursors (migration_lots.sql) are created.
+-- Every write to a domain table adds a row here in the same transaction (see
+-- app/outbox.py); scripts/run_outbox_dispatcher.py delivers them to the consumers
+-- and prunes rows every consumer has seen.
+
+CREATE TABLE IF NOT EXISTS outbox_events (
+  event_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+  aggregate VARCHAR(32) NOT NULL,
+  aggregate_id BIGINT NOT NULL,
+  op ENUM('insert', 'update', 'delete') NOT NULL,
+  payload JSON NULL,
+  created_at DATETIME NOT NULL
+);
@@ -0,0 +1,174 @@
+-- Migration script to add the portfolio performance rollup
+-- Run this after the base schema is created (re-running it rebuilds the table).
+-- portfolio_performance_rollup holds running totals per (currency, risk_level) so
+-- reports.portfolio_performance_summary reads a few hundred rows instead of every trade.
+--
+-- * Each bucket is spread over 16 shard rows. A trade is folded into shard
+--   T_ID % 16 of its bucket, so concurrent trades in the same bucket update
+--   different rows instead of queueing on one; readers sum the shards. Portfolio
+--   counts and moved totals go to shard 0. A single shard can hold negative totals
+--   after a move; only the bucket sum is meaningful.
+-- * NULL currency / risk level are stored as '' so they can be part of the key;
+--   currency_null tells a NULL currency from an empty one, since the report leaves
+--   out only NULL currencies.
+-- * commission_count counts trades with a commission_fee, so the report can show
+--   NULL commissions for a bucket where none was set, as SUM(commission_fee) does.
+-- * MAX cannot be decremented: a trade leaving a bucket flags it max_stale when it
+--   could have been the maximum. Reads then compute that bucket's maximum from the
+--   ledger, and the purge job (or rollups.refresh_stale_maxima) stores it again.
+
+DROP TABLE IF EXISTS portfolio_performance_rollup;
+CREATE TABLE portfolio_performance_rollup (
+  currency_null BOOLEAN NOT NULL DEFAULT FALSE,
+  currency VARCHAR(10) NOT NULL DEFAULT '',
+  risk_level VARCHAR(10) NOT NULL DEFAULT '',
+  shard TINYINT NOT NULL DEFAULT 0,
+  portfolio_count INT NOT NULL DEFAULT 0,
+  transaction_count BIGINT NOT NULL DEFAULT 0,
+  total_invested DECIMAL(20,2) NOT NULL DEFAULT 0,
+  total_commissions DECIMAL(20,2) NOT NULL DEFAULT 0,
+  commission_count BIGINT NOT NULL DEFAULT 0,
+  max_transaction_value DECIMAL(20,2) NULL,
+  max_stale BOOLEAN NOT NULL DEFAULT FALSE,
+  PRIMARY KEY (currency_null, currency, risk_level, shard)
+);
+
+DELIMITER $$
+
+-- Trigger: after_transaction_insert
+-- Folds each new trade into its shard of its portfolio's bucket
+DROP TRIGGER IF EXISTS after_transaction_insert $$
+CREATE TRIGGER after_transaction_insert
+AFTER INSERT ON transactions
+FOR EACH ROW
+BEGIN
+  INSERT INTO portfolio_performance_rollup
+    (currency_null, currency, risk_level, shard, transaction_count, total_invested,
+     total_commissions, commission_count, max_transaction_value)
+  SELECT p.currency IS NULL, COALESCE(p.currency, ''), COALESCE(p.risk_level, ''), NEW.T_ID % 16, 1,
+         NEW.quantity * NEW.price_per_unit, COALESCE(NEW.commission_fee, 0), NEW.commission_fee IS NOT NULL,
+         NEW.quantity * NEW.price_per_unit
+  FROM portfolios p
+  WHERE p.P_ID = NEW.P_ID
+  ON DUPLICATE KEY UPDATE
+    transaction_count = transaction_count + 1,
+    total_invested = total_invested + VALUES(total_invested),
+    total_commissions = total_commissions + VALUES(total_commissions),
+    commission_count = commission_count + VALUES(commission_count),
+    max_transaction_value = GREATEST(
+      COALESCE(max_transaction_value, VALUES(max_transaction_value)), VALUES(max_transaction_value)
+    );
+END $$
+
+-- Trigger: after_transaction_delete
+-- Takes a purged trade out of shard T_ID % 16 of its bucket, flagging the bucket when
+-- the trade could have been its maximum. The shard row may not exist yet (seeded or
+-- moved totals sit in shard 0), so it is upserted with the negated amounts.
+DROP TRIGGER IF EXISTS after_transaction_delete $$
+CREATE TRIGGER after_transaction_delete
+AFTER DELETE ON transactions
+FOR EACH ROW
+BEGIN
+  INSERT INTO portfolio_performance_rollup
+    (currency_null, currency, risk_level, shard, transaction_count, total_invested,
+     total_commissions, commission_count, max_stale)
+  SELECT p.currency IS NULL, COALESCE(p.currency, ''), COALESCE(p.risk_level, ''), OLD.T_ID % 16, -1,
+         -(OLD.quantity * OLD.price_per_unit), -COALESCE(OLD.commission_fee, 0),
+         -(OLD.commission_fee IS NOT NULL), TRUE
+  FROM portfolios p
+  WHERE p.P_ID = OLD.P_ID
+  ON DUPLICATE KEY UPDATE
+    transaction_count = transaction_count - 1,
+    total_invested = total_invested + VALUES(total_invested),
+    total_commissions = total_commissions + VALUES(total_commissions),
+    commission_count = commission_count + VALUES(commission_count),
+    max_stale = max_stale OR COALESCE(OLD.quantity * OLD.price_per_unit >= max_transaction_value, TRUE);
+END $$
+
+-- Trigger: after_portfolio_insert
+DROP TRIGGER IF EXISTS after_portfolio_insert $$
+CREATE TRIGGER after_portfolio_insert
+AFTER INSERT ON portfolios
+FOR EACH ROW
+BEGIN
+  INSERT INTO portfolio_performance_rollup (currency_null, currency, risk_level, shard, portfolio_count)
+  VALUES (NEW.currency IS NULL, COALESCE(NEW.currency, ''), COALESCE(NEW.risk_level, ''), 0, 1)
+  ON DUPLICATE KEY UPDATE portfolio_count = portfolio_count + 1;
+END $$
+
+-- Trigger: after_portfolio_update
+-- Moves a portfolio's totals between buckets (shard 0 of each) when its currency or
+-- risk level changes. sql/migration_transactions_partitioning.sql replaces it with a
+-- version that also moves archived months.
+DROP TRIGGER IF EXISTS after_portfolio_update $$
+CREATE TRIGGER after_portfolio_update
+AFTER UPDATE ON portfolios
+FOR EACH ROW
+BEGIN
+  DECLARE v_count BIGINT;
+  DECLARE v_invested DECIMAL(20,2);
+  DECLARE v_commissions DECIMAL(20,2);
+  DECLARE v_fees BIGINT;
+  DECLARE v_max DECIMAL(20,2);
+
+  IF NOT (OLD.currency <=> NEW.currency AND OLD.risk_level <=> NEW.risk_level) THEN
+    SELECT COUNT(*), COALESCE(SUM(t.quantity * t.price_per_unit), 0),
+           COALESCE(SUM(t.commission_fee), 0), COUNT(t.commission_fee), MAX(t.quantity * t.price_per_unit)
+      INTO v_count, v_invested, v_commissions, v_fees, v_max
+    FROM transactions t
+    WHERE t.P_ID = NEW.P_ID;
+
+    UPDATE portfolio_performance_rollup
+    SET portfolio_count = portfolio_count - (shard = 0),
+        transaction_count = transaction_count - IF(shard = 0, v_count, 0),
+        total_invested = total_invested - IF(shard = 0, v_invested, 0),
+        total_commissions = total_commissions - IF(shard = 0, v_commissions, 0),
+        commission_count = commission_count - IF(shard = 0, v_fees, 0),
+        max_stale = max_stale OR COALESCE(v_max >= max_transaction_value, FALSE)
+    WHERE currency_null = (OLD.currency IS NULL) AND currency = COALESCE(OLD.currency, '')
+      AND risk_level = COALESCE(OLD.risk_level, '');
+
+    INSERT INTO portfolio_performance_rollup
+      (currency_null, currency, risk_level, shard, portfolio_count, transaction_count, total_invested,
+       total_commissions, commission_count, max_transaction_value)
+    VALUES (NEW.currency IS NULL, COALESCE(NEW.currency, ''), COALESCE(NEW.risk_level, ''), 0, 1,
+            v_count, v_invested, v_commissions, v_fees, v_max)
+    ON DUPLICATE KEY UPDATE
+      portfolio_count = portfolio_count + 1,
+      transaction_count = transaction_count + VALUES(transaction_count),
+      total_invested = total_invested + VALUES(total_invested),
+      total_commissions = total_commissions + VALUES(total_commissions),
+      commission_count = commission_count + VALUES(commission_count),
+      max_transaction_value = GREATEST(
+        COALESCE(max_transaction_value, VALUES(max_transaction_value)),
+        COALESCE(VALUES(max_transaction_value), max_transaction_value)
+      );
+  END IF;
+END $$
+
+-- Trigger: after_portfolio_delete
+-- Portfolios are only deleted once their trades are gone (the purge job, app/deletion.py)
+DROP TRIGGER IF EXISTS after_portfolio_delete $$
+CREATE TRIGGER after_portfolio_delete
+AFTER DELETE ON portfolios
+FOR EACH ROW
+BEGIN
+  UPDATE portfolio_performance_rollup
+  SET portfolio_count = portfolio_count - 1
+  WHERE currency_null = (OLD.currency IS NULL) AND currency = COALESCE(OLD.currency, '')
+    AND risk_level = COALESCE(OLD.risk_level, '') AND shard = 0;
+END $$
+
+DELIMITER ;
+
+-- Seed from the existing ledger into shard 0 (same as scripts/rebuild_performance_rollup.py)
+INSERT INTO portfolio_performance_rollup
+  (currency_null, currency, risk_level, shard, portfolio_count, transaction_count, total_invested,
+   total_commissions, commission_count, max_transaction_value)
+SELECT p.currency IS NULL, COALESCE(p.currency, ''), COALESCE(p.risk_level, ''), 0,
+       COUNT(DISTINCT p.P_ID), COUNT(t.T_ID),
+       COALESCE(SUM(t.quantity * t.price_per_unit), 0), COALESCE(SUM(t.commission_fee), 0),
+       COUNT(t.commission_fee), MAX(t.quantity * t.price_per_unit)
+FROM portfolios p
+LEFT JOIN transactions t ON t.P_ID = p.P_ID
+GROUP BY p.currency IS NULL, COALESCE(p.currency, ''), COALESCE(p.risk_level, '');
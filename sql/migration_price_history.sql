@@ -0,0 +1,15 @@
+-- Migration script to add daily price history (for portfolio risk metrics)
+-- Run this after the base schema is created, then load a feed with scripts/load_price_history.py
+
+-- One close per product per day. The primary key is the clustered index, so a
+-- product's history is stored contiguously and a date window is one range scan.
+CREATE TABLE IF NOT EXISTS price_history (
+  Product_ID INT NOT NULL,
+  price_date DATE NOT NULL,
+  close_price DECIMAL(12,4) NOT NULL,
+  PRIMARY KEY (Product_ID, price_date),
+  CONSTRAINT fk_price_history_product FOREIGN KEY (Product_ID) REFERENCES products(Product_ID) ON DELETE CASCADE
+);
+
+INSERT IGNORE INTO data_versions (table_name, version, updated_at) VALUES
+  ('price_history', 0, UTC_TIMESTAMP());
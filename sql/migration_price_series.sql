@@ -0,0 +1,32 @@
+-- Migration script to add the intraday price series store (raw ticks plus OHLC bars)
+-- Run this after the base schema is created, then load ticks with scripts/load_price_ticks.py
+
+CREATE TABLE IF NOT EXISTS price_ticks (
+  tick_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+  Product_ID INT NOT NULL,
+  tick_time DATETIME(3) NOT NULL,
+  price DECIMAL(12,4) NOT NULL,
+  volume BIGINT NOT NULL DEFAULT 0,
+  INDEX idx_price_ticks_product_time (Product_ID, tick_time),
+  CONSTRAINT fk_price_ticks_product FOREIGN KEY (Product_ID) REFERENCES products(Product_ID) ON DELETE CASCADE
+);
+
+-- One row per (product, resolution, bucket); updated in place as ticks arrive (see app/price_series.py)
+CREATE TABLE IF NOT EXISTS price_bars (
+  Product_ID INT NOT NULL,
+  resolution ENUM('1m', '1h', '1d') NOT NULL,
+  bucket_start DATETIME NOT NULL,
+  open_price DECIMAL(12,4) NOT NULL,
+  high_price DECIMAL(12,4) NOT NULL,
+  low_price DECIMAL(12,4) NOT NULL,
+  close_price DECIMAL(12,4) NOT NULL,
+  volume BIGINT NOT NULL DEFAULT 0,
+  tick_count INT NOT NULL DEFAULT 0,
+  first_tick_time DATETIME(3) NOT NULL,
+  last_tick_time DATETIME(3) NOT NULL,
+  PRIMARY KEY (Product_ID, resolution, bucket_start),
+  CONSTRAINT fk_price_bars_product FOREIGN KEY (Product_ID) REFERENCES products(Product_ID) ON DELETE CASCADE
+);
+
+-- Change stamps are per product ('price_series:<Product_ID>' in data_versions) and are
+-- created by the first ingest for the product; nothing to seed
@@ -0,0 +1,11 @@
+-- Migration script to add soft-delete for customers and portfolios
+-- Run this after the base schema is created. Deleted rows are removed later by the
+-- purge job (python scripts/run_purge_worker.py; see app/deletion.py).
+
+ALTER TABLE customers
+  ADD COLUMN deleted_at DATETIME NULL,
+  ADD INDEX idx_customers_deleted_at (deleted_at);
+
+ALTER TABLE portfolios
+  ADD COLUMN deleted_at DATETIME NULL,
+  ADD INDEX idx_portfolios_deleted_at (deleted_at);
@@ -0,0 +1,42 @@
+-- Migration script to add the trade order queue (idempotent intake + group-commit writer)
+-- Run this after the base schema and users migration are created.
+-- Orders are applied by scripts/run_order_worker.py (see app/orders.py).
+
+CREATE TABLE IF NOT EXISTS trade_orders (
+  order_id INT AUTO_INCREMENT PRIMARY KEY,
+  user_id INT NOT NULL,
+  idempotency_key VARCHAR(64) NOT NULL,
+  P_ID INT NOT NULL,
+  Product_ID INT NOT NULL,
+  quantity INT NOT NULL,
+  price_per_unit DECIMAL(10,2) NOT NULL,
+  commission_rate DECIMAL(8,4) NOT NULL,
+  status ENUM('queued', 'executed', 'failed') NOT NULL DEFAULT 'queued',
+  error VARCHAR(255) NULL,
+  T_ID INT NULL,
+  created_at DATETIME NOT NULL,
+  processed_at DATETIME NULL,
+  CONSTRAINT uq_trade_orders_idempotency UNIQUE (user_id, idempotency_key),
+  CONSTRAINT fk_trade_orders_user FOREIGN KEY (user_id) REFERENCES users(user_id),
+  INDEX idx_trade_orders_status (status, order_id)
+);
+
+-- trade_orders is stamped like transactions: a base row plus 16 shards (app/versions.py)
+INSERT IGNORE INTO data_versions (table_name, version, updated_at) VALUES
+  ('trade_orders', 0, UTC_TIMESTAMP()),
+  ('trade_orders#0', 0, UTC_TIMESTAMP()),
+  ('trade_orders#1', 0, UTC_TIMESTAMP()),
+  ('trade_orders#2', 0, UTC_TIMESTAMP()),
+  ('trade_orders#3', 0, UTC_TIMESTAMP()),
+  ('trade_orders#4', 0, UTC_TIMESTAMP()),
+  ('trade_orders#5', 0, UTC_TIMESTAMP()),
+  ('trade_orders#6', 0, UTC_TIMESTAMP()),
+  ('trade_orders#7', 0, UTC_TIMESTAMP()),
+  ('trade_orders#8', 0, UTC_TIMESTAMP()),
+  ('trade_orders#9', 0, UTC_TIMESTAMP()),
+  ('trade_orders#10', 0, UTC_TIMESTAMP()),
+  ('trade_orders#11', 0, UTC_TIMESTAMP()),
+  ('trade_orders#12', 0, UTC_TIMESTAMP()),
+  ('trade_orders#13', 0, UTC_TIMESTAMP()),
+  ('trade_orders#14', 0, UTC_TIMESTAMP()),
+  ('trade_orders#15', 0, UTC_TIMESTAMP());
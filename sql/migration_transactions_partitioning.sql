@@ -0,0 +1,127 @@
+-- Migration script to partition transactions by month and add the cold archive
+-- Run this after migration_performance_rollup.sql, then create the monthly partitions:
+--   python scripts/archive_transactions.py --add-months 3
+--
+-- MySQL partitioning rules shape this migration:
+--   * every unique key must contain the partitioning column, so the primary key
+--     becomes (T_ID, transaction_date); T_ID stays AUTO_INCREMENT and unique in practice
+--   * partitioned InnoDB tables cannot have foreign keys, so fk_t_portfolio and
+--     fk_t_product are dropped. Their indexes stay. Trades are only written by
+--     Process_Trade and the order writer, which both read the portfolio and product
+--     rows with FOR SHARE first (re-run sql/objects.sql for the checking Process_Trade).
+--     The shared locks stand in for the foreign keys' own: soft-deleting a portfolio
+--     and deleting a product lock the row for update, so they wait for trades in
+--     flight, and a trade that starts later sees deleted_at set (or no product) and
+--     fails. The purge only removes portfolios that are already soft-deleted, so no
+--     trade can be added behind it. Deleting a product that has trades is refused.
+--   * the ORM model (app/models.py Transaction) maps the same two-column key
+--
+-- The table starts with a single p_future partition; the script above splits it
+-- into one partition per month (pYYYYMM, bounded by the first of the next month)
+-- from the first trade's month through a few months ahead. Run it from a monthly job
+-- so trades always land in their own month rather than in p_future.
+-- Rewriting the table takes a while on a large ledger; run it in a maintenance window.
+
+ALTER TABLE transactions
+  DROP FOREIGN KEY fk_t_portfolio,
+  DROP FOREIGN KEY fk_t_product;
+
+ALTER TABLE transactions
+  DROP PRIMARY KEY,
+  ADD PRIMARY KEY (T_ID, transaction_date);
+
+ALTER TABLE transactions
+  PARTITION BY RANGE COLUMNS (transaction_date) (
+    PARTITION p_future VALUES LESS THAN (MAXVALUE)
+  );
+
+-- Per (month, portfolio, product) totals of archived months. Archiving a month drops
+-- its partition (see app/archive.py), so balances that span all history (holdings,
+-- net worth, the performance rollup) add these rows to the live ones.
+CREATE TABLE IF NOT EXISTS archived_trade_totals (
+  period DATE NOT NULL,
+  P_ID INT NOT NULL,
+  Product_ID INT NOT NULL,
+  trade_count INT NOT NULL,
+  quantity BIGINT NOT NULL,
+  invested DECIMAL(20,2) NOT NULL,
+  commissions DECIMAL(20,2) NOT NULL,
+  -- Trades with a commission_fee, so the report can tell no commissions from zero
+  commission_count INT NOT NULL DEFAULT 0,
+  max_value DECIMAL(20,2) NULL,
+  PRIMARY KEY (P_ID, Product_ID, period),
+  INDEX idx_archived_trade_totals_period (period)
+);
+
+INSERT IGNORE INTO data_versions (table_name, version, updated_at) VALUES
+  ('archived_trade_totals', 0, UTC_TIMESTAMP());
+
+DELIMITER $$
+
+-- Trigger: after_portfolio_update (replaces the one in migration_performance_rollup.sql)
+-- Moves a portfolio's totals, live and archived, between buckets (shard 0 of each)
+-- when its currency or risk level changes
+DROP TRIGGER IF EXISTS after_portfolio_update $$
+CREATE TRIGGER after_portfolio_update
+AFTER UPDATE ON portfolios
+FOR EACH ROW
+BEGIN
+  DECLARE v_count BIGINT;
+  DECLARE v_invested DECIMAL(20,2);
+  DECLARE v_commissions DECIMAL(20,2);
+  DECLARE v_fees BIGINT;
+  DECLARE v_max DECIMAL(20,2);
+  DECLARE a_count BIGINT;
+  DECLARE a_invested DECIMAL(20,2);
+  DECLARE a_commissions DECIMAL(20,2);
+  DECLARE a_fees BIGINT;
+  DECLARE a_max DECIMAL(20,2);
+
+  IF NOT (OLD.currency <=> NEW.currency AND OLD.risk_level <=> NEW.risk_level) THEN
+    SELECT COUNT(*), COALESCE(SUM(t.quantity * t.price_per_unit), 0),
+           COALESCE(SUM(t.commission_fee), 0), COUNT(t.commission_fee), MAX(t.quantity * t.price_per_unit)
+      INTO v_count, v_invested, v_commissions, v_fees, v_max
+    FROM transactions t
+    WHERE t.P_ID = NEW.P_ID;
+
+    SELECT COALESCE(SUM(a.trade_count), 0), COALESCE(SUM(a.invested), 0),
+           COALESCE(SUM(a.commissions), 0), COALESCE(SUM(a.commission_count), 0), MAX(a.max_value)
+      INTO a_count, a_invested, a_commissions, a_fees, a_max
+    FROM archived_trade_totals a
+    WHERE a.P_ID = NEW.P_ID;
+
+    SET v_count = v_count + a_count;
+    SET v_invested = v_invested + a_invested;
+    SET v_commissions = v_commissions + a_commissions;
+    SET v_fees = v_fees + a_fees;
+    SET v_max = GREATEST(COALESCE(v_max, a_max), COALESCE(a_max, v_max));
+
+    UPDATE portfolio_performance_rollup
+    SET portfolio_count = portfolio_count - (shard = 0),
+        transaction_count = transaction_count - IF(shard = 0, v_count, 0),
+        total_invested = total_invested - IF(shard = 0, v_invested, 0),
+        total_commissions = total_commissions - IF(shard = 0, v_commissions, 0),
+        commission_count = commission_count - IF(shard = 0, v_fees, 0),
+        max_stale = max_stale OR COALESCE(v_max >= max_transaction_value, FALSE)
+    WHERE currency_null = (OLD.currency IS NULL) AND currency = COALESCE(OLD.currency, '')
+      AND risk_level = COALESCE(OLD.risk_level, '');
+
+    INSERT INTO portfolio_performance_rollup
+      (currency_null, currency, risk_level, shard, portfolio_count, transaction_count, total_invested,
+       total_commissions, commission_count, max_transaction_value)
+    VALUES (NEW.currency IS NULL, COALESCE(NEW.currency, ''), COALESCE(NEW.risk_level, ''), 0, 1,
+            v_count, v_invested, v_commissions, v_fees, v_max)
+    ON DUPLICATE KEY UPDATE
+      portfolio_count = portfolio_count + 1,
+      transaction_count = transaction_count + VALUES(transaction_count),
+      total_invested = total_invested + VALUES(total_invested),
+      total_commissions = total_commissions + VALUES(total_commissions),
+      commission_count = commission_count + VALUES(commission_count),
+      max_transaction_value = GREATEST(
+        COALESCE(max_transaction_value, VALUES(max_transaction_value)),
+        COALESCE(VALUES(max_transaction_value), max_transaction_value)
+      );
+  END IF;
+END $$
+
+DELIMITER ;
@@ -17,6 +17,9 @@ END $$
 
 -- Procedure: Process_Trade
 -- Inserts a transaction with commission_fee computed as quantity * price_per_unit * commission_rate
+-- Portfolio and product are checked here: a partitioned transactions table has no foreign keys.
+-- The checks are locking reads (FOR SHARE), held until commit, so the portfolio cannot be
+-- soft-deleted (and later purged) or the product deleted under a trade being written
 DROP PROCEDURE IF EXISTS Process_Trade $$
 CREATE PROCEDURE Process_Trade(
   IN in_p_id INT,
@@ -27,9 +30,21 @@ CREATE PROCEDURE Process_Trade(
 )
 BEGIN
   DECLARE fee DECIMAL(8,2);
+  DECLARE v_found INT DEFAULT NULL;
   IF in_commission_rate IS NULL THEN
     SET in_commission_rate = 0;
   END IF;
+  SELECT P_ID INTO v_found FROM portfolios
+  WHERE P_ID = in_p_id AND deleted_at IS NULL
+  FOR SHARE;
+  IF v_found IS NULL THEN
+    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Process_Trade: portfolio does not exist';
+  END IF;
+  SET v_found = NULL;
+  SELECT Product_ID INTO v_found FROM products WHERE Product_ID = in_product_id FOR SHARE;
+  IF v_found IS NULL THEN
+    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Process_Trade: product does not exist';
+  END IF;
   SET fee = ROUND(in_quantity * in_price_per_unit * in_commission_rate, 2);
   INSERT INTO transactions(P_ID, Product_ID, quantity, price_per_unit, transaction_date, commission_fee)
   VALUES (in_p_id, in_product_id, in_quantity, in_price_per_unit, NOW(), fee);
@@ -30,32 +30,38 @@ JOIN products pr ON pr.Product_ID = t.Product_ID
 ORDER BY p.P_ID, t.transaction_date DESC;
 
 -- ============================================================================
--- REPORT 2: Top Portfolios by Value (NESTED QUERY)
+-- REPORT 2: Top Portfolios by Value (WINDOW QUERY)
 -- ============================================================================
--- Uses subquery to find portfolios with total value above average.
--- Shows portfolios that exceed the average portfolio value.
+-- Aggregates transactions once per portfolio, then uses window functions for the
+-- average and percentile rank (MySQL 8+). Shows portfolios above the average value
+-- of portfolios with trades. The app also supports top-N, a percentile cutoff
+-- (r.pct_rank >= 0.90), and currency / owner type filters.
 -- ============================================================================
-SELECT 
-  p.P_ID AS portfolio_id,
-  p.P_name AS portfolio_name,
-  COALESCE(CONCAT(c.first_name, ' ', c.last_name), e.E_name) AS owner_name,
-  p.currency,
-  COALESCE(SUM(t.quantity * t.price_per_unit), 0) AS total_value
-FROM portfolios p
-LEFT JOIN customers c ON p.C_ID = c.C_ID
-LEFT JOIN employees e ON p.E_ID = e.E_ID
-LEFT JOIN transactions t ON t.P_ID = p.P_ID
-GROUP BY p.P_ID, p.P_name, owner_name, p.currency
-HAVING COALESCE(SUM(t.quantity * t.price_per_unit), 0) > (
-  SELECT AVG(portfolio_value)
-  FROM (
-    SELECT SUM(t2.quantity * t2.price_per_unit) AS portfolio_value
-    FROM portfolios p2
-    JOIN transactions t2 ON t2.P_ID = p2.P_ID
-    GROUP BY p2.P_ID
-  ) AS avg_values
+WITH portfolio_values AS (
+  SELECT t.P_ID, SUM(t.quantity * t.price_per_unit) AS total_value
+  FROM transactions t
+  GROUP BY t.P_ID
+),
+ranked AS (
+  SELECT
+    p.P_ID AS portfolio_id,
+    p.P_name AS portfolio_name,
+    COALESCE(CONCAT(c.first_name, ' ', c.last_name), e.E_name) AS owner_name,
+    CASE WHEN p.C_ID IS NOT NULL THEN 'Customer' ELSE 'Employee' END AS owner_type,
+    p.currency,
+    COALESCE(v.total_value, 0) AS total_value,
+    AVG(v.total_value) OVER () AS avg_value,
+    PERCENT_RANK() OVER (ORDER BY COALESCE(v.total_value, 0)) AS pct_rank
+  FROM portfolios p
+  LEFT JOIN portfolio_values v ON v.P_ID = p.P_ID
+  LEFT JOIN customers c ON p.C_ID = c.C_ID
+  LEFT JOIN employees e ON p.E_ID = e.E_ID
 )
-ORDER BY total_value DESC;
+SELECT r.portfolio_id, r.portfolio_name, r.owner_name, r.owner_type,
+       r.currency, r.total_value, r.avg_value, r.pct_rank
+FROM ranked r
+WHERE r.total_value > r.avg_value
+ORDER BY r.total_value DESC, r.portfolio_id;
 
 -- ============================================================================
 -- REPORT 3: Portfolio Performance Summary (AGGREGATE QUERY)